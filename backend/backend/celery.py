@@ -51,6 +51,14 @@ app.conf.beat_schedule = {
         'task': 'docscanner_app.tasks.send_trial_expired_emails',
         'schedule': crontab(hour=10, minute=15, day_of_week='1-5'),
     },
+    'refresh-dashboard-rollups': {
+        'task': 'docscanner_app.tasks.refresh_dashboard_rollups',
+        'schedule': crontab(minute=2),
+    },
+    'rebuild-dashboard-rollups': {
+        'task': 'docscanner_app.tasks.rebuild_dashboard_rollups',
+        'schedule': crontab(hour=3, minute=40),
+    },
 }
 
 
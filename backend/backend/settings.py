@@ -266,6 +266,33 @@ CLOUD_WEBHOOK_BASE_URL = os.getenv(
 )
 
 
+# OCR backend'ai: "gcv" (Google Vision) arba "paddle" (lokalus PaddleOCR worker)
+OCR_PRIMARY_BACKEND = os.getenv("OCR_PRIMARY_BACKEND", "gcv")
+OCR_FALLBACK_BACKEND = os.getenv("OCR_FALLBACK_BACKEND", "")
+
+# PaddleOCR worker (manage.py run_paddle_ocr_worker)
+PADDLE_OCR_WORKER_HOST = os.getenv("PADDLE_OCR_WORKER_HOST", "127.0.0.1")
+PADDLE_OCR_WORKER_PORT = int(os.getenv("PADDLE_OCR_WORKER_PORT", "8765"))
+PADDLE_OCR_WORKER_AUTHKEY = os.getenv("PADDLE_OCR_WORKER_AUTHKEY", "")  # privalomas, >= 16 simbolių
+PADDLE_OCR_MAX_BATCH_PAGES = int(os.getenv("PADDLE_OCR_MAX_BATCH_PAGES", "8"))
+PADDLE_OCR_BATCH_WAIT_SECONDS = float(os.getenv("PADDLE_OCR_BATCH_WAIT_SECONDS", "0.05"))
+PADDLE_OCR_REQUEST_TIMEOUT = int(os.getenv("PADDLE_OCR_REQUEST_TIMEOUT", "120"))
+
+# Kelių sąskaitų mokėjimų paieška matching engine'uose:
+# "subset_sum" (tikslus poaibis, utils/subset_sum.py) arba "greedy" (senas FIFO)
+PAYMENT_MULTI_SOLVER = os.getenv("PAYMENT_MULTI_SOLVER", "subset_sum")
+
+# Incremental matching (utils/incremental_matching.py): MatchingChange eilė,
+# apdorojama ne dažniau kaip kas INCREMENTAL_MATCHING_DELAY s vienam vartotojui
+INCREMENTAL_MATCHING_ENABLED = os.getenv("INCREMENTAL_MATCHING_ENABLED", "true").lower() == "true"
+INCREMENTAL_MATCHING_DELAY = int(os.getenv("INCREMENTAL_MATCHING_DELAY", "30"))
+
+# Perkėlimas į apskaitą (services/accounting_transfer_job.py): iki tiek dokumentų
+# vykdoma request'e, daugiau — Celery; užstrigęs job'as pratęsiamas po STALE s
+ACCOUNTING_TRANSFER_SYNC_LIMIT = int(os.getenv("ACCOUNTING_TRANSFER_SYNC_LIMIT", "20"))
+ACCOUNTING_TRANSFER_STALE_SECONDS = int(os.getenv("ACCOUNTING_TRANSFER_STALE_SECONDS", "600"))
+
+
 # Авто ID
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -275,6 +302,27 @@ CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:63
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 
+# Bendras cache visiems procesams (gunicorn + Celery prefork worker'iai).
+# Be jo Django naudoja LocMemCache atskirai kiekvienam procesui, todėl
+# proc_attempt / dedup / debounce raktai tarp worker'ių nesidalina.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/2"),
+        "KEY_PREFIX": "dokskenas",
+        "TIMEOUT": 600,
+    }
+}
+# namespace -> TTL (s); perrašo utils/shared_cache.NAMESPACE_TTLS
+CACHE_NAMESPACE_TTLS = {}
+
+# Išorinių API rate limiter (utils/rate_limiter.py); pagal nutylėjimą — Celery broker Redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# provider -> (capacity, period_seconds); perrašo DEFAULT_RATE_LIMITS
+RATE_LIMITS = {
+    # "google_vision": (55, 60),
+}
+
 TASKS = {
     "default": {
         "BACKEND": "django_tasks.backends.immediate.ImmediateBackend"
@@ -1,18 +1,51 @@
+from itertools import islice
+
 from django.db import transaction
 from ..models import ProductAutocomplete, ClientAutocomplete
 from openpyxl import load_workbook
-import io
 from ..utils.client_autocomplete_upsert import normalize_name
 
 
-def _get_xlsx_rows(file, required_fields):
+# Kiek eilučių validuojam ir upsert'inam vienu batch'u (viena transakcija)
+IMPORT_BATCH_SIZE = 2000
+
+
+def _norm_header(h: str) -> str:
+    h = (h or "").strip()
+
+    if "(" in h:
+        h = h[:h.index("(")]
+
+    h = h.strip()
+
+    if h.endswith("*"):
+        h = h[:-1]
+
+    h = h.strip().lower()
+
+    aliases = {
+        "mato vnt": "mato_vnt",
+        "mato vnt.": "mato_vnt",
+        "mato_vnt.": "mato_vnt",
+        "matavimo vienetas": "mato_vnt",
+        "matavimo_vienetas": "mato_vnt",
+        "unit": "mato_vnt",
+    }
+
+    return aliases.get(h, h)
+
+
+def _open_xlsx_rows(file, required_fields):
     """
-    Читает строки из XLSX и возвращает list[dict] с НОРМАЛИЗОВАННЫМИ ключами заголовков.
+    Atidaro XLSX read_only režimu, patikrina antraštes ir grąžina
+    (eilučių generatorius, apytikslis eilučių skaičius).
+
+    Generatorius yield'ina (row_num, dict) su НОРМАЛИЗОВАННЫМИ ключами заголовков.
     Нормализация: trim, lower, удаление конечной '*' (pvz. 'imones_kodas*' -> 'imones_kodas').
+    Visas failas į atmintį nekraunamas — eilutės skaitomos lazy.
     """
     file.seek(0)
-    file_bytes = file.read()
-    wb = load_workbook(filename=io.BytesIO(file_bytes), read_only=True, data_only=True)
+    wb = load_workbook(filename=file, read_only=True, data_only=True)
     ws = wb.active
 
     # 1) заголовки raw
@@ -20,51 +53,48 @@ def _get_xlsx_rows(file, required_fields):
     raw_headers = [str(c.value).strip() if c.value else "" for c in raw_header_cells]
 
     # 2) normalizacija
-    def norm(h: str) -> str:
-        h = (h or "").strip()
-
-        if "(" in h:
-            h = h[:h.index("(")]
-
-        h = h.strip()
-
-        if h.endswith("*"):
-            h = h[:-1]
-
-        h = h.strip().lower()
-
-        aliases = {
-            "mato vnt": "mato_vnt",
-            "mato vnt.": "mato_vnt",
-            "mato_vnt.": "mato_vnt",
-            "matavimo vienetas": "mato_vnt",
-            "matavimo_vienetas": "mato_vnt",
-            "unit": "mato_vnt",
-        }
-
-        return aliases.get(h, h)
-
-    norm_headers = [norm(h) for h in raw_headers]
+    norm_headers = [_norm_header(h) for h in raw_headers]
 
     # 3) validate required (jau be žvaigždučių)
     need = {f.strip().lower() for f in required_fields}
     have = set(norm_headers)
     if not need.issubset(have):
+        wb.close()
         missing = ", ".join(sorted(need - have))
         raise Exception(f"Nerasta {missing} stulpelio")
 
+    total_estimate = max((ws.max_row or 1) - 1, 0)
+
     # 4) rows -> dict su normalizuotais raktai
-    rows = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if not any(v is not None for v in row):
-            continue
-        d = {}
-        for i, val in enumerate(row[:len(norm_headers)]):
-            key = norm_headers[i]
-            d[key] = (str(val).strip() if val is not None else "")
-        rows.append(d)
+    def _rows():
+        try:
+            for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+                if not any(v is not None for v in row):
+                    continue
+                d = {}
+                for i, val in enumerate(row[:len(norm_headers)]):
+                    key = norm_headers[i]
+                    d[key] = (str(val).strip() if val is not None else "")
+                yield row_num, d
+        finally:
+            wb.close()
+
+    return _rows(), total_estimate
 
-    return rows
+
+def _get_xlsx_rows(file, required_fields):
+    """Suderinamumui: visos eilutės kaip list[dict]."""
+    rows, _ = _open_xlsx_rows(file, required_fields)
+    return [d for _, d in rows]
+
+
+def _chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 def _norm_preke_paslauga(value) -> str:
@@ -102,7 +132,53 @@ def _norm_preke_paslauga(value) -> str:
     return ""  # neatspažinta — paliekam tuščią
 
 
-def import_products_from_xlsx(user, file):
+PRODUCT_UPSERT_FIELDS = ["prekes_pavadinimas", "prekes_barkodas", "preke_paslauga"]
+
+
+def _upsert_products_batch(user, batch):
+    """
+    batch: list[(field_values, unit_column_present)].
+    Vienas SELECT (kurie kodai jau yra) + INSERT ... ON CONFLICT (user, prekes_kodas) DO UPDATE.
+    Grąžina (imported, updated).
+    """
+    codes = [fv["prekes_kodas"] for fv, _ in batch]
+    existing_codes = set(
+        ProductAutocomplete.objects
+        .filter(user=user, prekes_kodas__in=codes)
+        .values_list("prekes_kodas", flat=True)
+    )
+
+    # Если в Excel вообще есть колонка mato_vnt, обновляем unit.
+    # Если колонки нет, старое значение не трогаем — todėl du atskiri upsert'ai.
+    with_unit = [ProductAutocomplete(user=user, **fv) for fv, has_unit in batch if has_unit]
+    without_unit = [ProductAutocomplete(user=user, **fv) for fv, has_unit in batch if not has_unit]
+
+    with transaction.atomic():
+        if with_unit:
+            ProductAutocomplete.objects.bulk_create(
+                with_unit,
+                update_conflicts=True,
+                unique_fields=["user", "prekes_kodas"],
+                update_fields=PRODUCT_UPSERT_FIELDS + ["unit"],
+            )
+        if without_unit:
+            ProductAutocomplete.objects.bulk_create(
+                without_unit,
+                update_conflicts=True,
+                unique_fields=["user", "prekes_kodas"],
+                update_fields=PRODUCT_UPSERT_FIELDS,
+            )
+
+    updated = sum(1 for c in codes if c in existing_codes)
+    return len(codes) - updated, updated
+
+
+def import_products_from_xlsx(user, file, on_progress=None):
+    """
+    Streaming importas: eilutės skaitomos lazy, validuojamos ir upsert'inamos
+    po IMPORT_BATCH_SIZE (kiekvienas batch — atskira trumpa transakcija).
+    on_progress(processed, total_estimate) kviečiamas po kiekvieno batch'o.
+    """
     imported = 0
     updated = 0
     skipped_empty = 0
@@ -111,14 +187,15 @@ def import_products_from_xlsx(user, file):
     errors = []
 
     try:
-        rows = _get_xlsx_rows(file, required_fields=["prekes_kodas", "prekes_pavadinimas"])
+        rows, total_estimate = _open_xlsx_rows(file, required_fields=["prekes_kodas", "prekes_pavadinimas"])
     except Exception as e:
         return {"error": str(e)}
 
     seen_codes = set()
 
-    with transaction.atomic():
-        for row_num, data in enumerate(rows, start=2):
+    for chunk in _chunked(rows, IMPORT_BATCH_SIZE):
+        batch = []
+        for row_num, data in chunk:
             total += 1
 
             prekes_kodas = (data.get('prekes_kodas') or '').strip()
@@ -149,32 +226,25 @@ def import_products_from_xlsx(user, file):
             seen_codes.add(prekes_kodas)
 
             field_values = {
+                "prekes_kodas": prekes_kodas,
                 "prekes_pavadinimas": prekes_pavadinimas,
                 "prekes_barkodas": (
                     data.get("prekes_barkodas") or ""
                 ).strip(),
                 "preke_paslauga": preke_paslauga,
             }
-
-            # Если в Excel вообще есть колонка mato_vnt,
-            # обновляем unit. Если колонки нет, старое значение не трогаем.
             if unit_column_present:
                 field_values["unit"] = unit or None
 
-            existing = ProductAutocomplete.objects.filter(
-                user=user, prekes_kodas=prekes_kodas
-            ).first()
-
-            if existing:
-                for attr, val in field_values.items():
-                    setattr(existing, attr, val)
-                existing.save()
-                updated += 1
-            else:
-                ProductAutocomplete.objects.create(
-                    user=user, prekes_kodas=prekes_kodas, **field_values
-                )
-                imported += 1
+            batch.append((field_values, unit_column_present))
+
+        if batch:
+            batch_imported, batch_updated = _upsert_products_batch(user, batch)
+            imported += batch_imported
+            updated += batch_updated
+
+        if on_progress:
+            on_progress(total, total_estimate)
 
     return {
         "imported": imported,
@@ -203,22 +273,121 @@ def _norm_fizinis_asmuo(value):
     return None  # neatpažinta reikšmė
 
 
-def import_clients_from_xlsx(user, file):
+CLIENT_UPSERT_FIELDS = [
+    "pavadinimas", "is_person", "pvm_kodas", "ibans", "address",
+    "country_iso", "kodas_programoje", "name_normalized", "imones_kodas",
+]
+
+
+def _save_clients_rowwise(to_update, to_create, errors):
+    """Fallback, kai batch'as nepraėjo (pvz. IntegrityError): kiekviena eilutė atskirai su savepoint."""
+    imported = 0
+    updated = 0
+    for row_num, obj in to_update:
+        try:
+            with transaction.atomic():
+                obj.save(update_fields=CLIENT_UPSERT_FIELDS)
+            updated += 1
+        except Exception as e:
+            errors.append(f"Eilutė {row_num}: {str(e)}")
+    for row_num, obj in to_create:
+        try:
+            with transaction.atomic():
+                obj.save()
+            imported += 1
+        except Exception as e:
+            errors.append(f"Eilutė {row_num}: {str(e)}")
+    return imported, updated
+
+
+def _upsert_clients_batch(user, batch, errors):
+    """
+    batch: list[(row_num, code, pvm, field_values)].
+    Egzistuojantys įrašai randami dviem užklausom (pagal kodą, tada pagal PVM kodą),
+    atnaujinami bulk_update, nauji — bulk_create. Grąžina (imported, updated).
+    """
+    codes = [code for _, code, _, _ in batch]
+    by_code = {
+        c.imones_kodas: c
+        for c in ClientAutocomplete.objects.filter(
+            user=user, source="imported", imones_kodas__in=codes
+        )
+    }
+
+    pvms = [pvm for _, code, pvm, _ in batch if pvm and code not in by_code]
+    by_pvm = {}
+    if pvms:
+        # .first() semantika — mažiausias id laimi
+        for c in (
+            ClientAutocomplete.objects
+            .filter(user=user, source="imported", pvm_kodas__in=pvms)
+            .order_by("-id")
+        ):
+            by_pvm[c.pvm_kodas] = c
+
+    used_ids = set()
+    to_update = []
+    to_create = []
+    for row_num, code, pvm, field_values in batch:
+        existing = by_code.get(code)
+        if existing is None and pvm:
+            existing = by_pvm.get(pvm)
+        if existing is not None and existing.pk in used_ids:
+            existing = None
+
+        if existing is not None:
+            used_ids.add(existing.pk)
+            for attr, val in field_values.items():
+                setattr(existing, attr, val)
+            existing.imones_kodas = code
+            to_update.append((row_num, existing))
+        else:
+            to_create.append((row_num, ClientAutocomplete(
+                user=user,
+                imones_kodas=code,
+                source="imported",
+                doc_count=0,
+                **field_values,
+            )))
+
+    try:
+        with transaction.atomic():
+            if to_update:
+                ClientAutocomplete.objects.bulk_update(
+                    [obj for _, obj in to_update], CLIENT_UPSERT_FIELDS
+                )
+            if to_create:
+                ClientAutocomplete.objects.bulk_create([obj for _, obj in to_create])
+    except Exception:
+        return _save_clients_rowwise(to_update, to_create, errors)
+
+    return len(to_create), len(to_update)
+
+
+def import_clients_from_xlsx(user, file, on_progress=None):
+    """
+    Streaming importas: eilutės skaitomos lazy, validuojamos ir upsert'inamos
+    po IMPORT_BATCH_SIZE. on_progress(processed, total_estimate) — po kiekvieno batch'o.
+    """
     imported = 0
     updated = 0
     skipped_empty = 0
     skipped_duplicate = 0
+    total = 0
     errors = []
 
     try:
-        rows = _get_xlsx_rows(file, required_fields=["kodas", "pavadinimas"])
+        rows, total_estimate = _open_xlsx_rows(file, required_fields=["kodas", "pavadinimas"])
     except Exception as e:
         return {"error": str(e)}
 
     seen_codes = set()
 
-    with transaction.atomic():
-        for row_num, data in enumerate(rows, start=2):
+    for chunk in _chunked(rows, IMPORT_BATCH_SIZE):
+        batch = []
+        for row_num, data in chunk:
+            total += 1
+
             name = (data.get('pavadinimas') or '').strip()
             code = (data.get('kodas') or '').strip()
             pvm = (data.get('pvm_kodas') or '').strip()
@@ -261,43 +430,21 @@ def import_clients_from_xlsx(user, file):
                 kodas_programoje=(data.get('kodas_programoje') or '').strip(),
                 name_normalized=normalize_name(name),
             )
+            batch.append((row_num, code, pvm, field_values))
 
-            # ── Upsert ──
-            existing = None
-            if code:
-                existing = ClientAutocomplete.objects.filter(
-                    user=user, imones_kodas=code, source="imported"
-                ).first()
-            if not existing and pvm:
-                existing = ClientAutocomplete.objects.filter(
-                    user=user, pvm_kodas=pvm, source="imported"
-                ).first()
-
-            try:
-                if existing:
-                    for attr, val in field_values.items():
-                        setattr(existing, attr, val)
-                    if code:
-                        existing.imones_kodas = code
-                    existing.save()
-                    updated += 1
-                else:
-                    ClientAutocomplete.objects.create(
-                        user=user,
-                        imones_kodas=code,
-                        source="imported",
-                        doc_count=0,
-                        **field_values,
-                    )
-                    imported += 1
-            except Exception as e:
-                errors.append(f"Eilutė {row_num}: {str(e)}")
+        if batch:
+            batch_imported, batch_updated = _upsert_clients_batch(user, batch, errors)
+            imported += batch_imported
+            updated += batch_updated
+
+        if on_progress:
+            on_progress(total, total_estimate)
 
     return {
         "imported": imported,
         "updated": updated,
         "skipped_empty": skipped_empty,
         "skipped_duplicate": skipped_duplicate,
-        "processed": len(rows),
+        "processed": total,
         "errors": errors,
-    }
\ No newline at end of file
+    }
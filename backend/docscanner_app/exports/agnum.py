@@ -6,7 +6,7 @@ from datetime import date
 from django.utils.encoding import smart_str
 
 from .formatters import format_date_agnum, expand_empty_tags, COUNTRY_NAME_LT
-from ..models import CurrencyRate
+from ..utils.shared_cache import lookup_currency_rate
 from ..utils.extra_fields import get_extra_for_export
 
 
@@ -168,13 +168,9 @@ def get_currency_rate(currency_code, date_obj):
     if not currency_code or currency_code.upper() == "EUR":
         logger.info("[AGNUM:RATE] currency=%r -> 1.0", currency_code)
         return 1.0
-    obj = CurrencyRate.objects.filter(currency=currency_code.upper(), date=date_obj).first()
-    if obj:
-        logger.info("[AGNUM:RATE] currency=%s date=%s -> exact=%s", currency_code, date_obj, obj.rate)
-        return obj.rate
-    obj = CurrencyRate.objects.filter(currency=currency_code.upper(), date__lt=date_obj).order_by("-date").first()
-    logger.info("[AGNUM:RATE] currency=%s date=%s -> prev=%s", currency_code, date_obj, (obj.rate if obj else None))
-    return obj.rate if obj else None
+    rate = lookup_currency_rate(currency_code, date_obj)
+    logger.info("[AGNUM:RATE] currency=%s date=%s -> %s", currency_code, date_obj, rate)
+    return rate
 
 
 def build_dok_nr(series: str, number: str) -> str:
@@ -14,7 +14,7 @@ from django.utils.encoding import smart_str
 from django.utils.timezone import localdate
 
 from .formatters import format_date_iso, get_price_or_zero, expand_empty_tags
-from ..models import CurrencyRate
+from ..utils.shared_cache import lookup_currency_rate
 
 logger = logging.getLogger("docscanner_app")
 
@@ -162,16 +162,10 @@ def _get_currency_rate(currency_code: str, date_obj) -> float:
     code = (currency_code or '').upper() or 'EUR'
     if code == 'EUR':
         return 1.0
-    obj = CurrencyRate.objects.filter(currency=code, date=date_obj).first()
-    if obj and getattr(obj, 'rate', None):
+    rate = lookup_currency_rate(code, date_obj)
+    if rate:
         try:
-            return float(obj.rate) if obj.rate else 1.0
-        except Exception:
-            return 1.0
-    obj = CurrencyRate.objects.filter(currency=code, date__lt=date_obj).order_by('-date').first()
-    if obj and getattr(obj, 'rate', None):
-        try:
-            return float(obj.rate) if obj.rate else 1.0
+            return float(rate)
         except Exception:
             return 1.0
     return 1.0
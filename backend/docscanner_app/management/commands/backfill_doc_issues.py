@@ -0,0 +1,76 @@
+"""
+Management command: užpildo ScannedDocument.issue_flags / has_issues / issue_count
+(utils/doc_issues.py) dokumentams, išsaugotiems prieš migraciją 0168.
+
+Dokumentai skaitomi batch'ais pagal id (keyset), kraunami tik id + JSON laukai,
+įrašoma bulk_update — save() ir signalai nekviečiami. Saugu paleisti kelis kartus.
+
+Использование:
+    python manage.py backfill_doc_issues
+    python manage.py backfill_doc_issues --user 12 --batch 500
+    python manage.py backfill_doc_issues --dry-run
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Perskaičiuoja dokumentų problemų santrauką (issue_* stulpelius)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, default=None)
+        parser.add_argument("--batch", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Tik suskaičiuoti pakeitimus")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.models import ScannedDocument
+        from docscanner_app.utils.doc_issues import ISSUE_FIELDS, issue_field_values
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        batch = options["batch"]
+        if batch <= 0:
+            raise CommandError("--batch must be positive")
+
+        base = ScannedDocument.objects.all()
+        if options["user"]:
+            base = base.filter(user_id=options["user"])
+
+        t0 = time.perf_counter()
+        last_id = 0
+        scanned = changed = with_issues = 0
+
+        while True:
+            rows = list(
+                base.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "structured_json", "gpt_raw_json", *ISSUE_FIELDS)[:batch]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+            dirty = []
+            for doc in rows:
+                values = issue_field_values(doc.structured_json, doc.gpt_raw_json)
+                if values["has_issues"]:
+                    with_issues += 1
+                if any(getattr(doc, f) != v for f, v in values.items()):
+                    for f, v in values.items():
+                        setattr(doc, f, v)
+                    dirty.append(doc)
+
+            changed += len(dirty)
+            if dirty and not options["dry_run"]:
+                ScannedDocument.objects.bulk_update(dirty, list(ISSUE_FIELDS))
+
+            self.stdout.write(f"  ... id<={last_id}: {scanned} scanned, {changed} changed")
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{scanned} documents, {changed} updated, {with_issues} with issues "
+            f"in {time.perf_counter() - t0:.2f}s"
+        ))
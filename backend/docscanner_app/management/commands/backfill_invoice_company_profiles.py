@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from docscanner_app.models import Invoice, CompanyProfile, CustomUser
+from docscanner_app.services.debts_ledger import invalidate_debt_snapshots
 
 
 class Command(BaseCommand):
@@ -40,6 +41,8 @@ class Command(BaseCommand):
 
             if not dry:
                 null_qs.update(company_profile=target)
+                # .update() aplenkia signals.py — skolų kopijos invaliduojamos čia
+                invalidate_debt_snapshots(target.id, None, "customer")
             updated += n
 
         self.stdout.write(self.style.SUCCESS(
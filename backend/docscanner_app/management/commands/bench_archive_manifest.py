@@ -0,0 +1,145 @@
+"""
+Management command: archyvo narių skaičiavimo benchmark'as —
+buvęs compute_expected_items (pilni zip / tar / 7z / rar skaitytuvai)
+prieš archive_manifest() (tik archyvo katalogas, utils/file_converter.py).
+
+Archyvai nurodomi keliais arba sugeneruojami (--generate-mb): ZIP (stored),
+TAR ir TAR.GZ su atsitiktinio turinio „PDF“ failais bei keliais
+sisteminiais / nepalaikomais failais.
+
+Использование:
+    python manage.py bench_archive_manifest /data/big.zip /data/big.tar.gz
+    python manage.py bench_archive_manifest --generate-mb 2048 --member-kb 2048
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Benchmark: archyvo narių skaičiavimas (pilnas skaitymas vs manifest)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*")
+        parser.add_argument("--generate-mb", type=int, default=0, help="Sugeneruoti tokio dydžio archyvus")
+        parser.add_argument("--member-kb", type=int, default=1024)
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--keep", action="store_true", help="Neištrinti sugeneruotų archyvų")
+
+    def handle(self, *args, **options):
+        import logging
+        import os
+        import shutil
+        import tempfile
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        paths = list(options["paths"])
+        tmpdir = None
+        if options["generate_mb"]:
+            if options["member_kb"] <= 0:
+                raise CommandError("--member-kb must be positive")
+            tmpdir = tempfile.mkdtemp(prefix="bench_archive_")
+            paths += self._generate(tmpdir, options["generate_mb"], options["member_kb"])
+        if not paths:
+            raise CommandError("Nurodykite archyvus arba --generate-mb")
+
+        try:
+            for path in paths:
+                if not os.path.exists(path):
+                    raise CommandError(f"{path} not found")
+                self._bench(path, max(1, options["repeat"]))
+        finally:
+            if tmpdir and not options["keep"]:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+            elif tmpdir:
+                self.stdout.write(f"Archives kept in {tmpdir}")
+
+    def _bench(self, path, repeat):
+        import os
+        from docscanner_app.utils.file_converter import archive_manifest
+
+        name = os.path.basename(path)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        t_legacy = t_manifest = float("inf")
+        legacy = manifest = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            legacy = _legacy_count(path, name)
+            t_legacy = min(t_legacy, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            manifest = archive_manifest(path, name)
+            t_manifest = min(t_manifest, time.perf_counter() - t0)
+
+        skipped = (
+            len(manifest["unsupported"]) + len(manifest["too_large"])
+            + manifest["skipped_system"] + manifest["skipped_unsafe"]
+        )
+        speedup = t_legacy / t_manifest if t_manifest else 0
+        self.stdout.write(
+            f"{name} ({size_mb:.0f} MB): legacy {legacy} files in {t_legacy:.3f}s | "
+            f"manifest {len(manifest['members'])} documents (+{skipped} skipped) "
+            f"in {t_manifest:.3f}s | x{speedup:.1f}"
+        )
+
+    def _generate(self, tmpdir, total_mb, member_kb):
+        import io
+        import os
+        import tarfile
+        import zipfile
+
+        members = max(1, total_mb * 1024 // member_kb)
+        extra = [("__MACOSX/._doc_0001.pdf", b"x"), ("Thumbs.db", b"x"), ("notes.txt", b"x")]
+        payload = os.urandom(member_kb * 1024)  # tas pats turinys — generavimas greitas
+
+        zip_path = os.path.join(tmpdir, "bench.zip")
+        tar_path = os.path.join(tmpdir, "bench.tar")
+        tgz_path = os.path.join(tmpdir, "bench.tar.gz")
+        self.stdout.write(f"Generating {members} members x {member_kb} KB ...")
+
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf, \
+                tarfile.open(tar_path, "w") as tf, \
+                tarfile.open(tgz_path, "w:gz", compresslevel=1) as tgz:
+            for i in range(members):
+                fname = f"docs/doc_{i:05d}.pdf"
+                zf.writestr(fname, payload)
+                for archive in (tf, tgz):
+                    info = tarfile.TarInfo(fname)
+                    info.size = len(payload)
+                    archive.addfile(info, io.BytesIO(payload))
+            for fname, data in extra:
+                zf.writestr(fname, data)
+                for archive in (tf, tgz):
+                    info = tarfile.TarInfo(fname)
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+        return [zip_path, tar_path, tgz_path]
+
+
+def _legacy_count(path, name):
+    """Buvusi compute_expected_items logika (pilni skaitytuvai, be filtro)."""
+    import tarfile
+    import zipfile
+    from docscanner_app.utils.file_converter import TAR_EXTS, _ext
+
+    ext = _ext(name)
+    count = 0
+    if ext == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            count = sum(1 for zi in zf.infolist() if not zi.is_dir() and zi.filename)
+    elif ext in TAR_EXTS:
+        with tarfile.open(path, mode="r:*") as tf:
+            count = sum(1 for m in tf.getmembers() if m.isfile())
+    elif ext == ".7z":
+        import py7zr
+        with py7zr.SevenZipFile(path, mode="r") as sz:
+            count = sum(1 for n in sz.getnames() if not n.endswith("/"))
+    elif ext == ".rar":
+        import rarfile
+        with rarfile.RarFile(path) as rf:
+            count = sum(1 for ri in rf.infolist() if not ri.isdir())
+    else:
+        count = 1
+    return count
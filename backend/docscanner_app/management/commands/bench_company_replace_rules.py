@@ -0,0 +1,129 @@
+"""
+Management command: benchmark'as ir ekvivalentiškumo patikra
+CompiledCompanyReplaceRules prieš apply_company_replace_rules_linear.
+
+Sugeneruoja atsitiktines taisykles ir dokumentus (be DB), pritaiko abiem
+būdais ir palygina galutinę buyer/seller būseną. Linijinis variantas labai
+lėtas, todėl jis leidžiamas tik pirmiems --linear-docs dokumentams.
+
+Использование:
+    python manage.py bench_company_replace_rules
+    python manage.py bench_company_replace_rules --docs 10000 --rules 5000
+    python manage.py bench_company_replace_rules --linear-docs 0
+"""
+import copy
+import random
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+NAMES = ["UAB Alfa", "UAB Beta", "AB Gama", "MB Delta", "Jonas Jonaitis", "IĮ Epsilonas", "UAB Alfa Prekyba"]
+COUNTRIES = ["LT", "LV", "PL", "DE", ""]
+SIDE_FIELDS = ("name", "id", "vat_code", "country_iso", "is_person", "name_normalized", "replaced_by_rule")
+
+
+def _random_code(rng, n_codes):
+    return str(100000000 + rng.randrange(n_codes))
+
+
+def _random_rule(rng, rid, n_codes):
+    rule = {"id": rid, "enabled": rng.random() < 0.95}
+    kind = rng.random()
+    if kind < 0.6:
+        rule["match_kodas"] = _random_code(rng, n_codes)
+    elif kind < 0.9:
+        rule["match_pvm_kodas"] = "LT" + _random_code(rng, n_codes)
+    elif kind < 0.97:
+        rule["match_pavadinimas"] = rng.choice(NAMES)
+    elif kind < 0.98:
+        rule["match_kodas_op"] = rng.choice(["empty", "not_empty"])
+    elif kind < 0.99:
+        rule["match_salies_kodas"] = rng.choice(COUNTRIES[:-1])
+    if rng.random() < 0.1:
+        rule["match_tipas"] = rng.choice(["fizinis", "juridinis"])
+    rule["change_target"] = rng.choice(["", "", "buyer_only", "seller_only"])
+
+    if rng.random() < 0.7:
+        rule["result_kodas"] = _random_code(rng, n_codes)
+    if rng.random() < 0.5:
+        rule["result_pavadinimas"] = rng.choice(NAMES)
+    if rng.random() < 0.2:
+        rule["result_tipas"] = rng.choice(["fizinis", "juridinis"])
+    return rule
+
+
+def _random_doc(rng, pk, n_codes):
+    doc = SimpleNamespace(pk=pk)
+    for side in ("buyer", "seller"):
+        setattr(doc, f"{side}_name", rng.choice(NAMES))
+        setattr(doc, f"{side}_id", _random_code(rng, n_codes) if rng.random() < 0.9 else "")
+        setattr(doc, f"{side}_vat_code", "LT" + _random_code(rng, n_codes) if rng.random() < 0.6 else "")
+        setattr(doc, f"{side}_country_iso", rng.choice(COUNTRIES))
+        setattr(doc, f"{side}_is_person", rng.choice([True, False, None]))
+    return doc
+
+
+def _snapshot(doc):
+    return tuple(
+        getattr(doc, f"{side}_{f}", None)
+        for side in ("buyer", "seller")
+        for f in SIDE_FIELDS
+    )
+
+
+class Command(BaseCommand):
+    help = "Company replace rules: compiled vs linear benchmark + ekvivalentiškumo patikra"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--docs", type=int, default=10000, help="Dokumentų skaičius (default: 10000)")
+        parser.add_argument("--rules", type=int, default=5000, help="Taisyklių skaičius (default: 5000)")
+        parser.add_argument("--codes", type=int, default=3000, help="Skirtingų įmonės kodų (default: 3000)")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--linear-docs", type=int, default=500, help="Kiek dokumentų lyginti su linijiniu (0 — nelyginti)")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.utils.company_replace_rules_applier import (
+            CompiledCompanyReplaceRules, apply_company_replace_rules_linear, _apply_compiled,
+        )
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        seed = options["seed"] if options["seed"] is not None else random.randrange(1 << 30)
+        rng = random.Random(seed)
+        n_codes = options["codes"]
+        self.stdout.write(f"seed={seed} docs={options['docs']} rules={options['rules']}")
+
+        rules = [_random_rule(rng, i + 1, n_codes) for i in range(options["rules"])]
+        docs = [_random_doc(rng, i + 1, n_codes) for i in range(options["docs"])]
+        docs_linear = copy.deepcopy(docs[: options["linear_docs"]])
+
+        t0 = time.perf_counter()
+        compiled = CompiledCompanyReplaceRules(rules)
+        t_compile = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        applied_compiled = [_apply_compiled(d, compiled) for d in docs]
+        t_compiled = time.perf_counter() - t0
+        self.stdout.write(f"compile={t_compile:.3f}s compiled apply={t_compiled:.3f}s")
+
+        if not docs_linear:
+            return
+
+        t0 = time.perf_counter()
+        applied_linear = [apply_company_replace_rules_linear(d, rules) for d in docs_linear]
+        t_linear = time.perf_counter() - t0
+        self.stdout.write(f"linear apply ({len(docs_linear)} docs)={t_linear:.3f}s")
+
+        for a, b, n_a, n_b in zip(docs, docs_linear, applied_compiled, applied_linear):
+            if n_a != n_b or _snapshot(a) != _snapshot(b):
+                raise CommandError(f"Mismatch on doc pk={a.pk} (seed={seed}): {n_a} vs {n_b}")
+
+        per_doc_compiled = t_compiled / len(docs)
+        per_doc_linear = t_linear / len(docs_linear)
+        self.stdout.write(self.style.SUCCESS(
+            f"OK: identical results, per doc {per_doc_compiled * 1000:.2f}ms vs "
+            f"{per_doc_linear * 1000:.2f}ms (x{per_doc_linear / max(per_doc_compiled, 1e-9):.1f})"
+        ))
@@ -0,0 +1,122 @@
+"""
+Management command: greedy vs subset_sum kelių sąskaitų mokėjimams
+(payment_invoice_matching._greedy_multi / _solve_multi).
+
+Sintetiniai išrašai: klientas su N atvirų sąskaitų, mokėjimas = atsitiktinio
+k sąskaitų poaibio likučių suma. Be DB — kandidatai surūšiuoti pagal balą,
+kaip juos paduoda InvoiceMatchingEngine._try_multi.
+
+Matuojama:
+  exact  — pasiūlytų alokacijų suma = mokėjimas ir kiekviena sąskaita
+           padengta pilnai (jokios dirbtinės dalinės įmokos),
+  truth  — parinktas būtent tas poaibis, kuris sumokėtas,
+  laikas — vidutinis ir blogiausias vienam mokėjimui.
+
+Использование:
+    python manage.py bench_multi_invoice_solver
+    python manage.py bench_multi_invoice_solver --payments 500 --min-open 30 --max-open 120
+    python manage.py bench_multi_invoice_solver --min-k 10 --max-k 40 --seed 7
+"""
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Lygina greedy ir subset_sum kelių sąskaitų mokėjimų paiešką"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payments", type=int, default=200)
+        parser.add_argument("--min-open", type=int, default=30)
+        parser.add_argument("--max-open", type=int, default=120)
+        parser.add_argument("--min-k", type=int, default=10)
+        parser.add_argument("--max-k", type=int, default=40)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.utils.payment_invoice_matching import (
+            AMOUNT_TOLERANCE_ABS, _greedy_multi, _solve_multi,
+        )
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        if options["min_k"] < 2 or options["min_k"] > options["max_k"]:
+            raise CommandError("--min-k turi būti >= 2 ir <= --max-k")
+
+        seed = options["seed"] if options["seed"] is not None else random.randrange(1 << 30)
+        rng = random.Random(seed)
+        self.stdout.write(f"seed={seed}")
+
+        exact = lambda a, b: abs(a - b) <= AMOUNT_TOLERANCE_ABS
+        stats = {
+            name: {"exact": 0, "truth": 0, "time": 0.0, "worst": 0.0}
+            for name in ("greedy", "subset_sum")
+        }
+        exhaustive = 0
+
+        for n in range(options["payments"]):
+            candidates, due = self._customer(rng, rng.randint(options["min_open"], options["max_open"]))
+            k = min(rng.randint(options["min_k"], options["max_k"]), len(candidates))
+            paid = rng.sample(candidates, k)
+            amount = sum((c.invoice_remaining for c in paid), Decimal("0"))
+            truth = {c.invoice_id for c in paid}
+
+            runs = {
+                "greedy": lambda: _greedy_multi(amount, candidates, lambda c: c.invoice_remaining, exact),
+                "subset_sum": lambda: _solve_multi(
+                    amount, candidates,
+                    remaining=lambda c: c.invoice_remaining,
+                    due=lambda c: due[c.invoice_id],
+                ),
+            }
+            for name, run in runs.items():
+                t0 = time.perf_counter()
+                res = run()
+                dt = time.perf_counter() - t0
+                if name == "subset_sum":
+                    res, details = res
+                    exhaustive += bool(details.get("exhaustive"))
+
+                st = stats[name]
+                st["time"] += dt
+                st["worst"] = max(st["worst"], dt)
+                if not res:
+                    continue
+                total = sum((take for _, take in res), Decimal("0"))
+                if exact(total, amount) and all(take == c.invoice_remaining for c, take in res):
+                    st["exact"] += 1
+                    if {c.invoice_id for c, _ in res} == truth:
+                        st["truth"] += 1
+
+        total = options["payments"]
+        for name, st in stats.items():
+            self.stdout.write(
+                f"{name:>10}: exact {st['exact']}/{total} ({st['exact'] * 100 / total:.1f}%), "
+                f"true subset {st['truth']}/{total}, "
+                f"avg {st['time'] * 1000 / total:.2f}ms, worst {st['worst'] * 1000:.1f}ms"
+            )
+        self.stdout.write(f"subset_sum exhaustive searches: {exhaustive}/{total}")
+
+    def _customer(self, rng, n_open):
+        from docscanner_app.utils.payment_invoice_matching import MatchCandidate
+
+        candidates = []
+        due = {}
+        for i in range(n_open):
+            amount = Decimal(rng.randint(500, 300000)) / 100
+            candidates.append(MatchCandidate(
+                invoice_id=i + 1,
+                invoice_full_number=f"SF{1000 + i}",
+                invoice_amount=amount,
+                invoice_remaining=amount,
+                buyer_name="UAB Pirkėjas",
+                buyer_code="123456789",
+                score=Decimal(rng.randint(40, 95)) / 100,
+            ))
+            due[i + 1] = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        candidates.sort(key=lambda c: c.score, reverse=True)
+        return candidates, due
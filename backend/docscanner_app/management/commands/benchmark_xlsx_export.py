@@ -0,0 +1,237 @@
+"""
+Management command: XLSX eksporto palyginimas — senas būdas (pilnas openpyxl
+Workbook, celė po celės, BytesIO) prieš utils/xlsx_stream.py (write_only,
+NamedStyle, laikinas failas). DB nenaudojama — eilutės sugeneruojamos.
+
+Kiekvienas variantas vykdomas atskirame (fork) procese: matuojamas laikas,
+RSS prieaugis (VmHWM − VmRSS sugeneravus duomenis) ir failo dydis.
+
+Использование:
+    python manage.py benchmark_xlsx_export
+    python manage.py benchmark_xlsx_export --rows 50000 --kind journal
+"""
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+
+def _proc_status_kb(key):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ── Sintetiniai duomenys ────────────────────────────────────
+
+def _journal_data(n, seed):
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    entries = []
+    for i in range(n):
+        pardavimas = rng.random() < 0.5
+        amount = f"{rng.uniform(1, 5000):.2f}"
+        entries.append({
+            "invoice_date": (start + timedelta(days=rng.randrange(365))).isoformat(),
+            "serija_nr": f"AA-{i:06d}",
+            "counterparty": f"UAB Kontrahentas {rng.randrange(2000)}",
+            "turinys": "Pajamos" if pardavimas else "Išlaidos",
+            "pajamos": amount if pardavimas else None,
+            "islaidos": None if pardavimas else amount,
+        })
+    summary = {
+        "pardavimo_operacijos": sum(1 for e in entries if e["pajamos"]),
+        "pirkimo_operacijos": sum(1 for e in entries if e["islaidos"]),
+        "pajamu_suma": "0",
+        "islaidu_suma": "0",
+    }
+    return entries, summary
+
+
+def _waybill_rows(n, seed):
+    from docscanner_app.views import EXPORT_COLUMNS
+
+    rng = random.Random(seed)
+    return [
+        [f"{field[:6]}-{rng.randrange(10 ** 6)}" for field, _ in EXPORT_COLUMNS]
+        for _ in range(n)
+    ]
+
+
+# ── Senas būdas (kaip buvo views.py iki write_only) ─────────
+
+def _legacy_journal(entries, summary):
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+    wb = Workbook()
+    header_font = Font(bold=True, size=11)
+    header_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
+    thin_border = Border(
+        left=Side(style="thin"), right=Side(style="thin"),
+        top=Side(style="thin"), bottom=Side(style="thin"),
+    )
+    ws1 = wb.active
+    ws1.title = "Operacijos"
+    headers = ["Eil. Nr.", "Sąskaitos data", "Serija ir numeris",
+               "Pirkėjas/pardavėjas", "Turinys", "Pajamos, EUR", "Išlaidos, EUR"]
+    for col_idx, h in enumerate(headers, 1):
+        cell = ws1.cell(row=1, column=col_idx, value=h)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.border = thin_border
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    for row_idx, entry in enumerate(entries, 1):
+        r = row_idx + 1
+        ws1.cell(row=r, column=1, value=row_idx).border = thin_border
+        ws1.cell(row=r, column=2, value=entry["invoice_date"]).border = thin_border
+        ws1.cell(row=r, column=3, value=entry["serija_nr"]).border = thin_border
+        ws1.cell(row=r, column=4, value=entry["counterparty"]).border = thin_border
+        ws1.cell(row=r, column=5, value=entry["turinys"]).border = thin_border
+        for col, key in ((6, "pajamos"), (7, "islaidos")):
+            c = ws1.cell(row=r, column=col)
+            c.border = thin_border
+            if entry[key]:
+                c.value = float(entry[key])
+                c.number_format = "#,##0.00"
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _legacy_waybill(rows):
+    import openpyxl
+    from openpyxl.styles import Border, Side
+    from docscanner_app.views import EXPORT_COLUMNS
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    thin_border = Border(
+        left=Side(style="thin"), right=Side(style="thin"),
+        top=Side(style="thin"), bottom=Side(style="thin"),
+    )
+    for col_idx, (_, label) in enumerate(EXPORT_COLUMNS, start=1):
+        ws.cell(row=1, column=col_idx, value=label).border = thin_border
+    for row_idx, row in enumerate(rows, start=2):
+        for col_idx, val in enumerate(row, start=1):
+            ws.cell(row=row_idx, column=col_idx, value=val).border = thin_border
+    for col_idx, (_, label) in enumerate(EXPORT_COLUMNS, start=1):
+        max_len = len(label)
+        for col in ws.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx):
+            for cell in col:
+                if cell.value:
+                    max_len = max(max_len, len(str(cell.value)))
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = min(max_len + 3, 30)
+    ws.freeze_panes = "A2"
+
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+# ── Naujas būdas ────────────────────────────────────────────
+
+def _save_streaming(writer):
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        writer.save(path)
+        return os.path.getsize(path)
+    finally:
+        os.unlink(path)
+
+
+def _stream_journal(entries, summary):
+    from docscanner_app.views import build_veiklos_zurnalas_xlsx
+    return _save_streaming(build_veiklos_zurnalas_xlsx(entries, summary))
+
+
+def _stream_waybill(rows):
+    from docscanner_app.views import build_waybill_xlsx
+    return _save_streaming(build_waybill_xlsx(rows))
+
+
+VARIANTS = {
+    "journal": (_journal_data, _legacy_journal, _stream_journal),
+    "waybill": (lambda n, seed: (_waybill_rows(n, seed),), _legacy_waybill, _stream_waybill),
+}
+
+
+def _reset_peak_rss():
+    """Linux: VmHWM paveldimas iš tėvinio proceso — nunulinamas (clear_refs 5)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _run_variant(kind, variant, rows, seed, conn):
+    make_data, legacy, stream = VARIANTS[kind]
+    data = make_data(rows, seed)
+    _reset_peak_rss()
+    base_kb = _proc_status_kb("VmRSS")
+    fn = legacy if variant == "legacy" else stream
+
+    t0 = time.perf_counter()
+    result = fn(*data)
+    elapsed = time.perf_counter() - t0
+
+    size = len(result) if isinstance(result, bytes) else result
+    conn.send((elapsed, _proc_status_kb("VmHWM") - base_kb, size))
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = "Palygina seną ir srautinį (write_only) XLSX eksportą: laikas ir RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--kind", choices=["all", "journal", "waybill"], default="all")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        import importlib
+        import logging
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        # views importuojamas prieš fork'ą, kad nepatektų į matavimą
+        importlib.import_module("docscanner_app.views")
+
+        ctx = multiprocessing.get_context("fork")
+        kinds = ["journal", "waybill"] if options["kind"] == "all" else [options["kind"]]
+
+        for kind in kinds:
+            results = {}
+            for variant in ("legacy", "stream"):
+                parent, child = ctx.Pipe(duplex=False)
+                p = ctx.Process(target=_run_variant, args=(kind, variant, options["rows"], options["seed"], child))
+                p.start()
+                child.close()
+                results[variant] = parent.recv()
+                p.join()
+
+            for variant, (elapsed, rss_kb, size) in results.items():
+                self.stdout.write(
+                    f"{kind:8} {variant:7} rows={options['rows']}: {elapsed:7.2f}s, "
+                    f"peak RSS +{rss_kb / 1024:7.1f} MB, file {size / 1024:8.1f} KB"
+                )
+            (t_old, m_old, _), (t_new, m_new, _) = results["legacy"], results["stream"]
+            self.stdout.write(self.style.SUCCESS(
+                f"{kind}: {t_old / max(t_new, 1e-9):.1f}x faster, "
+                f"{m_old / max(m_new, 1):.1f}x less memory"
+            ))
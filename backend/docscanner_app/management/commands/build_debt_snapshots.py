@@ -0,0 +1,78 @@
+"""
+Management command: mėnesio pabaigos skolų kopijos (DebtSnapshot) istorinėms
+skolų ataskaitoms (services/debts_ledger.py).
+
+Kopija perkuriama visa (profile, type, as_of) apimtimi. Kai vėliau pasikeičia
+dokumentas ar alokacija su data <= as_of, kopija ištrinama signalu ir
+/apskaita/skolos/ vėl skaičiuoja gyvai, kol komanda nepaleista iš naujo.
+
+QuerySet.update() / bulk_update() / raw SQL signalų nekviečia: po masinių
+dokumentų ar alokacijų pataisymų šią komandą paleiskite iš naujo paveiktiems
+profiliams (--profile ... --months N), kitaip liks pasenusios kopijos.
+
+Использование:
+    python manage.py build_debt_snapshots --all
+    python manage.py build_debt_snapshots --profile 3 --month 2026-07
+    python manage.py build_debt_snapshots --profile 3 --months 12 --type customer
+"""
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Sukuria mėnesio pabaigos skolų kopijas (DebtSnapshot)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", type=int, default=None, help="CompanyProfile id")
+        parser.add_argument("--all", action="store_true", help="Visi įmonių profiliai")
+        parser.add_argument("--month", default=None, help="YYYY-MM (numatyta — praėjęs mėnuo)")
+        parser.add_argument("--months", type=int, default=1, help="Kiek mėnesių atgal nuo --month")
+        parser.add_argument("--type", choices=["all", "customer", "supplier"], default="all")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.models import CompanyProfile
+        from docscanner_app.services.debts_ledger import build_debt_snapshot, previous_month_end
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        if options["profile"]:
+            profiles = CompanyProfile.objects.filter(pk=options["profile"])
+            if not profiles.exists():
+                raise CommandError(f"CompanyProfile {options['profile']} not found")
+        elif options["all"]:
+            profiles = CompanyProfile.objects.all()
+        else:
+            raise CommandError("Nurodykite --profile arba --all")
+
+        if options["month"]:
+            try:
+                year, month = (int(x) for x in options["month"].split("-"))
+                first = date(year, month, 1)
+            except ValueError:
+                raise CommandError(f"Bad month: {options['month']}")
+            last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        else:
+            last = previous_month_end()
+
+        month_ends = [last]
+        for _ in range(max(options["months"], 1) - 1):
+            month_ends.append(month_ends[-1].replace(day=1) - timedelta(days=1))
+
+        types = ["customer", "supplier"] if options["type"] == "all" else [options["type"]]
+
+        t0 = time.perf_counter()
+        total = 0
+        for profile in profiles.order_by("id"):
+            for as_of in month_ends:
+                for debt_type in types:
+                    rows = build_debt_snapshot(profile, debt_type, as_of)
+                    total += rows
+                    if rows:
+                        self.stdout.write(f"  profile={profile.pk} {debt_type} {as_of}: {rows} counterparties")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} snapshot rows for {len(month_ends)} month(s) in {time.perf_counter() - t0:.2f}s"
+        ))
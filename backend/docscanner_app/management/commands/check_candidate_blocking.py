@@ -0,0 +1,183 @@
+"""
+Management command: recall patikra CandidateBlockingIndex.
+
+Kiekvienai operacijai balas skaičiuojamas visiems kandidatams (kaip anksčiau)
+ir tik shortlist'ui. Tikrinama:
+  - kiekvienas kandidatas su balu > BLOCKING_MAX_MISSED_SCORE yra shortlist'e,
+  - geriausias kandidatas (>= LIKELY_THRESHOLD) sutampa.
+
+Duomenys — atsitiktiniai (be DB) arba realūs vartotojo (--user): neapmokėti
+Purchase ir OutgoingTransaction.
+
+Использование:
+    python manage.py check_candidate_blocking
+    python manage.py check_candidate_blocking --candidates 20000 --txns 2000
+    python manage.py check_candidate_blocking --user 12
+"""
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+SELLERS = [
+    ("UAB Alfa", "111111111"), ("UAB Beta", "222222222"), ("Upwork Global Inc", ""),
+    ("Facebook Ireland Limited", ""), ("Hetzner Online GmbH", ""), ("AB Gama", "333333333"),
+    ("Shopify International", ""), ("MB Delta", "444444444"),
+]
+CURRENCIES = ["EUR", "EUR", "EUR", "USD"]
+
+
+def _random_candidate(rng, pos, n_codes):
+    name, code = rng.choice(SELLERS)
+    if code and rng.random() < 0.7:
+        code = str(100000000 + rng.randrange(n_codes))
+    amount = Decimal(rng.randint(100, 500000)) / 100
+    remaining = amount if rng.random() < 0.8 else (amount / 2).quantize(Decimal("0.01"))
+    inv_date = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    series = rng.choice(["SF", "T", "PVM", ""])
+    number = str(rng.randrange(10 ** rng.randint(3, 9)))
+    return {
+        "id": pos + 1,
+        "full_number": f"{series}{number}",
+        "series": series,
+        "number": number,
+        "amount": amount,
+        "remaining": remaining,
+        "currency": rng.choice(CURRENCIES),
+        "seller_name": name,
+        "seller_norm": name.lower(),
+        "seller_code": code,
+        "seller_iban": f"LT{rng.randrange(50):018d}" if rng.random() < 0.3 else "",
+        "invoice_date": inv_date,
+        "due_date": inv_date + timedelta(days=rng.choice([0, 14, 30])) if rng.random() < 0.7 else None,
+    }
+
+
+def _random_signals(rng, candidates, n_codes):
+    from docscanner_app.utils.transaction_signals import ExtractedReference, TransactionSignals
+
+    base = rng.choice(candidates)
+    s = TransactionSignals(txn_type=rng.choice(["bank_transfer", "card_direct", "card_clearing"]))
+    s.bank_currency = rng.choice([base["currency"], "EUR"])
+    s.bank_amount = base["remaining"] if rng.random() < 0.5 else Decimal(rng.randint(100, 500000)) / 100
+    if rng.random() < 0.1:
+        s.is_cross_currency = True
+        s.original_currency = "USD"
+        s.original_amount = s.bank_amount
+        s.settled_amount = (s.bank_amount * Decimal("0.92")).quantize(Decimal("0.01"))
+    if rng.random() < 0.4:
+        ref = base["full_number"] if rng.random() < 0.5 else base["number"]
+        if rng.random() < 0.3:
+            ref = ref[1:]
+        if len(ref) >= 3:
+            s.references = [ExtractedReference(ref, ref.upper(), "purpose", rng.choice(["high", "medium"]))]
+    if rng.random() < 0.3:
+        s.counterparty_code = base["seller_code"] or str(100000000 + rng.randrange(n_codes))
+    if rng.random() < 0.2:
+        s.counterparty_iban = base["seller_iban"]
+    s.counterparty_name = rng.choice(SELLERS)[0] if rng.random() < 0.7 else ""
+    s.merchant_name_clean = s.counterparty_name.split()[-1] if s.counterparty_name else ""
+    s.merchant_keywords = [w.lower() for w in s.merchant_name_clean.split()]
+    txn_date = base["invoice_date"] + timedelta(days=rng.randint(-10, 250))
+    return s, txn_date
+
+
+class Command(BaseCommand):
+    help = "Tikrina, kad CandidateBlockingIndex nepraranda atitikmenų (recall)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--candidates", type=int, default=5000)
+        parser.add_argument("--txns", type=int, default=500)
+        parser.add_argument("--codes", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--user", type=int, default=None, help="Realūs vartotojo Purchase / OutgoingTransaction")
+
+    def handle(self, *args, **options):
+        from docscanner_app.models import normalize_name
+        from docscanner_app.utils.purchase_matching_signals import LIKELY_THRESHOLD
+        from docscanner_app.utils.transaction_signals import (
+            BLOCKING_MAX_MISSED_SCORE, CandidateBlockingIndex, score_with_signals,
+        )
+
+        if options["user"]:
+            candidates, cases = self._load_user(options["user"])
+        else:
+            seed = options["seed"] if options["seed"] is not None else random.randrange(1 << 30)
+            rng = random.Random(seed)
+            self.stdout.write(f"seed={seed}")
+            candidates = [_random_candidate(rng, i, options["codes"]) for i in range(options["candidates"])]
+            cases = [_random_signals(rng, candidates, options["codes"]) for _ in range(options["txns"])]
+
+        t0 = time.perf_counter()
+        index = CandidateBlockingIndex(candidates)
+        t_index = time.perf_counter() - t0
+
+        t_full = t_block = 0.0
+        shortlisted = 0
+        matches = 0
+
+        for n, (signals, txn_date) in enumerate(cases):
+            setattr(signals, "_txn_date", txn_date)
+
+            t0 = time.perf_counter()
+            full = [(c, score_with_signals(signals, c, normalize_name)[0]) for c in candidates]
+            t1 = time.perf_counter()
+            short = index.shortlist(signals, txn_date)
+            blocked = [(c, score_with_signals(signals, c, normalize_name)[0]) for c in short]
+            t2 = time.perf_counter()
+
+            t_full += t1 - t0
+            t_block += t2 - t1
+            shortlisted += len(short)
+
+            short_ids = {id(c) for c in short}
+            for c, score in full:
+                if score > BLOCKING_MAX_MISSED_SCORE and id(c) not in short_ids:
+                    raise CommandError(
+                        f"Recall miss: txn #{n} candidate id={c['id']} score={score} not in shortlist"
+                    )
+
+            best_full = self._best(full, LIKELY_THRESHOLD)
+            best_block = self._best(blocked, LIKELY_THRESHOLD)
+            if best_full is not best_block:
+                raise CommandError(f"Best candidate differs for txn #{n}")
+            if best_full is not None:
+                matches += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"OK: {len(cases)} txns x {len(candidates)} candidates, {matches} matches kept; "
+            f"avg shortlist {shortlisted / max(len(cases), 1):.1f}; "
+            f"index {t_index:.3f}s, exhaustive {t_full:.2f}s vs blocked {t_block:.2f}s"
+        ))
+
+    def _best(self, scored, threshold):
+        best = None
+        best_score = None
+        for c, score in scored:
+            if score >= threshold and (best_score is None or score > best_score):
+                best, best_score = c, score
+        return best
+
+    def _load_user(self, user_id):
+        from docscanner_app.models import CustomUser, OutgoingTransaction
+        from docscanner_app.utils.purchase_matching_signals import SignalPurchaseMatchingEngine
+        from docscanner_app.utils.transaction_signals import load_signals
+
+        try:
+            user = CustomUser.objects.get(pk=user_id)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {user_id} not found")
+
+        engine = SignalPurchaseMatchingEngine(user)
+        candidates = [engine._purchase_to_candidate(p) for p in engine._load_purchases()]
+        txns = list(OutgoingTransaction.objects.filter(user=user).order_by("-transaction_date")[:2000])
+        signals_map = load_signals(txns)
+        cases = [
+            (signals_map[t], t.transaction_date)
+            for t in txns
+            if t in signals_map and not signals_map[t].skip_matching
+        ]
+        return candidates, cases
@@ -0,0 +1,140 @@
+"""
+Management command: chunked upload patikra (services/chunked_upload.py) —
+lygiagretūs, atsitiktine tvarka siunčiami chunk'ai su pakartojimais.
+
+  1) sugeneruojamas atsitiktinis failas, sukuriama laikina UploadSession +
+     ChunkedUpload (su sha256),
+  2) chunk'ai rašomi --workers gijomis sumaišyta tvarka, ~10% siunčiami
+     dukart (kaip kliento retry),
+  3) tikrinama: received_count, bitmap'as, .part failo sha256,
+  4) place_in_storage — ar failas į saugyklą įdėtas hard link'u (be
+     kopijavimo) ar kopijuojant (kitas skaidinys).
+Laikini įrašai ir failai ištrinami.
+
+Использование:
+    python manage.py check_chunked_upload --user 1
+    python manage.py check_chunked_upload --user 1 --size-mb 512 --chunk-mb 10 --workers 16
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Tikrina lygiagretų chunked upload (bitmap, pwrite, hard link į saugyklą)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, required=True)
+        parser.add_argument("--size-mb", type=float, default=64)
+        parser.add_argument("--chunk-mb", type=float, default=4)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        import hashlib
+        import logging
+        import os
+        import random
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+
+        from django.db import connection
+        from docscanner_app.models import ChunkedUpload, CustomUser, ScannedDocument, UploadSession
+        from docscanner_app.services.chunked_upload import (
+            chunk_bounds, check_complete, create_upload, discard_stored, discard_tmp,
+            place_in_storage, received_indexes, write_chunk,
+        )
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        user = CustomUser.objects.filter(pk=options["user"]).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} not found")
+        total_size = int(options["size_mb"] * 1024 * 1024)
+        chunk_size = int(options["chunk_mb"] * 1024 * 1024)
+        if total_size <= 0 or chunk_size <= 0 or options["workers"] <= 0:
+            raise CommandError("--size-mb, --chunk-mb and --workers must be positive")
+        total_chunks = -(-total_size // chunk_size)
+        rnd = random.Random(options["seed"])
+
+        fd, source = tempfile.mkstemp(suffix=".bin")
+        session = None
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, "wb") as fp:
+                left = total_size
+                while left:
+                    block = os.urandom(min(left, 1024 * 1024))
+                    fp.write(block)
+                    digest.update(block)
+                    left -= len(block)
+            expected = digest.hexdigest()
+
+            session = UploadSession.objects.create(user=user, stage="uploading")
+            upload = create_upload(
+                ChunkedUpload,
+                user=user,
+                session=session,
+                filename="check_chunked_upload.zip",
+                total_size=total_size,
+                chunk_size=chunk_size,
+                total_chunks=total_chunks,
+                sha256=expected,
+            )
+
+            order = list(range(total_chunks))
+            order += rnd.sample(order, max(1, total_chunks // 10))
+            rnd.shuffle(order)
+
+            src_fd = os.open(source, os.O_RDONLY)
+
+            def send(index):
+                try:
+                    offset, size = chunk_bounds(upload, index)
+                    data = os.pread(src_fd, size, offset)
+                    return write_chunk(upload, index, data, hashlib.sha256(data).hexdigest())
+                finally:
+                    connection.close()
+
+            t0 = time.perf_counter()
+            try:
+                with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                    list(pool.map(send, order))
+            finally:
+                os.close(src_fd)
+            t_upload = time.perf_counter() - t0
+
+            upload.refresh_from_db()
+            if upload.received_count != total_chunks:
+                raise CommandError(f"received_count {upload.received_count} != {total_chunks}")
+            if received_indexes(upload) != list(range(total_chunks)):
+                raise CommandError("Bitmap does not match received chunks")
+
+            t0 = time.perf_counter()
+            check_complete(upload)
+            t_check = time.perf_counter() - t0
+
+            doc = ScannedDocument(user=user)
+            t0 = time.perf_counter()
+            name = place_in_storage(upload, doc)
+            t_place = time.perf_counter() - t0
+            try:
+                stored = doc.file.storage.path(name)
+                linked = os.stat(stored).st_ino == os.stat(upload.tmp_path).st_ino
+            except NotImplementedError:
+                linked = False
+            finally:
+                discard_stored(doc, name)
+                discard_tmp(upload)
+        finally:
+            if session is not None:
+                session.delete()
+            os.remove(source)
+
+        mb = total_size / 1024 / 1024
+        self.stdout.write(
+            f"{len(order)} chunk posts ({len(order) - total_chunks} retries), "
+            f"{options['workers']} workers: {t_upload:.2f}s ({mb / t_upload:.0f} MB/s); "
+            f"sha256 {t_check:.2f}s; storage {'hard link' if linked else 'copy'} {t_place:.3f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"OK: {mb:.0f} MB in {total_chunks} chunks"))
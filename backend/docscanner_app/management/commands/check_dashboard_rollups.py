@@ -0,0 +1,72 @@
+"""
+Management command: superuser dashboard'o agregatai (DashboardRollup,
+services/dashboard_rollups.py) — užpildymas ir patikra.
+
+Kiekvienam langui (today, yesterday, last_7_days, last_30_days, this_week,
+this_month, total) palygina agregatų + gyvos „uodegos“ rezultatą su pilnomis
+gyvomis užklausomis tuo pačiu momentu. Neatitikimai = vėliau pasikeitę
+statusai / ištrinti dokumentai po paskutinio perskaičiavimo (arba klaida).
+
+--refresh N  — prieš tikrinant perskaičiuoti paskutines N dienų,
+--full       — prieš tikrinant perskaičiuoti visą istoriją (pradinis
+               užpildymas po 0172 migracijos).
+
+Использование:
+    python manage.py check_dashboard_rollups --full
+    python manage.py check_dashboard_rollups --refresh 35
+    python manage.py check_dashboard_rollups
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Tikrina superuser dashboard agregatus pagal gyvas užklausas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--refresh", type=int, default=None, help="Perskaičiuoti paskutines N dienų")
+        parser.add_argument("--full", action="store_true", help="Perskaičiuoti visą istoriją")
+
+    def handle(self, *args, **options):
+        import logging
+        from django.utils import timezone
+        from docscanner_app.services.dashboard_rollups import (
+            WINDOWS, live_window_values, refresh_rollups, rollup_window_values,
+        )
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        if options["refresh"] is not None and options["refresh"] <= 0:
+            raise CommandError("--refresh must be positive")
+
+        if options["full"] or options["refresh"]:
+            t0 = time.perf_counter()
+            written = refresh_rollups(days=None if options["full"] else options["refresh"])
+            self.stdout.write(f"{written} rollup rows written in {time.perf_counter() - t0:.2f}s")
+
+        now = timezone.now()
+
+        t0 = time.perf_counter()
+        rolled = rollup_window_values(now)
+        t_rolled = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        live = live_window_values(now)
+        t_live = time.perf_counter() - t0
+
+        mismatches = 0
+        for window in WINDOWS:
+            for metric, expected in live[window].items():
+                got = rolled[window].get(metric, 0)
+                if got != expected:
+                    mismatches += 1
+                    self.stderr.write(f"{window}.{metric}: rollup {got} != live {expected}")
+
+        summary = (
+            f"{len(WINDOWS)} windows checked: {mismatches} mismatch(es); "
+            f"rollups {t_rolled:.3f}s, live {t_live:.3f}s"
+        )
+        if mismatches:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
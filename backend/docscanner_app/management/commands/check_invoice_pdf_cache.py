@@ -0,0 +1,116 @@
+"""
+Management command: sąskaitų PDF kešo patikra (services/invoice_pdf_cache.py).
+
+Kiekvienai sąskaitai:
+  1) tiesioginis generate_invoice_pdf() laikas,
+  2) get_invoice_pdf() — pirmas (kešo įrašas) ir antras (skaitymas) kvietimas,
+  3) rakto pastovumas: be pakeitimų raktas tas pats, pakeitus lauką
+     (atmintyje, neįrašant) — kitas.
+
+Su --warm tik sugeneruojami trūkstami PDF (pvz., po TEMPLATE_VERSION
+padidinimo) išrašytoms sąskaitoms.
+
+Использование:
+    python manage.py check_invoice_pdf_cache --invoice 123 --invoice 124
+    python manage.py check_invoice_pdf_cache --user 1 --limit 20
+    python manage.py check_invoice_pdf_cache --user 1 --warm
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Tikrina / pašildo sąskaitų PDF kešą"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--invoice", type=int, action="append", default=[])
+        parser.add_argument("--user", type=int, default=None)
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--warm", action="store_true", help="Tik sugeneruoti trūkstamus PDF")
+
+    def handle(self, *args, **options):
+        import logging
+
+        from docscanner_app.models import Invoice
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        qs = Invoice.objects.select_related("user").exclude(status="draft")
+        if options["invoice"]:
+            qs = qs.filter(pk__in=options["invoice"])
+        elif options["user"]:
+            qs = qs.filter(user_id=options["user"]).order_by("-id")
+            if not options["warm"]:
+                qs = qs[:options["limit"]]
+        else:
+            raise CommandError("Nurodykite --invoice arba --user")
+
+        invoices = list(qs)
+        if not invoices:
+            raise CommandError("Sąskaitų nerasta")
+
+        if options["warm"]:
+            self._warm(invoices)
+        else:
+            for invoice in invoices:
+                self._check(invoice)
+
+    def _warm(self, invoices):
+        from docscanner_app.services.invoice_pdf_cache import get_invoice_pdf
+
+        t0 = time.perf_counter()
+        failed = 0
+        for invoice in invoices:
+            try:
+                get_invoice_pdf(invoice)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"invoice {invoice.pk}: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(invoices) - failed}/{len(invoices)} in {time.perf_counter() - t0:.1f}s"
+        ))
+
+    def _check(self, invoice):
+        import os
+
+        from docscanner_app.services.invoice_pdf_cache import (
+            _cache_dir, cache_key, drop_invoice_pdf_cache, get_invoice_pdf, render_options,
+        )
+        from docscanner_app.utils.invoice_pdf import generate_invoice_pdf
+
+        logo_path, watermark = render_options(invoice)
+        drop_invoice_pdf_cache(invoice)
+
+        t0 = time.perf_counter()
+        generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+        t_render = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        cold = get_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+        t_cold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        warm = get_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+        t_warm = time.perf_counter() - t0
+
+        if cold != warm:
+            raise CommandError(f"invoice {invoice.pk}: cached PDF differs")
+
+        key = cache_key(invoice, logo_path=logo_path, watermark=watermark)
+        if key != cache_key(invoice, logo_path=logo_path, watermark=watermark):
+            raise CommandError(f"invoice {invoice.pk}: key is not stable")
+        original = invoice.note
+        invoice.note = f"{original} "
+        try:
+            if cache_key(invoice, logo_path=logo_path, watermark=watermark) == key:
+                raise CommandError(f"invoice {invoice.pk}: key ignores field change")
+        finally:
+            invoice.note = original
+
+        cached = os.listdir(_cache_dir(invoice))
+        self.stdout.write(
+            f"invoice {invoice.pk}: render {t_render * 1000:.0f} ms | "
+            f"cache miss {t_cold * 1000:.0f} ms | hit {t_warm * 1000:.1f} ms | "
+            f"{len(cold) // 1024} KB, files {len(cached)}, watermark={watermark}"
+        )
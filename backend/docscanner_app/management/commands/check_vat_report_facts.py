@@ -0,0 +1,139 @@
+"""
+Management command: tikrina, kad VatReportFact (OSS / SVS ataskaitų faktai,
+services/vat_report_facts.py) sutampa su pilnu perskaičiavimu iš
+ScannedDocument / Invoice (be įrašymo į DB, nebent --fix).
+
+Randama:
+  missing — dokumentas turėtų turėti faktą, bet jo nėra,
+  stale   — faktas yra, bet reikšmės skiriasi (pvz. pataisytas valiutos
+            kursas, QuerySet.update be signalų),
+  orphan  — faktas be atitinkamo dokumento / dokumentas nebetinka.
+--fix perrašo neatitinkančių dokumentų faktus; ant tuščios lentelės —
+pradinis užpildymas (po 0170 migracijos).
+
+Использование:
+    python manage.py check_vat_report_facts --user 12
+    python manage.py check_vat_report_facts --all --fix
+"""
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+COMPARE_FIELDS = (
+    "user_id", "invoice_date", "document_series", "document_number",
+    "own_key", "other_key", "svs_code", "country",
+    "counterparty_name", "counterparty_vat_code",
+    "vat_percent", "taxable_eur", "vat_eur", "warning", "dedup_key",
+)
+
+
+class Command(BaseCommand):
+    help = "Tikrina OSS / SVS faktų lentelę pagal pilną perskaičiavimą"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, default=None)
+        parser.add_argument("--all", action="store_true", help="Visi vartotojai")
+        parser.add_argument("--fix", action="store_true", help="Perrašyti neatitinkančius faktus")
+        parser.add_argument("--show", type=int, default=20, help="Kiek neatitikimų išvesti")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.models import CustomUser, Invoice, ScannedDocument, VatReportFact
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        if options["user"]:
+            if not CustomUser.objects.filter(pk=options["user"]).exists():
+                raise CommandError(f"User {options['user']} not found")
+            user_ids = [options["user"]]
+        elif options["all"]:
+            user_ids = sorted(
+                set(ScannedDocument.objects.values_list("user_id", flat=True).distinct())
+                | set(Invoice.objects.values_list("user_id", flat=True).distinct())
+                | set(VatReportFact.objects.values_list("user_id", flat=True).distinct())
+            )
+        else:
+            raise CommandError("Nurodykite --user arba --all")
+
+        t0 = time.perf_counter()
+        totals = {"checked": 0, "missing": 0, "stale": 0, "orphan": 0}
+        problems = []
+        self.show = options["show"]
+        for user_id in user_ids:
+            if user_id is None:
+                continue
+            for key, value in self._check_user(user_id, options["fix"], problems).items():
+                totals[key] += value
+
+        for line in problems:
+            self.stderr.write(line)
+
+        bad = totals["missing"] + totals["stale"] + totals["orphan"]
+        summary = (
+            f"{totals['checked']} facts checked for {len(user_ids)} user(s): "
+            f"{totals['missing']} missing, {totals['stale']} stale, {totals['orphan']} orphan "
+            f"in {time.perf_counter() - t0:.2f}s"
+        )
+        if bad and not options["fix"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary + (" (fixed)" if bad else "")))
+
+    def _note(self, problems, line):
+        if len(problems) < self.show:
+            problems.append(line)
+
+    def _check_user(self, user_id, fix, problems):
+        from docscanner_app.models import VatReportFact
+        from docscanner_app.services.vat_report_facts import (
+            document_facts, refresh_document_facts, source_querysets,
+        )
+
+        # (source, doc_id) → {(report, line): (id, reikšmės)}
+        stored = defaultdict(dict)
+        for row in VatReportFact.objects.filter(user_id=user_id).values_list(
+            "source", "doc_id", "report", "line", "id", *COMPARE_FIELDS,
+        ):
+            stored[(row[0], row[1])][(row[2], row[3])] = (row[4], row[5:])
+        counts = {"checked": 0, "missing": 0, "stale": 0, "orphan": 0}
+
+        for source, qs in source_querysets(user_id).items():
+            for obj in qs.iterator(chunk_size=500):
+                current = stored.pop((source, obj.pk), {})
+                mismatch = False
+                for fact in document_facts(source, obj):
+                    key = (fact.report, source, obj.pk, fact.line)
+                    counts["checked"] += 1
+                    values = tuple(getattr(fact, f) for f in COMPARE_FIELDS)
+                    found = current.pop((fact.report, fact.line), None)
+                    if found is None:
+                        counts["missing"] += 1
+                        self._note(problems, f"missing {key}")
+                        mismatch = True
+                    elif found[1] != values:
+                        counts["stale"] += 1
+                        diff = [
+                            f"{f}: {a!r} != {b!r}"
+                            for f, a, b in zip(COMPARE_FIELDS, found[1], values) if a != b
+                        ]
+                        self._note(problems, f"stale {key}: {'; '.join(diff)}")
+                        mismatch = True
+                # To paties dokumento perteklinės eilutės (pvz. sumažėjo tarifų)
+                for report, line in current:
+                    counts["orphan"] += 1
+                    self._note(problems, f"orphan {(report, source, obj.pk, line)}")
+                    mismatch = True
+                if mismatch and fix:
+                    refresh_document_facts(source, obj)
+
+        # Likę — dokumentai, kurių nebėra arba kurie nebetinka
+        orphan_ids = []
+        for (source, doc_id), rows in stored.items():
+            for (report, line), (fact_id, _) in rows.items():
+                counts["orphan"] += 1
+                self._note(problems, f"orphan {(report, source, doc_id, line)}")
+                orphan_ids.append(fact_id)
+        if fix and orphan_ids:
+            VatReportFact.objects.filter(id__in=orphan_ids).delete()
+
+        return counts
@@ -9,6 +9,7 @@ from decimal import Decimal, InvalidOperation
 from django.db import transaction
 from django.core.management.base import BaseCommand, CommandError
 from docscanner_app.models import CurrencyRate
+from docscanner_app.utils.shared_cache import invalidate_namespace
 
 
 # =========================
@@ -211,6 +212,7 @@ def run_import(tp: str,
                 saved += 1
             time.sleep(throttle)  # чуть притормозим между валютами
 
+    invalidate_namespace("fx")
     elapsed = (datetime.now(timezone.utc) - start).total_seconds()
     return {"currency_count": len(codes), "saved": saved, "elapsed_sec": elapsed}
 
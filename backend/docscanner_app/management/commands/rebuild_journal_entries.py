@@ -0,0 +1,151 @@
+"""
+Management command: DK įrašų perkūrimas batch'u
+(journal_generators.sync_*_journal_entries / generate_*_journal_entries).
+
+Dokumentai filtruojami pagal vartotoją, įmonės profilį ir datą; can_post_to_dk()
+taisyklės tos pačios kaip sync_*_journal_entry().
+
+--check: nieko neįrašo (transakcija atšaukiama). Tiems patiems dokumentams
+DK sukuriamas po vieną (generate_*_journal_entry) ir batch'u, palyginamos
+įrašų sumos / statusai / eilutės, išvedamas laikas ir SQL užklausų skaičius.
+
+Использование:
+    python manage.py rebuild_journal_entries --user 12
+    python manage.py rebuild_journal_entries --user 12 --profile 3 --type sale --from 2025-01-01 --to 2025-12-31
+    python manage.py rebuild_journal_entries --user 12 --check --limit 500
+"""
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Perkuria DK įrašus pirkimams / pardavimams batch'u"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, required=True)
+        parser.add_argument("--profile", type=int, default=None, help="CompanyProfile id")
+        parser.add_argument("--type", choices=["all", "sale", "purchase"], default="all")
+        parser.add_argument("--from", dest="date_from", default=None, help="YYYY-MM-DD")
+        parser.add_argument("--to", dest="date_to", default=None, help="YYYY-MM-DD")
+        parser.add_argument("--chunk", type=int, default=500)
+        parser.add_argument("--limit", type=int, default=None, help="Tik --check: dokumentų skaičius")
+        parser.add_argument("--check", action="store_true", help="Palyginti su generavimu po vieną (be įrašymo)")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.models import CustomUser, Invoice, Purchase
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        try:
+            user = CustomUser.objects.get(pk=options["user"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found")
+
+        filters = {"user": user}
+        if options["profile"]:
+            filters["company_profile_id"] = options["profile"]
+        for key, lookup in (("date_from", "invoice_date__gte"), ("date_to", "invoice_date__lte")):
+            if options[key]:
+                try:
+                    filters[lookup] = date.fromisoformat(options[key])
+                except ValueError:
+                    raise CommandError(f"Bad date: {options[key]}")
+
+        kinds = []
+        if options["type"] in ("all", "sale"):
+            kinds.append(("sale", Invoice.objects.filter(**filters)))
+        if options["type"] in ("all", "purchase"):
+            kinds.append(("purchase", Purchase.objects.filter(**filters)))
+
+        failures = 0
+        for kind, qs in kinds:
+            if options["check"]:
+                failures += self._check(kind, qs, options)
+            else:
+                self._rebuild(kind, qs, options)
+
+        if failures:
+            raise CommandError(f"{failures} mismatches")
+
+    # ── Rebuild ─────────────────────────────────────────────
+
+    def _rebuild(self, kind, qs, options):
+        from docscanner_app.utils.journal_generators import (
+            sync_invoice_journal_entries, sync_purchase_journal_entries,
+        )
+
+        sync = sync_invoice_journal_entries if kind == "sale" else sync_purchase_journal_entries
+        t0 = time.perf_counter()
+        created, deleted = sync(qs, chunk_size=options["chunk"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind}: {created} entries created, {deleted} removed in {time.perf_counter() - t0:.2f}s"
+        ))
+
+    # ── Check ───────────────────────────────────────────────
+
+    def _check(self, kind, qs, options):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from docscanner_app.models import JournalEntry
+        from docscanner_app.utils.journal_generators import (
+            can_post_to_dk, generate_invoice_journal_entries, generate_invoice_journal_entry,
+            generate_purchase_journal_entries, generate_purchase_journal_entry,
+        )
+
+        if kind == "sale":
+            single, batch, fk = generate_invoice_journal_entry, generate_invoice_journal_entries, "invoice_id"
+        else:
+            single, batch, fk = generate_purchase_journal_entry, generate_purchase_journal_entries, "purchase_id"
+
+        docs = [d for d in qs.filter(company_profile__isnull=False).order_by("id") if can_post_to_dk(d)]
+        if options["limit"]:
+            docs = docs[:options["limit"]]
+        if not docs:
+            self.stdout.write(f"{kind}: nothing to check")
+            return 0
+
+        model = type(docs[0])
+        entries = JournalEntry.objects.filter(**{f"{fk}__in": [d.pk for d in docs]})
+
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as q_single:
+                t0 = time.perf_counter()
+                for doc in docs:
+                    single(doc)
+                t_single = time.perf_counter() - t0
+            expected = self._snapshot(entries, fk)
+
+            with CaptureQueriesContext(connection) as q_batch:
+                t0 = time.perf_counter()
+                batch(model.objects.filter(pk__in=[d.pk for d in docs]), chunk_size=options["chunk"])
+                t_batch = time.perf_counter() - t0
+            actual = self._snapshot(entries, fk)
+
+            transaction.set_rollback(True)
+
+        failures = 0
+        for doc_id in sorted(set(expected) | set(actual)):
+            if expected.get(doc_id) != actual.get(doc_id):
+                failures += 1
+                self.stderr.write(f"{kind} {fk}={doc_id}: {actual.get(doc_id)} != {expected.get(doc_id)}")
+
+        self.stdout.write(
+            f"{kind}: {len(docs)} docs; single {t_single:.2f}s / {len(q_single)} queries, "
+            f"batch {t_batch:.2f}s / {len(q_batch)} queries; mismatches {failures}"
+        )
+        return failures
+
+    def _snapshot(self, entries, fk):
+        result = {}
+        for e in entries.prefetch_related("lines"):
+            result[getattr(e, fk)] = (
+                e.status, e.total_debit, e.total_credit, e.difference, e.entry_date, e.document_number,
+                tuple(
+                    (l.side, l.account_code, l.account_name, l.amount, l.description, l.sort_order)
+                    for l in sorted(e.lines.all(), key=lambda l: l.sort_order)
+                ),
+            )
+        return result
@@ -0,0 +1,98 @@
+"""
+Management command: perkuria kontrahentų katalogą (UserCounterparty,
+services/counterparty_directory.py).
+
+1) ScannedDocument.seller_key / buyer_key perskaičiuojami batch'ais pagal id
+   (keyset, bulk_update — save() ir signalai nekviečiami);
+2) kiekvieno vartotojo katalogas perkuriamas iš naujo (4 GROUP BY užklausos).
+
+Paleisti po 0171 migracijos ir po bulk operacijų su dokumentais
+(QuerySet.update / bulk_create). Saugu paleisti kelis kartus.
+
+Использование:
+    python manage.py rebuild_user_counterparties --all
+    python manage.py rebuild_user_counterparties --user 12
+    python manage.py rebuild_user_counterparties --all --skip-keys
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Perkuria vartotojų kontrahentų katalogą (UserCounterparty)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, default=None)
+        parser.add_argument("--all", action="store_true", help="Visi vartotojai")
+        parser.add_argument("--batch", type=int, default=2000)
+        parser.add_argument("--skip-keys", action="store_true", help="Neperskaičiuoti dokumentų raktų")
+
+    def handle(self, *args, **options):
+        import logging
+        from docscanner_app.models import ScannedDocument
+        from docscanner_app.services.counterparty_directory import rebuild_counterparties
+
+        logging.getLogger("docscanner_app").setLevel(logging.ERROR)
+
+        if options["batch"] <= 0:
+            raise CommandError("--batch must be positive")
+
+        docs = ScannedDocument.objects.all()
+        if options["user"]:
+            docs = docs.filter(user_id=options["user"])
+            user_ids = [options["user"]]
+        elif options["all"]:
+            user_ids = None
+        else:
+            raise CommandError("Nurodykite --user arba --all")
+
+        t0 = time.perf_counter()
+        if not options["skip_keys"]:
+            self._backfill_keys(docs, options["batch"])
+
+        if user_ids is None:
+            user_ids = list(
+                docs.exclude(user_id__isnull=True).values_list("user_id", flat=True).distinct().order_by()
+            )
+
+        total = 0
+        for user_id in user_ids:
+            total += rebuild_counterparties(user_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} counterparties for {len(user_ids)} user(s) in {time.perf_counter() - t0:.2f}s"
+        ))
+
+    def _backfill_keys(self, docs, batch):
+        from docscanner_app.models import ScannedDocument
+        from docscanner_app.services.counterparty_directory import KEY_FIELDS, company_key
+
+        last_id = 0
+        scanned = changed = 0
+        while True:
+            rows = list(
+                docs.filter(id__gt=last_id)
+                .order_by("id")
+                .only(
+                    "id", "seller_id", "seller_name", "seller_vat_code",
+                    "buyer_id", "buyer_name", "buyer_vat_code", *KEY_FIELDS,
+                )[:batch]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+            dirty = []
+            for doc in rows:
+                seller_key = company_key(doc.seller_name, doc.seller_vat_code, doc.seller_id)
+                buyer_key = company_key(doc.buyer_name, doc.buyer_vat_code, doc.buyer_id)
+                if (doc.seller_key, doc.buyer_key) != (seller_key, buyer_key):
+                    doc.seller_key, doc.buyer_key = seller_key, buyer_key
+                    dirty.append(doc)
+
+            changed += len(dirty)
+            if dirty:
+                ScannedDocument.objects.bulk_update(dirty, list(KEY_FIELDS))
+            self.stdout.write(f"  ... id<={last_id}: {scanned} scanned, {changed} keys updated")
@@ -0,0 +1,54 @@
+"""
+Management command: užpildo / perskaičiuoja TransactionSignalsRecord
+operacijoms, kurių signalų nėra arba jie ištraukti senesne SIGNALS_VERSION.
+
+Naudoti po deploy'aus, kuriame padidinta SIGNALS_VERSION, arba pirmą kartą
+(senoms operacijoms, importuotoms prieš atsirandant lentelei). Be šios komandos
+signalai vis tiek perskaičiuojami "tingiai" pirmo matching'o metu.
+
+Использование:
+    python manage.py refresh_transaction_signals
+    python manage.py refresh_transaction_signals --user 12
+    python manage.py refresh_transaction_signals --all      # perskaičiuoti ir aktualius
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+
+class Command(BaseCommand):
+    help = "Užpildo / perskaičiuoja išsaugotus banko operacijų signalus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, default=None)
+        parser.add_argument("--all", action="store_true", help="Perskaičiuoti visus, ne tik pasenusius")
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from docscanner_app.models import IncomingTransaction, OutgoingTransaction
+        from docscanner_app.utils.transaction_signals import SIGNALS_VERSION, store_signals
+
+        total = 0
+        for Model in (OutgoingTransaction, IncomingTransaction):
+            qs = Model.objects.all()
+            if options["user"]:
+                qs = qs.filter(user_id=options["user"])
+            if not options["all"]:
+                qs = qs.filter(
+                    Q(signals_record__isnull=True)
+                    | ~Q(signals_record__version=SIGNALS_VERSION)
+                )
+
+            batch = []
+            for txn in qs.order_by("id").iterator(chunk_size=options["batch"]):
+                batch.append(txn)
+                if len(batch) >= options["batch"]:
+                    total += len(store_signals(batch))
+                    batch = []
+            if batch:
+                total += len(store_signals(batch))
+
+            self.stdout.write(f"{Model.__name__}: done")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"OK: {total} transactions refreshed (SIGNALS_VERSION={SIGNALS_VERSION})"
+        ))
@@ -0,0 +1,34 @@
+"""
+python manage.py run_paddle_ocr_worker [--host 127.0.0.1] [--port 8765] [--max-batch-pages 8]
+
+Резидентный PaddleOCR worker: модель грузится один раз, запросы от Celery
+(get_ocr_text_paddle) собираются в batch'и. Запускать отдельным сервисом (systemd/supervisor).
+Требует PADDLE_OCR_WORKER_AUTHKEY (тот же у worker'а и Celery).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from docscanner_app.utils.paddle_ocr_server import PaddleOCRWorker, WorkerNotConfigured
+
+
+class Command(BaseCommand):
+    help = "Run resident PaddleOCR worker (offline OCR backend)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default=None)
+        parser.add_argument("--port", type=int, default=None)
+        parser.add_argument("--max-batch-pages", type=int, default=None)
+        parser.add_argument("--batch-wait", type=float, default=None,
+                            help="Kiek sekundžių laukti papildomų puslapių batch'ui")
+
+    def handle(self, *args, **options):
+        try:
+            worker = PaddleOCRWorker(
+                host=options["host"],
+                port=options["port"],
+                max_batch_pages=options["max_batch_pages"],
+                batch_wait=options["batch_wait"],
+            )
+        except WorkerNotConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"PaddleOCR worker starting on {worker.address[0]}:{worker.address[1]}")
+        worker.serve_forever()
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+import docscanner_app.models
+
+
+def dedupe_product_codes(apps, schema_editor):
+    """Palieka naujausią ProductAutocomplete įrašą kiekvienai (user, prekes_kodas) porai."""
+    from django.db.models import Count, Max
+
+    ProductAutocomplete = apps.get_model("docscanner_app", "ProductAutocomplete")
+
+    dupes = (
+        ProductAutocomplete.objects
+        .filter(prekes_kodas__isnull=False)
+        .values("user_id", "prekes_kodas")
+        .annotate(cnt=Count("id"), keep_id=Max("id"))
+        .filter(cnt__gt=1)
+    )
+    for row in dupes.iterator():
+        (
+            ProductAutocomplete.objects
+            .filter(user_id=row["user_id"], prekes_kodas=row["prekes_kodas"])
+            .exclude(id=row["keep_id"])
+            .delete()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0161_apiexportarticlelog_kind"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_product_codes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="productautocomplete",
+            constraint=models.UniqueConstraint(
+                fields=("user", "prekes_kodas"),
+                name="unique_product_autocomplete_code_per_user",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DataImportSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("products", "Prekės"), ("clients", "Klientai")],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("processing", "Processing"),
+                            ("done", "Done"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        null=True,
+                        upload_to=docscanner_app.models.data_import_upload_path,
+                    ),
+                ),
+                (
+                    "original_filename",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("total_rows", models.IntegerField(default=0)),
+                ("processed_rows", models.IntegerField(default=0)),
+                ("report", models.JSONField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("task_id", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="data_import_sessions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "stage", "-created_at"],
+                        name="idx_dimport_user_stage",
+                    )
+                ],
+            },
+        ),
+    ]
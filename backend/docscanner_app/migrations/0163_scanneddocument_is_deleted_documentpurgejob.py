@@ -0,0 +1,78 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0162_productautocomplete_unique_code_dataimportsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="is_deleted",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="DocumentPurgeJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("processing", "Processing"),
+                            ("done", "Done"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("document_ids", models.JSONField(default=list)),
+                ("total_documents", models.IntegerField(default=0)),
+                ("processed_documents", models.IntegerField(default=0)),
+                ("deleted_documents", models.IntegerField(default=0)),
+                ("skipped_documents", models.IntegerField(default=0)),
+                ("deleted_files", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("task_id", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="document_purge_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "stage", "-created_at"],
+                        name="idx_purge_user_stage",
+                    )
+                ],
+            },
+        ),
+    ]
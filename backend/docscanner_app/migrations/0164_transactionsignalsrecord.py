@@ -0,0 +1,110 @@
+# Generated by Django 5.1.3 on 2026-10-19 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0163_scanneddocument_is_deleted_documentpurgejob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransactionSignalsRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveSmallIntegerField(default=0)),
+                ("source_hash", models.CharField(blank=True, default="", max_length=32)),
+                ("txn_type", models.CharField(default="unknown", max_length=30)),
+                ("skip_matching", models.BooleanField(default=False)),
+                ("skip_reason", models.CharField(blank=True, default="", max_length=30)),
+                ("merchant_name_raw", models.CharField(blank=True, default="", max_length=255)),
+                ("merchant_name_clean", models.CharField(blank=True, default="", max_length=255)),
+                ("merchant_keywords", models.JSONField(blank=True, default=list)),
+                ("merchant_alias_matches", models.JSONField(blank=True, default=list)),
+                ("references", models.JSONField(blank=True, default=list)),
+                (
+                    "original_amount",
+                    models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+                ),
+                ("original_currency", models.CharField(blank=True, default="", max_length=10)),
+                (
+                    "settled_amount",
+                    models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+                ),
+                ("settled_currency", models.CharField(blank=True, default="", max_length=10)),
+                (
+                    "conversion_fee",
+                    models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+                ),
+                ("is_cross_currency", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "incoming_transaction",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="signals_record",
+                        to="docscanner_app.incomingtransaction",
+                    ),
+                ),
+                (
+                    "outgoing_transaction",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="signals_record",
+                        to="docscanner_app.outgoingtransaction",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transaction_signals",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "version"], name="idx_txsig_user_ver"),
+                    models.Index(fields=["user", "txn_type"], name="idx_txsig_user_type"),
+                    models.Index(
+                        fields=["user", "merchant_name_clean"],
+                        name="idx_txsig_user_merch",
+                    ),
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(
+                                ("incoming_transaction__isnull", False),
+                                ("outgoing_transaction__isnull", True),
+                            ),
+                            models.Q(
+                                ("incoming_transaction__isnull", True),
+                                ("outgoing_transaction__isnull", False),
+                            ),
+                            _connector="OR",
+                        ),
+                        name="chk_txsig_one_transaction",
+                    ),
+                ],
+            },
+        ),
+    ]
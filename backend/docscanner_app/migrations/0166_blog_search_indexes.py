@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Tas pats kaip 0022_guides_search_indexes, tik tinklaraščio puslapiams:
+# GIN trigram indeksai ant public.unaccent_immutable(lower(search_text)),
+# kad BlogSmartSearchView LIKE / % (trigram) filtrai naudotų indeksą.
+SQL_IDX_CREATE = """
+-- temos
+CREATE INDEX IF NOT EXISTS docscan_blogcat_searchtext_trgm
+  ON docscanner_app_blogcategorypage
+  USING gin (public.unaccent_immutable(lower(search_text)) gin_trgm_ops);
+
+-- įrašai
+CREATE INDEX IF NOT EXISTS docscan_blogpost_searchtext_trgm
+  ON docscanner_app_blogpostpage
+  USING gin (public.unaccent_immutable(lower(search_text)) gin_trgm_ops);
+"""
+
+SQL_IDX_DROP = """
+DROP INDEX IF EXISTS docscan_blogcat_searchtext_trgm;
+DROP INDEX IF EXISTS docscan_blogpost_searchtext_trgm;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0165_matchingchange"),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL_IDX_CREATE, reverse_sql=SQL_IDX_DROP),
+    ]
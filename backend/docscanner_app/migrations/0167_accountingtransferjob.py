@@ -0,0 +1,82 @@
+# Generated by Django 5.1.3 on 2026-10-19 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0166_blog_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountingTransferJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("processing", "Processing"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("document_ids", models.JSONField(default=list)),
+                ("cp_key", models.CharField(blank=True, default="", max_length=255)),
+                ("replace_document_company", models.BooleanField(default=False)),
+                ("plan", models.JSONField(default=list)),
+                ("total_documents", models.IntegerField(default=0)),
+                ("processed_documents", models.IntegerField(default=0)),
+                ("created_purchases", models.JSONField(default=list)),
+                ("created_sales", models.JSONField(default=list)),
+                ("skipped", models.JSONField(default=list)),
+                ("error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("task_id", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "company_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="accounting_transfer_jobs",
+                        to="docscanner_app.companyprofile",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="accounting_transfer_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "stage", "-created_at"],
+                        name="idx_transfer_user_stage",
+                    )
+                ],
+            },
+        ),
+    ]
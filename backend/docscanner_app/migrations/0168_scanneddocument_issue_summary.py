@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0167_accountingtransferjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="issue_flags",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="has_issues",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="issue_count",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="scanneddocument",
+            index=models.Index(
+                condition=models.Q(("has_issues", True)),
+                fields=["-uploaded_at", "-id"],
+                name="idx_scandoc_has_issues",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="scanneddocument",
+            index=models.Index(
+                condition=models.Q(("has_issues", True)),
+                fields=["user", "-uploaded_at"],
+                name="idx_user_has_issues",
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0168_scanneddocument_issue_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "debt_type",
+                    models.CharField(
+                        choices=[
+                            ("customer", "Pirkėjų skolos"),
+                            ("supplier", "Skolos tiekėjams"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("as_of", models.DateField(verbose_name="Data")),
+                ("counterparty_name", models.CharField(blank=True, default="", max_length=255)),
+                ("counterparty_code", models.CharField(blank=True, default="", max_length=100)),
+                ("total_invoiced", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("total_paid", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("balance", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("bucket_0_30", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("bucket_31_60", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("bucket_61_90", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("bucket_90_plus", models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ("invoice_count", models.IntegerField(default=0)),
+                ("newest_invoice_date", models.DateField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "company_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="debt_snapshots",
+                        to="docscanner_app.companyprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Skolų kopija",
+                "verbose_name_plural": "Skolų kopijos",
+                "indexes": [
+                    models.Index(
+                        fields=["company_profile", "debt_type", "as_of", "-newest_invoice_date"],
+                        name="idx_debtsnap_profile_asof",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["company_profile", "invoice_date"],
+                name="idx_inv_profile_date",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="purchase",
+            index=models.Index(
+                fields=["company_profile", "invoice_date"],
+                name="idx_purchase_profile_date",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0169_debtsnapshot_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VatReportFact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("report", models.CharField(choices=[("oss", "OSS"), ("svs", "SVS")], max_length=3)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("skaitmenizavimas", "Skaitmenizavimas"),
+                            ("israsymas", "Išrašymas"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("doc_id", models.BigIntegerField()),
+                ("line", models.PositiveSmallIntegerField(default=0)),
+                ("invoice_date", models.DateField()),
+                ("document_series", models.CharField(blank=True, default="", max_length=50)),
+                ("document_number", models.CharField(blank=True, default="", max_length=100)),
+                ("own_key", models.TextField(blank=True, default="")),
+                ("other_key", models.TextField(blank=True, default="")),
+                ("svs_code", models.CharField(blank=True, default="", max_length=3)),
+                ("country", models.CharField(blank=True, default="", max_length=10)),
+                ("counterparty_name", models.CharField(blank=True, default="", max_length=255)),
+                ("counterparty_vat_code", models.CharField(blank=True, default="", max_length=50)),
+                ("vat_percent", models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ("taxable_eur", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("vat_eur", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("warning", models.CharField(blank=True, default="", max_length=255)),
+                ("dedup_key", models.CharField(blank=True, default="", max_length=255)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vat_report_facts",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "OSS / SVS faktas",
+                "verbose_name_plural": "OSS / SVS faktai",
+                "indexes": [
+                    models.Index(fields=["user", "report", "invoice_date"], name="idx_vatfact_user_date"),
+                    models.Index(fields=["user", "report", "dedup_key"], name="idx_vatfact_dedup"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=["source", "doc_id", "report", "line"],
+                        name="uniq_vatfact_doc_line",
+                    ),
+                ],
+            },
+        ),
+    ]
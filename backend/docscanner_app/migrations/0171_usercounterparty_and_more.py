@@ -0,0 +1,107 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Kontrahentų katalogo paieška: GIN trigram ant unaccent_immutable(lower(search_text))
+# (kaip 0022 / 0166). Counterparty (išrašymo klientai) — icontains filtrai
+# (UPPER(x::text) LIKE UPPER(%q%)) counterparty_list_create / invoice_search_companies.
+SQL_IDX_CREATE = """
+CREATE INDEX IF NOT EXISTS docscan_usercp_searchtext_trgm
+  ON docscanner_app_usercounterparty
+  USING gin (public.unaccent_immutable(lower(search_text)) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS docscan_counterparty_name_trgm
+  ON docscanner_app_counterparty
+  USING gin (upper(name::text) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS docscan_counterparty_code_trgm
+  ON docscanner_app_counterparty
+  USING gin (upper(company_code::text) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS docscan_counterparty_vat_trgm
+  ON docscanner_app_counterparty
+  USING gin (upper(vat_code::text) gin_trgm_ops);
+"""
+
+SQL_IDX_DROP = """
+DROP INDEX IF EXISTS docscan_usercp_searchtext_trgm;
+DROP INDEX IF EXISTS docscan_counterparty_name_trgm;
+DROP INDEX IF EXISTS docscan_counterparty_code_trgm;
+DROP INDEX IF EXISTS docscan_counterparty_vat_trgm;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0170_vatreportfact"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="seller_key",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="buyer_key",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="scanneddocument",
+            index=models.Index(fields=["user", "seller_key"], name="idx_user_seller_key"),
+        ),
+        migrations.AddIndex(
+            model_name="scanneddocument",
+            index=models.Index(fields=["user", "buyer_key"], name="idx_user_buyer_key"),
+        ),
+        migrations.CreateModel(
+            name="UserCounterparty",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255)),
+                ("company_code", models.CharField(blank=True, default="", max_length=100)),
+                ("name", models.CharField(blank=True, default="", max_length=255)),
+                ("vat_code", models.CharField(blank=True, default="", max_length=50)),
+                ("search_text", models.TextField(blank=True, default="")),
+                ("seller_count", models.PositiveIntegerField(default=0)),
+                ("buyer_count", models.PositiveIntegerField(default=0)),
+                ("docs_count", models.PositiveIntegerField(default=0)),
+                ("last_seen_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counterparty_directory",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Kontrahentas (katalogas)",
+                "verbose_name_plural": "Kontrahentų katalogas",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-docs_count", "name", "id"],
+                        name="idx_usercp_user_docs",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(fields=["user", "key"], name="uniq_usercp_user_key"),
+                ],
+            },
+        ),
+        migrations.RunSQL(SQL_IDX_CREATE, reverse_sql=SQL_IDX_DROP),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0171_usercounterparty_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Valanda"), ("day", "Diena")],
+                        max_length=8,
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("metric", models.CharField(max_length=32)),
+                ("value", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Dashboard agregatas",
+                "verbose_name_plural": "Dashboard agregatai",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=["period", "bucket_start", "metric"],
+                        name="uniq_dashrollup_bucket",
+                    ),
+                ],
+            },
+        ),
+        # Agregatų perskaičiavimas / gyva „uodega“ — intervalai pagal datą be user
+        migrations.AddIndex(
+            model_name="scanneddocument",
+            index=models.Index(fields=["uploaded_at"], name="idx_scandoc_uploaded"),
+        ),
+        migrations.AddIndex(
+            model_name="scannedwaybill",
+            index=models.Index(fields=["uploaded_at"], name="idx_wb_uploaded"),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["created_at"], name="idx_inv_created"),
+        ),
+        migrations.AddIndex(
+            model_name="invoiceemail",
+            index=models.Index(fields=["sent_at"], name="idx_invemail_sent"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+def received_to_bitmap(apps, schema_editor):
+    """JSON indeksų sąrašas → bitmap + kiekis (tik nebaigti upload'ai)."""
+    for model_name in ("ChunkedUpload", "WaybillChunkedUpload"):
+        Model = apps.get_model("docscanner_app", model_name)
+        for upload in Model.objects.filter(status="uploading").iterator():
+            bitmap = bytearray(-(-upload.total_chunks // 8))
+            indexes = {
+                int(i) for i in (upload.received or [])
+                if 0 <= int(i) < upload.total_chunks
+            }
+            for i in indexes:
+                bitmap[i >> 3] |= 1 << (i & 7)
+            upload.received_bitmap = bytes(bitmap)
+            upload.received_count = len(indexes)
+            upload.save(update_fields=["received_bitmap", "received_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0172_dashboardrollup_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunkedupload",
+            name="received_bitmap",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.AddField(
+            model_name="chunkedupload",
+            name="received_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="chunkedupload",
+            name="sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="waybillchunkedupload",
+            name="received_bitmap",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.AddField(
+            model_name="waybillchunkedupload",
+            name="received_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="waybillchunkedupload",
+            name="sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.RunPython(received_to_bitmap, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="chunkedupload",
+            name="received",
+        ),
+        migrations.RemoveField(
+            model_name="waybillchunkedupload",
+            name="received",
+        ),
+    ]
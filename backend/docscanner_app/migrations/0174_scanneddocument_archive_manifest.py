@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0173_chunkedupload_received_bitmap"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scanneddocument",
+            name="archive_manifest",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
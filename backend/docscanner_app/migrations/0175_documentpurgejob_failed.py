@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-19 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0174_scanneddocument_archive_manifest"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="documentpurgejob",
+            name="stage",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("processing", "Processing"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="queued",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentpurgejob",
+            name="failed_documents",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="documentpurgejob",
+            name="error_message",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("docscanner_app", "0175_documentpurgejob_failed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunkedupload",
+            name="doc_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="waybillchunkedupload",
+            name="doc_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
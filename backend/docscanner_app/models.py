@@ -157,12 +157,15 @@ class ChunkedUpload(models.Model):
     chunk_size = models.IntegerField()
     total_chunks = models.IntegerField()
 
-    # simplest: список полученных индексов (не идеально для 10000, но для 2GB при chunk=10-25MB это ок)
-    received = models.JSONField(default=list, blank=True)  # e.g. [0,1,2,5,...]
+    # Gauti chunk'ai: bitas i = chunk i (services/chunked_upload.py, set_bit)
+    received_bitmap = models.BinaryField(default=b"", blank=True)
+    received_count = models.IntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default="")  # kliento kontrolinė suma (nebūtina)
     status = models.CharField(max_length=16, choices=STATUS, default="uploading")
 
     tmp_path = models.TextField(blank=True, default="")  # путь до .part
     error_message = models.TextField(blank=True, default="")
+    doc_id = models.BigIntegerField(null=True, blank=True)  # sukurtas archyvo konteineris (pakartotinis complete)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -175,6 +178,17 @@ class ChunkedUpload(models.Model):
 
 
 
+class ScannedDocumentManager(models.Manager):
+    """
+    Numatytasis manager'is be soft-deleted dokumentų (is_deleted — laukia
+    DocumentPurgeJob): sąrašai, eksportai, ataskaitos, perkėlimas į apskaitą,
+    kontrahentų katalogas ir dashboard jų nemato. Visi — ScannedDocument.all_objects.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class ScannedDocument(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Tikrinami'),
@@ -376,6 +390,8 @@ class ScannedDocument(models.Model):
 
     is_archive_container = models.BooleanField(default=False)
     archive_file_count = models.PositiveIntegerField(default=0)
+    # archive_manifest() (utils/file_converter.py): failai, kurie taps dokumentais
+    archive_manifest = models.JSONField(null=True, blank=True)
 
 
     parent_document = models.ForeignKey(
@@ -441,6 +457,22 @@ class ScannedDocument(models.Model):
         verbose_name="Perkelta į įmonę",
     )
 
+    # Soft-delete: pažymima iškart, eilutės ir failai šalinami fone (DocumentPurgeJob)
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ScannedDocumentManager()
+    all_objects = models.Manager()
+
+    # Problemų santrauka sąrašams (utils/doc_issues.py) — skaičiuojama save() metu iš JSON
+    issue_flags = models.PositiveSmallIntegerField(default=0)
+    has_issues = models.BooleanField(default=False)
+    issue_count = models.PositiveSmallIntegerField(default=0)
+
+    # company_key() — kontrahentų katalogui (services/counterparty_directory.py)
+    seller_key = models.CharField(max_length=255, blank=True, default="")
+    buyer_key = models.CharField(max_length=255, blank=True, default="")
+
     class Meta:
         indexes = [
             models.Index(fields=["user", "-uploaded_at"], name="idx_user_uploaded_desc"),
@@ -453,8 +485,28 @@ class ScannedDocument(models.Model):
             models.Index(fields=["user", "buyer_name_normalized"], name="idx_user_buyer_norm"),
             models.Index(fields=["upload_session"]),
             models.Index(fields=["parent_document"]),
+            models.Index(
+                fields=["-uploaded_at", "-id"],
+                name="idx_scandoc_has_issues",
+                condition=models.Q(has_issues=True),
+            ),
+            models.Index(
+                fields=["user", "-uploaded_at"],
+                name="idx_user_has_issues",
+                condition=models.Q(has_issues=True),
+            ),
+            models.Index(fields=["user", "seller_key"], name="idx_user_seller_key"),
+            models.Index(fields=["user", "buyer_key"], name="idx_user_buyer_key"),
+            models.Index(fields=["uploaded_at"], name="idx_scandoc_uploaded"),
         ]
 
+    def save(self, *args, **kwargs):
+        from .utils.doc_issues import refresh_issue_fields
+        from .services.counterparty_directory import refresh_counterparty_keys
+        refresh_issue_fields(self, kwargs)
+        refresh_counterparty_keys(self, kwargs)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.original_filename} ({self.user.email})"
     
@@ -610,6 +662,104 @@ class CreditUsageLog(models.Model):
         return f"User {self.user_id} | -{self.credits_used} cr | {self.document_filename}{status}"
 
 
+class DocumentPurgeJob(models.Model):
+    """
+    Fone vykdomas masinis dokumentų trynimas.
+    Dokumentai pažymimi is_deleted iškart (request'e), o eilutės trinamos
+    ribotais batch'ais ir failai šalinami iš storage Celery task'e.
+    """
+    class Stage(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        PROCESSING = 'processing', 'Processing'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    user = models.ForeignKey(
+        'CustomUser',
+        on_delete=models.CASCADE,
+        related_name='document_purge_jobs',
+    )
+    stage = models.CharField(max_length=20, choices=Stage.choices, default=Stage.QUEUED)
+    document_ids = models.JSONField(default=list)
+
+    total_documents = models.IntegerField(default=0)
+    processed_documents = models.IntegerField(default=0)
+    deleted_documents = models.IntegerField(default=0)
+    skipped_documents = models.IntegerField(default=0)  # PROTECT (Purchase / Invoice)
+    failed_documents = models.IntegerField(default=0)   # nepavykę batch'ai — atžymėti, matomi vėl
+    deleted_files = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    task_id = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'stage', '-created_at'], name='idx_purge_user_stage'),
+        ]
+
+    def __str__(self):
+        return f"DocumentPurgeJob #{self.pk} [{self.stage}] {self.processed_documents}/{self.total_documents}"
+
+
+class AccountingTransferJob(models.Model):
+    """
+    Fone vykdomas ScannedDocument → Purchase / Invoice perkėlimas
+    (services/accounting_transfer_job.py). plan — sprendimai kiekvienam
+    dokumentui; processed_documents — kiek plano įrašų jau įvykdyta
+    (įrašoma toje pačioje transakcijoje kaip chunk'o dokumentai).
+    """
+    class Stage(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        PROCESSING = 'processing', 'Processing'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    user = models.ForeignKey(
+        'CustomUser',
+        on_delete=models.CASCADE,
+        related_name='accounting_transfer_jobs',
+    )
+    company_profile = models.ForeignKey(
+        'CompanyProfile',
+        on_delete=models.CASCADE,
+        related_name='accounting_transfer_jobs',
+    )
+    stage = models.CharField(max_length=20, choices=Stage.choices, default=Stage.QUEUED)
+
+    document_ids = models.JSONField(default=list)
+    cp_key = models.CharField(max_length=255, blank=True, default='')
+    replace_document_company = models.BooleanField(default=False)
+    plan = models.JSONField(default=list)
+
+    total_documents = models.IntegerField(default=0)
+    processed_documents = models.IntegerField(default=0)
+    created_purchases = models.JSONField(default=list)
+    created_sales = models.JSONField(default=list)
+    skipped = models.JSONField(default=list)
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    task_id = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'stage', '-created_at'], name='idx_transfer_user_stage'),
+        ]
+
+    def __str__(self):
+        return f"AccountingTransferJob #{self.pk} [{self.stage}] {self.processed_documents}/{self.total_documents}"
+
+
 
 
 
@@ -1392,6 +1542,14 @@ class ProductAutocomplete(models.Model):
         indexes = [
             models.Index(fields=["user", "prekes_kodas"]),
         ]
+        constraints = [
+            # ON CONFLICT (user, prekes_kodas) taikinys bulk upsert'ui importe.
+            # NULL kodai Postgres'e laikomi skirtingais, todėl netrukdo.
+            models.UniqueConstraint(
+                fields=["user", "prekes_kodas"],
+                name="unique_product_autocomplete_code_per_user",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.prekes_pavadinimas or self.prekes_kodas}"
@@ -1484,6 +1642,60 @@ class ClientAutocomplete(models.Model):
 
 
 
+def data_import_upload_path(instance, filename):
+    ext = filename.split('.')[-1]
+    return os.path.join("imports", str(instance.user_id), f"{uuid.uuid4().hex}.{ext}")
+
+
+class DataImportSession(models.Model):
+    """
+    Fone vykdomas prekių / klientų XLSX importas.
+    Failas išsaugomas, Celery task'as jį skaito eilutėmis ir rašo batch'ais,
+    o frontas poll'ina progresą per data_import_status.
+    """
+    class Kind(models.TextChoices):
+        PRODUCTS = 'products', 'Prekės'
+        CLIENTS = 'clients', 'Klientai'
+
+    class Stage(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        PROCESSING = 'processing', 'Processing'
+        DONE = 'done', 'Done'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='data_import_sessions'
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    stage = models.CharField(max_length=20, choices=Stage.choices, default=Stage.QUEUED)
+
+    file = models.FileField(upload_to=data_import_upload_path, blank=True, null=True)
+    original_filename = models.CharField(max_length=255, blank=True, default='')
+
+    # Счётчики (total_rows — оценка по ws.max_row, может быть неточной)
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+
+    # Итоговый отчёт в том же формате, что и раньше возвращал sync endpoint
+    report = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    task_id = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'stage', '-created_at'], name='idx_dimport_user_stage'),
+        ]
+
+    def __str__(self):
+        return f"DataImportSession #{self.pk} {self.kind} [{self.stage}]"
+
+
 class PVMKlasifikatoriai(models.Model):
     kodas = models.CharField(max_length=16, unique=True)
     aprasymas = models.TextField()
@@ -2858,6 +3070,8 @@ class Invoice(models.Model):
             models.Index(fields=["user", "buyer_name_normalized"], name="idx_inv_buyer_norm"),
             models.Index(fields=["due_date"], name="idx_inv_due_date"),
             models.Index(fields=["source_invoice"], name="idx_inv_source"),
+            models.Index(fields=["company_profile", "invoice_date"], name="idx_inv_profile_date"),
+            models.Index(fields=["created_at"], name="idx_inv_created"),
         ]
 
     def __str__(self):
@@ -3840,6 +4054,7 @@ class InvoiceEmail(models.Model):
             models.Index(fields=["invoice", "-sent_at"], name="idx_invemail_inv_sent"),
             models.Index(fields=["invoice", "email_type"], name="idx_invemail_inv_type"),
             models.Index(fields=["mailgun_message_id"], name="idx_invemail_msgid"),
+            models.Index(fields=["sent_at"], name="idx_invemail_sent"),
         ]
 
     def __str__(self):
@@ -4307,6 +4522,115 @@ class OutgoingTransaction(BaseTransaction):
         return f"↑ {self.transaction_date} {self.amount} {self.currency} – {self.counterparty_name}"
 
 
+class TransactionSignalsRecord(models.Model):
+    """
+    Iš banko operacijos ištraukti signalai (utils/transaction_signals.extract_signals),
+    išsaugoti importo metu, kad matching'as nekartotų regex'ų kiekvieną kartą.
+
+    version     — SIGNALS_VERSION, kuria ištraukta (pakeitus šabloną/alias'us — perskaičiuojama)
+    source_hash — operacijos tekstinių laukų md5 (pasikeitus operacijai — perskaičiuojama)
+    """
+
+    incoming_transaction = models.OneToOneField(
+        IncomingTransaction,
+        null=True, blank=True,
+        on_delete=models.CASCADE,
+        related_name="signals_record",
+    )
+    outgoing_transaction = models.OneToOneField(
+        OutgoingTransaction,
+        null=True, blank=True,
+        on_delete=models.CASCADE,
+        related_name="signals_record",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="transaction_signals",
+    )
+
+    version = models.PositiveSmallIntegerField(default=0)
+    source_hash = models.CharField(max_length=32, blank=True, default="")
+
+    txn_type = models.CharField(max_length=30, default="unknown")
+    skip_matching = models.BooleanField(default=False)
+    skip_reason = models.CharField(max_length=30, blank=True, default="")
+
+    merchant_name_raw = models.CharField(max_length=255, blank=True, default="")
+    merchant_name_clean = models.CharField(max_length=255, blank=True, default="")
+    merchant_keywords = models.JSONField(default=list, blank=True)
+    merchant_alias_matches = models.JSONField(default=list, blank=True)
+    references = models.JSONField(default=list, blank=True)
+
+    original_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    original_currency = models.CharField(max_length=10, blank=True, default="")
+    settled_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    settled_currency = models.CharField(max_length=10, blank=True, default="")
+    conversion_fee = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    is_cross_currency = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "version"], name="idx_txsig_user_ver"),
+            models.Index(fields=["user", "txn_type"], name="idx_txsig_user_type"),
+            models.Index(fields=["user", "merchant_name_clean"], name="idx_txsig_user_merch"),
+        ]
+        constraints = [
+            # Lygiai viena operacija: incoming arba outgoing
+            models.CheckConstraint(
+                condition=(
+                    models.Q(incoming_transaction__isnull=False, outgoing_transaction__isnull=True)
+                    | models.Q(incoming_transaction__isnull=True, outgoing_transaction__isnull=False)
+                ),
+                name="chk_txsig_one_transaction",
+            ),
+        ]
+
+    def __str__(self):
+        txn_id = self.outgoing_transaction_id or self.incoming_transaction_id
+        return f"Signals v{self.version} txn={txn_id} {self.txn_type}"
+
+
+class MatchingChange(models.Model):
+    """
+    Incremental matching eilė (utils/incremental_matching.py): dokumentai ir
+    operacijos, pasikeitę nuo paskutinio matching'o. Įrašoma toje pačioje DB
+    transakcijoje kaip ir pats pakeitimas, apdorojama Celery task'e —
+    perskaičiuojamos tik paveiktos neapmokėtų dokumentų ↔ operacijų poros.
+    """
+    class Kind(models.TextChoices):
+        INVOICE = "invoice", "Invoice"
+        PURCHASE = "purchase", "Purchase"
+        INCOMING = "incoming", "IncomingTransaction"
+        OUTGOING = "outgoing", "OutgoingTransaction"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="matching_changes",
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kind", "object_id"],
+                name="uniq_matchchange_object",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "id"], name="idx_matchchange_user"),
+        ]
+
+    def __str__(self):
+        return f"MatchingChange {self.kind}#{self.object_id} user={self.user_id}"
+
+
 # ────────────────────────────────────────────────────────────
 # 3. PaymentAllocation
 # ────────────────────────────────────────────────────────────
@@ -5207,10 +5531,13 @@ class WaybillChunkedUpload(models.Model):
     total_size = models.BigIntegerField()
     chunk_size = models.IntegerField()
     total_chunks = models.IntegerField()
-    received = models.JSONField(default=list, blank=True)
+    received_bitmap = models.BinaryField(default=b"", blank=True)
+    received_count = models.IntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default="")
     status = models.CharField(max_length=16, choices=STATUS, default="uploading")
     tmp_path = models.TextField(blank=True, default="")
     error_message = models.TextField(blank=True, default="")
+    doc_id = models.BigIntegerField(null=True, blank=True)  # sukurtas ScannedWaybill (pakartotinis complete)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -5442,6 +5769,7 @@ class ScannedWaybill(models.Model):
             models.Index(fields=["user", "buyer_name"], name="idx_wb_user_buyer"),
             models.Index(fields=["upload_session"]),
             models.Index(fields=["parent_document"]),
+            models.Index(fields=["uploaded_at"], name="idx_wb_uploaded"),
         ]
 
     def __str__(self):
@@ -5710,6 +6038,10 @@ class Purchase(models.Model):
                 fields=["user", "seller_name_normalized"],
                 name="idx_purchase_seller_norm",
             ),
+            models.Index(
+                fields=["company_profile", "invoice_date"],
+                name="idx_purchase_profile_date",
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -6158,7 +6490,216 @@ class JournalEntryLine(models.Model):
 
     def __str__(self):
         return f"{self.side} {self.account_code} {self.amount}"
-    
+
+
+class DebtSnapshot(models.Model):
+    """
+    Skolų žiniaraščio kopija mėnesio pabaigai (services/debts_ledger.py).
+    Viena eilutė — vienas kontrahentas. Kuriama build_debt_snapshots komanda,
+    ištrinama, kai pasikeičia dokumentas / alokacija su data <= as_of.
+    """
+    TYPE_CHOICES = [
+        ("customer", "Pirkėjų skolos"),
+        ("supplier", "Skolos tiekėjams"),
+    ]
+
+    company_profile = models.ForeignKey(
+        "CompanyProfile",
+        on_delete=models.CASCADE,
+        related_name="debt_snapshots",
+    )
+    debt_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    as_of = models.DateField("Data")
+
+    counterparty_name = models.CharField(max_length=255, blank=True, default="")
+    counterparty_code = models.CharField(max_length=100, blank=True, default="")
+
+    total_invoiced = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    bucket_0_30 = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    bucket_31_60 = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    bucket_61_90 = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    bucket_90_plus = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+
+    invoice_count = models.IntegerField(default=0)
+    newest_invoice_date = models.DateField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Skolų kopija"
+        verbose_name_plural = "Skolų kopijos"
+        indexes = [
+            models.Index(
+                fields=["company_profile", "debt_type", "as_of", "-newest_invoice_date"],
+                name="idx_debtsnap_profile_asof",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.debt_type} {self.as_of} {self.counterparty_name}: {self.balance}"
+
 # ========================================================
 # END - DK
-# ========================================================
\ No newline at end of file
+# ========================================================
+
+# ========================================================
+# OSS / SVS ataskaitos
+# ========================================================
+
+class VatReportFact(models.Model):
+    """
+    Dokumento (ScannedDocument / Invoice) indėlis į OSS arba SVS ataskaitą,
+    jau konvertuotas į EUR (services/vat_report_facts.py). Viena eilutė —
+    vienas PVM tarifas (OSS) arba viena kryptis (SVS pirkimas / pardavimas).
+    Perrašoma signalais, kai pasikeičia dokumentas ar jo eilutės.
+    """
+    REPORT_CHOICES = [
+        ("oss", "OSS"),
+        ("svs", "SVS"),
+    ]
+    SOURCE_CHOICES = [
+        ("skaitmenizavimas", "Skaitmenizavimas"),
+        ("israsymas", "Išrašymas"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="vat_report_facts",
+    )
+    report = models.CharField(max_length=3, choices=REPORT_CHOICES)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    doc_id = models.BigIntegerField()
+    line = models.PositiveSmallIntegerField(default=0)
+
+    invoice_date = models.DateField()
+    document_series = models.CharField(max_length=50, blank=True, default="")
+    document_number = models.CharField(max_length=100, blank=True, default="")
+
+    # _company_key(): mūsų įmonės pusė ir kita pusė
+    own_key = models.TextField(blank=True, default="")
+    other_key = models.TextField(blank=True, default="")
+
+    svs_code = models.CharField(max_length=3, blank=True, default="")
+    country = models.CharField(max_length=10, blank=True, default="")
+    counterparty_name = models.CharField(max_length=255, blank=True, default="")
+    counterparty_vat_code = models.CharField(max_length=50, blank=True, default="")
+
+    vat_percent = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    taxable_eur = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vat_eur = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    warning = models.CharField(max_length=255, blank=True, default="")
+
+    dedup_key = models.CharField(max_length=255, blank=True, default="")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "OSS / SVS faktas"
+        verbose_name_plural = "OSS / SVS faktai"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "doc_id", "report", "line"],
+                name="uniq_vatfact_doc_line",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "report", "invoice_date"], name="idx_vatfact_user_date"),
+            models.Index(fields=["user", "report", "dedup_key"], name="idx_vatfact_dedup"),
+        ]
+
+    def __str__(self):
+        return f"{self.report} {self.source}#{self.doc_id}/{self.line}: {self.taxable_eur}"
+
+# ========================================================
+# END - OSS / SVS ataskaitos
+# ========================================================
+
+
+# ========================================================
+# Kontrahentų katalogas
+# ========================================================
+
+class UserCounterparty(models.Model):
+    """
+    Vartotojo kontrahentas iš ScannedDocument (pardavėjas arba pirkėjas),
+    sugrupuotas pagal company_key(). Atnaujinamas signalais
+    (services/counterparty_directory.py), perkuriamas rebuild_user_counterparties.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="counterparty_directory",
+    )
+    key = models.CharField(max_length=255)
+
+    company_code = models.CharField(max_length=100, blank=True, default="")
+    name = models.CharField(max_length=255, blank=True, default="")
+    vat_code = models.CharField(max_length=50, blank=True, default="")
+    # name + PVM + kodas, trigram paieškai (GIN, 0171)
+    search_text = models.TextField(blank=True, default="")
+
+    seller_count = models.PositiveIntegerField(default=0)
+    buyer_count = models.PositiveIntegerField(default=0)
+    docs_count = models.PositiveIntegerField(default=0)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Kontrahentas (katalogas)"
+        verbose_name_plural = "Kontrahentų katalogas"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="uniq_usercp_user_key"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-docs_count", "name", "id"], name="idx_usercp_user_docs"),
+        ]
+
+    def __str__(self):
+        return f"{self.name or self.key} ({self.docs_count})"
+
+# ========================================================
+# END - Kontrahentų katalogas
+# ========================================================
+
+
+# ========================================================
+# Superuser dashboard agregatai
+# ========================================================
+
+class DashboardRollup(models.Model):
+    """
+    Iš anksto suskaičiuota dashboard'o metrika laiko intervalui
+    (services/dashboard_rollups.py). period="hour" — UTC valanda,
+    period="day" — vietinė diena. Pildo refresh_dashboard_rollups_task.
+    """
+    PERIOD_CHOICES = [
+        ("hour", "Valanda"),
+        ("day", "Diena"),
+    ]
+
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    metric = models.CharField(max_length=32)
+    value = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dashboard agregatas"
+        verbose_name_plural = "Dashboard agregatai"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "bucket_start", "metric"], name="uniq_dashrollup_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket_start:%Y-%m-%d %H:%M} {self.metric}={self.value}"
+
+# ========================================================
+# END - Superuser dashboard agregatai
+# ========================================================
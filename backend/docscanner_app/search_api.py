@@ -1,5 +1,10 @@
-from django.db.models import F, Q, Value
-from django.db.models.functions import Lower
+import hashlib
+import unicodedata
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Lower, Substr
 from django.db.models.expressions import Func
 from django.contrib.postgres.search import TrigramSimilarity
 from django.utils.html import strip_tags
@@ -13,6 +18,13 @@ from docscanner_app.models import (
     BlogCategoryPage, BlogPostPage,
 )
 from docscanner_app.serializers import rendition_url  # твой helper из сериализаторов
+from docscanner_app.utils.shared_cache import get_or_set
+
+
+SEARCH_CACHE_NAMESPACE = "site_search"   # invaliduojamas publikuojant puslapius (utils/signals.py)
+SIM_THRESHOLD = 0.1
+SNIPPET_LEN = 180
+RENDITION_SPEC = "fill-800x450|jpegquality-70"
 
 
 # -- helper: использовать нашу IMMUTABLE-обёртку в SQL
@@ -22,42 +34,128 @@ class UnaccentImmutable(Func):
 
 
 def norm_expr(field_name: str):
-    """unaccent_immutable(lower(field))"""
+    """unaccent_immutable(lower(field)) — tas pats išraiškos indeksas (0022, 0166)"""
     return UnaccentImmutable(Lower(F(field_name)))
 
 
+def normalize_query(q: str) -> str:
+    """lower + diakritikų pašalinimas, kaip unaccent (ą→a, š→s ...)."""
+    decomposed = unicodedata.normalize("NFKD", q.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+@contextmanager
+def trigram_threshold(value=SIM_THRESHOLD):
+    """
+    `%` (trigram_similar) naudoja GIN indeksą, bet slenkstis imamas iš
+    pg_trgm.similarity_threshold (numatytas 0.3) — nustatom tik šiai transakcijai.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", [str(value)])
+        yield
+
+
+def search_pages(qs, q_norm, fields, image_field, limit):
+    """
+    Viena užklausa: atitinkantys puslapiai + sim + rendition failas,
+    surikiuoti pagal panašumą. Filtras ant normalizuotos išraiškos, kad
+    būtų naudojamas trigram indeksas.
+    """
+    from wagtail.images import get_image_model
+
+    Rendition = get_image_model().get_rendition_model()
+    rendition_file = (
+        Rendition.objects
+        .filter(image_id=OuterRef(f"{image_field}_id"), filter_spec=RENDITION_SPEC)
+        .order_by("-id")
+        .values("file")[:1]
+    )
+
+    return list(
+        qs
+        .annotate(
+            norm=norm_expr("search_text"),
+            sim=TrigramSimilarity(norm_expr("search_text"), Value(q_norm)),
+            image_id=F(f"{image_field}_id"),
+            rendition_file=Subquery(rendition_file),
+        )
+        .filter(Q(norm__contains=q_norm) | Q(norm__trigram_similar=q_norm))
+        .order_by("-sim", "id")
+        .values("id", "slug", "title", "sim", "image_id", "rendition_file", *fields)[:limit]
+    )
+
+
+def image_urls(rows) -> dict:
+    """image_id -> URL. Trūkstami rendition'ai sugeneruojami (viena užklausa paveikslėliams)."""
+    from wagtail.images import get_image_model
+
+    Image = get_image_model()
+    storage = Image.get_rendition_model()._meta.get_field("file").storage
+
+    urls = {}
+    missing = set()
+    for row in rows:
+        image_id = row["image_id"]
+        if not image_id:
+            continue
+        if row["rendition_file"]:
+            urls[image_id] = storage.url(row["rendition_file"])
+        else:
+            missing.add(image_id)
+
+    for img in Image.objects.filter(id__in=missing - set(urls)):
+        urls[img.id] = rendition_url(img, RENDITION_SPEC)
+    return urls
+
+
+def _query_key(q_norm: str) -> str:
+    return hashlib.sha1(q_norm.encode("utf-8")).hexdigest()
+
+
+def _parse_limit(request):
+    try:
+        return max(1, min(int(request.GET.get("limit", 5)), 20))
+    except (TypeError, ValueError):
+        return 5
+
+
 class GuidesSmartSearchView(APIView):
     """
     GET /guides-api/v2/search/?q=tekstas&limit=5
     Смешанные результаты: категории + статьи. До `limit` штук.
+    Rezultatai cache'inami (SEARCH_CACHE_NAMESPACE) pagal normalizuotą užklausą.
     """
     permission_classes = [AllowAny]
 
     def get(self, request):
         q = (request.GET.get("q") or "").strip()
-        try:
-            limit = max(1, min(int(request.GET.get("limit", 5)), 20))
-        except (TypeError, ValueError):
-            limit = 5
+        limit = _parse_limit(request)
         if not q:
             return Response({"results": []})
 
-        q_norm = q.lower()
-
-        # --- Категории
-        cats_qs = (
-            GuideCategoryPage.objects.live().public()
-            .annotate(sim=TrigramSimilarity(norm_expr("search_text"), Value(q_norm)))
-            .filter(Q(search_text__icontains=q_norm) | Q(sim__gt=0.1))
-            .values("id", "slug", "title", "description", "sim")
+        q_norm = normalize_query(q)
+        results = get_or_set(
+            SEARCH_CACHE_NAMESPACE,
+            ("guides", limit, _query_key(q_norm)),
+            lambda: self._search(q_norm, limit),
         )
+        return Response({"results": results})
+
+    def _search(self, q_norm, limit):
+        with trigram_threshold():
+            # --- Категории
+            cats_list = search_pages(
+                GuideCategoryPage.objects.live().public(),
+                q_norm, ("description",), "cat_image", limit * 3,
+            )
+            # --- Статьи
+            guides_list = search_pages(
+                GuidePage.objects.live().public().annotate(snippet_src=Substr("search_text", 1, SNIPPET_LEN * 2)),
+                q_norm, ("snippet_src",), "main_image", limit * 3,
+            )
 
-        cats_list = list(cats_qs[:limit * 3])
-        cat_ids = [c["id"] for c in cats_list]
-        cat_img_lookup = {
-            obj.id: getattr(obj, "cat_image", None)
-            for obj in GuideCategoryPage.objects.only("id", "cat_image").filter(id__in=cat_ids)
-        }
+        urls = image_urls(cats_list + guides_list)
 
         cat_results = []
         for c in cats_list:
@@ -65,35 +163,21 @@ class GuidesSmartSearchView(APIView):
                 "type": "category",
                 "id": c["id"],
                 "title": c["title"],
-                "snippet": (strip_tags(c.get("description") or "")[:180]),
-                "image_url": rendition_url(cat_img_lookup.get(c["id"])),
+                "snippet": (strip_tags(c.get("description") or "")[:SNIPPET_LEN]),
+                "image_url": urls.get(c["image_id"], ""),
                 "href": f"/kategorija/{c['slug']}",
                 "score": float(c.get("sim") or 0.0) + 0.05,  # слегка бустим категории
             })
 
-        # --- Статьи
-        guides_qs = (
-            GuidePage.objects.live().public()
-            .annotate(sim=TrigramSimilarity(norm_expr("search_text"), Value(q_norm)))
-            .filter(Q(search_text__icontains=q_norm) | Q(sim__gt=0.1))
-            .values("id", "slug", "title", "sim")
-        )
-
         guide_results = []
-        guide_ids = [g["id"] for g in guides_qs[:limit * 3]]
-        # вытащим заранее поля для сниппета и картинки
-        st_map = dict(GuidePage.objects.filter(id__in=guide_ids).values_list("id", "search_text"))
-        img_lookup = {obj.id: getattr(obj, "main_image", None)
-                      for obj in GuidePage.objects.only("id", "main_image").filter(id__in=guide_ids)}
-
-        for g in guides_qs[:limit * 3]:
-            st = (st_map.get(g["id"]) or "").replace("\n", " ").strip()
+        for g in guides_list:
+            st = (g.get("snippet_src") or "").replace("\n", " ").strip()
             guide_results.append({
                 "type": "article",
                 "id": g["id"],
                 "title": g["title"],
-                "snippet": st[:180],
-                "image_url": rendition_url(img_lookup.get(g["id"])),
+                "snippet": st[:SNIPPET_LEN],
+                "image_url": urls.get(g["image_id"], ""),
                 "href": f"/straipsnis/{g['slug']}",
                 "score": float(g.get("sim") or 0.0),
             })
@@ -101,83 +185,75 @@ class GuidesSmartSearchView(APIView):
         # --- Смешиваем и сортируем по релевантности
         combined = cat_results + guide_results
         combined.sort(key=lambda x: (-x["score"], x["title"]))
-        return Response({"results": combined[:limit]})
+        return combined[:limit]
 
 
 class BlogSmartSearchView(APIView):
     """
     GET /api/blog-api/v2/search/?q=tekstas&limit=5[&category=<slug>]
     Смешанные результаты: темы (категории) + посты. До `limit` штук.
+    Rezultatai cache'inami (SEARCH_CACHE_NAMESPACE) pagal normalizuotą užklausą.
     """
     permission_classes = [AllowAny]
 
     def get(self, request):
         q = (request.GET.get("q") or "").strip()
-        try:
-            limit = max(1, min(int(request.GET.get("limit", 5)), 20))
-        except (TypeError, ValueError):
-            limit = 5
+        limit = _parse_limit(request)
         category_slug = (request.GET.get("category") or "").strip()
         if not q:
             return Response({"results": []})
 
-        q_norm = q.lower()
-
-        # --- Категории (только без фильтра по конкретной теме)
-        cat_results = []
-        if not category_slug:
-            cats_qs = (
-                BlogCategoryPage.objects.live().public()
-                .annotate(sim=TrigramSimilarity(norm_expr("search_text"), Value(q_norm)))
-                .filter(Q(search_text__icontains=q_norm) | Q(sim__gt=0.1))
-                .values("id", "slug", "title", "description", "sim")
-            )
+        q_norm = normalize_query(q)
+        results = get_or_set(
+            SEARCH_CACHE_NAMESPACE,
+            ("blog", limit, category_slug, _query_key(q_norm)),
+            lambda: self._search(q_norm, limit, category_slug),
+        )
+        return Response({"results": results})
 
-            cats_list = list(cats_qs[:limit * 3])
-            cat_ids = [c["id"] for c in cats_list]
-            cat_img_lookup = {
-                obj.id: getattr(obj, "cat_image", None)
-                for obj in BlogCategoryPage.objects.only("id", "cat_image").filter(id__in=cat_ids)
-            }
-
-            for c in cats_list:
-                cat_results.append({
-                    "type": "category",
-                    "id": c["id"],
-                    "title": c["title"],
-                    "snippet": (strip_tags(c.get("description") or "")[:180]),
-                    "image_url": rendition_url(cat_img_lookup.get(c["id"])),
-                    "href": f"/tinklarastis/tema/{c['slug']}",
-                    "score": float(c.get("sim") or 0.0) + 0.05,  # слегка бустим темы
-                })
-
-        # --- Посты
+    def _search(self, q_norm, limit, category_slug):
         posts_qs = BlogPostPage.objects.live().public()
         if category_slug:
             parent = BlogCategoryPage.objects.filter(slug=category_slug).first()
             posts_qs = posts_qs.child_of(parent) if parent else posts_qs.none()
 
-        posts_qs = (
-            posts_qs
-            .annotate(sim=TrigramSimilarity(norm_expr("search_text"), Value(q_norm)))
-            .filter(Q(search_text__icontains=q_norm) | Q(sim__gt=0.1))
-            .values("id", "slug", "title", "sim")
-        )
+        with trigram_threshold():
+            # --- Категории (только без фильтра по конкретной теме)
+            cats_list = []
+            if not category_slug:
+                cats_list = search_pages(
+                    BlogCategoryPage.objects.live().public(),
+                    q_norm, ("description",), "cat_image", limit * 3,
+                )
+            # --- Посты
+            posts_list = search_pages(
+                posts_qs.annotate(snippet_src=Substr("search_text", 1, SNIPPET_LEN * 2)),
+                q_norm, ("snippet_src",), "main_image", limit * 3,
+            )
 
-        post_results = []
-        post_ids = [g["id"] for g in list(posts_qs[:limit * 3])]
-        st_map = dict(BlogPostPage.objects.filter(id__in=post_ids).values_list("id", "search_text"))
-        img_lookup = {obj.id: getattr(obj, "main_image", None)
-                      for obj in BlogPostPage.objects.only("id", "main_image").filter(id__in=post_ids)}
+        urls = image_urls(cats_list + posts_list)
 
-        for g in posts_qs[:limit * 3]:
-            st = (st_map.get(g["id"]) or "").replace("\n", " ").strip()
+        cat_results = []
+        for c in cats_list:
+            cat_results.append({
+                "type": "category",
+                "id": c["id"],
+                "title": c["title"],
+                "snippet": (strip_tags(c.get("description") or "")[:SNIPPET_LEN]),
+                "image_url": urls.get(c["image_id"], ""),
+                "href": f"/tinklarastis/tema/{c['slug']}",
+                "score": float(c.get("sim") or 0.0) + 0.05,  # слегка бустим темы
+            })
+
+        post_results = []
+        for g in posts_list:
+            st = (g.get("snippet_src") or "").replace("\n", " ").strip()
             post_results.append({
                 "type": "article",
                 "id": g["id"],
                 "title": g["title"],
-                "snippet": st[:180],
-                "image_url": rendition_url(img_lookup.get(g["id"])),
+                "snippet": st[:SNIPPET_LEN],
+                "image_url": urls.get(g["image_id"], ""),
                 "href": f"/tinklarastis/{g['slug']}",
                 "score": float(g.get("sim") or 0.0),
             })
@@ -185,4 +261,4 @@ class BlogSmartSearchView(APIView):
         # --- Смешиваем и сортируем по релевантности
         combined = cat_results + post_results
         combined.sort(key=lambda x: (-x["score"], x["title"]))
-        return Response({"results": combined[:limit]})
\ No newline at end of file
+        return combined[:limit]
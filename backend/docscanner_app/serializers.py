@@ -338,6 +338,8 @@ class ScannedDocumentListSerializer(serializers.ModelSerializer):
             'scan_type',
             'ready_for_export',
             'math_validation_passed',
+            'has_issues',
+            'issue_count',
             'optimum_api_status',
             'optimum_last_try_date',
             'dineta_api_status',
@@ -1205,9 +1207,12 @@ class CompanyProfileSerializer(serializers.ModelSerializer):
 
             # Osiruoti dokumentai (išrašyti be profilio) → priskirti pirmam profiliui
             from .models import Invoice
+            from .services.debts_ledger import invalidate_debt_snapshots
             orphan_qs = Invoice.objects.filter(user=user, company_profile__isnull=True)
             updated = orphan_qs.update(company_profile=profile)
             if updated:
+                # .update() signalų nekviečia — skolų kopijas invaliduojam patys
+                invalidate_debt_snapshots(profile.id, None, "customer")
                 logger.info(
                     "[CompanyProfile] Priskirta %d osiruotų sąskaitų user=%s → profile=%s",
                     updated, user.id, profile.id,
@@ -2276,6 +2281,7 @@ class CounterpartySerializer(serializers.Serializer):
     name = serializers.CharField(allow_blank=True, required=False)
     vat = serializers.CharField(allow_blank=True, required=False)
     docs_count = serializers.IntegerField()
+    last_seen_at = serializers.DateTimeField(allow_null=True, required=False)
 
 
 
@@ -4279,7 +4285,7 @@ class WaybillChunkedUploadInitSerializer(serializers.Serializer):
 class WaybillChunkedUploadStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = WaybillChunkedUpload
-        fields = ["id", "filename", "status", "total_chunks", "received"]
+        fields = ["id", "filename", "status", "total_chunks", "received_count"]
 
 
 # ============================================================
@@ -41,14 +41,11 @@ def rate_to_eur(currency, on_date) -> Decimal:
     code = (currency or "EUR").upper()
     if code == "EUR" or not on_date:
         return Decimal("1")
-    from ..models import CurrencyRate
-    obj = (
-        CurrencyRate.objects.filter(currency=code, date=on_date).first()
-        or CurrencyRate.objects.filter(currency=code, date__lt=on_date).order_by("-date").first()
-    )
-    if obj and obj.rate:
+    from ..utils.shared_cache import lookup_currency_rate
+    rate = lookup_currency_rate(code, on_date)
+    if rate:
         try:
-            r = Decimal(str(obj.rate))
+            r = Decimal(str(rate))
             if r > 0:
                 return r
         except Exception:
@@ -0,0 +1,1277 @@
+"""
+services/accounting_transfer_job.py
+===================================
+ScannedDocument → Purchase / Invoice perkėlimas į apskaitą (DokSkenas ERP).
+
+1. plan_transfer — sprendimai kiekvienam dokumentui (pirkimas / pardavimas /
+   praleisti su priežastimi) iš kelių užklausų: egzistuojančių Purchase /
+   Invoice žemėlapis ir užimti pardavimų numeriai (įskaitant numerius,
+   kuriuos užims ankstesni to paties perkėlimo dokumentai).
+   dry_run grąžina būtent šį planą — realus perkėlimas vykdo tą patį.
+2. run_transfer_job — Celery task'e (arba request'e, jei dokumentų nedaug):
+   planas vykdomas chunk'ais, kiekvienas chunk'as — atskira transakcija
+   kartu su job progreso įrašu. Job eilutė ir chunk'o dokumentai
+   užrakinami (select_for_update), egzistavimas tikrinamas dar kartą, todėl
+   pakartotinis / lygiagretus paleidimas dokumento nesukuria antrą kartą.
+   Chunk'o DK įrašai kuriami vienu batch'u (utils/journal_generators.py
+   sync_*_journal_entries), ne po vieną dokumentą.
+"""
+
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger("docscanner_app")
+
+TRANSFER_CHUNK_SIZE = 100
+TRANSFER_PLAN_BATCH = 1000
+
+
+# ═══════════════════════════════════════════════════════
+# Helpers: signs / amounts
+# ═══════════════════════════════════════════════════════
+
+def _dec(val, default=None):
+    if val is None or val == "":
+        return default
+
+    try:
+        return Decimal(str(val))
+    except (InvalidOperation, TypeError, ValueError):
+        return default
+
+
+def _has_amount(val):
+    d = _dec(val)
+    return d is not None and abs(d) > Decimal("0.001")
+
+
+def _signed_amount(val, is_credit):
+    """
+    Normalizuoja sumas:
+    - įprastai SF visada teigiama
+    - kreditinei SF visada neigiama
+    """
+    d = _dec(val)
+    if d is None:
+        return None
+
+    if d == 0:
+        return Decimal("0")
+
+    return -abs(d) if is_credit else abs(d)
+
+
+def _signed_quantity(val, is_credit, default=1):
+    """
+    Normalizuoja kiekį:
+    - įprastai SF kiekis teigiamas
+    - kreditinei SF kiekis neigiamas
+    """
+    d = _dec(val, Decimal(str(default)))
+
+    if d is None:
+        return None
+
+    if d == 0:
+        return Decimal("0")
+
+    return -abs(d) if is_credit else abs(d)
+
+
+def _positive_amount(val, default=None):
+    """
+    Kaina visada turi būti teigiama.
+    """
+    d = _dec(val, default)
+
+    if d is None:
+        return None
+
+    return abs(d)
+
+
+def _line_price(price, subtotal, quantity):
+    """
+    Jeigu OCR davė price, imam abs(price).
+    Jeigu price nėra, bandom paskaičiuoti iš subtotal / quantity.
+    """
+    price_dec = _dec(price)
+
+    if price_dec is not None and price_dec != 0:
+        return abs(price_dec)
+
+    subtotal_abs = _positive_amount(subtotal)
+    quantity_abs = _positive_amount(quantity)
+
+    if subtotal_abs is not None and quantity_abs not in (None, Decimal("0")):
+        return subtotal_abs / quantity_abs
+
+    return subtotal_abs
+
+
+def _norm(value):
+    return (str(value) if value else "").strip().upper()
+
+
+def _int_number(value):
+    try:
+        return int(str(value).strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def _sale_invoice_type(doc):
+    if bool(doc.is_credit_invoice):
+        return "kreditine"
+    if _has_amount(doc.vat_amount) or doc.separate_vat:
+        return "pvm_saskaita"
+    return "saskaita"
+
+
+def _doc_pvm_kodas(doc, pirkimas_pardavimas, preke_paslauga, vat_percent, separate_vat):
+    from ..validators.vat_klas import auto_select_pvm_code
+
+    return auto_select_pvm_code(
+        pirkimas_pardavimas=pirkimas_pardavimas,
+        buyer_country_iso=doc.buyer_country_iso,
+        seller_country_iso=doc.seller_country_iso,
+        preke_paslauga=preke_paslauga,
+        vat_percent=vat_percent,
+        separate_vat=separate_vat,
+        buyer_has_vat_code=bool(doc.buyer_vat_code),
+        seller_has_vat_code=bool(doc.seller_vat_code),
+        doc_96_str=bool(getattr(doc, "doc_96_str", False)),
+    )
+
+
+def _line_vat_pct(li, doc):
+    if li.vat_percent is not None:
+        return float(li.vat_percent)
+    if doc.vat_percent is not None:
+        return float(doc.vat_percent)
+    return None
+
+
+# ═══════════════════════════════════════════════════════
+# Company detection
+# ═══════════════════════════════════════════════════════
+
+class TransferContext:
+    """Profilis + pasirinkta įmonė (cp_key): krypties ir įmonės sutapimo taisyklės."""
+
+    def __init__(self, user, profile, cp_key="", replace_document_company=False):
+        self.user = user
+        self.profile = profile
+        self.cp_key = cp_key or ""
+        self.replace_document_company = bool(replace_document_company)
+        self.uses_inventory = bool(getattr(profile, "uses_inventory", False))
+
+        self.profile_ids = set()
+
+        if profile.company_code:
+            self.profile_ids.add(profile.company_code.strip().upper())
+
+        if profile.vat_code:
+            self.profile_ids.add(profile.vat_code.strip().upper())
+
+        profile_name_norm = (profile.name or "").strip().upper()
+
+        if profile_name_norm:
+            self.profile_ids.add(profile_name_norm)
+
+    @staticmethod
+    def _ids_from_doc(id_val, vat_val, name_val):
+        s = set()
+
+        if id_val:
+            s.add(id_val.strip().upper())
+
+        if vat_val:
+            s.add(vat_val.strip().upper())
+
+        if name_val:
+            s.add(name_val.strip().upper())
+
+        return s
+
+    @staticmethod
+    def _cp_key(id_val, vat_val, name_val):
+        id_str = (str(id_val) if id_val else "").strip()
+
+        if id_str:
+            return f"id:{id_str}"
+
+        norm_vat = (vat_val or "").strip().lower()
+
+        if norm_vat:
+            return norm_vat
+
+        return (name_val or "").strip().lower()
+
+    def selected_role(self, doc):
+        """
+        Grąžina, kuri dokumento pusė buvo pasirinkta kaip 'mano įmonė':
+        buyer / seller / None.
+        """
+        if not self.cp_key:
+            return None
+
+        if self.cp_key == self._cp_key(doc.seller_id, doc.seller_vat_code, doc.seller_name):
+            return "seller"
+
+        if self.cp_key == self._cp_key(doc.buyer_id, doc.buyer_vat_code, doc.buyer_name):
+            return "buyer"
+
+        return None
+
+    @staticmethod
+    def party_payload(doc, role):
+        prefix = "seller" if role == "seller" else "buyer"
+
+        return {
+            "role": "Pardavėjas" if role == "seller" else "Pirkėjas",
+            "name": getattr(doc, f"{prefix}_name", "") or "",
+            "code": getattr(doc, f"{prefix}_id", "") or "",
+            "vat": getattr(doc, f"{prefix}_vat_code", "") or "",
+        }
+
+    def profile_payload(self):
+        return {
+            "name": self.profile.name or "",
+            "code": self.profile.company_code or "",
+            "vat": self.profile.vat_code or "",
+        }
+
+    @staticmethod
+    def _clean_name(value):
+        s = _norm(value)
+
+        remove_parts = [
+            "UAB",
+            "AB",
+            "MB",
+            "VŠĮ",
+            "VSI",
+            "IĮ",
+            "II",
+            "INDIVIDUALI ĮMONĖ",
+            "INDIVIDUALI IMONE",
+        ]
+
+        for part in remove_parts:
+            s = s.replace(part, " ")
+
+        s = s.replace('"', " ").replace("'", " ").replace(",", " ").replace(".", " ")
+
+        return " ".join(s.split())
+
+    def party_matches_profile(self, party):
+        profile_code = _norm(self.profile.company_code)
+        party_code = _norm(party.get("code"))
+
+        profile_vat = _norm(self.profile.vat_code)
+        party_vat = _norm(party.get("vat"))
+
+        # 1. Jeigu įmonės kodas sutampa — laikome match
+        if profile_code and party_code and profile_code == party_code:
+            return True
+
+        # 2. Jeigu PVM kodas sutampa — laikome match
+        if profile_vat and party_vat and profile_vat == party_vat:
+            return True
+
+        # 3. Jeigu abu kodai yra ir abu nesutampa — mismatch
+        if (profile_code and party_code) or (profile_vat and party_vat):
+            return False
+
+        # 4. Jei kodų palyginti negalime, naudojame name fallback
+        profile_name = self._clean_name(self.profile.name)
+        party_name = self._clean_name(party.get("name"))
+
+        if profile_name and party_name:
+            return profile_name == party_name
+
+        # 5. Jei nėra pakankamai duomenų — nerodome mismatch
+        return True
+
+    def company_mismatch(self, doc_list):
+        mismatches = []
+
+        for d in doc_list:
+            role = self.selected_role(d)
+
+            if not role:
+                continue
+
+            party = self.party_payload(d, role)
+
+            if not self.party_matches_profile(party):
+                mismatches.append({
+                    "doc_id": d.id,
+                    "selected_company": party,
+                })
+
+        if not mismatches:
+            return None
+
+        return {
+            "selected_company": mismatches[0]["selected_company"],
+            "active_profile": self.profile_payload(),
+            "affected_count": len(mismatches),
+        }
+
+    def _profile_field(self, *names):
+        for name in names:
+            value = getattr(self.profile, name, None)
+
+            if value not in (None, ""):
+                return value
+
+        return ""
+
+    def apply_profile_party_in_memory(self, doc):
+        """
+        Jei replace_document_company ir pasirinkta pusė nesutampa su profiliu —
+        pakeičia ją profilio duomenimis tik atmintyje (kuriant Purchase / Invoice).
+        ScannedDocument DB įrašas nekeičiamas.
+        """
+        if not self.replace_document_company:
+            return
+
+        role = self.selected_role(doc)
+        if not role or self.party_matches_profile(self.party_payload(doc, role)):
+            return
+
+        prefix = "seller" if role == "seller" else "buyer"
+        profile = self.profile
+
+        model_fields = {f.name for f in doc._meta.fields}
+        updates = {
+            f"{prefix}_name": profile.name or "",
+            f"{prefix}_id": profile.company_code or "",
+            f"{prefix}_vat_code": profile.vat_code or "",
+            f"{prefix}_name_normalized": _norm(profile.name),
+        }
+
+        optional_updates = {
+            f"{prefix}_address": self._profile_field("address", "company_address"),
+            f"{prefix}_country": self._profile_field("country", "company_country"),
+            f"{prefix}_country_iso": self._profile_field("country_iso", "company_country_iso"),
+            f"{prefix}_iban": self._profile_field("iban", "bank_iban", "bank_account"),
+            f"{prefix}_is_person": False,
+        }
+
+        for field, value in optional_updates.items():
+            if value not in (None, ""):
+                updates[field] = value
+
+        for field, value in updates.items():
+            if field in model_fields:
+                setattr(doc, field, value)
+
+    def detect_direction(self, doc):
+        # Multi mode: kryptis nustatoma pagal pasirinktą įmonę dokumente
+        role = self.selected_role(doc)
+        if role == "seller":
+            return "pardavimas"
+        if role == "buyer":
+            return "pirkimas"
+
+        # Fallback pagal aktyvų profilį
+        buyer_ids = self._ids_from_doc(doc.buyer_id, doc.buyer_vat_code, doc.buyer_name)
+        seller_ids = self._ids_from_doc(doc.seller_id, doc.seller_vat_code, doc.seller_name)
+
+        if self.profile_ids & buyer_ids:
+            return "pirkimas"
+
+        if self.profile_ids & seller_ids:
+            return "pardavimas"
+
+        return None
+
+
+# ═══════════════════════════════════════════════════════
+# Plan (bendras dry_run ir realiam perkėlimui)
+# ═══════════════════════════════════════════════════════
+
+ACTION_PURCHASE = "purchase"
+ACTION_SALE = "sale"
+ACTION_SKIP = "skip"
+
+
+def _plan_docs_qs(user, doc_ids):
+    from ..models import ScannedDocument
+
+    return ScannedDocument.objects.filter(id__in=doc_ids, user=user).order_by("id")
+
+
+def _existing_transfers(profile, doc_ids):
+    """(scanned_document_id su Purchase, ... su Invoice) šiam profiliui."""
+    from ..models import Invoice, Purchase
+
+    purchased = set(
+        Purchase.objects
+        .filter(scanned_document_id__in=doc_ids, company_profile=profile)
+        .values_list("scanned_document_id", flat=True)
+    )
+    invoiced = set(
+        Invoice.objects
+        .filter(scanned_document_id__in=doc_ids, company_profile=profile)
+        .values_list("scanned_document_id", flat=True)
+    )
+    return purchased, invoiced
+
+
+def _taken_sale_numbers(user, profile, numbers):
+    """{(series, number)} — jau užimti nepanaikintų Invoice numeriai."""
+    from ..models import Invoice
+
+    if not numbers:
+        return set()
+    return set(
+        Invoice.objects
+        .filter(user=user, company_profile=profile, document_number__in=numbers)
+        .exclude(status="cancelled")
+        .values_list("document_series", "document_number")
+    )
+
+
+class _SeriesNumbers:
+    """
+    Laisvo numerio paieška (kaip views._next_free_number_int), bet su
+    numeriais, kuriuos užims ankstesni to paties plano dokumentai.
+    """
+
+    def __init__(self, user, profile):
+        self.user = user
+        self.profile = profile
+        self._taken = {}
+        self._planned = {}
+
+    def _load(self, prefix, invoice_type):
+        from ..models import Invoice
+
+        key = (prefix, invoice_type)
+        if key not in self._taken:
+            raw = (
+                Invoice.objects
+                .filter(
+                    user=self.user,
+                    company_profile=self.profile,
+                    document_series=prefix,
+                    invoice_type=invoice_type,
+                )
+                .exclude(status="cancelled")
+                .values_list("document_number", flat=True)
+            )
+            self._taken[key] = {n for n in (_int_number(v) for v in raw) if n is not None}
+        return self._taken[key]
+
+    def reserve(self, prefix, invoice_type, number):
+        n = _int_number(number)
+        if n is not None:
+            self._planned.setdefault((prefix, invoice_type), set()).add(n)
+
+    def next_free(self, prefix, invoice_type, start_from):
+        taken = self._load(prefix, invoice_type)
+        planned = self._planned.get((prefix, invoice_type), set())
+        n = max(int(start_from), 1)
+        while n in taken or n in planned:
+            n += 1
+        return n
+
+
+def plan_transfer(ctx, doc_ids):
+    """
+    Grąžina planą: [{"id", "action", "reason", "filename", "mark"}] dokumentų
+    id tvarka. mark=True — dokumentas jau perkeltas, tik pažymėti.
+    Dokumentai skaitomi TRANSFER_PLAN_BATCH dydžio porcijomis.
+    """
+    user, profile = ctx.user, ctx.profile
+    ids = sorted({int(i) for i in doc_ids})
+
+    plan = []
+    planned_numbers = set()
+    series_numbers = _SeriesNumbers(user, profile)
+
+    for start in range(0, len(ids), TRANSFER_PLAN_BATCH):
+        docs = list(_plan_docs_qs(user, ids[start:start + TRANSFER_PLAN_BATCH]))
+        purchased, invoiced = _existing_transfers(profile, [d.id for d in docs])
+        taken = _taken_sale_numbers(
+            user, profile, {d.document_number for d in docs if d.document_number},
+        )
+
+        for doc in docs:
+            direction = ctx.detect_direction(doc)
+
+            if direction == "pirkimas":
+                if doc.id in purchased:
+                    plan.append(_skip(doc, "Jau perkeltas į pirkimus", mark=True))
+                    continue
+                plan.append({"id": doc.id, "action": ACTION_PURCHASE})
+
+            elif direction == "pardavimas":
+                if doc.id in invoiced:
+                    plan.append(_skip(doc, "Jau perkeltas į pardavimus", mark=True))
+                    continue
+
+                if not doc.document_number:
+                    plan.append(_skip(doc, "Trūksta dokumento numerio", with_filename=True))
+                    continue
+
+                series = doc.document_series or ""
+                number_key = (series, doc.document_number)
+                inv_type = _sale_invoice_type(doc)
+
+                if number_key in taken or number_key in planned_numbers:
+                    start_from = _int_number(doc.document_number) or 1
+                    free_int = series_numbers.next_free(series, inv_type, start_from)
+                    plan.append(_skip(
+                        doc,
+                        (
+                            f"Dokumentas {series}-{doc.document_number} "
+                            f"jau yra apskaitoje. Laisvas numeris šioje serijoje: "
+                            f"{series}-{free_int}"
+                        ),
+                        with_filename=True,
+                    ))
+                    continue
+
+                planned_numbers.add(number_key)
+                series_numbers.reserve(series, inv_type, doc.document_number)
+                plan.append({"id": doc.id, "action": ACTION_SALE})
+
+            else:
+                plan.append(_skip(doc, "Nepavyko nustatyti krypties", with_filename=True))
+
+    return plan
+
+
+def _skip(doc, reason, mark=False, with_filename=False):
+    item = {"id": doc.id, "action": ACTION_SKIP, "reason": reason, "mark": mark}
+    if with_filename:
+        item["filename"] = doc.original_filename
+    return item
+
+
+def skipped_payload(item):
+    """Plano įrašas → atsakymo "skipped" elementas (tas pats formatas kaip anksčiau)."""
+    out = {"id": item["id"]}
+    if "filename" in item:
+        out["filename"] = item["filename"]
+    out["reason"] = item["reason"]
+    return out
+
+
+def preview_transfer(ctx, doc_ids):
+    """dry_run atsakymas — tas pats planas, kurį vykdys run_transfer_job."""
+    plan = plan_transfer(ctx, doc_ids)
+
+    to_create = [p["id"] for p in plan if p["action"] != ACTION_SKIP]
+    mismatch_docs = []
+    for start in range(0, len(to_create), TRANSFER_PLAN_BATCH):
+        mismatch_docs += list(_plan_docs_qs(ctx.user, to_create[start:start + TRANSFER_PLAN_BATCH]))
+
+    return {
+        "company_name": ctx.profile.name,
+        "purchase_count": sum(1 for p in plan if p["action"] == ACTION_PURCHASE),
+        "sale_count": sum(1 for p in plan if p["action"] == ACTION_SALE),
+        "skipped": [skipped_payload(p) for p in plan if p["action"] == ACTION_SKIP],
+        "company_mismatch": ctx.company_mismatch(mismatch_docs),
+    }
+
+
+# ═══════════════════════════════════════════════════════
+# Create purchase / invoice
+# ═══════════════════════════════════════════════════════
+
+def _create_purchase(ctx, doc):
+    from ..models import Purchase, PurchaseLine
+    from ..utils.journal_generators import resolve_debeto_for_inventory
+
+    user, profile, uses_inventory = ctx.user, ctx.profile, ctx.uses_inventory
+    is_credit = bool(doc.is_credit_invoice)
+
+    doc_pvm_kodas = _doc_pvm_kodas(
+        doc, "pirkimas", doc.preke_paslauga,
+        float(doc.vat_percent) if doc.vat_percent is not None else None,
+        bool(doc.separate_vat),
+    )
+
+    purchase = Purchase.objects.create(
+        user=user,
+        company_profile=profile,
+        scanned_document=doc,
+        status="new",
+
+        # Korespondencijos
+        debeto_saskaita=resolve_debeto_for_inventory(
+            doc.pirkimo_saskaita,
+            uses_inventory=uses_inventory,
+        ) or "6312",
+        kredito_saskaita="4430",
+        pvm_saskaita="2441" if _has_amount(doc.vat_amount) else None,
+
+        period=doc.invoice_date.replace(day=1) if doc.invoice_date else None,
+
+        # Dokumento duomenys
+        document_type=doc.document_type,
+        is_credit_invoice=doc.is_credit_invoice,
+        is_debit_invoice=doc.is_debit_invoice,
+        document_series=doc.document_series,
+        document_number=doc.document_number,
+        invoice_date=doc.invoice_date,
+        due_date=doc.due_date,
+        operation_date=doc.operation_date,
+
+        # Seller / tiekėjas
+        seller_name=doc.seller_name,
+        seller_id=doc.seller_id,
+        seller_vat_code=doc.seller_vat_code,
+        seller_address=doc.seller_address,
+        seller_country=doc.seller_country,
+        seller_country_iso=doc.seller_country_iso,
+        seller_iban=doc.seller_iban,
+        seller_is_person=doc.seller_is_person,
+        seller_vat_val=getattr(doc, "seller_vat_val", None),
+
+        # Buyer / mes
+        buyer_name=doc.buyer_name,
+        buyer_id=doc.buyer_id,
+        buyer_vat_code=doc.buyer_vat_code,
+        buyer_address=doc.buyer_address,
+        buyer_country=doc.buyer_country,
+        buyer_country_iso=doc.buyer_country_iso,
+        buyer_iban=doc.buyer_iban,
+        buyer_is_person=doc.buyer_is_person,
+
+        # Sumos
+        currency=doc.currency or "EUR",
+        amount_wo_vat=_signed_amount(doc.amount_wo_vat, is_credit),
+        vat_amount=_signed_amount(doc.vat_amount, is_credit),
+        vat_percent=doc.vat_percent,
+        amount_with_vat=_signed_amount(doc.amount_with_vat, is_credit),
+        invoice_discount_with_vat=_signed_amount(
+            doc.invoice_discount_with_vat,
+            is_credit,
+        ),
+        invoice_discount_wo_vat=_signed_amount(
+            doc.invoice_discount_wo_vat,
+            is_credit,
+        ),
+        separate_vat=doc.separate_vat,
+        doc_96_str=doc.doc_96_str,
+
+        # iSAF / klasifikatoriai
+        pirkimas_pardavimas="pirkimas",
+        report_to_isaf=doc.report_to_isaf,
+        document_type_code=doc.document_type_code or "",
+        pvm_kodas=doc_pvm_kodas or "",
+
+        # Prekė / sumiškai
+        prekes_kodas=doc.prekes_kodas,
+        prekes_pavadinimas=doc.prekes_pavadinimas,
+        preke_paslauga=doc.preke_paslauga,
+
+        # Meta
+        scan_type=doc.scan_type,
+        order_number=doc.order_number,
+        paid_by_cash=doc.paid_by_cash,
+        is_long_term_asset_candidate=doc.is_long_term_asset_candidate,
+        suggested_asset_type=doc.suggested_asset_type or "",
+    )
+
+    purchase_lines = []
+    source_lines = list(doc.line_items.all())
+
+    if source_lines:
+        for i, li in enumerate(source_lines):
+            li_preke_paslauga = li.preke_paslauga or doc.preke_paslauga
+            li_pvm_kodas = _doc_pvm_kodas(doc, "pirkimas", li_preke_paslauga, _line_vat_pct(li, doc), False)
+            raw_quantity = li.quantity if li.quantity is not None else 1
+
+            purchase_lines.append(
+                PurchaseLine(
+                    purchase=purchase,
+
+                    prekes_kodas=li.prekes_kodas or doc.prekes_kodas or "",
+                    prekes_barkodas=li.prekes_barkodas or "",
+                    prekes_pavadinimas=(
+                        li.prekes_pavadinimas
+                        or doc.prekes_pavadinimas
+                        or "Prekės / paslaugos"
+                    ),
+                    preke_paslauga=li_preke_paslauga or "",
+
+                    unit=li.unit or "vnt.",
+
+                    # Kreditinei kiekis neigiamas, kaina teigiama
+                    quantity=_signed_quantity(raw_quantity, is_credit),
+                    price=_line_price(li.price, li.subtotal, raw_quantity),
+
+                    subtotal=_signed_amount(li.subtotal, is_credit),
+                    vat=_signed_amount(li.vat, is_credit),
+                    vat_percent=(
+                        li.vat_percent
+                        if li.vat_percent is not None
+                        else doc.vat_percent
+                    ),
+                    total=_signed_amount(li.total, is_credit),
+
+                    discount_with_vat=_signed_amount(li.discount_with_vat, is_credit),
+                    discount_wo_vat=_signed_amount(li.discount_wo_vat, is_credit),
+
+                    pvm_kodas=li_pvm_kodas or "",
+                    debeto_saskaita=resolve_debeto_for_inventory(
+                        li.pirkimo_saskaita,
+                        uses_inventory=uses_inventory,
+                    ) or None,
+                    sort_order=i,
+                )
+            )
+
+    else:
+        fallback_name = (
+            doc.prekes_pavadinimas
+            or doc.original_filename
+            or "Prekės / paslaugos"
+        )
+
+        purchase_lines.append(
+            PurchaseLine(
+                purchase=purchase,
+
+                prekes_kodas=doc.prekes_kodas or "",
+                prekes_barkodas="",
+                prekes_pavadinimas=fallback_name,
+                preke_paslauga=doc.preke_paslauga or "",
+
+                unit="vnt.",
+
+                # Sumiškai:
+                # įprasta SF:  1 x 100 = 100
+                # kreditinė:  -1 x 100 = -100
+                quantity=_signed_quantity(1, is_credit),
+                price=_positive_amount(doc.amount_wo_vat),
+
+                subtotal=_signed_amount(doc.amount_wo_vat, is_credit),
+                vat=_signed_amount(doc.vat_amount, is_credit),
+                vat_percent=doc.vat_percent,
+                total=_signed_amount(doc.amount_with_vat, is_credit),
+
+                discount_with_vat=_signed_amount(doc.invoice_discount_with_vat, is_credit),
+                discount_wo_vat=_signed_amount(doc.invoice_discount_wo_vat, is_credit),
+
+                pvm_kodas=doc_pvm_kodas or "",
+                debeto_saskaita=resolve_debeto_for_inventory(
+                    doc.pirkimo_saskaita,
+                    uses_inventory=uses_inventory,
+                ) or None,
+                sort_order=0,
+            )
+        )
+
+    PurchaseLine.objects.bulk_create(purchase_lines)
+    _finish_document(purchase)
+
+    # DK įrašai ir banko matching'as — _finish_chunk_documents(), visam chunk'ui
+    return purchase
+
+
+def _create_invoice(ctx, doc):
+    from ..models import Invoice, InvoiceLineItem
+    from ..utils.journal_generators import derive_pardavimo
+
+    user, profile = ctx.user, ctx.profile
+    is_credit = bool(doc.is_credit_invoice)
+    inv_type = _sale_invoice_type(doc)
+
+    doc_pvm_kodas = _doc_pvm_kodas(
+        doc, "pardavimas", doc.preke_paslauga,
+        float(doc.vat_percent) if doc.vat_percent is not None else None,
+        bool(doc.separate_vat),
+    )
+
+    # Pardavimo korespondencijos
+    debit_account = "2410"  # Pirkėjų skolos
+
+    credit_account = (
+        getattr(doc, "pardavimo_saskaita", None)
+        or derive_pardavimo(
+            getattr(doc, "pirkimo_saskaita", None),
+            traded_type=getattr(doc, "traded_type", None),
+        )
+    )
+
+    pvm_account = "4492" if _has_amount(doc.vat_amount) else None
+
+    entry_date = doc.invoice_date
+    period = entry_date.replace(day=1) if entry_date else None
+
+    invoice = Invoice.objects.create(
+        user=user,
+        company_profile=profile,
+        scanned_document=doc,
+        invoice_type=inv_type,
+        status="issued",
+
+        # Numeracija
+        document_series=doc.document_series or "",
+        document_number=doc.document_number or "",
+
+        # Datos
+        invoice_date=doc.invoice_date,
+        due_date=doc.due_date,
+        operation_date=doc.operation_date,
+
+        # Korespondencijos
+        debeto_saskaita=debit_account,
+        kredito_saskaita=credit_account,
+        pvm_saskaita=pvm_account,
+        period=period,
+
+        # Seller / mes
+        seller_name=doc.seller_name or "",
+        seller_name_normalized=(doc.seller_name or "").strip().upper(),
+        seller_id=doc.seller_id or "",
+        seller_vat_code=doc.seller_vat_code or "",
+        seller_address=doc.seller_address or "",
+        seller_country=doc.seller_country or "",
+        seller_country_iso=doc.seller_country_iso or "",
+        seller_iban=doc.seller_iban or "",
+        seller_is_person=doc.seller_is_person,
+
+        # Buyer / pirkėjas
+        buyer_name=doc.buyer_name or "",
+        buyer_name_normalized=(doc.buyer_name or "").strip().upper(),
+        buyer_id=doc.buyer_id or "",
+        buyer_vat_code=doc.buyer_vat_code or "",
+        buyer_address=doc.buyer_address or "",
+        buyer_country=doc.buyer_country or "",
+        buyer_country_iso=doc.buyer_country_iso or "",
+        buyer_iban=doc.buyer_iban or "",
+        buyer_is_person=doc.buyer_is_person,
+
+        # Sumos
+        currency=doc.currency or "EUR",
+        pvm_tipas=(
+            "taikoma"
+            if inv_type in ("pvm_saskaita", "kreditine")
+            else "netaikoma"
+        ),
+        vat_percent=doc.vat_percent,
+
+        amount_wo_vat=_signed_amount(doc.amount_wo_vat, is_credit),
+        vat_amount=_signed_amount(doc.vat_amount, is_credit),
+        amount_with_vat=_signed_amount(doc.amount_with_vat, is_credit),
+
+        invoice_discount_with_vat=_signed_amount(doc.invoice_discount_with_vat, is_credit),
+        invoice_discount_wo_vat=_signed_amount(doc.invoice_discount_wo_vat, is_credit),
+
+        separate_vat=doc.separate_vat,
+        doc_96_str=doc.doc_96_str,
+
+        # iSAF
+        pirkimas_pardavimas="pardavimas",
+        report_to_isaf=doc.report_to_isaf,
+        document_type_code=doc.document_type_code or "",
+        document_type=doc.document_type or "",
+        pvm_kodas=doc_pvm_kodas or "",
+
+        # Prekė / sumiškai
+        prekes_kodas=doc.prekes_kodas or "",
+        prekes_pavadinimas=doc.prekes_pavadinimas or "",
+        preke_paslauga=doc.preke_paslauga or "",
+
+        # Meta
+        public_link_enabled=False,
+    )
+
+    invoice_lines = []
+    source_lines = list(doc.line_items.all())
+
+    if source_lines:
+        for i, li in enumerate(source_lines):
+            li_preke_paslauga = li.preke_paslauga or doc.preke_paslauga
+            li_pvm_kodas = _doc_pvm_kodas(doc, "pardavimas", li_preke_paslauga, _line_vat_pct(li, doc), False)
+            raw_quantity = li.quantity if li.quantity is not None else 1
+
+            invoice_lines.append(
+                InvoiceLineItem(
+                    invoice=invoice,
+
+                    prekes_kodas=li.prekes_kodas or doc.prekes_kodas or "",
+                    prekes_barkodas=li.prekes_barkodas or "",
+                    prekes_pavadinimas=(
+                        li.prekes_pavadinimas
+                        or doc.prekes_pavadinimas
+                        or "Prekės / paslaugos"
+                    ),
+                    preke_paslauga=li_preke_paslauga or "",
+
+                    unit=li.unit or "vnt.",
+
+                    # Kreditinei kiekis neigiamas, kaina teigiama
+                    quantity=_signed_quantity(raw_quantity, is_credit),
+                    price=_line_price(li.price, li.subtotal, raw_quantity),
+
+                    subtotal=_signed_amount(li.subtotal, is_credit),
+                    vat=_signed_amount(li.vat, is_credit),
+                    vat_percent=(
+                        li.vat_percent
+                        if li.vat_percent is not None
+                        else doc.vat_percent
+                    ),
+                    total=_signed_amount(li.total, is_credit),
+
+                    discount_with_vat=_signed_amount(li.discount_with_vat, is_credit),
+                    discount_wo_vat=_signed_amount(li.discount_wo_vat, is_credit),
+
+                    pvm_kodas=li_pvm_kodas or "",
+
+                    # Korespondencijos line-level
+                    pirkimo_saskaita=li.pirkimo_saskaita or None,
+                    kredito_saskaita=(
+                        li.pardavimo_saskaita
+                        or derive_pardavimo(
+                            li.pirkimo_saskaita,
+                            preke_paslauga=li_preke_paslauga,
+                            traded_type=getattr(doc, "traded_type", None),
+                        )
+                    ),
+                    pvm_saskaita=pvm_account,
+
+                    sort_order=i,
+                )
+            )
+
+    else:
+        fallback_name = (
+            doc.prekes_pavadinimas
+            or doc.original_filename
+            or "Prekės / paslaugos"
+        )
+
+        invoice_lines.append(
+            InvoiceLineItem(
+                invoice=invoice,
+
+                prekes_kodas=doc.prekes_kodas or "",
+                prekes_barkodas="",
+                prekes_pavadinimas=fallback_name,
+                preke_paslauga=doc.preke_paslauga or "",
+
+                unit="vnt.",
+
+                # Sumiškai:
+                # įprasta SF:  1 x 100 = 100
+                # kreditinė:  -1 x 100 = -100
+                quantity=_signed_quantity(1, is_credit),
+                price=_positive_amount(doc.amount_wo_vat),
+
+                subtotal=_signed_amount(doc.amount_wo_vat, is_credit),
+                vat=_signed_amount(doc.vat_amount, is_credit),
+                vat_percent=doc.vat_percent,
+                total=_signed_amount(doc.amount_with_vat, is_credit),
+
+                discount_with_vat=_signed_amount(doc.invoice_discount_with_vat, is_credit),
+                discount_wo_vat=_signed_amount(doc.invoice_discount_wo_vat, is_credit),
+
+                pvm_kodas=doc_pvm_kodas or "",
+
+                pirkimo_saskaita=doc.pirkimo_saskaita or None,
+                kredito_saskaita=credit_account,
+                pvm_saskaita=pvm_account,
+
+                sort_order=0,
+            )
+        )
+
+    InvoiceLineItem.objects.bulk_create(invoice_lines)
+    _finish_document(invoice)
+
+    # DK įrašai ir banko matching'as — _finish_chunk_documents(), visam chunk'ui
+    return invoice
+
+
+def _finish_document(obj):
+    from ..validators.math_validator_for_export import validate_document_math_for_export
+    from ..validators.required_fields_checker import check_required_fields_for_export
+    from ..views import compute_kor_balanced
+
+    obj.ready_for_export = check_required_fields_for_export(obj)
+
+    is_math_valid, _ = validate_document_math_for_export(obj)
+    obj.math_validation_passed = is_math_valid
+
+    obj.kor_balanced = compute_kor_balanced(obj)
+
+    obj.save(update_fields=[
+        "ready_for_export",
+        "math_validation_passed",
+        "kor_balanced",
+    ])
+
+
+def _finish_chunk_documents(purchases, invoices):
+    """
+    Chunk'o dokumentų DK įrašai vienu batch'u (sync_*_journal_entries — tas
+    pats rezultatas kaip sync_*_journal_entry kiekvienam), po to matching'as
+    su banko operacijomis: jis naudoja jau perskaičiuotas Invoice sumas.
+    """
+    from ..models import Invoice, Purchase
+    from ..utils.journal_generators import sync_invoice_journal_entries, sync_purchase_journal_entries
+    from ..utils.payment_invoice_matching import match_invoice_on_transfer, match_purchase_on_transfer
+
+    for objs, Model, sync in (
+        (purchases, Purchase, sync_purchase_journal_entries),
+        (invoices, Invoice, sync_invoice_journal_entries),
+    ):
+        if not objs:
+            continue
+        try:
+            with transaction.atomic():
+                sync(Model.objects.filter(pk__in=[o.pk for o in objs]))
+        except Exception as e:
+            logger.warning("[Transfer] %s failed for %s: %s", sync.__name__, [o.pk for o in objs], e)
+
+    for objs, Model, match in (
+        (purchases, Purchase, match_purchase_on_transfer),
+        (invoices, Invoice, match_invoice_on_transfer),
+    ):
+        for obj in Model.objects.filter(pk__in=[o.pk for o in objs]).order_by("pk"):
+            try:
+                with transaction.atomic():
+                    alloc = match(obj)
+                if alloc:
+                    logger.info("[Transfer] %s %s auto-matched to bank txn, amount=%s", Model.__name__, obj.pk, alloc.amount)
+            except Exception as e:
+                logger.warning("[Transfer] %s failed for %s: %s", match.__name__, obj.pk, e)
+
+
+def _bump_invoice_series(ctx, invoices):
+    """Подтянуть счётчик серии за перенесёнными номерами (vienas lock'as serijai per chunk'ą)."""
+    from ..models import InvoiceSeries
+
+    top = {}
+    for inv in invoices:
+        n = _int_number(inv.document_number)
+        if n is None:
+            continue
+        key = (inv.document_series, inv.invoice_type)
+        top[key] = max(top.get(key, n), n)
+
+    for (prefix, inv_type), n in top.items():
+        series = InvoiceSeries.objects.select_for_update().filter(
+            user=ctx.user,
+            company_profile=ctx.profile,
+            prefix=prefix,
+            invoice_type=inv_type,
+            is_active=True,
+        ).first()
+
+        if series and n >= series.next_number:
+            series.next_number = n + 1
+            series.save(update_fields=["next_number"])
+
+
+# ═══════════════════════════════════════════════════════
+# Job
+# ═══════════════════════════════════════════════════════
+
+def create_transfer_job(ctx, doc_ids):
+    from ..models import AccountingTransferJob
+
+    ids = sorted({int(i) for i in doc_ids})
+    return AccountingTransferJob.objects.create(
+        user=ctx.user,
+        company_profile=ctx.profile,
+        document_ids=ids,
+        cp_key=ctx.cp_key,
+        replace_document_company=ctx.replace_document_company,
+        total_documents=len(ids),
+    )
+
+
+def _context_for_job(job):
+    return TransferContext(
+        job.user,
+        job.company_profile,
+        cp_key=job.cp_key,
+        replace_document_company=job.replace_document_company,
+    )
+
+
+def _run_chunk(job_id, ctx):
+    """
+    Vienas chunk'as vienoje transakcijoje. Grąžina False, kai planas baigtas.
+    """
+    from ..models import AccountingTransferJob, ScannedDocument
+
+    with transaction.atomic():
+        job = AccountingTransferJob.objects.select_for_update().get(pk=job_id)
+        items = job.plan[job.processed_documents:job.processed_documents + TRANSFER_CHUNK_SIZE]
+        if not items:
+            return False
+
+        ids = [p["id"] for p in items]
+        docs = {
+            d.id: d
+            for d in ScannedDocument.objects
+            .select_for_update()
+            .filter(id__in=ids, user=job.user)
+            .prefetch_related("line_items")
+        }
+        # Pakartotinis patikrinimas po lock'o — dokumentas nesukuriamas du kartus
+        purchased, invoiced = _existing_transfers(job.company_profile, ids)
+        taken = _taken_sale_numbers(
+            job.user, job.company_profile,
+            {d.document_number for d in docs.values() if d.document_number},
+        )
+
+        to_mark = []
+        purchases = []
+        invoices = []
+
+        for item in items:
+            doc = docs.get(item["id"])
+            action = item["action"]
+
+            if doc is None:
+                job.skipped.append({"id": item["id"], "reason": "Dokumentas nerastas"})
+                continue
+
+            if action == ACTION_SKIP:
+                job.skipped.append(skipped_payload(item))
+                if item.get("mark") and not doc.perkelta_i_apskaita:
+                    to_mark.append(doc.id)
+                continue
+
+            if action == ACTION_PURCHASE and doc.id in purchased:
+                job.skipped.append({"id": doc.id, "reason": "Jau perkeltas į pirkimus"})
+                continue
+            if action == ACTION_SALE and doc.id in invoiced:
+                job.skipped.append({"id": doc.id, "reason": "Jau perkeltas į pardavimus"})
+                continue
+            if action == ACTION_SALE and (doc.document_series or "", doc.document_number) in taken:
+                job.skipped.append({
+                    "id": doc.id,
+                    "filename": doc.original_filename,
+                    "reason": f"Dokumentas {doc.document_series or ''}-{doc.document_number} jau yra apskaitoje.",
+                })
+                continue
+
+            ctx.apply_profile_party_in_memory(doc)
+            try:
+                with transaction.atomic():
+                    if action == ACTION_PURCHASE:
+                        purchase = _create_purchase(ctx, doc)
+                        purchases.append(purchase)
+                        job.created_purchases.append(purchase.id)
+                    else:
+                        invoice = _create_invoice(ctx, doc)
+                        invoices.append(invoice)
+                        job.created_sales.append(invoice.id)
+            except Exception as e:
+                logger.exception("[Transfer] job=%s doc=%s failed", job.pk, doc.id)
+                job.skipped.append({
+                    "id": doc.id,
+                    "filename": doc.original_filename,
+                    "reason": f"Klaida perkeliant: {e}",
+                })
+                continue
+
+            to_mark.append(doc.id)
+
+        _finish_chunk_documents(purchases, invoices)
+        _bump_invoice_series(ctx, invoices)
+
+        if to_mark:
+            ScannedDocument.objects.filter(id__in=to_mark).update(
+                perkelta_i_apskaita=True,
+                perkelta_i_apskaita_at=timezone.now(),
+                perkelta_i_company_profile=job.company_profile,
+            )
+
+        job.processed_documents += len(items)
+        job.save(update_fields=[
+            "processed_documents", "created_purchases", "created_sales", "skipped", "updated_at",
+        ])
+
+    return True
+
+
+def run_transfer_job(job_id):
+    """
+    Vykdo (arba pratęsia) perkėlimą. Saugu kviesti pakartotinai: progresas
+    įrašomas kartu su kiekvieno chunk'o rezultatais.
+    """
+    from ..models import AccountingTransferJob
+
+    try:
+        job = AccountingTransferJob.objects.select_related("user", "company_profile").get(pk=job_id)
+    except AccountingTransferJob.DoesNotExist:
+        logger.error("[Transfer] AccountingTransferJob %s not found", job_id)
+        return None
+
+    if job.stage in (AccountingTransferJob.Stage.DONE, AccountingTransferJob.Stage.FAILED):
+        return job
+
+    ctx = _context_for_job(job)
+
+    try:
+        with transaction.atomic():
+            locked = AccountingTransferJob.objects.select_for_update().get(pk=job_id)
+            if locked.stage == AccountingTransferJob.Stage.QUEUED:
+                locked.plan = plan_transfer(ctx, locked.document_ids)
+                locked.stage = AccountingTransferJob.Stage.PROCESSING
+                locked.started_at = timezone.now()
+                locked.save(update_fields=["plan", "stage", "started_at", "updated_at"])
+
+        while _run_chunk(job_id, ctx):
+            pass
+    except Exception as e:
+        logger.exception("[Transfer] job=%s failed", job_id)
+        AccountingTransferJob.objects.filter(pk=job_id).update(
+            stage=AccountingTransferJob.Stage.FAILED,
+            error=str(e)[:2000],
+            finished_at=timezone.now(),
+        )
+        return AccountingTransferJob.objects.get(pk=job_id)
+
+    AccountingTransferJob.objects.filter(
+        pk=job_id, stage=AccountingTransferJob.Stage.PROCESSING,
+    ).update(stage=AccountingTransferJob.Stage.DONE, finished_at=timezone.now())
+
+    job.refresh_from_db()
+    logger.info(
+        "[Transfer] job=%s DONE total=%d purchases=%d sales=%d skipped=%d",
+        job_id, job.total_documents, len(job.created_purchases),
+        len(job.created_sales), len(job.skipped),
+    )
+    return job
+
+
+def transfer_sync_limit() -> int:
+    """Iki tiek dokumentų perkeliama tiesiai request'e (be Celery)."""
+    return getattr(settings, "ACCOUNTING_TRANSFER_SYNC_LIMIT", 20)
+
+
+def transfer_job_payload(job):
+    return {
+        "id": job.pk,
+        "stage": job.stage,
+        "total_documents": job.total_documents,
+        "processed_documents": job.processed_documents,
+        "created_purchases": job.created_purchases,
+        "created_sales": job.created_sales,
+        "skipped": job.skipped,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,295 @@
+"""
+services/chunked_upload.py
+==========================
+Archyvų chunked upload: ChunkedUpload (SF, /sessions/<id>/chunks/...) ir
+WaybillChunkedUpload (važtaraščiai).
+
+  - init: .part failas MEDIA_ROOT/chunks_tmp/<user>/ iš karto išskiriamas
+    visam dydžiui (posix_fallocate; vietos trūkumas matomas iškart),
+    received_bitmap — ceil(total_chunks / 8) nulinių baitų,
+  - chunk: os.pwrite savo poslinkiu — tvarka ir lygiagretumas nesvarbūs;
+    bitas pažymimas vienu UPDATE ... set_bit(...) RETURNING received_count
+    (be SELECT FOR UPDATE ir viso JSON sąrašo perrašymo),
+  - complete: .part failas įdedamas į FileField saugyklą hard link'u
+    (tas pats failų sistemos skaidinys — be 2 GB kopijavimo); kitaip —
+    įprastas storage.save().
+
+Vientisumas: X-Chunk-Sha256 antraštė tikrinama kiekvienam chunk'ui, sha256
+(init / complete) — visam failui, skaitant srautu 1 MB blokais.
+"""
+
+import errno
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.utils import timezone
+
+HASH_BLOCK = 1024 * 1024
+CHUNK_HASH_HEADER = "HTTP_X_CHUNK_SHA256"
+
+
+class ChunkUploadError(Exception):
+    """Kliento klaida (400): netinkamas chunk'as, dydis, kontrolinė suma."""
+
+
+class ChecksumMismatch(ChunkUploadError):
+    """Surinktas failas nesutampa su sha256 — upload'ą reikia kartoti iš naujo."""
+
+
+# ════════════════════════════════════════════════════════════
+# Init
+# ════════════════════════════════════════════════════════════
+
+def expected_chunks(total_size, chunk_size):
+    return -(-total_size // chunk_size)
+
+
+def validate_layout(total_size, chunk_size, total_chunks):
+    if total_size <= 0 or chunk_size <= 0 or total_chunks <= 0:
+        raise ChunkUploadError("Bad init params")
+    if total_chunks != expected_chunks(total_size, chunk_size):
+        raise ChunkUploadError(
+            f"total_chunks must be {expected_chunks(total_size, chunk_size)} "
+            f"for total_size={total_size}, chunk_size={chunk_size}"
+        )
+
+
+def normalize_sha256(value):
+    value = (value or "").strip().lower()
+    if value and (len(value) != 64 or any(c not in "0123456789abcdef" for c in value)):
+        raise ChunkUploadError("Bad sha256")
+    return value
+
+
+def create_upload(model, *, user, session, filename, total_size, chunk_size, total_chunks, sha256=""):
+    """Sukuria upload įrašą su nuliniu bitmap'u ir išskirtu .part failu."""
+    import uuid
+
+    validate_layout(total_size, chunk_size, total_chunks)
+    upload_id = uuid.uuid4()
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, "chunks_tmp", str(user.id))
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{upload_id.hex}.part")
+
+    _preallocate(tmp_path, total_size)
+    try:
+        return model.objects.create(
+            id=upload_id,
+            user=user,
+            session=session,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=total_chunks,
+            received_bitmap=bytes(-(-total_chunks // 8)),
+            received_count=0,
+            sha256=normalize_sha256(sha256),
+            status="uploading",
+            tmp_path=tmp_path,
+        )
+    except Exception:
+        _unlink(tmp_path)
+        raise
+
+
+def _preallocate(path, size):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise ChunkUploadError("Not enough disk space for upload") from e
+            # Failų sistema be fallocate — retas (sparse) failas
+            os.ftruncate(fd, size)
+        except AttributeError:
+            os.ftruncate(fd, size)
+    except Exception:
+        os.close(fd)
+        _unlink(path)
+        raise
+    os.close(fd)
+
+
+# ════════════════════════════════════════════════════════════
+# Chunk
+# ════════════════════════════════════════════════════════════
+
+def chunk_bounds(upload, index):
+    """(poslinkis, tikslus dydis) chunk'ui `index`."""
+    if index < 0 or index >= upload.total_chunks:
+        raise ChunkUploadError("Bad index")
+    offset = index * upload.chunk_size
+    return offset, min(upload.chunk_size, upload.total_size - offset)
+
+
+def write_chunk(upload, index, data, expected_sha256=""):
+    """
+    Įrašo chunk'ą (bytes arba UploadedFile) savo vietoje ir pažymi gautą.
+    Grąžina gautų chunk'ų skaičių. Pakartotinai siųstas chunk'as
+    perrašomas, skaičius nedidėja.
+    """
+    if upload.status != "uploading":
+        raise ChunkUploadError("Upload is not active")
+    offset, size = chunk_bounds(upload, index)
+    expected_sha256 = normalize_sha256(expected_sha256)
+
+    length = len(data) if isinstance(data, (bytes, bytearray, memoryview)) else data.size
+    if not length:
+        raise ChunkUploadError("Empty chunk")
+    if length != size:
+        raise ChunkUploadError(f"Bad chunk size: {length} != {size}")
+
+    if not upload.tmp_path:
+        raise ChunkUploadError("Missing tmp file")
+
+    is_bytes = isinstance(data, (bytes, bytearray, memoryview))
+    # Tikrinama prieš rašant — blogas chunk'as neperrašo jau gauto turinio
+    if expected_sha256:
+        digest = hashlib.sha256()
+        for part in ((data,) if is_bytes else data.chunks()):
+            digest.update(part)
+        if digest.hexdigest() != expected_sha256:
+            raise ChunkUploadError("Chunk checksum mismatch")
+
+    fd = os.open(upload.tmp_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        pos = offset
+        for part in ((data,) if is_bytes else data.chunks()):
+            _pwrite_all(fd, part, pos)
+            pos += len(part)
+    finally:
+        os.close(fd)
+
+    return mark_received(upload, index)
+
+
+def _pwrite_all(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def mark_received(upload, index):
+    """Atomiškai pažymi bitą; received_count didėja tik naujam chunk'ui."""
+    table = connection.ops.quote_name(type(upload)._meta.db_table)
+    with connection.cursor() as cursor:
+        # SET dešinėje matomos senos eilutės reikšmės — get_bit prieš set_bit
+        cursor.execute(
+            f"""
+            UPDATE {table}
+               SET received_bitmap = set_bit(received_bitmap, %s, 1),
+                   received_count = received_count + 1 - get_bit(received_bitmap, %s),
+                   updated_at = %s
+             WHERE id = %s AND status = 'uploading'
+         RETURNING received_count
+            """,
+            [index, index, timezone.now(), upload.pk],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise ChunkUploadError("Upload is not active")
+    upload.received_count = row[0]
+    return row[0]
+
+
+def received_indexes(upload):
+    """Gautų chunk'ų indeksai (resume / status)."""
+    bitmap = bytes(upload.received_bitmap or b"")
+    return [
+        i for i in range(upload.total_chunks)
+        if (i >> 3) < len(bitmap) and bitmap[i >> 3] >> (i & 7) & 1
+    ]
+
+
+# ════════════════════════════════════════════════════════════
+# Complete
+# ════════════════════════════════════════════════════════════
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_complete(upload, sha256=""):
+    """Visi chunk'ai gauti, .part failas vietoje, kontrolinė suma (jei žinoma)."""
+    if upload.received_count != upload.total_chunks:
+        raise ChunkUploadError(f"Not all chunks uploaded: {upload.received_count}/{upload.total_chunks}")
+    if not upload.tmp_path or not os.path.exists(upload.tmp_path):
+        raise ChunkUploadError("Missing tmp file")
+    if os.path.getsize(upload.tmp_path) != upload.total_size:
+        raise ChunkUploadError("Size mismatch")
+
+    expected = normalize_sha256(sha256) or upload.sha256
+    if expected and file_sha256(upload.tmp_path) != expected:
+        raise ChecksumMismatch("Checksum mismatch")
+
+
+def place_in_storage(upload, instance, field_name="file"):
+    """
+    Įdeda .part failą į instance.<field_name> saugyklą ir grąžina saugyklos
+    vardą (instance dar neįrašomas). Hard link'as — be kopijavimo, .part
+    lieka iki discard_tmp() (jei transakcija nepavyktų — galima kartoti).
+    """
+    field = instance._meta.get_field(field_name)
+    storage = field.storage
+    name = field.generate_filename(instance, upload.filename)
+
+    for _ in range(5):
+        name = storage.get_available_name(name, max_length=field.max_length)
+        try:
+            dest = storage.path(name)
+        except NotImplementedError:
+            break
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(upload.tmp_path, dest)
+        except FileExistsError:
+            continue
+        except OSError as e:
+            if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                break
+            raise
+        if storage.file_permissions_mode is not None:
+            os.chmod(dest, storage.file_permissions_mode)
+        return name
+
+    # Kitas skaidinys / ne failų sistemos saugykla — įprastas kopijavimas
+    with open(upload.tmp_path, "rb") as fp:
+        return storage.save(name, File(fp), max_length=field.max_length)
+
+
+def discard_stored(instance, name, field_name="file"):
+    """Atšaukia place_in_storage (nepavykusi transakcija)."""
+    try:
+        instance._meta.get_field(field_name).storage.delete(name)
+    except Exception:
+        pass
+
+
+def discard_tmp(upload):
+    _unlink(upload.tmp_path)
+
+
+def fail_upload(upload, message):
+    upload.status = "failed"
+    upload.error_message = str(message)
+    upload.save(update_fields=["status", "error_message", "updated_at"])
+    discard_tmp(upload)
+
+
+def _unlink(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,315 @@
+"""
+services/counterparty_directory.py
+==================================
+Vartotojo kontrahentų katalogas (UserCounterparty) dokumentų sąrašo šoninei
+juostai (/documents/counterparties/).
+
+Anksčiau get_user_counterparties kiekvienam puslapio įkėlimui grupavo visus
+vartotojo ScannedDocument pagal (id, pavadinimas, PVM) ir jungė Python'e.
+Dabar:
+  - ScannedDocument.seller_key / buyer_key — company_key() reikšmė,
+    skaičiuojama save() metu (refresh_counterparty_keys),
+  - UserCounterparty — viena eilutė (user, key): rodomi duomenys iš
+    naujausio dokumento, kiekiai pardavėjo / pirkėjo pusėje, last_seen_at.
+    Atnaujinama signalais tik paveiktiems raktams (sync_counterparties),
+  - paieška — trigram (GIN ant unaccent_immutable(lower(search_text)), 0171),
+    puslapiavimas — keyset (docs_count DESC, name, id).
+
+Su status / datų filtrais kiekiai skaičiuojami SQL GROUP BY pagal
+seller_key / buyer_key (be Python'o jungimo), rodomi duomenys — iš katalogo.
+
+Bulk operacijos (QuerySet.update, bulk_create) signalų nekviečia —
+python manage.py rebuild_user_counterparties --user <id>
+"""
+
+import base64
+import json
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+ROLES = ("seller", "buyer")
+KEY_FIELDS = ("seller_key", "buyer_key")
+KEY_SOURCE_FIELDS = frozenset({
+    "user", "is_archive_container",
+    "seller_id", "seller_name", "seller_vat_code",
+    "buyer_id", "buyer_name", "buyer_vat_code",
+})
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 500
+
+
+def company_key(name, vat, cp_id):
+    """Kontrahento raktas: id:<kodas> → PVM kodas → pavadinimas (lower)."""
+    cp_id = (cp_id or "").strip()
+    if cp_id:
+        return f"id:{cp_id}"
+    vat = (vat or "").strip().lower()
+    if vat:
+        return vat
+    name = (name or "").strip().lower()
+    return name
+
+
+# ════════════════════════════════════════════════════════════
+# Dokumento raktai
+# ════════════════════════════════════════════════════════════
+
+_SOURCE_VALUES = (
+    "user_id", "is_archive_container",
+    "seller_id", "seller_name", "seller_vat_code",
+    "buyer_id", "buyer_name", "buyer_vat_code",
+)
+
+
+def refresh_counterparty_keys(doc, save_kwargs):
+    """
+    Kviečiama iš ScannedDocument.save(): perskaičiuoja seller_key / buyer_key
+    ir pažymi doc._counterparty_sync = {user_id: {raktai}} — kuriuos katalogo
+    įrašus post_save signalas turi perskaičiuoti (įskaitant raktus, iš kurių
+    dokumentas „išėjo“). Jei kontrahentų laukai nepasikeitė — None.
+    """
+    doc._counterparty_sync = None
+    update_fields = save_kwargs.get("update_fields")
+    if update_fields is not None and KEY_SOURCE_FIELDS.isdisjoint(update_fields):
+        return
+    if not KEY_SOURCE_FIELDS.isdisjoint(doc.get_deferred_fields()):
+        return
+
+    before = None
+    if doc.pk and not doc._state.adding:
+        before = type(doc).objects.filter(pk=doc.pk).values_list(
+            *_SOURCE_VALUES, "seller_key", "buyer_key",
+        ).first()
+
+    doc.seller_key = company_key(doc.seller_name, doc.seller_vat_code, doc.seller_id)
+    doc.buyer_key = company_key(doc.buyer_name, doc.buyer_vat_code, doc.buyer_id)
+    if update_fields is not None:
+        save_kwargs["update_fields"] = set(update_fields) | set(KEY_FIELDS)
+
+    current = tuple(getattr(doc, f) for f in _SOURCE_VALUES)
+    if before is not None and before[:len(_SOURCE_VALUES)] == current \
+            and before[len(_SOURCE_VALUES):] == (doc.seller_key, doc.buyer_key):
+        return
+
+    sync = defaultdict(set)
+    if doc.user_id:
+        sync[doc.user_id].update((doc.seller_key, doc.buyer_key))
+    if before is not None and before[0]:
+        sync[before[0]].update(before[len(_SOURCE_VALUES):])
+    doc._counterparty_sync = dict(sync)
+
+
+def document_counterparty_keys(doc):
+    """{user_id: {raktai}} ištrintam dokumentui."""
+    if not doc.user_id:
+        return {}
+    return {doc.user_id: {doc.seller_key, doc.buyer_key}}
+
+
+# ════════════════════════════════════════════════════════════
+# Katalogo atnaujinimas
+# ════════════════════════════════════════════════════════════
+
+def _directory_rows(user_id, keys=None):
+    """
+    UserCounterparty eilutės (neįrašytos) vartotojui: visiems raktams arba
+    tik nurodytiems. 4 užklausos nepriklausomai nuo raktų skaičiaus.
+    """
+    from ..models import ScannedDocument, UserCounterparty
+
+    docs = ScannedDocument.objects.filter(user_id=user_id, is_archive_container=False)
+    stats = defaultdict(lambda: {
+        "seller_count": 0, "buyer_count": 0, "last_seen_at": None,
+        "latest": None, "any_vat": "",
+    })
+
+    for role in ROLES:
+        key_field = f"{role}_key"
+        role_docs = docs.exclude(**{key_field: ""})
+        if keys is not None:
+            role_docs = role_docs.filter(**{f"{key_field}__in": list(keys)})
+
+        for r in role_docs.values(key_field).annotate(
+            cnt=Count("id"), last=Max("uploaded_at"), any_vat=Max(f"{role}_vat_code"),
+        ).order_by():
+            s = stats[r[key_field]]
+            s[f"{role}_count"] = r["cnt"]
+            s["any_vat"] = s["any_vat"] or r["any_vat"] or ""
+            if r["last"] and (s["last_seen_at"] is None or r["last"] > s["last_seen_at"]):
+                s["last_seen_at"] = r["last"]
+
+        # Rodomi duomenys — iš naujausio dokumento (DISTINCT ON raktas)
+        latest = (
+            role_docs.order_by(key_field, "-uploaded_at", "-id")
+            .distinct(key_field)
+            .values(key_field, "uploaded_at", f"{role}_id", f"{role}_name", f"{role}_vat_code")
+        )
+        for r in latest:
+            s = stats[r[key_field]]
+            if s["latest"] is None or (r["uploaded_at"] and r["uploaded_at"] >= s["latest"][0]):
+                s["latest"] = (
+                    r["uploaded_at"],
+                    (r[f"{role}_id"] or "").strip(),
+                    r[f"{role}_name"] or "",
+                    r[f"{role}_vat_code"] or "",
+                )
+
+    rows = []
+    for key, s in stats.items():
+        _, code, name, vat = s["latest"] or (None, "", "", "")
+        vat = vat or s["any_vat"]
+        rows.append(UserCounterparty(
+            user_id=user_id,
+            key=key,
+            company_code=code,
+            name=name,
+            vat_code=vat,
+            search_text=" ".join(x for x in (name, vat, code) if x),
+            seller_count=s["seller_count"],
+            buyer_count=s["buyer_count"],
+            docs_count=s["seller_count"] + s["buyer_count"],
+            last_seen_at=s["last_seen_at"],
+        ))
+    return rows
+
+
+UPSERT_FIELDS = [
+    "company_code", "name", "vat_code", "search_text",
+    "seller_count", "buyer_count", "docs_count", "last_seen_at", "updated_at",
+]
+
+
+@transaction.atomic
+def sync_counterparties(user_id, keys):
+    """Perskaičiuoja nurodytus vartotojo raktus (signalai po save / delete)."""
+    from ..models import UserCounterparty
+
+    keys = {k for k in keys if k}
+    if not user_id or not keys:
+        return
+    rows = _directory_rows(user_id, keys)
+    if rows:
+        UserCounterparty.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "key"],
+            update_fields=UPSERT_FIELDS,
+        )
+    gone = keys - {r.key for r in rows}
+    if gone:
+        UserCounterparty.objects.filter(user_id=user_id, key__in=gone).delete()
+
+
+@transaction.atomic
+def rebuild_counterparties(user_id):
+    """Visas vartotojo katalogas iš naujo (rebuild_user_counterparties)."""
+    from ..models import UserCounterparty
+
+    rows = _directory_rows(user_id)
+    UserCounterparty.objects.filter(user_id=user_id).delete()
+    UserCounterparty.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ════════════════════════════════════════════════════════════
+# Skaitymas
+# ════════════════════════════════════════════════════════════
+
+def encode_cursor(docs_count, name, pk) -> str:
+    raw = json.dumps([docs_count, name, pk], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(docs_count, name, id) arba None, jei cursor'is neteisingas."""
+    if not cursor:
+        return None
+    try:
+        count, name, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return int(count), str(name), int(pk)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+def _search(qs, search):
+    """Substring arba trigram panašumas ant normalizuoto search_text (GIN indeksas)."""
+    from ..search_api import norm_expr, normalize_query
+
+    q_norm = normalize_query(search)
+    return qs.annotate(norm=norm_expr("search_text")).filter(
+        Q(norm__contains=q_norm) | Q(norm__trigram_similar=q_norm)
+    )
+
+
+def _item(cp, docs_count=None):
+    return {
+        "key": cp.key,
+        "id": cp.company_code or None,
+        "name": cp.name,
+        "vat": cp.vat_code,
+        "docs_count": cp.docs_count if docs_count is None else docs_count,
+        "last_seen_at": cp.last_seen_at,
+    }
+
+
+def directory_page(user, search="", cursor=None, limit=DEFAULT_LIMIT):
+    """Visas katalogas: docs_count DESC, name, id + keyset cursor."""
+    from ..models import UserCounterparty
+    from ..search_api import trigram_threshold
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    qs = UserCounterparty.objects.filter(user=user)
+    after = decode_cursor(cursor)
+    if after:
+        count, name, pk = after
+        qs = qs.filter(
+            Q(docs_count__lt=count)
+            | Q(docs_count=count, name__gt=name)
+            | Q(docs_count=count, name=name, id__gt=pk)
+        )
+    qs = qs.order_by("-docs_count", "name", "id")
+
+    if search:
+        with trigram_threshold():
+            rows = list(_search(qs, search)[:limit + 1])
+    else:
+        rows = list(qs[:limit + 1])
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+    return {
+        "results": [_item(cp) for cp in rows],
+        "has_more": has_more,
+        "next_cursor": encode_cursor(last.docs_count, last.name, last.pk) if has_more else None,
+    }
+
+
+def filtered_counterparties(user, docs_qs, search="", limit=DEFAULT_LIMIT):
+    """
+    Kontrahentai su kiekiais tik docs_qs (status / datų filtras) dokumentuose:
+    GROUP BY seller_key / buyer_key, rodomi duomenys — iš katalogo.
+    """
+    from ..models import UserCounterparty
+    from ..search_api import trigram_threshold
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    counts = Counter()
+    for key_field in KEY_FIELDS:
+        for r in docs_qs.exclude(**{key_field: ""}).values(key_field).annotate(cnt=Count("id")).order_by():
+            counts[r[key_field]] += r["cnt"]
+    if not counts:
+        return []
+
+    directory = UserCounterparty.objects.filter(user=user, key__in=list(counts))
+    if search:
+        with trigram_threshold():
+            directory = {cp.key: cp for cp in _search(directory, search)}
+    else:
+        directory = {cp.key: cp for cp in directory}
+
+    items = [_item(cp, counts[key]) for key, cp in directory.items()]
+    items.sort(key=lambda x: (-x["docs_count"], (x["name"] or "").lower()))
+    return items[:limit]
@@ -0,0 +1,483 @@
+"""
+services/dashboard_rollups.py
+=============================
+Superuser dashboard'o statistika iš iš anksto suskaičiuotų agregatų
+(DashboardRollup) vietoj ~60 atskirų count() per didžiausias lenteles.
+
+DashboardRollup — (period, bucket_start, metric) → value:
+  - "hour": UTC valandos (paskutinės DASHBOARD_ROLLUP_HOUR_DAYS dienos),
+  - "day":  vietinės (TIME_ZONE) dienos, visa istorija.
+Įrašomos ir nulinės reikšmės, todėl max(bucket_start) = iki kur agregatai
+padengia laiką; viskas po to (einamoji nepilna valanda arba atsilikęs job'as)
+skaičiuojama gyvai tomis pačiomis metrikomis.
+
+Pildo refresh_dashboard_rollups_task (celery beat):
+  - kas valandą — paskutinės DASHBOARD_ROLLUP_REFRESH_DAYS dienos (vėliau
+    pasikeitę statusai: rejected, klaidos, waybill ok),
+  - naktį — visa istorija (ištrinti / išvalyti dokumentai, seni pakeitimai).
+
+Langai: today / this_week / this_month / total — nuo vietinės vidurnakčio,
+last_7_days / last_30_days — nuo einamosios valandos pradžios − N dienų
+(anksčiau — nuo now() − N dienų; skirtumas < 1 val.).
+
+Patikra (agregatai == gyvi count'ai): python manage.py check_dashboard_rollups
+"""
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+HOUR = "hour"
+DAY = "day"
+
+WINDOWS = ("today", "yesterday", "last_7_days", "last_30_days", "this_week", "this_month", "total")
+
+# Vartotojai, neįtraukiami į važtaraščių statistiką (testiniai / vidiniai)
+WAYBILL_EXCLUDED_USERS = (1, 2, 31, 105)
+
+
+def _hour_days():
+    return getattr(settings, "DASHBOARD_ROLLUP_HOUR_DAYS", 35)
+
+
+def _refresh_days():
+    return getattr(settings, "DASHBOARD_ROLLUP_REFRESH_DAYS", 35)
+
+
+# ════════════════════════════════════════════════════════════
+# Šaltiniai ir metrikos
+# ════════════════════════════════════════════════════════════
+
+def sources():
+    """{šaltinis: (queryset, datos laukas, {metrika: agregatas})}"""
+    from ..models import (
+        CustomUser, Invoice, InvoiceEmail, Payments, ScannedDocument, ScannedWaybill,
+    )
+
+    return {
+        "documents": (
+            ScannedDocument.objects.filter(is_archive_container=False),
+            "uploaded_at",
+            {
+                "docs": Count("id"),
+                # Klaida = math_validation_passed=False ARBA ready_for_export=False
+                "docs_errors": Count("id", filter=Q(math_validation_passed=False) | Q(ready_for_export=False)),
+                "docs_rejected": Count("id", filter=Q(status="rejected")),
+                "docs_sumiskai": Count("id", filter=Q(scan_type="sumiskai")),
+                "docs_detaliai": Count("id", filter=Q(scan_type="detaliai")),
+            },
+        ),
+        "waybills": (
+            ScannedWaybill.objects.filter(
+                is_archive_container=False, is_multi_doc_container=False,
+            ).exclude(user_id__in=WAYBILL_EXCLUDED_USERS),
+            "uploaded_at",
+            {
+                "wb_total": Count("id"),
+                "wb_ok": Count("id", filter=Q(status__in=("completed", "exported"))),
+                "wb_rejected": Count("id", filter=Q(status="rejected")),
+            },
+        ),
+        "users": (
+            CustomUser.objects.all(),
+            "date_joined",
+            {"users_new": Count("id")},
+        ),
+        "payments": (
+            Payments.objects.filter(payment_status="paid"),
+            "paid_at",
+            {
+                "pay_count": Count("id"),
+                "pay_total_cents": Sum("amount_total"),
+                "pay_net_cents": Sum("net_amount"),
+            },
+        ),
+        "invoices": (
+            Invoice.objects.exclude(status="draft"),
+            "created_at",
+            {"invoices": Count("id")},
+        ),
+        "emails": (
+            InvoiceEmail.objects.all(),
+            "sent_at",
+            {
+                "emails_sent": Count("id", filter=Q(status="sent")),
+                "emails_failed": Count("id", filter=Q(status__in=("failed", "bounced"))),
+            },
+        ),
+    }
+
+
+def metric_names():
+    return [m for _, _, metrics in sources().values() for m in metrics]
+
+
+# ════════════════════════════════════════════════════════════
+# Laikas
+# ════════════════════════════════════════════════════════════
+
+def _hour_floor(dt):
+    return dt.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def dashboard_windows(now=None):
+    """{langas: (pradžia | None, pabaiga | None=now)}"""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    today_start = _local_midnight(today)
+    cur_hour = _hour_floor(now)
+    return {
+        "today": (today_start, None),
+        "yesterday": (_local_midnight(today - timedelta(days=1)), today_start),
+        "last_7_days": (cur_hour - timedelta(days=7), None),
+        "last_30_days": (cur_hour - timedelta(days=30), None),
+        "this_week": (_local_midnight(today - timedelta(days=today.weekday())), None),
+        "this_month": (_local_midnight(today.replace(day=1)), None),
+        "total": (None, None),
+    }
+
+
+def _range_q(date_field, start, end):
+    q = Q()
+    if start is not None:
+        q &= Q(**{f"{date_field}__gte": start})
+    if end is not None:
+        q &= Q(**{f"{date_field}__lt": end})
+    return q
+
+
+# ════════════════════════════════════════════════════════════
+# Gyvi skaičiai
+# ════════════════════════════════════════════════════════════
+
+def _live(ranges):
+    """{(start, end): {metrika: reikšmė}} — po vieną aggregate() šaltiniui ir intervalui."""
+    result = {r: {} for r in ranges}
+    for qs, date_field, metrics in sources().values():
+        for start, end in ranges:
+            values = qs.filter(_range_q(date_field, start, end)).aggregate(**metrics)
+            result[(start, end)].update({m: v or 0 for m, v in values.items()})
+    return result
+
+
+def live_window_values(now=None):
+    """Visi langai tik gyvomis užklausomis (patikrai / kai agregatų dar nėra)."""
+    now = now or timezone.now()
+    windows = {w: (s, e or now) for w, (s, e) in dashboard_windows(now).items()}
+    live = _live(set(windows.values()))
+    return {w: live[r] for w, r in windows.items()}
+
+
+# ════════════════════════════════════════════════════════════
+# Agregatų pildymas
+# ════════════════════════════════════════════════════════════
+
+def _bucket_rows(period, start, end):
+    """{bucket_start: {metrika: reikšmė}} intervalui [start, end)."""
+    trunc = TruncHour if period == HOUR else TruncDay
+    tzinfo = dt_timezone.utc if period == HOUR else timezone.get_current_timezone()
+    buckets = {}
+    for qs, date_field, metrics in sources().values():
+        rows = (
+            qs.filter(_range_q(date_field, start, end))
+            .annotate(bucket=trunc(date_field, tzinfo=tzinfo))
+            .values("bucket")
+            .annotate(**metrics)
+            .order_by()
+        )
+        for row in rows:
+            bucket = row.pop("bucket")
+            buckets.setdefault(bucket, {}).update({m: v or 0 for m, v in row.items()})
+    return buckets
+
+
+def _iter_buckets(period, start, end):
+    if period == HOUR:
+        cur = start
+        while cur < end:
+            yield cur
+            cur += timedelta(hours=1)
+    else:
+        day = timezone.localdate(start)
+        while _local_midnight(day) < end:
+            yield _local_midnight(day)
+            day += timedelta(days=1)
+
+
+def _upsert(period, start, end):
+    from ..models import DashboardRollup
+
+    names = metric_names()
+    computed = _bucket_rows(period, start, end)
+    # TruncDay grąžina vietinę vidurnaktį — lyginama kaip aware datetime
+    computed = {b.astimezone(dt_timezone.utc): v for b, v in computed.items()}
+    rows = []
+    for bucket in _iter_buckets(period, start, end):
+        values = computed.get(bucket.astimezone(dt_timezone.utc), {})
+        rows.extend(
+            DashboardRollup(period=period, bucket_start=bucket, metric=m, value=values.get(m, 0))
+            for m in names
+        )
+    DashboardRollup.objects.bulk_create(
+        rows,
+        batch_size=2000,
+        update_conflicts=True,
+        unique_fields=["period", "bucket_start", "metric"],
+        update_fields=["value", "updated_at"],
+    )
+    return len(rows)
+
+
+def _history_start():
+    """Anksčiausia data iš visų šaltinių (pilnam perskaičiavimui)."""
+    firsts = [
+        qs.aggregate(first=Min(date_field))["first"]
+        for qs, date_field, _ in sources().values()
+    ]
+    firsts = [f for f in firsts if f]
+    return min(firsts) if firsts else None
+
+
+def refresh_rollups(days=None, now=None):
+    """
+    Perskaičiuoja uždarytas valandas / dienas (be einamosios) per paskutines
+    `days` dienas. days=None (arba dienų agregatų dar nėra) — dienos visai
+    istorijai. Grąžina įrašytų eilučių skaičių.
+    """
+    from ..models import DashboardRollup
+
+    now = now or timezone.now()
+    cur_hour = _hour_floor(now)
+    today = timezone.localdate(now)
+    today_start = _local_midnight(today)
+
+    full = days is None or not DashboardRollup.objects.filter(period=DAY).exists()
+    if full:
+        first = _history_start()
+        day_from = _local_midnight(timezone.localdate(first)) if first else today_start
+        hour_from = cur_hour - timedelta(days=_hour_days())
+    else:
+        day_from = _local_midnight(today - timedelta(days=days))
+        hour_from = cur_hour - timedelta(days=min(days, _hour_days()))
+
+    written = 0
+    with transaction.atomic():
+        written += _upsert(HOUR, hour_from, cur_hour)
+        if day_from < today_start:
+            written += _upsert(DAY, day_from, today_start)
+        DashboardRollup.objects.filter(
+            period=HOUR, bucket_start__lt=cur_hour - timedelta(days=_hour_days()),
+        ).delete()
+    return written
+
+
+def refresh_recent_rollups(now=None):
+    """Kas valandą: paskutinės DASHBOARD_ROLLUP_REFRESH_DAYS dienos."""
+    return refresh_rollups(days=_refresh_days(), now=now)
+
+
+# ════════════════════════════════════════════════════════════
+# Skaitymas
+# ════════════════════════════════════════════════════════════
+
+def _coverage():
+    """(pirma valanda, valandų pabaiga, dienų pabaiga) — pagal įrašytus agregatus."""
+    from ..models import DashboardRollup
+
+    hours = DashboardRollup.objects.filter(period=HOUR).aggregate(
+        first=Min("bucket_start"), last=Max("bucket_start"),
+    )
+    last_day = DashboardRollup.objects.filter(period=DAY).aggregate(last=Max("bucket_start"))["last"]
+    hour_from = hours["first"]
+    hour_until = hours["last"] + timedelta(hours=1) if hours["last"] else None
+    day_until = _local_midnight(timezone.localdate(last_day) + timedelta(days=1)) if last_day else None
+    return hour_from, hour_until, day_until
+
+
+def _plan(start, end, now, today_start, hour_from, hour_until, day_until):
+    """Lango [start, end) dalys: [(DAY | HOUR | "live", s, e)]."""
+    end = end or now
+    parts = []
+    cursor = start
+
+    # Dienų agregatai — tik nuo vidurnakčio ir tik uždarytoms dienoms
+    if day_until and (cursor is None or cursor == _local_midnight(timezone.localdate(cursor))):
+        d_end = min(day_until, end, today_start)
+        if cursor is None or d_end > cursor:
+            parts.append((DAY, cursor, d_end))
+            cursor = d_end
+
+    if cursor is None:
+        return [("live", None, end)]
+
+    if hour_until and hour_from and hour_from <= cursor < hour_until:
+        h_end = min(hour_until, end)
+        if h_end > cursor:
+            parts.append((HOUR, cursor, h_end))
+            cursor = h_end
+
+    if cursor < end:
+        parts.append(("live", cursor, end))
+    return parts
+
+
+def _sum_parts(period, ranges):
+    """{(s, e): {metrika: suma}} vienai periodo lentelei — viena užklausa."""
+    from ..models import DashboardRollup
+
+    if not ranges:
+        return {}
+    ranges = list(ranges)
+    aggs = {
+        f"p{i}": Sum("value", filter=_range_q("bucket_start", s, e))
+        for i, (s, e) in enumerate(ranges)
+    }
+    result = {r: {} for r in ranges}
+    for row in DashboardRollup.objects.filter(period=period).values("metric").annotate(**aggs).order_by():
+        for i, r in enumerate(ranges):
+            result[r][row["metric"]] = row[f"p{i}"] or 0
+    return result
+
+
+def rollup_window_values(now=None):
+    """Visi langai: agregatai + gyvai tik tai, ko agregatai dar nepadengia."""
+    now = now or timezone.now()
+    today_start = _local_midnight(timezone.localdate(now))
+    coverage = _coverage()
+    plans = {
+        w: _plan(s, e, now, today_start, *coverage)
+        for w, (s, e) in dashboard_windows(now).items()
+    }
+
+    needed = {DAY: set(), HOUR: set(), "live": set()}
+    for parts in plans.values():
+        for kind, s, e in parts:
+            needed[kind].add((s, e))
+
+    sums = {
+        DAY: _sum_parts(DAY, needed[DAY]),
+        HOUR: _sum_parts(HOUR, needed[HOUR]),
+        "live": _live(needed["live"]),
+    }
+
+    names = metric_names()
+    values = {}
+    for w, parts in plans.items():
+        totals = dict.fromkeys(names, 0)
+        for kind, s, e in parts:
+            for m, v in sums[kind][(s, e)].items():
+                totals[m] += v
+        values[w] = totals
+    return values
+
+
+# ════════════════════════════════════════════════════════════
+# Atsakymo formatas (kaip superuser_dashboard_stats)
+# ════════════════════════════════════════════════════════════
+
+def _pct(part, whole):
+    return round((part / whole * 100.0), 2) if whole else 0.0
+
+
+def _payments(v):
+    return {
+        "total_eur": round((v["pay_total_cents"] or 0) / 100, 2),
+        "net_eur": round((v["pay_net_cents"] or 0) / 100, 2),
+        "count": v["pay_count"] or 0,
+    }
+
+
+def live_extras(now=None):
+    """Ne laiko eilutės: unikalūs šiandienos vartotojai, vartotojų kiekis, prenumeratos."""
+    from ..models import CustomUser, InvSubscription, ScannedDocument
+
+    now = now or timezone.now()
+    today_start = dashboard_windows(now)["today"][0]
+    subs = InvSubscription.objects.aggregate(
+        trial_active=Count("id", filter=Q(status="trial", trial_end__gte=now)),
+        trial_expired=Count("id", filter=Q(trial_used=True) & ~Q(status="trial", trial_end__gte=now)),
+        paid_monthly=Count("id", filter=Q(status="active", plan__icontains="monthly")),
+        paid_yearly=Count("id", filter=Q(status="active", plan__icontains="yearly")),
+    )
+    return {
+        "unique_users_excluding_1_2_today": (
+            ScannedDocument.objects
+            .filter(is_archive_container=False, uploaded_at__gte=today_start)
+            .exclude(user_id__in=[1, 2])
+            .values("user_id").distinct().count()
+        ),
+        "total_users": CustomUser.objects.count(),
+        "subscriptions": subs,
+    }
+
+
+def format_dashboard(values, extras, now=None):
+    now = now or timezone.now()
+    periods = ("today", "yesterday", "last_7_days", "last_30_days", "total")
+    docs = {w: values[w]["docs"] for w in periods}
+    errs = {w: values[w]["docs_errors"] for w in periods}
+    total = values["total"]
+
+    return {
+        "documents": {
+            **{w: {"count": docs[w], "errors": errs[w]} for w in periods},
+            "success_rate": {w: _pct(max(docs[w] - errs[w], 0), docs[w]) for w in periods},
+            "rejected": {
+                w: {
+                    "rejected": values[w]["docs_rejected"],
+                    "total": docs[w],
+                    "pct": _pct(values[w]["docs_rejected"], docs[w]),
+                }
+                for w in periods
+            },
+            "unique_users_excluding_1_2_today": extras["unique_users_excluding_1_2_today"],
+            "scan_types": {
+                "sumiskai": {"count": total["docs_sumiskai"], "pct": _pct(total["docs_sumiskai"], total["docs"])},
+                "detaliai": {"count": total["docs_detaliai"], "pct": _pct(total["docs_detaliai"], total["docs"])},
+            },
+        },
+        "vaztarasciai": {
+            w: {
+                "total": values[w]["wb_total"],
+                "ok": values[w]["wb_ok"],
+                "rejected": values[w]["wb_rejected"],
+            }
+            for w in periods
+        },
+        "users": {
+            "new_today": values["today"]["users_new"],
+            "new_yesterday": values["yesterday"]["users_new"],
+            "new_last_7_days": values["last_7_days"]["users_new"],
+            "new_last_30_days": values["last_30_days"]["users_new"],
+            "total": extras["total_users"],
+        },
+        "payments": {
+            w: _payments(values[w])
+            for w in ("today", "yesterday", "this_week", "this_month", "last_30_days", "total")
+        },
+        "israsymas": {
+            "invoices": {w: values[w]["invoices"] for w in periods},
+            "subscriptions": extras["subscriptions"],
+            "emails": {
+                w: {"sent": values[w]["emails_sent"], "failed": values[w]["emails_failed"]}
+                for w in periods
+            },
+        },
+        "meta": {
+            "timezone": str(timezone.get_current_timezone()),
+            "generated_at": now.isoformat(),
+        },
+    }
+
+
+def dashboard_stats(now=None):
+    now = now or timezone.now()
+    return format_dashboard(rollup_window_values(now), live_extras(now), now)
@@ -0,0 +1,365 @@
+"""
+services/debts_ledger.py
+========================
+Skolų žiniaraštis (Apskaita → Skolos) su senėjimo intervalais.
+
+Likutis skaičiuojamas datai as_of:
+    balance = amount_with_vat − Σ PaymentAllocation.amount
+    (statusai auto / confirmed / manual, mokėjimo data <= as_of)
+Mokėjimo data — kaip PaymentAllocation.effective_payment_date:
+payment_date → operacijos data → created_at.
+
+Kontrahentų sąrašas — viena sugrupuota SQL užklausa (alokacijų suma —
+koreliuota subquery kiekvienam dokumentui), puslapiavimas keyset'u
+(newest_invoice_date DESC, code, name), ne offset'u.
+
+Dokumentai be invoice_date įtraukiami visada (rūšiuojami gale).
+
+Senėjimas pagal due_date (jei nėra — invoice_date): 0–30, 31–60, 61–90, 90+
+dienų iki as_of. Dar neapmokėti, bet dar nepradelsti patenka į 0–30.
+
+Mėnesio pabaigos kopijos (DebtSnapshot) — neprivalomos: jei as_of yra praėjęs
+mėnesio galas ir kopija sukurta (python manage.py build_debt_snapshots),
+sąrašas skaitomas iš jos. Pasikeitus dokumentui / alokacijai su data <= as_of,
+kopija ištrinama (utils/signals.py).
+
+Signalai veikia tik per save() / delete(). QuerySet.update(), bulk_update(),
+bulk_create() ir raw SQL jų nekviečia — tokie keitimai turi patys kviesti
+invalidate_debt_snapshots() (pvz. serializers.py, osiruotų sąskaitų
+priskyrimas profiliui), o po masinių pataisymų / duomenų migracijų
+build_debt_snapshots reikia paleisti iš naujo paveiktiems profiliams.
+"""
+
+import base64
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+PAID_STATUSES = ("auto", "confirmed", "manual")
+OPEN_TOLERANCE = Decimal("0.009")
+
+AGING_BUCKETS = ("0_30", "31_60", "61_90", "90_plus")
+
+# Rūšiavimui: dokumentai be datos — sąrašo gale
+NO_DATE = date(1900, 1, 1)
+
+MONEY = DecimalField(max_digits=14, decimal_places=4)
+MONEY_QUANT = Decimal("0.0001")
+
+DEBT_TYPES = {
+    "customer": {
+        "model": "Invoice",
+        "alloc_fk": "invoice",
+        "name_field": "buyer_name",
+        "code_field": "buyer_id",
+        "counterparty_type": "pirkejas",
+        "source_type": "sale",
+    },
+    "supplier": {
+        "model": "Purchase",
+        "alloc_fk": "purchase",
+        "name_field": "seller_name",
+        "code_field": "seller_id",
+        "counterparty_type": "tiekejas",
+        "source_type": "purchase",
+    },
+}
+
+
+def _zero():
+    return Value(Decimal("0"), output_field=MONEY)
+
+
+def _model(debt_type):
+    from .. import models
+    return getattr(models, DEBT_TYPES[debt_type]["model"])
+
+
+def is_month_end(d) -> bool:
+    return (d + timedelta(days=1)).day == 1
+
+
+def previous_month_end(today=None) -> date:
+    today = today or timezone.localdate()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+# ════════════════════════════════════════════════════════════
+# Cursor
+# ════════════════════════════════════════════════════════════
+
+def encode_cursor(sort_date, code, name) -> str:
+    raw = json.dumps([sort_date.isoformat(), code, name], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(sort_date, code, name) arba None, jei cursor'is neteisingas."""
+    if not cursor:
+        return None
+    try:
+        d, code, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return date.fromisoformat(d), str(code), str(name)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+def _after_cursor(qs, cursor):
+    """Keyset: sort_date DESC, counterparty_code ASC, counterparty_name ASC."""
+    if not cursor:
+        return qs
+    d, code, name = cursor
+    return qs.filter(
+        Q(sort_date__lt=d)
+        | Q(sort_date=d, counterparty_code__gt=code)
+        | Q(sort_date=d, counterparty_code=code, counterparty_name__gt=name)
+    )
+
+
+# ════════════════════════════════════════════════════════════
+# Open documents as of date
+# ════════════════════════════════════════════════════════════
+
+def paid_as_of(alloc_fk, as_of):
+    """Σ alokacijų iki as_of vienam dokumentui (koreliuota subquery)."""
+    from ..models import PaymentAllocation
+
+    allocations = (
+        PaymentAllocation.objects
+        .filter(**{alloc_fk: OuterRef("pk")}, status__in=PAID_STATUSES)
+        .alias(effective_date=Coalesce(
+            "payment_date",
+            "incoming_transaction__transaction_date",
+            "outgoing_transaction__transaction_date",
+            TruncDate("created_at"),
+        ))
+        .filter(effective_date__lte=as_of)
+        .values(alloc_fk)
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    return Coalesce(Subquery(allocations, output_field=MONEY), _zero())
+
+
+def aging_bucket_expr(as_of):
+    """Senėjimo intervalas pagal ref_date anotaciją (due_date arba invoice_date)."""
+    return Case(
+        When(ref_date__lt=as_of - timedelta(days=90), then=Value("90_plus")),
+        When(ref_date__lt=as_of - timedelta(days=60), then=Value("61_90")),
+        When(ref_date__lt=as_of - timedelta(days=30), then=Value("31_60")),
+        default=Value("0_30"),
+    )
+
+
+def open_documents(profile, debt_type, as_of, search=""):
+    """
+    Dokumentai su likučiu > 0 datai as_of. Anotacijos: paid_as_of, open_balance,
+    ref_date, aging_bucket, counterparty_name, counterparty_code.
+    """
+    cfg = DEBT_TYPES[debt_type]
+    name_field, code_field = cfg["name_field"], cfg["code_field"]
+
+    qs = _model(debt_type).objects.filter(
+        Q(invoice_date__lte=as_of) | Q(invoice_date__isnull=True),
+        company_profile=profile,
+    )
+    if search:
+        qs = qs.filter(Q(**{f"{name_field}__icontains": search}) | Q(**{f"{code_field}__icontains": search}))
+
+    return (
+        qs.annotate(
+            paid_as_of=paid_as_of(cfg["alloc_fk"], as_of),
+            open_balance=ExpressionWrapper(
+                Coalesce(F("amount_with_vat"), _zero()) - F("paid_as_of"),
+                output_field=MONEY,
+            ),
+            ref_date=Coalesce("due_date", "invoice_date"),
+            counterparty_name=Coalesce(F(name_field), Value("")),
+            counterparty_code=Coalesce(F(code_field), Value("")),
+        )
+        .annotate(aging_bucket=aging_bucket_expr(as_of))
+        .filter(open_balance__gt=OPEN_TOLERANCE)
+    )
+
+
+def _bucket_sums():
+    return {
+        f"bucket_{b}": Coalesce(
+            Sum(Case(When(aging_bucket=b, then=F("open_balance")), default=_zero(), output_field=MONEY)),
+            _zero(),
+        )
+        for b in AGING_BUCKETS
+    }
+
+
+def grouped_balances(profile, debt_type, as_of, search=""):
+    """Viena eilutė kontrahentui (GROUP BY name, code)."""
+    return (
+        open_documents(profile, debt_type, as_of, search)
+        .values("counterparty_name", "counterparty_code")
+        .annotate(
+            total_invoiced=Coalesce(Sum("amount_with_vat"), _zero()),
+            total_paid=Coalesce(Sum("paid_as_of"), _zero()),
+            balance=Coalesce(Sum("open_balance"), _zero()),
+            invoice_count=Count("id"),
+            newest_invoice_date=Max("invoice_date"),
+            sort_date=Coalesce(Max("invoice_date"), Value(NO_DATE)),
+            **_bucket_sums(),
+        )
+    )
+
+
+# ════════════════════════════════════════════════════════════
+# Ledger
+# ════════════════════════════════════════════════════════════
+
+def _snapshot_rows(profile, debt_type, as_of, search):
+    """Mėnesio pabaigos kopija arba None, jei jos nėra."""
+    from ..models import DebtSnapshot
+
+    if not is_month_end(as_of) or as_of >= timezone.localdate():
+        return None
+    qs = DebtSnapshot.objects.filter(company_profile=profile, debt_type=debt_type, as_of=as_of)
+    if not qs.exists():
+        return None
+    if search:
+        qs = qs.filter(Q(counterparty_name__icontains=search) | Q(counterparty_code__icontains=search))
+    return qs.annotate(sort_date=Coalesce("newest_invoice_date", Value(NO_DATE)))
+
+
+def _money(value) -> str:
+    """Vienodas tikslumas (MONEY): gyvoje užklausoje Σ alokacijų turi 2 skaitmenis, kopijoje — 4."""
+    return str((value or Decimal("0")).quantize(MONEY_QUANT))
+
+
+def _row(values, counterparty_type):
+    paid = values["total_paid"] or Decimal("0")
+    newest = values["newest_invoice_date"]
+    return {
+        "counterparty_name": values["counterparty_name"] or "",
+        "counterparty_code": values["counterparty_code"] or "",
+        "counterparty_type": counterparty_type,
+        "total_invoiced": _money(values["total_invoiced"]),
+        "total_paid": _money(paid),
+        "balance": _money(values["balance"]),
+        "invoice_count": values["invoice_count"] or 0,
+        "newest_invoice_date": newest.isoformat() if newest else None,
+        "payment_status": "partially_paid" if paid > 0 else "unpaid",
+        "aging": {b: _money(values[f"bucket_{b}"]) for b in AGING_BUCKETS},
+    }
+
+
+def ledger_page(profile, debt_type, as_of, search="", cursor=None, limit=25, with_summary=True):
+    """
+    Kontrahentų puslapis. Grąžina dict: results, next_cursor, has_more,
+    summary (tik jei with_summary), source ("snapshot" | "live").
+    """
+    cfg = DEBT_TYPES[debt_type]
+    fields = (
+        "counterparty_name", "counterparty_code", "total_invoiced", "total_paid", "balance",
+        "invoice_count", "newest_invoice_date", "sort_date",
+        *(f"bucket_{b}" for b in AGING_BUCKETS),
+    )
+
+    snapshot = _snapshot_rows(profile, debt_type, as_of, search)
+    if snapshot is not None:
+        source, qs = "snapshot", snapshot
+    else:
+        source = "live"
+        qs = grouped_balances(profile, debt_type, as_of, search).filter(balance__gt=OPEN_TOLERANCE)
+
+    page_qs = _after_cursor(qs, cursor).order_by("-sort_date", "counterparty_code", "counterparty_name")
+    rows = list(page_qs.values(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    result = {
+        "results": [_row(r, cfg["counterparty_type"]) for r in rows],
+        "has_more": has_more,
+        "next_cursor": (
+            encode_cursor(rows[-1]["sort_date"], rows[-1]["counterparty_code"], rows[-1]["counterparty_name"])
+            if has_more else None
+        ),
+        "source": source,
+    }
+
+    if with_summary:
+        if snapshot is not None:
+            agg = snapshot.aggregate(
+                total_balance=Coalesce(Sum("balance"), _zero()),
+                **{f"bucket_{b}": Coalesce(Sum(f"bucket_{b}"), _zero()) for b in AGING_BUCKETS},
+            )
+        else:
+            agg = open_documents(profile, debt_type, as_of, search).aggregate(
+                total_balance=Coalesce(Sum("open_balance"), _zero()),
+                **_bucket_sums(),
+            )
+        result["summary"] = {
+            "total_balance": _money(agg["total_balance"]),
+            "aging": {b: _money(agg[f"bucket_{b}"]) for b in AGING_BUCKETS},
+        }
+
+    return result
+
+
+def counterparty_documents(profile, debt_type, as_of, code="", name=""):
+    """Vieno kontrahento atviri dokumentai datai as_of (naujausi pirmi)."""
+    cfg = DEBT_TYPES[debt_type]
+    qs = open_documents(profile, debt_type, as_of)
+    if code:
+        qs = qs.filter(**{cfg["code_field"]: code})
+    else:
+        qs = qs.filter(**{cfg["name_field"]: name})
+    return qs.order_by("-invoice_date", "-id")
+
+
+# ════════════════════════════════════════════════════════════
+# Month-end snapshots
+# ════════════════════════════════════════════════════════════
+
+def build_debt_snapshot(profile, debt_type, as_of) -> int:
+    """Perkuria (profile, debt_type, as_of) kopiją. Grąžina eilučių skaičių."""
+    from ..models import DebtSnapshot
+
+    rows = [
+        DebtSnapshot(
+            company_profile=profile,
+            debt_type=debt_type,
+            as_of=as_of,
+            counterparty_name=r["counterparty_name"],
+            counterparty_code=r["counterparty_code"],
+            total_invoiced=r["total_invoiced"],
+            total_paid=r["total_paid"],
+            balance=r["balance"],
+            invoice_count=r["invoice_count"],
+            newest_invoice_date=r["newest_invoice_date"],
+            **{f"bucket_{b}": r[f"bucket_{b}"] for b in AGING_BUCKETS},
+        )
+        for r in grouped_balances(profile, debt_type, as_of).filter(balance__gt=OPEN_TOLERANCE)
+    ]
+
+    with transaction.atomic():
+        DebtSnapshot.objects.filter(company_profile=profile, debt_type=debt_type, as_of=as_of).delete()
+        DebtSnapshot.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def invalidate_debt_snapshots(company_profile_id, since, debt_type=None):
+    """Ištrina kopijas su as_of >= since (since=None — visas profilio kopijas)."""
+    from ..models import DebtSnapshot
+
+    if not company_profile_id:
+        return
+    qs = DebtSnapshot.objects.filter(company_profile_id=company_profile_id)
+    if since:
+        qs = qs.filter(as_of__gte=since)
+    if debt_type:
+        qs = qs.filter(debt_type=debt_type)
+    qs.delete()
@@ -0,0 +1,259 @@
+"""
+services/document_purge.py
+==========================
+Masinis ScannedDocument trynimas fone.
+
+1. mark_documents_for_purge — request'e: pažymi is_deleted, CreditUsageLog audit,
+   sukuria DocumentPurgeJob. Dokumentai, į kuriuos rodo Purchase / Invoice
+   (on_delete=PROTECT), nežymimi ir grąžinami atskirai.
+2. run_document_purge — Celery task'e: trina eilutes ribotais batch'ais
+   (kiekvienas batch — atskira transakcija) ir po commit'o šalina failus iš storage.
+   Nepavykęs batch'as atžymimas (vėl matomas vartotojui), job'as baigiamas FAILED.
+"""
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger("docscanner_app")
+
+PURGE_BATCH_SIZE = 500
+
+
+def _protected_ids(doc_ids):
+    """Dokumentai, į kuriuos rodo Purchase / Invoice (on_delete=PROTECT)."""
+    from ..models import Purchase, Invoice
+
+    return set(
+        Purchase.objects.filter(scanned_document_id__in=doc_ids)
+        .values_list("scanned_document_id", flat=True)
+    ) | set(
+        Invoice.objects.filter(scanned_document_id__in=doc_ids)
+        .values_list("scanned_document_id", flat=True)
+    )
+
+
+def mark_documents_for_purge(user, ids):
+    """
+    Pažymi vartotojo dokumentus kaip ištrintus ir sukuria purge job'ą.
+    Grąžina (job | None, pažymėtų dokumentų skaičius, apsaugotų dokumentų id).
+    """
+    from ..models import ScannedDocument, CreditUsageLog, DocumentPurgeJob
+
+    now = timezone.now()
+    with transaction.atomic():
+        doc_ids = list(
+            ScannedDocument.objects
+            .filter(id__in=ids, user=user)
+            .values_list("id", flat=True)
+        )
+        protected = _protected_ids(doc_ids)
+        doc_ids = [i for i in doc_ids if i not in protected]
+        if not doc_ids:
+            return None, 0, sorted(protected)
+
+        ScannedDocument.all_objects.filter(id__in=doc_ids).update(
+            is_deleted=True,
+            deleted_at=now,
+        )
+
+        # --- audit log: помечаем удаление в CreditUsageLog ---
+        CreditUsageLog.objects.filter(
+            scanned_document_id__in=doc_ids,
+            document_deleted_by_user=False,
+        ).update(
+            document_deleted_by_user=True,
+            document_deleted_at=now,
+        )
+
+        _sync_derived(doc_ids)
+
+        job = DocumentPurgeJob.objects.create(
+            user=user,
+            document_ids=doc_ids,
+            total_documents=len(doc_ids),
+        )
+
+    return job, len(doc_ids), sorted(protected)
+
+
+def _unmark_documents(doc_ids):
+    """
+    Atšaukia mark_documents_for_purge dokumentams, kurie nebus ištrinti:
+    nuimamas is_deleted ir CreditUsageLog trynimo žymos (kviesti transakcijoje).
+    """
+    from ..models import ScannedDocument, CreditUsageLog
+
+    if not doc_ids:
+        return
+    ScannedDocument.all_objects.filter(id__in=doc_ids, is_deleted=True).update(
+        is_deleted=False, deleted_at=None,
+    )
+    CreditUsageLog.objects.filter(
+        scanned_document_id__in=doc_ids,
+        document_deleted_by_user=True,
+    ).update(
+        document_deleted_by_user=False,
+        document_deleted_at=None,
+    )
+    _sync_derived(doc_ids)
+
+
+def _sync_derived(doc_ids):
+    """
+    Kontrahentų katalogas ir OSS / SVS faktai seka is_deleted pakeitimą
+    (QuerySet.update() signalų nesiunčia): pažymėti dokumentai iš jų dingsta
+    iškart, atžymėti — grįžta.
+    """
+    from collections import defaultdict
+    from ..models import ScannedDocument, VatReportFact
+    from . import vat_report_facts as vat_facts
+    from .counterparty_directory import sync_counterparties
+
+    keys = defaultdict(set)
+    for user_id, seller_key, buyer_key in (
+        ScannedDocument.all_objects.filter(id__in=doc_ids)
+        .values_list("user_id", "seller_key", "buyer_key")
+    ):
+        keys[user_id] |= {seller_key, buyer_key}
+    for user_id, user_keys in keys.items():
+        sync_counterparties(user_id, user_keys)
+
+    VatReportFact.objects.filter(source=vat_facts.SOURCE_SCAN, doc_id__in=doc_ids).delete()
+    for doc in vat_facts.source_querysets()[vat_facts.SOURCE_SCAN].filter(id__in=doc_ids):
+        vat_facts.refresh_document_facts(vat_facts.SOURCE_SCAN, doc)
+
+
+def _media_paths_for_doc(file_name, preview_url):
+    """Storage keliai, kuriuos reikia ištrinti: failas + preview (jei rodo į kitą failą)."""
+    paths = set()
+    if file_name:
+        paths.add(file_name)
+    if preview_url:
+        media_prefix = f"{settings.SITE_URL_BACKEND}{settings.MEDIA_URL}"
+        if preview_url.startswith(media_prefix):
+            paths.add(preview_url[len(media_prefix):])
+    return paths
+
+
+def _delete_storage_files(paths):
+    deleted = 0
+    for path in paths:
+        try:
+            if default_storage.exists(path):
+                default_storage.delete(path)
+                deleted += 1
+        except Exception as e:
+            logger.warning("[PURGE] Could not delete file %s: %s", path, e)
+    return deleted
+
+
+def _purge_batch(user_id, batch_ids):
+    """
+    Ištrina vieną batch'ą. Grąžina (deleted, skipped, file_paths).
+    Dokumentai, tapę apsaugoti po pažymėjimo (perkelti į apskaitą), praleidžiami
+    ir atžymimi (_unmark_documents), kad vartotojas juos vėl matytų.
+    """
+    from ..models import ScannedDocument
+
+    base_qs = ScannedDocument.all_objects.filter(
+        id__in=batch_ids, user_id=user_id, is_deleted=True,
+    )
+
+    with transaction.atomic():
+        protected_ids = _protected_ids(batch_ids)
+        if protected_ids:
+            _unmark_documents(list(base_qs.filter(id__in=protected_ids).values_list("id", flat=True)))
+
+        purge_qs = base_qs.exclude(id__in=protected_ids)
+        rows = list(purge_qs.values_list("id", "file", "preview_url"))
+        if not rows:
+            return 0, len(protected_ids), set()
+
+        ids = [r[0] for r in rows]
+        paths = set()
+        for _, file_name, preview_url in rows:
+            paths |= _media_paths_for_doc(file_name, preview_url)
+
+        # .only("id") — Collector'ius neužkrauna didelių JSON/tekstų laukų,
+        # susiję LineItem / logai trinami / nullinami batch užklausomis.
+        ScannedDocument.all_objects.filter(id__in=ids).only("id").delete()
+
+    return len(ids), len(protected_ids), paths
+
+
+def run_document_purge(job_id):
+    from ..models import DocumentPurgeJob
+
+    try:
+        job = DocumentPurgeJob.objects.get(pk=job_id)
+    except DocumentPurgeJob.DoesNotExist:
+        logger.error("[PURGE] DocumentPurgeJob %s not found", job_id)
+        return
+
+    job.stage = DocumentPurgeJob.Stage.PROCESSING
+    job.started_at = timezone.now()
+    job.save(update_fields=["stage", "started_at"])
+
+    ids = list(job.document_ids or [])
+    errors = []
+    for start in range(0, len(ids), PURGE_BATCH_SIZE):
+        batch_ids = ids[start:start + PURGE_BATCH_SIZE]
+        failed = 0
+        try:
+            deleted, skipped, paths = _purge_batch(job.user_id, batch_ids)
+        except Exception as e:
+            logger.exception("[PURGE] job=%s batch starting at %d failed", job_id, start)
+            deleted, skipped, paths = 0, 0, set()
+            failed = _unmark_failed_batch(job, batch_ids)
+            errors.append(f"batch {start // PURGE_BATCH_SIZE + 1}: {e}")
+
+        # Failai trinami tik po sėkmingo DB commit'o
+        files_deleted = _delete_storage_files(paths)
+
+        job.processed_documents += len(batch_ids)
+        job.deleted_documents += deleted
+        job.skipped_documents += skipped
+        job.failed_documents += failed
+        job.deleted_files += files_deleted
+        job.save(update_fields=[
+            "processed_documents",
+            "deleted_documents",
+            "skipped_documents",
+            "failed_documents",
+            "deleted_files",
+        ])
+
+    job.stage = DocumentPurgeJob.Stage.FAILED if errors else DocumentPurgeJob.Stage.DONE
+    job.error_message = "\n".join(errors)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["stage", "error_message", "finished_at"])
+
+    logger.info(
+        "[PURGE] job=%s %s total=%d deleted=%d skipped=%d failed=%d files=%d",
+        job_id, job.stage.upper(), job.total_documents, job.deleted_documents,
+        job.skipped_documents, job.failed_documents, job.deleted_files,
+    )
+
+
+def _unmark_failed_batch(job, batch_ids):
+    """
+    Nepavykęs batch'as: dokumentai, kurie dar pažymėti, atžymimi — vartotojas
+    juos vėl mato ir gali trinti iš naujo. Grąžina atžymėtų skaičių.
+    """
+    from ..models import ScannedDocument
+
+    try:
+        with transaction.atomic():
+            still_marked = list(
+                ScannedDocument.all_objects
+                .filter(id__in=batch_ids, user_id=job.user_id, is_deleted=True)
+                .values_list("id", flat=True)
+            )
+            _unmark_documents(still_marked)
+    except Exception:
+        logger.exception("[PURGE] job=%s could not unmark failed batch", job.pk)
+        return len(batch_ids)
+    return len(still_marked)
@@ -93,32 +93,12 @@ def _mailgun_send(*, to, subject, html, reply_to=None, pdf_bytes=None, pdf_filen
 def _get_invoice_pdf(invoice):
     """
     Возвращает (pdf_bytes, filename) для вложения в email.
-    Генерирует PDF в памяти, не сохраняет на диск.
+    PDF из кеша (services/invoice_pdf_cache.py), генерируется только при изменениях.
     """
-    from ..utils.invoice_pdf import generate_invoice_pdf
+    from .invoice_pdf_cache import get_invoice_pdf
 
-    # Логотип
-    logo_path = None
     try:
-        settings = invoice.user.invoice_settings
-        if settings.logo and settings.logo.storage.exists(settings.logo.name):
-            logo_path = settings.logo.path
-    except Exception:
-        pass
-
-    # Watermark для free
-    watermark = False
-    try:
-        from ..models import InvSubscription
-        sub = InvSubscription.objects.filter(user=invoice.user).first()
-        if sub:
-            sub.check_and_expire()
-            watermark = sub.status == "free"
-    except Exception:
-        pass
-
-    try:
-        pdf_bytes = generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+        pdf_bytes = get_invoice_pdf(invoice)
         filename = f"saskaita-{invoice.document_series}{invoice.document_number}.pdf"
         return pdf_bytes, filename
     except Exception:
@@ -0,0 +1,216 @@
+"""
+services/invoice_pdf_cache.py
+=============================
+Išrašytų sąskaitų PDF kešas (utils/invoice_pdf.generate_invoice_pdf).
+
+PDF'as generuojamas vieną kartą ir laikomas
+MEDIA_ROOT/invoice_pdf_cache/<user>/<invoice>/<raktas>.pdf. Raktas —
+kanoninis HMAC-SHA256 nuo visko, kas patenka į maketą:
+
+  - sąskaitos laukai (RENDER_FIELDS + visi seller_* / buyer_*),
+  - eilutės (visi laukai, sort_order, id tvarka),
+  - logotipas (saugyklos vardas, dydis, mtime) ir watermark (free planas),
+  - TEMPLATE_VERSION (utils/invoice_pdf.py).
+
+Pasikeitus bet kuriam įėjimui raktas kitas — senas failas nebenaudojamas
+ir ištrinamas įrašant naują; atskiro invalidavimo signalų nereikia.
+Ištrinta sąskaita — katalogas šalinamas (utils/signals.py).
+
+Naudoja: invoice_pdf / invoice_public_pdf view'ai, el. laiškų priedai
+(invoice_email_service._get_invoice_pdf), warm_invoice_pdf_cache task'as
+po invoice_send.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+logger = logging.getLogger("docscanner_app")
+
+CACHE_DIR = "invoice_pdf_cache"
+
+# Sąskaitos laukai, naudojami makete (be seller_* / buyer_*, kurie imami visi).
+# Keičiant maketą, kad jis skaitytų naują lauką, — pridėti čia ir padidinti
+# TEMPLATE_VERSION.
+RENDER_FIELDS = (
+    "invoice_type", "document_series", "document_number",
+    "invoice_date", "due_date", "operation_date", "order_number",
+    "currency", "pvm_tipas", "vat_percent",
+    "amount_wo_vat", "vat_amount", "amount_with_vat",
+    "invoice_discount_wo_vat", "invoice_discount_with_vat", "delivery_fee",
+    "separate_vat", "is_credit_invoice", "note", "issued_by", "received_by",
+)
+PARTY_PREFIXES = ("seller_", "buyer_")
+
+WATERMARK_LOGO = os.path.join("images", "dokskenas_logo_for_pdf.jpg")
+
+
+# ════════════════════════════════════════════════════════════
+# Įėjimai
+# ════════════════════════════════════════════════════════════
+
+def render_options(invoice):
+    """(logo_path, watermark) — vartotojo logotipas ir free plano watermark."""
+    from ..models import InvSubscription
+
+    logo_path = None
+    try:
+        inv_settings = invoice.user.invoice_settings
+        if inv_settings.logo and inv_settings.logo.storage.exists(inv_settings.logo.name):
+            logo_path = inv_settings.logo.path
+    except Exception:
+        pass
+
+    watermark = False
+    try:
+        sub = InvSubscription.objects.filter(user_id=invoice.user_id).first()
+        if sub:
+            sub.check_and_expire()
+            watermark = sub.status == "free"
+    except Exception as e:
+        logger.error("[PDF] watermark check failed: invoice=%s %s", invoice.pk, e)
+
+    return logo_path, watermark
+
+
+def _invoice_fields(invoice):
+    names = set(RENDER_FIELDS)
+    for field in invoice._meta.concrete_fields:
+        if field.is_relation:
+            continue
+        if field.name.startswith(PARTY_PREFIXES):
+            names.add(field.name)
+    return {name: getattr(invoice, name) for name in sorted(names)}
+
+
+def _line_fields(invoice):
+    from ..models import InvoiceLineItem
+
+    names = [
+        f.attname for f in InvoiceLineItem._meta.concrete_fields
+        if not f.is_relation
+    ]
+    return list(
+        invoice.line_items.order_by("sort_order", "id").values_list(*names)
+    )
+
+
+def _file_identity(path):
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+
+def cache_key(invoice, logo_path=None, watermark=False):
+    """Kanoninis rakto hash'as (hex) — žr. modulio aprašą."""
+    from ..utils.invoice_pdf import TEMPLATE_VERSION
+
+    payload = {
+        "v": TEMPLATE_VERSION,
+        "invoice": invoice.pk,
+        "fields": _invoice_fields(invoice),
+        "lines": _line_fields(invoice),
+        "logo": _file_identity(logo_path),
+        "watermark": (
+            _file_identity(os.path.join(settings.MEDIA_ROOT, WATERMARK_LOGO))
+            if watermark else False
+        ),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    # HMAC — failų vardai MEDIA_ROOT'e neatspėjami iš sąskaitos duomenų
+    return hmac.new(
+        (settings.SECRET_KEY or "").encode(), canonical.encode(), hashlib.sha256,
+    ).hexdigest()
+
+
+# ════════════════════════════════════════════════════════════
+# Kešas
+# ════════════════════════════════════════════════════════════
+
+def _cache_dir(invoice):
+    return os.path.join(settings.MEDIA_ROOT, CACHE_DIR, str(invoice.user_id), str(invoice.pk))
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as fp:
+            return fp.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write(directory, key, pdf_bytes):
+    """Atominis įrašas (tmp + os.replace) ir senų raktų šalinimas."""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(pdf_bytes)
+        os.replace(tmp, os.path.join(directory, f"{key}.pdf"))
+    except Exception:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    for name in os.listdir(directory):
+        if name != f"{key}.pdf" and name.endswith(".pdf"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def get_invoice_pdf(invoice, logo_path=None, watermark=None):
+    """
+    PDF baitai iš kešo arba sugeneruoti ir įrašyti į kešą.
+    logo_path / watermark — kaip generate_invoice_pdf; None — render_options().
+    """
+    from ..utils.invoice_pdf import generate_invoice_pdf
+
+    if watermark is None:
+        default_logo, watermark = render_options(invoice)
+        logo_path = logo_path or default_logo
+
+    key = cache_key(invoice, logo_path=logo_path, watermark=watermark)
+    directory = _cache_dir(invoice)
+    path = os.path.join(directory, f"{key}.pdf")
+
+    pdf_bytes = _read(path)
+    if pdf_bytes:
+        return pdf_bytes
+
+    pdf_bytes = generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+    try:
+        _write(directory, key, pdf_bytes)
+    except OSError as e:
+        # Kešas — tik optimizacija; PDF grąžinamas bet kuriuo atveju
+        logger.warning("[PDF cache] write failed: invoice=%s %s", invoice.pk, e)
+    return pdf_bytes
+
+
+def warm_invoice_pdf(invoice_id):
+    """Sugeneruoja PDF į kešą (jei dar nėra). Grąžina False, jei sąskaitos nėra / draft."""
+    from ..models import Invoice
+
+    invoice = Invoice.objects.select_related("user").filter(pk=invoice_id).first()
+    if invoice is None or invoice.status == "draft":
+        return False
+    get_invoice_pdf(invoice)
+    return True
+
+
+def drop_invoice_pdf_cache(invoice):
+    """Ištrinta sąskaita — šalinami visi jos kešuoti PDF."""
+    shutil.rmtree(_cache_dir(invoice), ignore_errors=True)
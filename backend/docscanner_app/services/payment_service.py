@@ -21,9 +21,10 @@ from ..models import (
     JournalEntryLine,
 )
 from ..utils.bank_statement_parcers import (
-    detect_bank_from_content, detect_format_from_content, get_parser,
+    get_parser, sniff_statement,
 )
 from ..utils.payment_invoice_matching import InvoiceMatchingEngine
+from ..utils.transaction_signals import store_signals
 from ..utils.journal_generators import finalize_journal_entry
 
 
@@ -51,6 +52,7 @@ class BankImportService:
         "text/plain",  # some CSVs come as text/plain
     }
     MAX_FILE_SIZE = 20 * 1024 * 1024  # 10 MB
+    IMPORT_CHUNK_SIZE = 1000
 
     def __init__(self, user, company_profile=None):
         self.user = user
@@ -150,25 +152,21 @@ class BankImportService:
         if len(content) < 10:
             raise BankImportError("Failas tuščias arba per mažas.")
 
+        # ── 4. Sniff: formatas, bankas, koduotė, separatorius — vienu praėjimu ──
+        sniff = sniff_statement(content)
+        logger.info("[BankImport] Sniff: %s", sniff)
+
         # ── 5. Detect bank ─────────────────────────────────────
         if not bank_name:
-            bank_name = detect_bank_from_content(content) or ""
+            bank_name = sniff.bank or ""
             logger.info("[BankImport] Auto-detected bank: '%s'", bank_name)
             if not bank_name:
                 # Diagnostika: kodėl neatpažinta — parodom antraštę ir formatą
-                enc_used, preview = None, ""
-                for e in ("utf-8-sig", "utf-8", "windows-1257", "iso-8859-13"):
-                    try:
-                        preview = content[:1000].decode(e)
-                        enc_used = e
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                first_line = (preview.splitlines()[0] if preview else "")[:400]
+                first_line = (sniff.prefix.splitlines()[0] if sniff.prefix else "")[:400]
                 logger.warning(
                     "[BankImport] FAILED: could not detect bank. "
                     "format=%s encoding=%s first_line=%r",
-                    detect_format_from_content(content), enc_used, first_line,
+                    sniff.file_format, sniff.encoding, first_line,
                 )
                 raise BankImportError(
                     "Nepavyko automatiškai nustatyti banko. "
@@ -179,7 +177,7 @@ class BankImportService:
 
         # ── 6. Detect format ───────────────────────────────────
         if not file_format:
-            file_format = detect_format_from_content(content)
+            file_format = sniff.file_format
             logger.info("[BankImport] Auto-detected format: '%s'", file_format)
         else:
             logger.info("[BankImport] Format provided: '%s'", file_format)
@@ -198,23 +196,23 @@ class BankImportService:
 
         # ── 8. Parse ───────────────────────────────────────────
         try:
-            parser = get_parser(bank_name, file_format)
+            parser = get_parser(bank_name, file_format, sniff=sniff)
             logger.info(
                 "[BankImport] Parser: %s (bank=%s, format=%s)",
                 parser.__class__.__name__, bank_name, file_format,
             )
 
             # Log first 500 chars for debugging separator/encoding issues
-            try:
-                encoding = parser._detect_encoding(content)
-                preview = content.decode(encoding)[:500]
-                logger.info("[BankImport] Encoding: %s", encoding)
-                logger.info("[BankImport] File preview (first 500 chars):\n%s", preview)
-            except Exception:
+            if sniff.prefix:
+                logger.info("[BankImport] Encoding: %s", sniff.encoding)
+                logger.info("[BankImport] File preview (first 500 chars):\n%s", sniff.prefix[:500])
+            else:
                 logger.info("[BankImport] Could not preview file content")
 
-            raw = parser.parse(content)
-            logger.info("[BankImport] Parsed rows: %d", len(raw) if raw else 0)
+            # Operacijos skaitomos dalimis (ISO 20022 — srautiniu parseriu),
+            # kad didelis išrašas nebūtų laikomas atmintyje visas.
+            chunks = parser.iter_chunks(content, self.IMPORT_CHUNK_SIZE)
+            raw = next(chunks, [])
 
             if raw:
                 for i, txn in enumerate(raw[:3]):
@@ -240,26 +238,16 @@ class BankImportService:
                 logger.info("=" * 60)
                 return stmt
 
-            meta = parser._extract_metadata(raw)
-            stmt.period_from = meta.get("period_from")
-            stmt.period_to = meta.get("period_to")
             stmt.account_iban = self._extract_iban(content)
             if raw:
                 stmt.currency = raw[0].get("currency", "EUR")
 
             stmt.save(update_fields=[
-                "period_from",
-                "period_to",
                 "account_iban",
                 "currency",
                 "updated_at",
             ])
 
-            logger.info(
-                "[BankImport] Metadata: period=%s..%s, iban=%s, currency=%s",
-                stmt.period_from, stmt.period_to, stmt.account_iban, stmt.currency,
-            )
-
             # ── Register / resolve bank account BEFORE matching ─────────
             try:
                 from ..models import CompanyProfile
@@ -289,26 +277,43 @@ class BankImportService:
                     )
             except Exception as e:
                 logger.warning("[BankImport] Bank account pre-resolve failed: %s", e)
-            # ── Проверка пересечения периодов ──────────────
-            if stmt.account_iban and stmt.period_from and stmt.period_to:
-                overlap = BankStatement.objects.filter(
-                    user=self.user,
-                    account_iban=stmt.account_iban,
-                    status="processed",
-                    period_from__lte=stmt.period_to,
-                    period_to__gte=stmt.period_from,
-                ).exclude(id=stmt.id).first()
-                if overlap:
-                    logger.info(
-                        "[BankImport] Period overlap with stmt %s (%s – %s), "
-                        "duplicates will be skipped by hash",
-                        overlap.id, overlap.period_from, overlap.period_to,
-                    )
 
             # ── 9+10. Create transactions + match in atomic block ──
             # If matching fails, transactions are rolled back too
             with db_transaction.atomic():
-                created_inc, created_out, dupes, duplicate_details = self._create_transactions(stmt, raw)
+                created_inc, created_out, dupes, duplicate_details = [], [], 0, []
+                parsed_rows = 0
+                period_from = period_to = None
+
+                while raw:
+                    parsed_rows += len(raw)
+                    meta = parser._extract_metadata(raw)
+                    if meta.get("period_from") and (period_from is None or meta["period_from"] < period_from):
+                        period_from = meta["period_from"]
+                    if meta.get("period_to") and (period_to is None or meta["period_to"] > period_to):
+                        period_to = meta["period_to"]
+
+                    inc, out, chunk_dupes, chunk_dup_details = self._create_transactions(stmt, raw)
+                    store_signals(inc + out)
+                    created_inc.extend(inc)
+                    created_out.extend(out)
+                    dupes += chunk_dupes
+                    duplicate_details.extend(chunk_dup_details)
+
+                    raw = next(chunks, [])
+
+                logger.info("[BankImport] Parsed rows: %d", parsed_rows)
+
+                stmt.period_from = period_from
+                stmt.period_to = period_to
+                stmt.save(update_fields=["period_from", "period_to", "updated_at"])
+
+                logger.info(
+                    "[BankImport] Metadata: period=%s..%s, iban=%s, currency=%s",
+                    stmt.period_from, stmt.period_to, stmt.account_iban, stmt.currency,
+                )
+
+                self._log_period_overlap(stmt)
 
                 logger.info(
                     "[BankImport] Transactions created: incoming=%d, outgoing=%d, dupes=%d",
@@ -804,6 +809,24 @@ class BankImportService:
             "existing": self._serialize_txn_for_duplicate(existing_txn),
         }
 
+    def _log_period_overlap(self, stmt):
+        """Проверка пересечения периодов (только лог — дубликаты отсекаются по hash)."""
+        if not (stmt.account_iban and stmt.period_from and stmt.period_to):
+            return
+        overlap = BankStatement.objects.filter(
+            user=self.user,
+            account_iban=stmt.account_iban,
+            status="processed",
+            period_from__lte=stmt.period_to,
+            period_to__gte=stmt.period_from,
+        ).exclude(id=stmt.id).first()
+        if overlap:
+            logger.info(
+                "[BankImport] Period overlap with stmt %s (%s – %s), "
+                "duplicates will be skipped by hash",
+                overlap.id, overlap.period_from, overlap.period_to,
+            )
+
     def _create_transactions(self, stmt, raw_list):
         created_inc = []
         created_out = []
@@ -35,6 +35,7 @@ from django.db import transaction
 from django.utils import timezone
 
 from docscanner_app.models import Company
+from docscanner_app.utils.shared_cache import invalidate_namespace
 
 logger = logging.getLogger("docscanner_app")
 
@@ -481,4 +482,6 @@ def sync_lt_companies_weekly():
         result2 = sync_addresses_from_jar()
         logger.info(result2)
     except Exception as e:
-        logger.error(f"sync_lt_companies_weekly: addresses error: {e}")
\ No newline at end of file
+        logger.error(f"sync_lt_companies_weekly: addresses error: {e}")
+
+    invalidate_namespace("registry")
\ No newline at end of file
@@ -0,0 +1,485 @@
+"""
+services/vat_report_facts.py
+============================
+OSS / SVS ataskaitų faktai (VatReportFact).
+
+Anksčiau OSSReportGenerateView / SVSReportGenerateView kiekvienai užklausai
+(ir kiekvienam puslapiui) iš naujo pereidavo visus dokumentus: _to_eur,
+SVS klasifikacija, deduplikacija Python'e. Dabar dokumento indėlis į
+ataskaitą (šalis, PVM tarifas, suma be PVM / PVM EUR, SVS kodas, įspėjimas)
+apskaičiuojamas vieną kartą — kai pasikeičia ScannedDocument / Invoice ar jų
+eilutės (utils/signals.py) — ir saugomas VatReportFact lentelėje.
+
+Kontrahentų (savo įmonės variacijų) pasirinkimas nuo dokumento nepriklauso,
+todėl faktas saugo abu raktus:
+  - own_key   — mūsų įmonės pusė (OSS / SVS 043: pardavėjas, SVS 140/141: pirkėjas),
+  - other_key — kita pusė.
+Užklausa: own_key IN keys (SVS — dar ir other_key NOT IN keys), kaip senoje
+_build_report logikoje.
+
+Deduplikacija (israsymas prioritetas): faktas yra dublikatas, jei pasirinktoje
+aibėje yra ankstesnio dokumento faktas su tuo pačiu dedup_key — ankstesnis =
+israsymas prieš skaitmenizavimas, toliau pagal doc_id. Kelios to paties
+dokumento tarifų eilutės viena kitos dublikatais nelaikomos.
+
+Valiutų kursai fiksuojami fakto sukūrimo metu. Vėliau pataisytus kursus /
+bulk update'us (QuerySet.update signalų nekviečia) sutvarko:
+    python manage.py check_vat_report_facts --user <id> --fix
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+
+REPORT_OSS = "oss"
+REPORT_SVS = "svs"
+
+SOURCE_SCAN = "skaitmenizavimas"
+SOURCE_INVOICE = "israsymas"
+
+SCAN_STATUSES = ("completed", "exported")
+INVOICE_STATUSES = ("issued", "sent", "partially_paid", "paid")
+INVOICE_TYPES = ("saskaita", "pvm_saskaita")
+
+OSS_SUMISKAI_WARNING = "Keli skirtingi PVM – suminis režimas, reikia peržiūrėti"
+
+# Laukai, nuo kurių priklauso faktai: save(update_fields=...) be jų faktų neliečia
+SCAN_FACT_FIELDS = frozenset({
+    "user", "status", "is_archive_container", "invoice_date",
+    "document_series", "document_number",
+    "seller_id", "seller_name", "seller_vat_code", "seller_country_iso",
+    "buyer_id", "buyer_name", "buyer_vat_code", "buyer_country_iso", "buyer_is_person",
+    "amount_wo_vat", "vat_amount", "amount_with_vat", "vat_percent",
+    "separate_vat", "scan_type", "currency", "traded_type",
+    "ready_for_export", "math_validation_passed",
+})
+INVOICE_FACT_FIELDS = frozenset({
+    "user", "status", "invoice_type", "invoice_date",
+    "document_series", "document_number",
+    "seller_id", "seller_name", "seller_vat_code", "seller_country_iso",
+    "buyer_id", "buyer_name", "buyer_vat_code", "buyer_country_iso", "buyer_is_person",
+    "amount_wo_vat", "vat_amount", "amount_with_vat", "vat_percent",
+    "separate_vat", "currency",
+})
+
+Q2 = Decimal("0.01")
+
+
+def _helpers():
+    from .. import views
+    return views
+
+
+# ════════════════════════════════════════════════════════════
+# Dokumento indėlis
+# ════════════════════════════════════════════════════════════
+
+def _rate_groups(obj):
+    """separate_vat: eilučių sumos pagal PVM tarifą (tik > 0)."""
+    v = _helpers()
+    groups = defaultdict(lambda: {"subtotal": Decimal("0"), "vat": Decimal("0")})
+    for li in obj.line_items.all():
+        if li.vat_percent is None or v._safe_d(li.vat_percent) <= 0:
+            continue
+        key = v._safe_d(li.vat_percent)
+        groups[key]["subtotal"] += v._safe_d(li.subtotal)
+        groups[key]["vat"] += v._safe_d(li.vat)
+    return groups
+
+
+def _dedup_key(parts):
+    return "" if parts == ("", "", "", "") else "|".join(parts)
+
+
+def _oss_eligible(source, obj):
+    v = _helpers()
+    if (obj.buyer_country_iso or "") not in v.EU_COUNTRIES_NO_LT:
+        return False
+    if obj.buyer_is_person is not True or not obj.invoice_date:
+        return False
+    if (obj.buyer_vat_code or "") != "":
+        return False
+    if source == SOURCE_SCAN:
+        return bool(obj.ready_for_export) and bool(obj.math_validation_passed)
+    return True
+
+
+def oss_contributions(source, obj):
+    """OSS eilutės dokumentui (be kontrahentų filtro) — kaip senas _build_report."""
+    v = _helpers()
+    if not _oss_eligible(source, obj):
+        return []
+
+    base = {
+        "report": REPORT_OSS,
+        "own_key": v._company_key(obj.seller_name, obj.seller_vat_code, obj.seller_id),
+        "other_key": v._company_key(obj.buyer_name, obj.buyer_vat_code, obj.buyer_id),
+        "country": obj.buyer_country_iso or "",
+        "counterparty_name": obj.buyer_name or "",
+        "counterparty_vat_code": "",
+        "dedup_key": _dedup_key(v._oss_dedup_key(
+            obj.document_series, obj.document_number, obj.amount_with_vat, obj.invoice_date,
+        )),
+    }
+    currency, day = obj.currency, obj.invoice_date
+    separate_vat = bool(obj.separate_vat)
+    scan_type = (getattr(obj, "scan_type", "sumiskai") or "sumiskai") if source == SOURCE_SCAN else "detaliai"
+
+    if separate_vat and scan_type == "sumiskai":
+        return [dict(base, vat_percent=None, taxable_eur=Decimal("0"), vat_eur=Decimal("0"),
+                     warning=OSS_SUMISKAI_WARNING)]
+
+    if separate_vat and scan_type == "detaliai":
+        return [
+            dict(
+                base,
+                vat_percent=vp,
+                taxable_eur=v._to_eur(amounts["subtotal"], currency, day),
+                vat_eur=v._to_eur(amounts["vat"], currency, day),
+            )
+            for vp, amounts in _rate_groups(obj).items()
+        ]
+
+    vp = v._safe_d(obj.vat_percent)
+    if vp <= 0:
+        return []
+    return [dict(
+        base,
+        vat_percent=vp,
+        taxable_eur=v._to_eur(obj.amount_wo_vat, currency, day),
+        vat_eur=v._to_eur(obj.vat_amount, currency, day),
+    )]
+
+
+def svs_contributions(source, obj):
+    """
+    SVS kandidatai dokumentui: pirkimas (140/141, own_key = pirkėjas) ir/arba
+    pardavimas (043, own_key = pardavėjas). Kuris jų patenka į ataskaitą,
+    nusprendžia užklausa pagal pasirinktus kontrahentus.
+    """
+    v = _helpers()
+    if not obj.invoice_date:
+        return []
+
+    seller_key = v._company_key(obj.seller_name, obj.seller_vat_code, obj.seller_id)
+    buyer_key = v._company_key(obj.buyer_name, obj.buyer_vat_code, obj.buyer_id)
+    seller_iso = (obj.seller_country_iso or "").strip().upper()
+    buyer_iso = (obj.buyer_country_iso or "").strip().upper()
+    b_vat = (obj.buyer_vat_code or "").strip()
+
+    # traded_type: tik paslaugos (tuščias — atgalinis suderinamumas; Invoice lauko neturi)
+    t_type = (getattr(obj, "traded_type", None) or "").strip().lower()
+    if t_type not in ("", "services"):
+        return []
+
+    taxable = v._to_eur(obj.amount_wo_vat, obj.currency, obj.invoice_date)
+    if taxable == Decimal("0") and obj.amount_with_vat:
+        taxable = v._to_eur(obj.amount_with_vat, obj.currency, obj.invoice_date)
+    dedup_key = _dedup_key(v._svs_dedup_key(
+        obj.document_series, obj.document_number, taxable, obj.invoice_date,
+    ))
+    base = {
+        "report": REPORT_SVS,
+        "vat_percent": None,
+        "taxable_eur": taxable,
+        "vat_eur": Decimal("0"),
+        "dedup_key": dedup_key,
+    }
+
+    rows = []
+    # Pirkimas: pardavėjas užsienietis ir nepritaikė PVM (pvz. per OSS)
+    if seller_iso and seller_iso != "LT" and not (
+        v._safe_d(obj.vat_percent) > 0 and v._safe_d(obj.vat_amount) > 0
+    ):
+        rows.append(dict(
+            base,
+            own_key=buyer_key,
+            other_key=seller_key,
+            svs_code="140" if seller_iso in v.EU_COUNTRIES_NO_LT else "141",
+            country=seller_iso,
+            counterparty_name=obj.seller_name or "",
+            counterparty_vat_code="",
+        ))
+    # Pardavimas: pirkėjas — ES PVM mokėtojas
+    if buyer_iso in v.EU_COUNTRIES_NO_LT and b_vat:
+        rows.append(dict(
+            base,
+            own_key=seller_key,
+            other_key=buyer_key,
+            svs_code="043",
+            country=buyer_iso,
+            counterparty_name=obj.buyer_name or "",
+            counterparty_vat_code=b_vat,
+        ))
+    return rows
+
+
+def _in_scope(source, obj):
+    if source == SOURCE_SCAN:
+        return (
+            obj.status in SCAN_STATUSES
+            and not obj.is_archive_container
+            and not obj.is_deleted
+        )
+    return obj.status in INVOICE_STATUSES and obj.invoice_type in INVOICE_TYPES
+
+
+def document_facts(source, obj):
+    """Neįrašyti VatReportFact objektai vienam dokumentui."""
+    from ..models import VatReportFact
+
+    if not obj.user_id or not _in_scope(source, obj):
+        return []
+
+    facts = []
+    for report, rows in (
+        (REPORT_OSS, oss_contributions(source, obj)),
+        (REPORT_SVS, svs_contributions(source, obj)),
+    ):
+        for line, row in enumerate(rows):
+            row.setdefault("svs_code", "")
+            row.setdefault("warning", "")
+            facts.append(VatReportFact(
+                user_id=obj.user_id,
+                source=source,
+                doc_id=obj.pk,
+                line=line,
+                invoice_date=obj.invoice_date,
+                document_series=obj.document_series or "",
+                document_number=obj.document_number or "",
+                **dict(
+                    row,
+                    taxable_eur=row["taxable_eur"].quantize(Q2),
+                    vat_eur=row["vat_eur"].quantize(Q2),
+                ),
+            ))
+    return facts
+
+
+@transaction.atomic
+def refresh_document_facts(source, obj):
+    """Perrašo vieno dokumento faktus (signalai, check_vat_report_facts --fix)."""
+    from ..models import VatReportFact
+
+    VatReportFact.objects.filter(source=source, doc_id=obj.pk).delete()
+    facts = document_facts(source, obj)
+    if facts:
+        VatReportFact.objects.bulk_create(facts)
+    return len(facts)
+
+
+def delete_document_facts(source, doc_id):
+    from ..models import VatReportFact
+
+    VatReportFact.objects.filter(source=source, doc_id=doc_id).delete()
+
+
+def source_querysets(user_id=None):
+    """Dokumentai, kurie gali turėti faktų: {source: queryset}."""
+    from ..models import Invoice, ScannedDocument
+
+    scans = ScannedDocument.objects.filter(
+        status__in=SCAN_STATUSES, is_archive_container=False, invoice_date__isnull=False,
+    ).prefetch_related("line_items")
+    invoices = Invoice.objects.filter(
+        status__in=INVOICE_STATUSES, invoice_type__in=INVOICE_TYPES, invoice_date__isnull=False,
+    ).prefetch_related("line_items")
+    if user_id:
+        scans = scans.filter(user_id=user_id)
+        invoices = invoices.filter(user_id=user_id)
+    return {SOURCE_SCAN: scans, SOURCE_INVOICE: invoices}
+
+
+# ════════════════════════════════════════════════════════════
+# Užklausos
+# ════════════════════════════════════════════════════════════
+
+def _selection(user, report, contractor_keys, date_from, date_to, sources):
+    from ..models import VatReportFact
+
+    keys = list(contractor_keys)
+    qs = VatReportFact.objects.filter(
+        user=user, report=report, source__in=list(sources), own_key__in=keys,
+    )
+    if report == REPORT_SVS:
+        qs = qs.exclude(other_key__in=keys)
+    if date_from:
+        qs = qs.filter(invoice_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(invoice_date__lte=date_to)
+    return qs
+
+
+def _with_duplicates(qs):
+    """is_duplicate: ta pati aibė turi ankstesnio dokumento faktą su tuo pačiu dedup_key."""
+    earlier = qs.exclude(dedup_key="").filter(dedup_key=OuterRef("dedup_key")).filter(
+        Q(source__lt=OuterRef("source"))
+        | Q(source=OuterRef("source"), doc_id__lt=OuterRef("doc_id"))
+    )
+    return qs.annotate(is_duplicate=Exists(earlier))
+
+
+def _entries(qs, offset, limit):
+    qs = qs.order_by("-invoice_date", "source", "doc_id", "line")
+    if limit is not None:
+        qs = qs[offset:offset + limit]
+    elif offset:
+        qs = qs[offset:]
+    return qs
+
+
+def _serija_nr(fact):
+    series, number = fact.document_series, fact.document_number
+    return f"{series}-{number}" if series else number
+
+
+def oss_report(user, contractor_keys, date_from, date_to, sources, offset=0, limit=None):
+    v = _helpers()
+    qs = _with_duplicates(_selection(user, REPORT_OSS, contractor_keys, date_from, date_to, sources))
+
+    # ── Suvestinė pagal (šalis, tarifas) — be dublikatų ir įspėjimų ──
+    rows = (
+        qs.filter(is_duplicate=False, warning="")
+        .values("country", "vat_percent")
+        .annotate(taxable=Sum("taxable_eur"), vat=Sum("vat_eur"), doc_count=Count("id"))
+        .order_by("country", "vat_percent")
+    )
+    summary = []
+    grand_taxable = grand_vat = Decimal("0")
+    grand_doc_count = 0
+    for r in rows:
+        t = (r["taxable"] or Decimal("0")).quantize(Q2)
+        vat = (r["vat"] or Decimal("0")).quantize(Q2)
+        summary.append({
+            "buyer_country_iso": r["country"],
+            "buyer_country_name": v.EU_COUNTRY_NAMES_LT.get(r["country"], r["country"]),
+            "vat_percent": str(r["vat_percent"]),
+            "taxable_amount": str(t),
+            "vat_amount": str(vat),
+            "doc_count": r["doc_count"],
+        })
+        grand_taxable += t
+        grand_vat += vat
+        grand_doc_count += r["doc_count"]
+
+    counts = qs.aggregate(
+        total=Count("id"),
+        warnings=Count("id", filter=~Q(warning="")),
+        duplicates=Count("id", filter=Q(is_duplicate=True)),
+    )
+    grand_totals = {
+        "taxable_amount": str(grand_taxable.quantize(Q2)),
+        "vat_amount": str(grand_vat.quantize(Q2)),
+        "documents_count": grand_doc_count,
+        "warnings_count": counts["warnings"],
+        "duplicates_count": counts["duplicates"],
+    }
+
+    entries = [
+        {
+            "doc_id": f.doc_id,
+            "source": f.source,
+            "invoice_date": f.invoice_date.strftime("%Y-%m-%d"),
+            "serija_nr": _serija_nr(f),
+            "buyer_name": f.counterparty_name,
+            "buyer_country_iso": f.country,
+            "buyer_country_name": v.EU_COUNTRY_NAMES_LT.get(f.country, f.country),
+            "vat_percent": str(f.vat_percent) if f.vat_percent is not None else None,
+            "taxable_amount": str(f.taxable_eur),
+            "vat_amount": str(f.vat_eur),
+            "is_duplicate": f.is_duplicate,
+            "warning": f.warning or None,
+        }
+        for f in _entries(qs, offset, limit)
+    ]
+
+    return {
+        "summary": summary,
+        "grand_totals": grand_totals,
+        "total_count": counts["total"],
+        "entries": entries,
+    }
+
+
+def svs_report(user, contractor_keys, date_from, date_to, sources, offset=0, limit=None):
+    v = _helpers()
+    qs = _with_duplicates(_selection(user, REPORT_SVS, contractor_keys, date_from, date_to, sources))
+    unique = qs.filter(is_duplicate=False)
+
+    # ── PVM101 suvestinė: pagal kodą ──
+    pvm101_summary = []
+    grand_taxable = grand_vat = Decimal("0")
+    grand_doc_count = 0
+    for r in unique.values("svs_code").annotate(taxable=Sum("taxable_eur"), doc_count=Count("id")).order_by("svs_code"):
+        code = r["svs_code"]
+        taxable = (r["taxable"] or Decimal("0")).quantize(Q2)
+        if code in ("140", "141"):
+            vat, vat_pct = (taxable * Decimal("0.21")).quantize(Q2), "21"
+        else:
+            vat, vat_pct = Decimal("0"), "0"
+        pvm101_summary.append({
+            "code": code,
+            "label": v.CODE_LABELS.get(code, code),
+            "vat_percent": vat_pct,
+            "taxable_amount": str(taxable),
+            "vat_amount": str(vat),
+            "doc_count": r["doc_count"],
+        })
+        grand_taxable += taxable
+        grand_vat += vat
+        grand_doc_count += r["doc_count"]
+
+    # ── FR0564 suvestinė: pagal pirkėją (tik 043), sumos iki sveikų (taisyklių 11 p.) ──
+    fr0564_summary = []
+    fr_rows = (
+        unique.filter(svs_code="043")
+        .values("country", "counterparty_vat_code")
+        .annotate(amount=Sum("taxable_eur"), doc_count=Count("id"), buyer_name=Max("counterparty_name"))
+        .order_by("country", "counterparty_vat_code")
+    )
+    for r in fr_rows:
+        c_iso, vat_raw = r["country"], r["counterparty_vat_code"]
+        fr0564_summary.append({
+            "country_iso": c_iso,
+            "country_name": v.EU_COUNTRY_NAMES_LT.get(c_iso, c_iso),
+            "vat_code": v._strip_vat_prefix(vat_raw, c_iso),
+            "vat_code_full": vat_raw,
+            "buyer_name": r["buyer_name"],
+            "services_amount": str((r["amount"] or Decimal("0")).quantize(Decimal("1"))),
+            "doc_count": r["doc_count"],
+        })
+
+    counts = qs.aggregate(total=Count("id"), duplicates=Count("id", filter=Q(is_duplicate=True)))
+    grand_totals = {
+        "taxable_amount": str(grand_taxable.quantize(Q2)),
+        "vat_amount": str(grand_vat.quantize(Q2)),
+        "documents_count": grand_doc_count,
+        "duplicates_count": counts["duplicates"],
+    }
+
+    entries = [
+        {
+            "doc_id": f.doc_id,
+            "source": f.source,
+            "svs_code": f.svs_code,
+            "invoice_date": f.invoice_date.strftime("%Y-%m-%d"),
+            "serija_nr": _serija_nr(f),
+            "counterparty_name": f.counterparty_name,
+            "counterparty_country_iso": f.country,
+            "counterparty_country_name": v.EU_COUNTRY_NAMES_LT.get(f.country, f.country or ""),
+            "counterparty_vat_code": f.counterparty_vat_code,
+            "amount_wo_vat": str(f.taxable_eur),
+            "is_duplicate": f.is_duplicate,
+        }
+        for f in _entries(qs, offset, limit)
+    ]
+
+    return {
+        "pvm101_summary": pvm101_summary,
+        "fr0564_summary": fr0564_summary,
+        "grand_totals": grand_totals,
+        "total_count": counts["total"],
+        "entries": entries,
+    }
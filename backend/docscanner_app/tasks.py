@@ -326,6 +326,27 @@ def _count_line_items(structured: dict) -> int:
     except Exception:
         return 0
 
+OCR_RATE_LIMIT_MAX_RETRIES = 8
+
+
+def _is_ocr_rate_limited(err) -> bool:
+    return bool(err) and str(err).startswith(("QUOTA_EXCEEDED", "RATE_LIMITED"))
+
+
+def _ocr_rate_limit_countdown(retry: int) -> int:
+    """30s, 60s, 120s ... max 10 min + jitter, kad perplanuoti task'ai neišsiųstų vienu metu."""
+    import random
+    return min(30 * (2 ** retry), 600) + random.randint(0, 15)
+
+
+def _run_ocr_backend(backend: str, data: bytes, filename: str):
+    """OCR per pasirinktą backend'ą. Grąžina (raw_json, joined_text, words, error)."""
+    if backend == "paddle":
+        from .utils.paddle_ocr_server import get_ocr_text_paddle
+        return get_ocr_text_paddle(data, filename, logger)
+    return get_ocr_text_gcv(data, filename, logger)
+
+
 def _is_response_truncated(resp: str) -> bool:
     if not resp or not resp.strip():
         return False
@@ -1050,7 +1071,7 @@ def start_session_processing(session_id: str):
 
 
 @shared_task(bind=True, soft_time_limit=450, time_limit=480, acks_late=True, reject_on_worker_lost=True)
-def process_uploaded_file_task(self, user_id, doc_id, scan_type, split_depth=0, skip_ocr=False):
+def process_uploaded_file_task(self, user_id, doc_id, scan_type, split_depth=0, skip_ocr=False, rate_limit_retries=0):
     """
     Полный пайплайн:
     - OCR: Google Vision (компактный JSON параграфов + склеенный текст) → fallback Gemini OCR (только текст)
@@ -1249,7 +1270,8 @@ def process_uploaded_file_task(self, user_id, doc_id, scan_type, split_depth=0,
         
         try:
             from .utils.file_converter import normalize_any, ArchiveLimitError
-            normalized_result = normalize_any(fake_file)
+            # Archyvui — manifest'as iš compute_expected_items (be pakartotinio filtravimo)
+            normalized_result = normalize_any(fake_file, manifest=doc.archive_manifest)
             _log_t("Normalize uploaded file", t0)
             
         except ArchiveLimitError as e:
@@ -1517,11 +1539,45 @@ def process_uploaded_file_task(self, user_id, doc_id, scan_type, split_depth=0,
         else:
 
             t0 = _t()
-            # get_ocr_text_gcv возвращает: raw_json, joined_text, paragraphs, error
-            gcv_raw_json, gcv_joined_text, _, gcv_err = get_ocr_text_gcv(data, original_filename, logger)
-            _log_t("OCR (Google Vision)", t0)
-            logger.info("[TASK] GCV result: err=%s, raw_len=%s, text_len=%s",
-                gcv_err, len(gcv_raw_json or ''), len(gcv_joined_text or ''))
+            # OCR backend'as pagal settings (gcv / paddle) su fallback'u
+            # возвращает: raw_json, joined_text, paragraphs, error
+            ocr_backend = getattr(settings, "OCR_PRIMARY_BACKEND", "gcv")
+            gcv_raw_json, gcv_joined_text, _, gcv_err = _run_ocr_backend(ocr_backend, data, original_filename)
+            _log_t(f"OCR ({ocr_backend})", t0)
+
+            fallback_backend = getattr(settings, "OCR_FALLBACK_BACKEND", "")
+            if (gcv_err or (not gcv_raw_json and not gcv_joined_text)) and fallback_backend and fallback_backend != ocr_backend:
+                logger.warning("[TASK] OCR %s failed (%s), trying fallback %s",
+                               ocr_backend, gcv_err, fallback_backend)
+                t0 = _t()
+                ocr_backend = fallback_backend
+                gcv_raw_json, gcv_joined_text, _, gcv_err = _run_ocr_backend(ocr_backend, data, original_filename)
+                _log_t(f"OCR ({ocr_backend}, fallback)", t0)
+
+            logger.info("[TASK] OCR result: backend=%s err=%s, raw_len=%s, text_len=%s",
+                ocr_backend, gcv_err, len(gcv_raw_json or ''), len(gcv_joined_text or ''))
+
+            if _is_ocr_rate_limited(gcv_err) and rate_limit_retries < OCR_RATE_LIMIT_MAX_RETRIES:
+                # Quota / limiteris — ne atmetam, o perplanuojam su countdown
+                countdown = _ocr_rate_limit_countdown(rate_limit_retries)
+                logger.warning(
+                    "[TASK] OCR rate limited (%s), rescheduling doc_id=%s in %ss (retry %d)",
+                    gcv_err, doc_id, countdown, rate_limit_retries + 1,
+                )
+                doc.preview_url = preview_url
+                doc.save(update_fields=['preview_url'])
+                cache.delete(attempt_key)
+                process_uploaded_file_task.apply_async(
+                    args=[user_id, doc_id, scan_type],
+                    kwargs={
+                        "split_depth": split_depth,
+                        "skip_ocr": skip_ocr,
+                        "rate_limit_retries": rate_limit_retries + 1,
+                    },
+                    countdown=countdown,
+                )
+                _log_t("TOTAL (rescheduled, OCR rate limited)", total_start)
+                return
 
             if gcv_err or (not gcv_raw_json and not gcv_joined_text):
                 # ВРЕМЕННО: без fallback, чтобы увидеть ошибку GCV
@@ -2273,6 +2329,102 @@ def process_uploaded_file_task(self, user_id, doc_id, scan_type, split_depth=0,
 
 
 
+# Fone vykdomas masinis dokumentų trynimas (eilutės + failai storage)
+@shared_task(bind=True, max_retries=0, soft_time_limit=3600, time_limit=3660)
+def purge_documents_task(self, job_id: int):
+    from docscanner_app.services.document_purge import run_document_purge
+    run_document_purge(job_id)
+
+
+# Perkėlimas į apskaitą (ScannedDocument → Purchase / Invoice) chunk'ais
+@shared_task(bind=True, max_retries=0, soft_time_limit=3600, time_limit=3660)
+def accounting_transfer_task(self, job_id: int):
+    from docscanner_app.services.accounting_transfer_job import run_transfer_job
+    run_transfer_job(job_id)
+
+
+# Incremental matching: MatchingChange eilė → tik paveiktos operacijos
+@shared_task(bind=True, max_retries=0, soft_time_limit=900, time_limit=960)
+def process_matching_changes_task(self, user_id: int):
+    from django.core.cache import cache
+    from docscanner_app.models import CustomUser
+    from docscanner_app.utils.incremental_matching import (
+        MATCHING_CHANGES_BATCH, MATCHING_CHANGES_DEBOUNCE_KEY, process_matching_changes,
+    )
+
+    # Nauji pakeitimai apdorojimo metu suplanuos kitą task'ą
+    cache.delete(MATCHING_CHANGES_DEBOUNCE_KEY.format(user_id=user_id))
+
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if not user:
+        return
+    while True:
+        stats = process_matching_changes(user, limit=MATCHING_CHANGES_BATCH)
+        if stats["changes"] < MATCHING_CHANGES_BATCH:
+            break
+
+
+# Fone vykdomas prekių / klientų XLSX importas
+@shared_task(bind=True, max_retries=0, soft_time_limit=1800, time_limit=1860)
+def run_data_import_task(self, session_id: int):
+    """
+    Skaito DataImportSession failą eilutėmis ir upsert'ina batch'ais.
+    Progresas rašomas į sessiją po kiekvieno batch'o, galutinis report — į session.report.
+    """
+    from docscanner_app.models import DataImportSession
+    from docscanner_app.data_import.data_import_from_buh import (
+        import_products_from_xlsx,
+        import_clients_from_xlsx,
+    )
+
+    try:
+        session = DataImportSession.objects.select_related("user").get(pk=session_id)
+    except DataImportSession.DoesNotExist:
+        logger.error("[DATA_IMPORT] DataImportSession %s not found", session_id)
+        return
+
+    session.stage = DataImportSession.Stage.PROCESSING
+    session.started_at = timezone.now()
+    session.save(update_fields=["stage", "started_at"])
+
+    def _on_progress(processed, total_estimate):
+        DataImportSession.objects.filter(pk=session_id).update(
+            processed_rows=processed,
+            total_rows=max(total_estimate, processed),
+        )
+
+    importer = (
+        import_products_from_xlsx
+        if session.kind == DataImportSession.Kind.PRODUCTS
+        else import_clients_from_xlsx
+    )
+
+    start_time = time.time()
+    try:
+        with session.file.open("rb") as fh:
+            report = importer(session.user, fh, on_progress=_on_progress)
+    except Exception as e:
+        logger.exception("[DATA_IMPORT] session=%s failed", session_id)
+        report = {"error": str(e)}
+
+    session.refresh_from_db(fields=["processed_rows", "total_rows"])
+    session.report = report
+    session.stage = DataImportSession.Stage.DONE
+    session.finished_at = timezone.now()
+    session.save(update_fields=["report", "stage", "finished_at"])
+
+    # Failas po importo nebereikalingas
+    try:
+        session.file.delete(save=True)
+    except Exception:
+        logger.warning("[DATA_IMPORT] session=%s failed to delete upload", session_id)
+
+    logger.info(
+        "[DATA_IMPORT] session=%s kind=%s DONE rows=%d time=%.1fs",
+        session_id, session.kind, session.processed_rows, time.time() - start_time,
+    )
+
+
 #FUNKICII dlia exporta cerez API
 @shared_task(bind=True, max_retries=0)
 def export_to_optimum_task(self, session_id: int, api_key_id: int):
@@ -3797,6 +3949,39 @@ def send_trial_expired_emails():
     return _send()
 
 
+# ════════════════════════════════════════════════
+#  Superuser dashboard agregatai (services/dashboard_rollups.py)
+# ════════════════════════════════════════════════
+
+@shared_task(name="docscanner_app.tasks.refresh_dashboard_rollups")
+def refresh_dashboard_rollups():
+    """Kas valandą: uždarytos valandos / dienos per paskutines N dienų."""
+    from .services.dashboard_rollups import refresh_recent_rollups
+    return refresh_recent_rollups()
+
+
+@shared_task(name="docscanner_app.tasks.rebuild_dashboard_rollups", soft_time_limit=1800, time_limit=1900)
+def rebuild_dashboard_rollups():
+    """Naktį: dienų agregatai visai istorijai (ištrinti dokumentai, seni statusų pakeitimai)."""
+    from .services.dashboard_rollups import refresh_rollups
+    return refresh_rollups(days=None)
+
+
+# ════════════════════════════════════════════════
+#  Sąskaitų PDF kešas (services/invoice_pdf_cache.py)
+# ════════════════════════════════════════════════
+
+@shared_task(name="docscanner_app.tasks.warm_invoice_pdf_cache", soft_time_limit=120, time_limit=150)
+def warm_invoice_pdf_cache(invoice_id):
+    """Po invoice_send: PDF sugeneruojamas į kešą, kol pirkėjas dar neatidarė."""
+    from .services.invoice_pdf_cache import warm_invoice_pdf
+    try:
+        return warm_invoice_pdf(invoice_id)
+    except Exception as e:
+        logger.warning("[PDF cache] warm failed: invoice=%s %s", invoice_id, e)
+        return False
+
+
 
 
 # # ════════════════════════════════════════════════
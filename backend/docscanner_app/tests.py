@@ -1,3 +1,1430 @@
-from django.test import TestCase
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    ChunkedUpload, CustomUser, DashboardRollup, ScannedDocument, UploadSession,
+)
+
+
+# ════════════════════════════════════════════════════════════
+# Superuser dashboard agregatai (services/dashboard_rollups.py)
+# ════════════════════════════════════════════════════════════
+
+class DashboardRollupTests(TestCase):
+    """Agregatai + gyva einamoji valanda == gyvi count'ai visuose languose."""
+
+    def setUp(self):
+        from .services.dashboard_rollups import _hour_floor
+
+        # Fiksuotas „dabar“ — einamoji valanda visada netuščia
+        self.cur_hour = _hour_floor(timezone.now())
+        self.now = self.cur_hour + timedelta(minutes=30)
+        self.user = CustomUser.objects.create_user(email="rollups@example.com", password="x")
+
+    def _doc(self, uploaded_at, **fields):
+        fields.setdefault("status", "completed")
+        doc = ScannedDocument.objects.create(user=self.user, file="rollups/test.pdf", **fields)
+        # uploaded_at — auto_now_add
+        ScannedDocument.objects.filter(pk=doc.pk).update(uploaded_at=uploaded_at)
+        return doc
+
+    def _history(self):
+        ages = (
+            timedelta(days=400), timedelta(days=40), timedelta(days=29, hours=23),
+            timedelta(days=8), timedelta(days=6, hours=5), timedelta(days=1, hours=2),
+            timedelta(hours=5), timedelta(hours=1, minutes=10),
+        )
+        for i, age in enumerate(ages):
+            self._doc(
+                self.cur_hour - age,
+                scan_type="detaliai" if i % 2 else "sumiskai",
+                status="rejected" if i % 3 == 0 else "completed",
+            )
+
+    def _partial_hour(self):
+        # Tarp einamosios valandos pradžios ir now — agregatai jos nepadengia
+        return self.cur_hour + (self.now - self.cur_hour) / 2
+
+    def assertMatchesLive(self):
+        from .services.dashboard_rollups import live_window_values, rollup_window_values
+
+        rolled = rollup_window_values(self.now)
+        live = live_window_values(self.now)
+        for window, values in live.items():
+            self.assertEqual(rolled[window], values, window)
+        return rolled
+
+    def test_rollups_match_live_counts(self):
+        from .services.dashboard_rollups import DAY, HOUR, refresh_rollups
+
+        self._history()
+        refresh_rollups(days=None, now=self.now)
+        self.assertTrue(DashboardRollup.objects.filter(period=DAY).exists())
+        self.assertTrue(DashboardRollup.objects.filter(period=HOUR).exists())
+
+        self.assertMatchesLive()
+
+    def test_current_partial_hour_is_live(self):
+        from .services.dashboard_rollups import refresh_rollups
+
+        self._history()
+        refresh_rollups(days=None, now=self.now)
+        before = self.assertMatchesLive()
+
+        # Įkelta po paskutinio refresh — matoma iškart, be agregatų perskaičiavimo
+        self._doc(self._partial_hour(), scan_type="detaliai")
+        after = self.assertMatchesLive()
+        for window in ("today", "last_7_days", "last_30_days", "this_month", "total"):
+            self.assertEqual(after[window]["docs"], before[window]["docs"] + 1, window)
+        self.assertEqual(after["yesterday"]["docs"], before["yesterday"]["docs"])
+
+    def test_incremental_refresh_matches_live(self):
+        from .services.dashboard_rollups import refresh_recent_rollups, refresh_rollups
+
+        self._history()
+        refresh_rollups(days=None, now=self.now)
+
+        # Vėliau pasikeitęs statusas uždarytoje valandoje
+        doc = ScannedDocument.objects.filter(user=self.user, status="completed").order_by("-uploaded_at").first()
+        ScannedDocument.objects.filter(pk=doc.pk).update(status="rejected")
+        refresh_recent_rollups(now=self.now)
+
+        self.assertMatchesLive()
+
+    def test_without_rollups_everything_is_live(self):
+        self._history()
+        self._doc(self._partial_hour())
+        self.assertFalse(DashboardRollup.objects.exists())
+
+        self.assertMatchesLive()
+
+
+# ════════════════════════════════════════════════════════════
+# Chunked upload (services/chunked_upload.py)
+# ════════════════════════════════════════════════════════════
+
+class _ChunkedUploadMixin:
+    chunk_size = 1000
+    total_size = 10 * 1000 + 123  # paskutinis chunk'as trumpesnis
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp(prefix="test_chunks_")
+        self.media_override = override_settings(MEDIA_ROOT=self.media)
+        self.media_override.enable()
+        self.user = CustomUser.objects.create_user(email="chunks@example.com", password="x")
+        self.session = UploadSession.objects.create(user=self.user, stage="uploading")
+        self.data = os.urandom(self.total_size)
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _upload(self, sha256=""):
+        from .services.chunked_upload import create_upload, expected_chunks
+
+        return create_upload(
+            ChunkedUpload,
+            user=self.user,
+            session=self.session,
+            filename="archive.zip",
+            total_size=self.total_size,
+            chunk_size=self.chunk_size,
+            total_chunks=expected_chunks(self.total_size, self.chunk_size),
+            sha256=sha256,
+        )
+
+    def _chunk(self, upload, index):
+        from .services.chunked_upload import chunk_bounds
+
+        offset, size = chunk_bounds(upload, index)
+        return self.data[offset:offset + size]
+
+    def _send(self, upload, index):
+        from .services.chunked_upload import write_chunk
+
+        data = self._chunk(upload, index)
+        return write_chunk(upload, index, data, hashlib.sha256(data).hexdigest())
+
+    def _shuffled_with_retries(self, upload, seed=0):
+        rnd = random.Random(seed)
+        order = list(range(upload.total_chunks))
+        order += rnd.sample(order, 4)
+        rnd.shuffle(order)
+        return order
+
+    def _read_tmp(self, upload):
+        with open(upload.tmp_path, "rb") as fp:
+            return fp.read()
+
+
+class ChunkedUploadTests(_ChunkedUploadMixin, TestCase):
+
+    def test_out_of_order_chunks_with_duplicates(self):
+        from .services.chunked_upload import check_complete, received_indexes
+
+        upload = self._upload(sha256=self.sha256)
+        order = self._shuffled_with_retries(upload)
+        seen = set()
+        for index in order:
+            seen.add(index)
+            self.assertEqual(self._send(upload, index), len(seen))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.received_count, upload.total_chunks)
+        self.assertEqual(received_indexes(upload), list(range(upload.total_chunks)))
+        self.assertEqual(self._read_tmp(upload), self.data)
+        check_complete(upload)
+
+    def test_partial_bitmap(self):
+        from .services.chunked_upload import ChunkUploadError, check_complete, received_indexes
+
+        upload = self._upload()
+        for index in (9, 2, 2, 10, 0):
+            self._send(upload, index)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.received_count, 4)
+        self.assertEqual(received_indexes(upload), [0, 2, 9, 10])
+        with self.assertRaises(ChunkUploadError):
+            check_complete(upload)
+
+    def test_chunk_checksum_mismatch_keeps_received_data(self):
+        from .services.chunked_upload import ChunkUploadError, write_chunk
+
+        upload = self._upload()
+        good = self._chunk(upload, 3)
+        self._send(upload, 3)
+
+        bad = bytes(len(good))
+        with self.assertRaises(ChunkUploadError):
+            write_chunk(upload, 3, bad, hashlib.sha256(good).hexdigest())
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.received_count, 1)
+        self.assertEqual(self._read_tmp(upload)[3000:4000], good)
+
+    def test_bad_chunk_size_rejected(self):
+        from .services.chunked_upload import ChunkUploadError, write_chunk
+
+        upload = self._upload()
+        with self.assertRaises(ChunkUploadError):
+            write_chunk(upload, 0, self.data[:999])
+        with self.assertRaises(ChunkUploadError):
+            write_chunk(upload, upload.total_chunks, self.data[:123])
+
+    def test_file_checksum_mismatch(self):
+        from .services.chunked_upload import ChecksumMismatch, check_complete
+
+        upload = self._upload(sha256=hashlib.sha256(b"other").hexdigest())
+        for index in range(upload.total_chunks):
+            self._send(upload, index)
+        upload.refresh_from_db()
+
+        with self.assertRaises(ChecksumMismatch):
+            check_complete(upload)
+        # complete metu atsiųsta teisinga suma pakeičia init reikšmę
+        check_complete(upload, self.sha256)
+
+    def test_complete_view_is_idempotent(self):
+        from rest_framework.test import APIClient
+
+        upload = self._upload(sha256=self.sha256)
+        for index in self._shuffled_with_retries(upload):
+            self._send(upload, index)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("chunk_complete", args=[self.session.id, upload.id])
+
+        first = client.post(url, {}, format="json")
+        second = client.post(url, {}, format="json")
+
+        self.assertEqual(first.status_code, 200, first.data)
+        self.assertEqual(second.status_code, 200, second.data)
+        self.assertEqual(first.data["doc_id"], second.data["doc_id"])
+
+        docs = ScannedDocument.objects.filter(upload_session=self.session, is_archive_container=True)
+        self.assertEqual(docs.count(), 1)
+        with docs.get().file.open("rb") as fp:
+            self.assertEqual(fp.read(), self.data)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.uploaded_files, 1)
+        self.assertFalse(os.path.exists(upload.tmp_path))
+
+    def test_complete_view_rejects_checksum_mismatch(self):
+        from rest_framework.test import APIClient
+
+        upload = self._upload()
+        for index in range(upload.total_chunks):
+            self._send(upload, index)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("chunk_complete", args=[self.session.id, upload.id])
+        response = client.post(url, {"sha256": hashlib.sha256(b"other").hexdigest()}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+        self.assertFalse(ScannedDocument.objects.filter(upload_session=self.session).exists())
+
+
+class ParallelChunkedUploadTests(_ChunkedUploadMixin, TransactionTestCase):
+    """Lygiagretūs chunk'ai (atskiros DB jungtys) — bitmap'as be lenktynių."""
+
+    total_size = 64 * 1000 + 7
+
+    def test_parallel_out_of_order_chunks(self):
+        from .services.chunked_upload import check_complete, received_indexes
+
+        upload = self._upload(sha256=self.sha256)
+        order = self._shuffled_with_retries(upload, seed=1)
+
+        def send(index):
+            try:
+                return self._send(upload, index)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            counts = list(pool.map(send, order))
+
+        self.assertEqual(max(counts), upload.total_chunks)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received_count, upload.total_chunks)
+        self.assertEqual(received_indexes(upload), list(range(upload.total_chunks)))
+        self.assertEqual(self._read_tmp(upload), self.data)
+        check_complete(upload)
+
+
+# ════════════════════════════════════════════════════════════
+# Archyvų manifest'as (utils/file_converter.archive_manifest)
+# ════════════════════════════════════════════════════════════
+
+class ArchiveManifestTests(SimpleTestCase):
+    """archive_manifest() nariai == failai, kuriuos normalize_any tikrai apdoroja."""
+
+    MAX_SINGLE = 4000  # vietoj 50 MB — „per didelis“ narys lieka mažas
+
+    def setUp(self):
+        import io
+        from PIL import Image
+
+        self.tmpdir = tempfile.mkdtemp(prefix="test_manifest_")
+        buf = io.BytesIO()
+        Image.new("RGB", (24, 16), (200, 30, 30)).save(buf, format="PNG")
+        png = buf.getvalue()
+
+        self.members = [
+            ("docs/a.png", png),
+            ("docs/sub/b.PNG", png),
+            ("c.png", png),
+            ("__MACOSX/docs/._a.png", b"x"),     # sisteminis
+            ("docs/.hidden.png", png),          # sisteminis (taškas)
+            ("Thumbs.db", b"x"),                # sisteminis
+            ("../evil.png", png),               # nesaugus kelias
+            ("docs/../../evil2.png", png),      # nesaugus kelias
+            ("notes.txt", b"hello"),            # nepalaikomas
+            ("data.csv", b"a;b"),               # nepalaikomas
+            ("big.png", os.urandom(self.MAX_SINGLE + 1)),  # per didelis
+        ]
+        self.expected = ["c.png", "docs/a.png", "docs/sub/b.PNG"]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _zip(self):
+        import zipfile
+
+        path = os.path.join(self.tmpdir, "bundle.zip")
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("docs/", b"")  # katalogas — ne narys
+            for name, data in self.members:
+                zf.writestr(name, data)
+        return path
+
+    def _tar_gz(self):
+        import io
+        import tarfile
+
+        path = os.path.join(self.tmpdir, "bundle.tar.gz")
+        with tarfile.open(path, "w:gz") as tf:
+            info = tarfile.TarInfo("docs")
+            info.type = tarfile.DIRTYPE
+            tf.addfile(info)
+            for name, data in self.members:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+            link = tarfile.TarInfo("docs/link.png")
+            link.type = tarfile.SYMTYPE
+            link.linkname = "a.png"
+            tf.addfile(link)
+        return path
+
+    def _normalize(self, path, manifest=None):
+        """(apdoroti nariai, rezultatai) — nariai užfiksuojami per _process_archive_member."""
+        from .utils import file_converter
+
+        with open(path, "rb") as fp:
+            upload = SimpleUploadedFile(os.path.basename(path), fp.read())
+        with mock.patch.object(
+            file_converter, "_process_archive_member", wraps=file_converter._process_archive_member,
+        ) as spy:
+            results = file_converter.normalize_any(upload, manifest=manifest)
+        return sorted(call.args[1] for call in spy.call_args_list), results
+
+    def _check(self, path):
+        from .utils import file_converter
+
+        with mock.patch.object(file_converter, "MAX_SINGLE_FILE_BYTES", self.MAX_SINGLE):
+            manifest = file_converter.archive_manifest(path, os.path.basename(path))
+            names = sorted(m["name"] for m in manifest["members"])
+            self.assertEqual(names, self.expected)
+
+            for cached in (None, manifest):
+                processed, results = self._normalize(path, manifest=cached)
+                self.assertEqual(processed, names)
+                self.assertEqual(
+                    sorted(r["original_filename"] for r in results),
+                    sorted(os.path.basename(n) for n in names),
+                )
+                skipped = results[0]["_archive_skipped"]
+                self.assertEqual(skipped["unsupported"], manifest["unsupported"])
+                self.assertEqual(skipped["too_large"], manifest["too_large"])
+
+        self.assertEqual(manifest["skipped_system"], 3)
+        self.assertEqual(manifest["skipped_unsafe"], 2)
+        self.assertEqual(
+            sorted(u["name"] for u in manifest["unsupported"]), ["data.csv", "notes.txt"],
+        )
+        self.assertEqual([t["name"] for t in manifest["too_large"]], ["big.png"])
+        return manifest
+
+    def test_zip_manifest_matches_normalize(self):
+        manifest = self._check(self._zip())
+        self.assertEqual(manifest["file_count"], len(self.members))
+
+    def test_tar_gz_manifest_matches_normalize(self):
+        manifest = self._check(self._tar_gz())
+        # Katalogas ir simbolinė nuoroda — ne failai
+        self.assertEqual(manifest["file_count"], len(self.members))
+
+    def test_stale_manifest_is_ignored(self):
+        from .utils import file_converter
+
+        path = self._zip()
+        with mock.patch.object(file_converter, "MAX_SINGLE_FILE_BYTES", self.MAX_SINGLE):
+            manifest = file_converter.archive_manifest(path, "bundle.zip")
+            stale = dict(manifest, bytes=manifest["bytes"] + 1, members=[{"name": "c.png", "size": 1}])
+            processed, _ = self._normalize(path, manifest=stale)
+        self.assertEqual(processed, self.expected)
+
+
+# ════════════════════════════════════════════════════════════
+# Masinis dokumentų trynimas (services/document_purge.py)
+# ════════════════════════════════════════════════════════════
+
+class DocumentPurgeTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp(prefix="test_purge_")
+        self.media_override = override_settings(MEDIA_ROOT=self.media)
+        self.media_override.enable()
+        self.user = CustomUser.objects.create_user(email="purge@example.com", password="x")
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media, ignore_errors=True)
+
+    def _doc(self, i, **fields):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        path = default_storage.save(f"purge/doc_{i}.pdf", ContentFile(b"%PDF-1.4 test"))
+        fields.setdefault("status", "completed")
+        fields.setdefault("seller_name", f"UAB Pardavėjas {i}")
+        fields.setdefault("seller_id", f"30000000{i}")
+        fields.setdefault("buyer_name", "UAB Pirkėjas")
+        fields.setdefault("buyer_id", "300000999")
+        return ScannedDocument.objects.create(user=self.user, file=path, **fields)
+
+    def _purge(self, docs):
+        from .services.document_purge import mark_documents_for_purge, run_document_purge
+
+        job, marked, protected = mark_documents_for_purge(self.user, [d.pk for d in docs])
+        self.assertEqual((marked, protected), (len(docs), []))
+        run_document_purge(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_purge_deletes_rows_and_files(self):
+        from django.core.files.storage import default_storage
+        from .models import CreditUsageLog, LineItem
+
+        docs = [self._doc(i) for i in range(3)]
+        LineItem.objects.create(document=docs[0], prekes_pavadinimas="Prekė")
+        log = CreditUsageLog.objects.create(user=self.user, scanned_document=docs[1], credits_used=1)
+        paths = [d.file.name for d in docs]
+
+        job = self._purge(docs)
+
+        self.assertEqual(job.stage, "done", job.error_message)
+        self.assertEqual(
+            (job.total_documents, job.processed_documents, job.deleted_documents,
+             job.skipped_documents, job.failed_documents, job.deleted_files),
+            (3, 3, 3, 0, 0, 3),
+        )
+        self.assertFalse(ScannedDocument.all_objects.filter(pk__in=[d.pk for d in docs]).exists())
+        self.assertFalse(LineItem.objects.filter(document_id=docs[0].pk).exists())
+        self.assertFalse(any(default_storage.exists(p) for p in paths))
+        log.refresh_from_db()
+        self.assertTrue(log.document_deleted_by_user)
+
+    def test_purge_keeps_other_documents(self):
+        docs = [self._doc(i) for i in range(3)]
+        job = self._purge(docs[:2])
+
+        self.assertEqual(job.stage, "done", job.error_message)
+        self.assertEqual(list(ScannedDocument.objects.values_list("pk", flat=True)), [docs[2].pk])
+
+    def test_purge_updates_counterparty_directory(self):
+        from .models import UserCounterparty
+
+        docs = [self._doc(i) for i in range(3)]
+        self.assertEqual(UserCounterparty.objects.filter(user=self.user).count(), 4)
+
+        # post_delete gauna .only("id") objektus — signalas neturi jų perkrauti
+        job = self._purge(docs)
+
+        self.assertEqual(job.stage, "done", job.error_message)
+        self.assertFalse(UserCounterparty.objects.filter(user=self.user).exists())
+
+    def test_single_delete_updates_counterparty_directory(self):
+        from .models import UserCounterparty
+
+        keep, gone = self._doc(1), self._doc(2)
+        gone.delete()
+
+        keys = set(UserCounterparty.objects.filter(user=self.user).values_list("key", flat=True))
+        self.assertEqual(keys, {keep.seller_key, keep.buyer_key})
+
+
+# ════════════════════════════════════════════════════════════
+# Kelių sąskaitų subset-sum (utils/subset_sum.py)
+# ════════════════════════════════════════════════════════════
+
+class SubsetSumTests(SimpleTestCase):
+
+    def _items(self, cents):
+        from .utils.subset_sum import SubsetItem
+
+        return [SubsetItem(key=i, cents=c) for i, c in enumerate(cents)]
+
+    def _brute_force(self, items, target, tolerance, min_items, max_items):
+        """Mažiausias |nuokrypis| per leidžiamo dydžio poaibius arba None."""
+        from itertools import combinations
+
+        best = None
+        for k in range(min_items, min(max_items, len(items)) + 1):
+            for combo in combinations(items, k):
+                d = abs(sum(it.cents for it in combo) - target)
+                if d <= tolerance and (best is None or d < best):
+                    best = d
+        return best
+
+    def test_single_exact_item_does_not_hide_multi_item_match(self):
+        from .utils.subset_sum import solve_subset_sum
+
+        sol = solve_subset_sum(self._items([10000, 6000, 4003]), 10000, tolerance_cents=5)
+
+        self.assertIsNotNone(sol)
+        self.assertEqual(sorted(it.cents for it in sol.items), [4003, 6000])
+        self.assertEqual(sol.diff_cents, 3)
+        self.assertTrue(sol.exhaustive)
+
+    def test_matches_brute_force(self):
+        from .utils.subset_sum import solve_subset_sum
+
+        rnd = random.Random(37)
+        for case in range(300):
+            cents = [rnd.randint(100, 20000) for _ in range(rnd.randint(2, 10))]
+            items = self._items(cents)
+            if case % 2:
+                target = sum(rnd.sample(cents, rnd.randint(1, len(cents)))) + rnd.randint(-7, 7)
+            else:
+                target = rnd.randint(500, 60000)
+            tolerance = rnd.choice([0, 5, 50])
+            max_items = rnd.choice([None, 2, 3])
+
+            sol = solve_subset_sum(
+                items, target, tolerance_cents=tolerance, max_items=max_items, time_budget=5,
+            )
+            expected = self._brute_force(items, target, tolerance, 2, max_items or len(items))
+            msg = (cents, target, tolerance, max_items)
+            if expected is None:
+                self.assertIsNone(sol, msg)
+                continue
+            self.assertIsNotNone(sol, msg)
+            self.assertEqual(abs(sol.diff_cents), expected, msg)
+            self.assertEqual(sum(it.cents for it in sol.items), sol.total_cents, msg)
+            self.assertGreaterEqual(len(sol.items), 2, msg)
+            if max_items:
+                self.assertLessEqual(len(sol.items), max_items, msg)
+
+    def test_infeasible_without_dfs(self):
+        from .utils.subset_sum import solve_subset_sum
+
+        self.assertIsNone(solve_subset_sum(self._items([300, 500, 900]), 1000, tolerance_cents=5))
+        self.assertIsNone(solve_subset_sum(self._items([10000]), 10000, tolerance_cents=5))
+
+    def test_prefers_older_due_dates_on_tie(self):
+        from datetime import date
+        from .utils.subset_sum import SubsetItem, solve_subset_sum
+
+        items = [
+            SubsetItem(key="new_a", cents=5000, due=date(2026, 3, 1)),
+            SubsetItem(key="new_b", cents=5000, due=date(2026, 3, 2)),
+            SubsetItem(key="old_a", cents=5000, due=date(2026, 1, 1)),
+            SubsetItem(key="old_b", cents=5000, due=date(2026, 1, 2)),
+        ]
+        sol = solve_subset_sum(items, 10000, tolerance_cents=0)
+
+        self.assertEqual([it.key for it in sol.items], ["old_a", "old_b"])
+
+
+# ════════════════════════════════════════════════════════════
+# Srautinis XLSX (utils/xlsx_stream.py)
+# ════════════════════════════════════════════════════════════
+
+class StreamingXlsxTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_xlsx_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _load(self, writer):
+        from openpyxl import load_workbook
+
+        path = os.path.join(self.tmpdir, "out.xlsx")
+        writer.save(path)
+        return load_workbook(path)
+
+    def test_waybill_document_date_keeps_date_format(self):
+        from datetime import date, datetime
+        from .views import EXPORT_COLUMNS, _format_value, build_waybill_xlsx
+
+        values = {"document_number": "VZ-1", "document_date": date(2026, 3, 5), "outside_eu": True}
+        row = [_format_value(field, values.get(field)) for field, _ in EXPORT_COLUMNS]
+        ws = self._load(build_waybill_xlsx([row])).active
+
+        col = [field for field, _ in EXPORT_COLUMNS].index("document_date") + 1
+        cell = ws.cell(row=2, column=col)
+        self.assertEqual(ws.cell(row=1, column=col).value, "Data")
+        self.assertEqual(cell.value, datetime(2026, 3, 5))
+        self.assertEqual(cell.number_format, "yyyy-mm-dd")
+        self.assertEqual(cell.border.left.style, "thin")
+        self.assertEqual(ws.cell(row=2, column=1).value, "VZ-1")
+
+    def test_datetime_money_and_plain_cells(self):
+        from datetime import datetime
+        from .utils.xlsx_stream import CELL, MONEY, StreamingXlsxWriter
+
+        writer = StreamingXlsxWriter()
+        sheet = writer.add_sheet("Lapas", [("Laikas", 20), ("Suma", 12), ("Tekstas", 12)])
+        sheet.append([datetime(2026, 3, 5, 14, 30), 12.5, "x"], styles=(CELL, MONEY, CELL))
+        ws = self._load(writer)["Lapas"]
+
+        stamp, money, text = ws[2]
+        self.assertEqual(stamp.value, datetime(2026, 3, 5, 14, 30))
+        self.assertEqual(stamp.number_format, "yyyy-mm-dd h:mm:ss")
+        self.assertEqual(money.number_format, "#,##0.00")
+        self.assertEqual(text.number_format, "General")
+        self.assertTrue(ws["A1"].font.bold)
+
+
+# ════════════════════════════════════════════════════════════
+# Eilučių taisyklių variklis (utils/lineitem_rules_applier.py)
+# ════════════════════════════════════════════════════════════
+
+class LineItemRulesEngineTests(SimpleTestCase):
+    """CompiledLineItemRules parenka lygiai tą pačią taisyklę kaip select_rule_linear."""
+
+    WORDS = [
+        "pienas", "duona", "kava", "arbata", "cukrus", "miltai", "aliejus",
+        "kuras", "dyzelinas", "benzinas", "paslauga", "nuoma", "transportas",
+        "šokoladas", "sūris", "vanduo", "elektra", "šildymas", "pr", "ab", "x",
+    ]
+    CODES = ["", "", "", "111", "222", "333", "LT111", "LT222", "lt333"]
+    VAT_OPS = ["<", "<=", "=", ">=", ">"]
+    VAT_VALUES = [0, 5, 9, 21]
+
+    def _rule(self, rng, rid):
+        apply_all = rng.random() < 0.03
+        name = ""
+        if not apply_all and rng.random() < 0.6:
+            word = rng.choice(self.WORDS)
+            name = word[: rng.randint(1, len(word))] if rng.random() < 0.3 else word
+        vat = None
+        if rng.random() < 0.4:
+            vat = {"op": rng.choice(self.VAT_OPS), "value": rng.choice(self.VAT_VALUES)}
+        return {
+            "id": rid if rng.random() < 0.95 else str(rid),
+            "enabled": rng.random() < 0.9,
+            "apply_to_all": apply_all,
+            "vat_percent": vat,
+            "name_contains": name,
+            "name_contains_norm": "" if rng.random() < 0.2 else name,
+            "buyer_id": "" if apply_all else rng.choice(self.CODES),
+            "buyer_vat_code": "" if apply_all else rng.choice(self.CODES),
+            "seller_id": "" if apply_all else rng.choice(self.CODES),
+            "seller_vat_code": "" if apply_all else rng.choice(self.CODES),
+            "result_kodas": f"K{rid}",
+        }
+
+    def _line(self, rng):
+        from types import SimpleNamespace
+
+        return SimpleNamespace(
+            prekes_pavadinimas=" ".join(rng.choice(self.WORDS) for _ in range(rng.randint(0, 4))),
+            vat_percent=rng.choice([None, 0, 5, 9, 21, "21.00"]),
+        )
+
+    def assertSameSelection(self, rules, lines, party, msg):
+        from .utils.lineitem_rules_applier import (
+            CompiledLineItemRules, _sort_rules, select_rule_linear,
+        )
+
+        ordered = _sort_rules(rules)
+        matcher = CompiledLineItemRules(rules).for_document(*party)
+        for ln in lines:
+            expected = select_rule_linear(ordered, ln, *party)
+            actual = matcher.select(ln)
+            self.assertIs(
+                actual, expected,
+                f"{msg}: line={ln!r} party={party} "
+                f"expected={expected and expected.get('id')} actual={actual and actual.get('id')}",
+            )
+
+    def test_matches_linear_on_random_rules(self):
+        from .utils.lineitem_rules_applier import _norm_code
+
+        for seed in range(40):
+            rng = random.Random(seed)
+            rules = [self._rule(rng, i + 1) for i in range(rng.choice([1, 20, 300]))]
+            lines = [self._line(rng) for _ in range(50)]
+            party = [_norm_code(rng.choice(self.CODES)) for _ in range(4)]
+            self.assertSameSelection(rules, lines, party, f"seed={seed}")
+
+    def test_empty_rules(self):
+        from .utils.lineitem_rules_applier import CompiledLineItemRules
+
+        rng = random.Random(0)
+        matcher = CompiledLineItemRules([]).for_document("", "", "", "")
+        self.assertIsNone(matcher.select(self._line(rng)))
+
+
+# ════════════════════════════════════════════════════════════
+# Banko išrašų atpažinimas ir parseriai (utils/bank_statement_parcers.py)
+# ════════════════════════════════════════════════════════════
+
+BANK_STATEMENTS_DIR = os.path.join(os.path.dirname(__file__), "test_data", "bank_statements")
+
+
+class BankStatementCorpusTests(SimpleTestCase):
+    """
+    test_data/bank_statements/<bankas>/statement.<formatas> — po vieną pavyzdį
+    kiekvienam PARSER_REGISTRY raktui. Sniffer'is turi atpažinti banką pagal
+    katalogą, o parseris su sniff rezultatu — grąžinti tą patį kaip be jo.
+    """
+
+    # (data, kryptis, suma, valiuta, kontrahentas) — po vieną kiekvienai operacijai
+    EXPECTED = {
+        ("swedbank", "csv"): [
+            ("2026-03-02", "credit", "1210.50", "EUR", "UAB Alfa"),
+            ("2026-03-05", "debit", "86.20", "EUR", "UAB Beta"),
+        ],
+        ("siauliu", "csv"): [
+            ("2026-03-10", "debit", "45.00", "EUR", "Šiaulių UAB Gama"),
+            ("2026-03-11", "credit", "300.00", "EUR", "MB Delta"),
+        ],
+        ("seb", "csv"): [
+            ("2026-03-03", "debit", "562.78", "EUR", "Facebook Ireland Ltd"),
+            ("2026-03-04", "credit", "1500.00", "EUR", "UAB Epsilon"),
+        ],
+        ("luminor", "csv"): [
+            ("2026-03-07", "credit", "250.00", "EUR", "UAB Zeta"),
+            ("2026-03-08", "debit", "19.99", "EUR", "UAB Eta"),
+        ],
+        ("revolut", "csv"): [
+            ("2026-03-03", "debit", "7.50", "EUR", "Bolt"),
+            ("2026-03-04", "credit", "500.00", "EUR", "Payment from UAB Theta"),
+        ],
+        ("paypal", "xlsx"): [
+            ("2026-03-02", "credit", "49.90", "EUR", "John Buyer"),
+            ("2026-03-03", "debit", "100.00", "USD", "Supplier Ltd"),
+        ],
+    }
+    CAMT = [
+        ("2026-03-02", "credit", "1210.50", "EUR", "UAB Alfa"),
+        ("2026-03-05", "debit", "86.20", "EUR", "UAB Beta"),
+    ]
+
+    def _corpus(self):
+        for bank in sorted(os.listdir(BANK_STATEMENTS_DIR)):
+            bank_dir = os.path.join(BANK_STATEMENTS_DIR, bank)
+            for name in sorted(os.listdir(bank_dir)):
+                yield bank, os.path.splitext(name)[1].lstrip("."), os.path.join(bank_dir, name)
+
+    def test_every_registered_parser_has_a_sample(self):
+        from .utils.bank_statement_parcers import PARSER_REGISTRY
+
+        self.assertEqual(
+            {(bank, fmt) for bank, fmt, _ in self._corpus()}, set(PARSER_REGISTRY),
+        )
+
+    def test_sniffer_and_parsers(self):
+        from decimal import Decimal
+        from .utils.bank_statement_parcers import get_parser, sniff_statement
+
+        for bank, fmt, path in self._corpus():
+            with self.subTest(path=os.path.relpath(path, BANK_STATEMENTS_DIR)):
+                with open(path, "rb") as fh:
+                    content = fh.read()
+
+                sniff = sniff_statement(content)
+                self.assertEqual((sniff.bank, sniff.file_format), (bank, fmt))
+
+                with_sniff = get_parser(sniff.bank, sniff.file_format, sniff=sniff).parse(content)
+                plain = get_parser(bank, fmt).parse(content)
+                self.assertEqual(with_sniff, plain)
+
+                expected = self.CAMT if fmt == "xml" else self.EXPECTED[(bank, fmt)]
+                self.assertEqual(
+                    [
+                        (t["transaction_date"].isoformat(), t["direction"], t["amount"],
+                         t["currency"], t["counterparty_name"])
+                        for t in with_sniff
+                    ],
+                    [(d, direction, Decimal(amount), ccy, name) for d, direction, amount, ccy, name in expected],
+                )
+
+    def test_manual_bank_choice_ignores_sniffed_layout(self):
+        from .utils.bank_statement_parcers import get_parser, sniff_statement
+
+        with open(os.path.join(BANK_STATEMENTS_DIR, "seb", "statement.csv"), "rb") as fh:
+            content = fh.read()
+        sniff = sniff_statement(content)
+
+        # Vartotojas pasirinko Swedbank — SEB antraštės eilutė / separatorius neperduodami
+        parser = get_parser("swedbank", "csv", sniff=sniff)
+        self.assertIsNone(parser.sniff.header_row)
+        self.assertIsNone(parser.sniff.separator)
+        self.assertEqual(parser.sniff.text, sniff.text)
+
+
+# ════════════════════════════════════════════════════════════
+# Kandidatų blocking (utils/transaction_signals.CandidateBlockingIndex)
+# ════════════════════════════════════════════════════════════
+
+class CandidateBlockingTests(SimpleTestCase):
+    """Shortlist'as nepraranda nė vieno kandidato, kurį randa pilnas perėjimas."""
+
+    SELLERS = [
+        ("UAB Alfa", "111111111"), ("UAB Beta", "222222222"), ("Upwork Global Inc", ""),
+        ("Facebook Ireland Limited", ""), ("Hetzner Online GmbH", ""), ("AB Gama", "333333333"),
+        ("Shopify International", ""), ("MB Delta", "444444444"),
+    ]
+    CURRENCIES = ["EUR", "EUR", "EUR", "USD"]
+    N_CODES = 200
+
+    def _candidate(self, rng, pos):
+        from datetime import date
+        from decimal import Decimal
+
+        name, code = rng.choice(self.SELLERS)
+        if code and rng.random() < 0.7:
+            code = str(100000000 + rng.randrange(self.N_CODES))
+        amount = Decimal(rng.randint(100, 500000)) / 100
+        remaining = amount if rng.random() < 0.8 else (amount / 2).quantize(Decimal("0.01"))
+        inv_date = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+        series = rng.choice(["SF", "T", "PVM", ""])
+        number = str(rng.randrange(10 ** rng.randint(3, 9)))
+        return {
+            "id": pos + 1,
+            "full_number": f"{series}{number}",
+            "series": series,
+            "number": number,
+            "amount": amount,
+            "remaining": remaining,
+            "currency": rng.choice(self.CURRENCIES),
+            "seller_name": name,
+            "seller_norm": name.lower(),
+            "seller_code": code,
+            "seller_iban": f"LT{rng.randrange(50):018d}" if rng.random() < 0.3 else "",
+            "invoice_date": inv_date,
+            "due_date": inv_date + timedelta(days=rng.choice([0, 14, 30])) if rng.random() < 0.7 else None,
+        }
+
+    def _signals(self, rng, candidates):
+        from decimal import Decimal
+        from .utils.transaction_signals import ExtractedReference, TransactionSignals
+
+        base = rng.choice(candidates)
+        s = TransactionSignals(txn_type=rng.choice(["bank_transfer", "card_direct", "card_clearing"]))
+        s.bank_currency = rng.choice([base["currency"], "EUR"])
+        s.bank_amount = base["remaining"] if rng.random() < 0.5 else Decimal(rng.randint(100, 500000)) / 100
+        if rng.random() < 0.1:
+            s.is_cross_currency = True
+            s.original_currency = "USD"
+            s.original_amount = s.bank_amount
+            s.settled_amount = (s.bank_amount * Decimal("0.92")).quantize(Decimal("0.01"))
+        if rng.random() < 0.4:
+            ref = base["full_number"] if rng.random() < 0.5 else base["number"]
+            if rng.random() < 0.3:
+                ref = ref[1:]
+            if len(ref) >= 3:
+                s.references = [ExtractedReference(ref, ref.upper(), "purpose", rng.choice(["high", "medium"]))]
+        if rng.random() < 0.3:
+            s.counterparty_code = base["seller_code"] or str(100000000 + rng.randrange(self.N_CODES))
+        if rng.random() < 0.2:
+            s.counterparty_iban = base["seller_iban"]
+        s.counterparty_name = rng.choice(self.SELLERS)[0] if rng.random() < 0.7 else ""
+        s.merchant_name_clean = s.counterparty_name.split()[-1] if s.counterparty_name else ""
+        s.merchant_keywords = [w.lower() for w in s.merchant_name_clean.split()]
+        txn_date = base["invoice_date"] + timedelta(days=rng.randint(-10, 250))
+        setattr(s, "_txn_date", txn_date)
+        return s, txn_date
+
+    def _best(self, scored, threshold):
+        best = best_score = None
+        for c, score in scored:
+            if score >= threshold and (best_score is None or score > best_score):
+                best, best_score = c, score
+        return best
+
+    def test_shortlist_keeps_every_exhaustive_match(self):
+        from .models import normalize_name
+        from .utils.purchase_matching_signals import LIKELY_THRESHOLD
+        from .utils.transaction_signals import (
+            BLOCKING_MAX_MISSED_SCORE, CandidateBlockingIndex, score_with_signals,
+        )
+
+        matches = 0
+        for seed in range(3):
+            rng = random.Random(seed)
+            candidates = [self._candidate(rng, i) for i in range(400)]
+            index = CandidateBlockingIndex(candidates)
+
+            for n in range(60):
+                signals, txn_date = self._signals(rng, candidates)
+                full = [(c, score_with_signals(signals, c, normalize_name)[0]) for c in candidates]
+                short = index.shortlist(signals, txn_date)
+                msg = f"seed={seed} txn={n}"
+
+                # Pradinė tvarka išlaikoma (lygių balų tvarka nesikeičia)
+                positions = [c["id"] for c in short]
+                self.assertEqual(positions, sorted(positions), msg)
+
+                short_ids = {c["id"] for c in short}
+                missed = [
+                    (c["id"], score) for c, score in full
+                    if score > BLOCKING_MAX_MISSED_SCORE and c["id"] not in short_ids
+                ]
+                self.assertEqual(missed, [], msg)
+
+                blocked = [(c, score_with_signals(signals, c, normalize_name)[0]) for c in short]
+                best = self._best(full, LIKELY_THRESHOLD)
+                self.assertIs(self._best(blocked, LIKELY_THRESHOLD), best, msg)
+                matches += best is not None
+
+        # Generatorius turi duoti ir realių atitikmenų, ne vien „nieko nerasta“
+        self.assertGreater(matches, 20)
+
+
+# ════════════════════════════════════════════════════════════
+# Incremental matching == pilnas paleidimas (utils/incremental_matching.py)
+# ════════════════════════════════════════════════════════════
+
+@override_settings(INCREMENTAL_MATCHING_ENABLED=True)
+class IncrementalMatchingTests(TestCase):
+
+    def setUp(self):
+        from .models import CompanyProfile
+
+        self.user = CustomUser.objects.create_user(email="incmatch@example.com", password="x")
+        self.profile = CompanyProfile.objects.create(user=self.user, name="UAB Mūsų įmonė")
+        self.day = timezone.localdate() - timedelta(days=20)
+
+    def _invoice(self, i, amount):
+        from .models import Invoice
+
+        return Invoice.objects.create(
+            user=self.user, company_profile=self.profile,
+            invoice_type="pvm_saskaita", status="issued",
+            document_series="INC", document_number=f"{i:04d}",
+            buyer_name=f"UAB Pirkėjas {i}", buyer_id=f"30010000{i}",
+            invoice_date=self.day, amount_with_vat=Decimal(amount),
+        )
+
+    def _purchase(self, i, amount):
+        from .models import Purchase
+
+        return Purchase.objects.create(
+            user=self.user, company_profile=self.profile,
+            document_series="TK", document_number=f"{i:04d}",
+            seller_name=f"UAB Tiekėjas {i}", seller_id=f"30020000{i}",
+            invoice_date=self.day, amount_with_vat=Decimal(amount),
+        )
+
+    def _txn(self, Model, i, amount, name, code, purpose):
+        return Model.objects.create(
+            user=self.user, company_profile=self.profile, source="bank_import",
+            transaction_date=self.day + timedelta(days=3), amount=Decimal(amount),
+            counterparty_name=name, counterparty_code=code,
+            payment_purpose=purpose, doc_number=f"T{i}",
+        )
+
+    def _full_run(self):
+        from .utils.incremental_matching import unmatched_for_matching
+        from .utils.payment_invoice_matching import InvoiceMatchingEngine
+        from .utils.purchase_matching_signals import SignalPurchaseMatchingEngine
+
+        for Engine, direction in (
+            (InvoiceMatchingEngine, "incoming"),
+            (SignalPurchaseMatchingEngine, "outgoing"),
+        ):
+            engine = Engine(self.user)
+            engine.apply_results(engine.match_transactions(unmatched_for_matching(self.user, direction)))
+
+    def _state(self):
+        from .models import IncomingTransaction, OutgoingTransaction, PaymentAllocation
+
+        return (
+            sorted(
+                PaymentAllocation.objects.values_list(
+                    "incoming_transaction_id", "outgoing_transaction_id",
+                    "invoice_id", "purchase_id", "amount", "status",
+                ),
+                key=repr,
+            ),
+            sorted(IncomingTransaction.objects.filter(user=self.user).values_list("id", "match_status")),
+            sorted(OutgoingTransaction.objects.filter(user=self.user).values_list("id", "match_status")),
+        )
+
+    def test_edits_match_full_rerun(self):
+        from django.db import transaction as db_transaction
+        from .models import IncomingTransaction, MatchingChange, OutgoingTransaction, PaymentAllocation
+        from .utils.incremental_matching import process_matching_changes
+
+        invoices = [self._invoice(i, amount) for i, amount in enumerate(("100.00", "250.00", "80.00", "300.00"))]
+        purchases = [self._purchase(i, amount) for i, amount in enumerate(("120.00", "45.50", "990.00"))]
+        PaymentAllocation.objects.create(
+            invoice=invoices[3], source="manual", status="manual",
+            amount=Decimal("200.00"), payment_date=self.day,
+        )
+        for inv in (invoices[0], invoices[2]):
+            self._txn(IncomingTransaction, inv.pk, inv.amount_with_vat, inv.buyer_name, inv.buyer_id, f"Apmokėjimas pagal {inv.full_number}")
+        for p in purchases[:2]:
+            self._txn(OutgoingTransaction, p.pk, p.amount_with_vat, p.seller_name, p.seller_id, f"Sąskaita TK{p.document_number}")
+        # Redaguojamų dokumentų operacijos be numerio — iki pakeitimo sumos
+        # nesutampa, todėl pilnas paleidimas jas palieka unmatched
+        self._txn(IncomingTransaction, 101, "275.00", invoices[1].buyer_name, "", "Už paslaugas")
+        self._txn(IncomingTransaction, 103, "150.00", invoices[3].buyer_name, "", "Už paslaugas")
+        self._txn(OutgoingTransaction, 102, "1200.00", "Mokėjimų agentas", purchases[2].seller_id, "Už prekes")
+
+        self._full_run()
+        MatchingChange.objects.all().delete()
+        before = self._state()
+
+        # Sąskaita, pirkimas ir alokacija keičiami per save() — į eilę rašo signals.py
+        invoices[1].amount_with_vat = Decimal("275.00")
+        invoices[1].save()
+        purchases[2].amount_with_vat = Decimal("1200.00")
+        purchases[2].save()
+        alloc = PaymentAllocation.objects.get(invoice=invoices[3], source="manual")
+        alloc.amount = Decimal("150.00")
+        alloc.save()
+        self.assertEqual(
+            set(MatchingChange.objects.values_list("kind", flat=True)),
+            {MatchingChange.Kind.INVOICE, MatchingChange.Kind.PURCHASE},
+        )
+
+        with db_transaction.atomic():
+            self._full_run()
+            full = self._state()
+            db_transaction.set_rollback(True)
+
+        stats = process_matching_changes(self.user)
+
+        self.assertEqual(self._state(), full)
+        # Visi trys pakeitimai turi įjungti po naują atitikmenį
+        self.assertEqual(len(full[0]) - len(before[0]), 3)
+        self.assertEqual(stats["matched"], 3)
+
+
+# ════════════════════════════════════════════════════════════
+# Perkėlimas į apskaitą (services/accounting_transfer_job.py)
+# ════════════════════════════════════════════════════════════
+
+class AccountingTransferJobTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import CompanyProfile
+
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="transfer@example.com", password="x")
+        self.profile = CompanyProfile.objects.create(
+            user=self.user, name="UAB Mūsų įmonė", company_code="300000111", vat_code="LT300000111",
+        )
+        self.docs = [
+            self._doc(1, buyer_id="300000111", seller_id="300000201", seller_name="UAB Tiekėjas"),
+            self._doc(2, seller_id="300000111", buyer_id="300000301", buyer_name="UAB Pirkėjas",
+                      document_series="MUS", document_number="101"),
+            self._doc(3, buyer_id="300000111", seller_id="300000202", seller_name="UAB Kitas tiekėjas"),
+            # Tas pats numeris kaip 2 — antrasis praleidžiamas jau plane
+            self._doc(4, seller_id="300000111", buyer_id="300000302", buyer_name="UAB Kitas pirkėjas",
+                      document_series="MUS", document_number="101"),
+            self._doc(5, seller_id="300000111", buyer_id="300000303", buyer_name="UAB Trečias pirkėjas"),
+            self._doc(6, seller_id="300000901", buyer_id="300000902"),
+        ]
+        self.doc_ids = [d.pk for d in self.docs]
+
+    def _doc(self, i, **fields):
+        fields.setdefault("status", "completed")
+        fields.setdefault("document_number", f"P-{i}")
+        return ScannedDocument.objects.create(
+            user=self.user, file=f"transfer/doc_{i}.pdf", original_filename=f"doc_{i}.pdf",
+            invoice_date=timezone.localdate() - timedelta(days=10), currency="EUR",
+            amount_wo_vat=Decimal("100.00"), vat_percent=Decimal("21"), vat_amount=Decimal("21.00"),
+            amount_with_vat=Decimal("121.00"), **fields,
+        )
+
+    def _ctx(self):
+        from .services.accounting_transfer_job import TransferContext
+
+        return TransferContext(self.user, self.profile)
+
+    def _transfer(self):
+        from .services.accounting_transfer_job import create_transfer_job, run_transfer_job
+
+        job = create_transfer_job(self._ctx(), self.doc_ids)
+        return run_transfer_job(job.pk)
+
+    def test_preview_equals_run(self):
+        from .models import Invoice, JournalEntry, Purchase
+        from .services.accounting_transfer_job import preview_transfer
+
+        preview = preview_transfer(self._ctx(), self.doc_ids)
+        self.assertEqual((Purchase.objects.count(), Invoice.objects.count()), (0, 0))
+
+        job = self._transfer()
+
+        self.assertEqual(job.stage, "done", job.error)
+        self.assertEqual(preview["purchase_count"], len(job.created_purchases))
+        self.assertEqual(preview["sale_count"], len(job.created_sales))
+        self.assertEqual(preview["skipped"], job.skipped)
+        self.assertEqual((preview["purchase_count"], preview["sale_count"], len(preview["skipped"])), (2, 2, 2))
+
+        self.assertEqual(
+            set(Purchase.objects.values_list("scanned_document_id", flat=True)),
+            {self.docs[0].pk, self.docs[2].pk},
+        )
+        self.assertEqual(
+            set(Invoice.objects.values_list("scanned_document_id", flat=True)),
+            {self.docs[1].pk, self.docs[4].pk},
+        )
+        # DK įrašai sukurti chunk'o batch'u
+        self.assertEqual(
+            set(JournalEntry.objects.filter(source_type=JournalEntry.SOURCE_SALE).values_list("invoice_id", flat=True)),
+            set(job.created_sales),
+        )
+
+    def test_rerun_creates_nothing(self):
+        from .models import Invoice, JournalEntry, Purchase
+        from .services.accounting_transfer_job import preview_transfer
+
+        first = self._transfer()
+        counts = (Purchase.objects.count(), Invoice.objects.count(), JournalEntry.objects.count())
+
+        preview = preview_transfer(self._ctx(), self.doc_ids)
+        second = self._transfer()
+
+        self.assertEqual(second.stage, "done", second.error)
+        self.assertEqual((second.created_purchases, second.created_sales), ([], []))
+        self.assertEqual((preview["purchase_count"], preview["sale_count"]), (0, 0))
+        self.assertEqual(preview["skipped"], second.skipped)
+        self.assertEqual(len(second.skipped), len(self.doc_ids))
+        self.assertEqual((Purchase.objects.count(), Invoice.objects.count(), JournalEntry.objects.count()), counts)
+        self.assertEqual(len(first.created_purchases) + len(first.created_sales), 4)
+
+    def test_status_resumes_stale_job(self):
+        from rest_framework.test import APIClient
+        from .models import AccountingTransferJob, Purchase
+        from .services.accounting_transfer_job import (
+            ACTION_SKIP, create_transfer_job, plan_transfer, run_transfer_job,
+        )
+        from .tasks import accounting_transfer_task
+
+        # Worker'is nutrūko po plano: PROCESSING, nė vienas chunk'as neįvykdytas
+        job = create_transfer_job(self._ctx(), self.doc_ids)
+        AccountingTransferJob.objects.filter(pk=job.pk).update(
+            stage=AccountingTransferJob.Stage.PROCESSING,
+            plan=plan_transfer(self._ctx(), self.doc_ids),
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("transfer-job-status", args=[job.pk])
+
+        with override_settings(ACCOUNTING_TRANSFER_STALE_SECONDS=600), mock.patch.object(
+            accounting_transfer_task, "delay", side_effect=run_transfer_job,
+        ) as delay:
+            fresh = client.get(url)
+            self.assertEqual(fresh.data["stage"], "processing")
+            delay.assert_not_called()
+
+            AccountingTransferJob.objects.filter(pk=job.pk).update(
+                updated_at=timezone.now() - timedelta(seconds=601),
+            )
+            client.get(url)
+            delay.assert_called_once_with(job.pk)
+
+            # Kol galioja resume lock'as, antrą kartą nepaleidžiama
+            AccountingTransferJob.objects.filter(pk=job.pk).update(
+                stage=AccountingTransferJob.Stage.PROCESSING,
+                updated_at=timezone.now() - timedelta(seconds=601),
+            )
+            client.get(url)
+            self.assertEqual(delay.call_count, 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.processed_documents, len(self.doc_ids))
+        self.assertEqual(
+            len(job.created_purchases) + len(job.created_sales),
+            sum(1 for p in job.plan if p["action"] != ACTION_SKIP),
+        )
+        self.assertEqual(Purchase.objects.filter(scanned_document_id__in=self.doc_ids).count(), 2)
+
+
+# ════════════════════════════════════════════════════════════
+# Skolų žiniaraštis (services/debts_ledger.py)
+# ════════════════════════════════════════════════════════════
+
+class DebtsLedgerTests(TestCase):
+
+    def setUp(self):
+        from .models import CompanyProfile
+        from .services.debts_ledger import previous_month_end
+
+        self.user = CustomUser.objects.create_user(email="debts@example.com", password="x")
+        self.profile = CompanyProfile.objects.create(user=self.user, name="UAB Mūsų įmonė")
+        self.as_of = previous_month_end()
+        self.invoices = [
+            self._invoice(i, days_before, amount)
+            for i, (days_before, amount) in enumerate((
+                (5, "121.00"), (5, "300.00"), (5, "50.00"), (40, "80.00"),
+                (75, "1000.00"), (120, "15.50"), (40, "60.00"),
+            ))
+        ]
+        # Vienas pirkėjas su dviem sąskaitomis
+        self.invoices.append(self._invoice(1, 100, "20.00"))
+
+    def _invoice(self, i, days_before, amount):
+        from .models import Invoice
+
+        day = self.as_of - timedelta(days=days_before)
+        return Invoice.objects.create(
+            user=self.user, company_profile=self.profile,
+            invoice_type="pvm_saskaita", status="issued",
+            document_series="SK", document_number=f"{Invoice.objects.count() + 1:04d}",
+            buyer_name=f"UAB Pirkėjas {i}", buyer_id=f"30030000{i}",
+            invoice_date=day, due_date=day + timedelta(days=14), amount_with_vat=Decimal(amount),
+        )
+
+    def _pay(self, invoice, amount, day):
+        from .models import PaymentAllocation
+
+        return PaymentAllocation.objects.create(
+            invoice=invoice, source="manual", status="manual", amount=Decimal(amount), payment_date=day,
+        )
+
+    def _all_pages(self, as_of, limit):
+        from .services.debts_ledger import decode_cursor, ledger_page
+
+        rows, cursor = [], None
+        while True:
+            page = ledger_page(self.profile, "customer", as_of, cursor=decode_cursor(cursor), limit=limit)
+            rows += page["results"]
+            self.assertEqual(page["has_more"], page["next_cursor"] is not None)
+            if not page["has_more"]:
+                return rows
+            self.assertEqual(len(page["results"]), limit)
+            cursor = page["next_cursor"]
+
+    def test_keyset_paging_matches_single_page(self):
+        from .services.debts_ledger import ledger_page
+
+        full = ledger_page(self.profile, "customer", self.as_of, limit=100)["results"]
+        self.assertEqual(len(full), 7)
+        for limit in (1, 2, 3):
+            self.assertEqual(self._all_pages(self.as_of, limit), full, limit)
+
+        # newest_invoice_date DESC, lygiems — kodas ASC (trys pirkėjai su ta pačia data)
+        order = [(-date.fromisoformat(r["newest_invoice_date"]).toordinal(), r["counterparty_code"]) for r in full]
+        self.assertEqual(order, sorted(order))
+
+    def test_allocation_after_as_of_is_ignored(self):
+        from .services.debts_ledger import ledger_page
+
+        inv = self.invoices[0]
+        self._pay(inv, "21.00", self.as_of)
+        self._pay(inv, "100.00", self.as_of + timedelta(days=1))
+
+        def row(as_of):
+            rows = ledger_page(self.profile, "customer", as_of, limit=100)["results"]
+            return next((r for r in rows if r["counterparty_code"] == inv.buyer_id), None)
+
+        before = row(self.as_of)
+        self.assertEqual(Decimal(before["total_paid"]), Decimal("21.00"))
+        self.assertEqual(Decimal(before["balance"]), Decimal("100.00"))
+        self.assertEqual(before["payment_status"], "partially_paid")
+        # Po antro mokėjimo sąskaita apmokėta — kontrahento sąraše nebėra
+        self.assertIsNone(row(self.as_of + timedelta(days=1)))
+
+    def test_snapshot_equals_live(self):
+        from .models import DebtSnapshot
+        from .services.debts_ledger import build_debt_snapshot, ledger_page
+
+        self._pay(self.invoices[4], "400.00", self.as_of - timedelta(days=10))
+        self._pay(self.invoices[4], "100.00", self.as_of + timedelta(days=1))
+
+        live = ledger_page(self.profile, "customer", self.as_of, limit=100)
+        self.assertEqual(live["source"], "live")
+        self.assertEqual(build_debt_snapshot(self.profile, "customer", self.as_of), 7)
+
+        snap = ledger_page(self.profile, "customer", self.as_of, limit=100)
+        self.assertEqual(snap["source"], "snapshot")
+        self.assertEqual(snap["results"], live["results"])
+        self.assertEqual(snap["summary"], live["summary"])
+        self.assertEqual(self._all_pages(self.as_of, 3), snap["results"])
+
+        # Alokacija iki as_of per save() — kopija ištrinama, vėl skaičiuojama gyvai
+        self._pay(self.invoices[2], "10.00", self.as_of - timedelta(days=1))
+        self.assertFalse(DebtSnapshot.objects.filter(company_profile=self.profile).exists())
+        self.assertEqual(ledger_page(self.profile, "customer", self.as_of)["source"], "live")
+
+
+# ════════════════════════════════════════════════════════════
+# Išsaugoti operacijų signalai (utils/transaction_signals.py)
+# ════════════════════════════════════════════════════════════
+
+class TransactionSignalsRecordTests(TestCase):
+
+    def setUp(self):
+        from .models import IncomingTransaction, OutgoingTransaction
+
+        self.user = CustomUser.objects.create_user(email="signals@example.com", password="x")
+        common = dict(
+            user=self.user, source="bank_import", transaction_date=timezone.localdate(),
+            amount=Decimal("36.30"), currency="EUR",
+        )
+        self.outgoing = OutgoingTransaction.objects.create(
+            counterparty_name="UAB Tiekėjas", payment_purpose="Apmokėjimas pagal sąskaitą TK-1001", **common,
+        )
+        self.incoming = IncomingTransaction.objects.create(
+            counterparty_name="UAB Pirkėjas", payment_purpose="SF MUS-55", **common,
+        )
+
+    def _load(self, txns):
+        """(signalai, kiek operacijų ištraukta iš naujo)."""
+        from .utils import transaction_signals
+
+        with mock.patch.object(
+            transaction_signals, "extract_signals", wraps=transaction_signals.extract_signals,
+        ) as extract:
+            out = transaction_signals.load_signals(txns)
+        return out, extract.call_count
+
+    def test_fresh_records_are_reused(self):
+        from .models import TransactionSignalsRecord
+        from .utils.transaction_signals import SIGNALS_VERSION, signals_source_hash
+
+        txns = [self.outgoing, self.incoming]
+        first, extracted = self._load(txns)
+        self.assertEqual(extracted, 2)
+
+        self.assertEqual(TransactionSignalsRecord.objects.count(), 2)
+        for txn in txns:
+            record = txn.signals_record
+            self.assertEqual(record.version, SIGNALS_VERSION)
+            self.assertEqual(record.source_hash, signals_source_hash(txn))
+
+        second, extracted = self._load(txns)
+        self.assertEqual(extracted, 0)
+        for txn in txns:
+            self.assertEqual(second[txn].merchant_name_clean, first[txn].merchant_name_clean)
+            self.assertEqual(second[txn].references, first[txn].references)
+
+    def test_old_version_is_reextracted(self):
+        from .models import TransactionSignalsRecord
+        from .utils.transaction_signals import SIGNALS_VERSION
+
+        self._load([self.outgoing, self.incoming])
+        TransactionSignalsRecord.objects.filter(outgoing_transaction=self.outgoing).update(
+            version=SIGNALS_VERSION - 1, merchant_name_clean="pasenęs",
+        )
+
+        out, extracted = self._load([self.outgoing, self.incoming])
+
+        self.assertEqual(extracted, 1)
+        self.assertNotEqual(out[self.outgoing].merchant_name_clean, "pasenęs")
+        record = TransactionSignalsRecord.objects.get(outgoing_transaction=self.outgoing)
+        self.assertEqual(record.version, SIGNALS_VERSION)
+        self.assertEqual(record.merchant_name_clean, out[self.outgoing].merchant_name_clean)
+        self.assertEqual(TransactionSignalsRecord.objects.count(), 2)
+
+    def test_changed_transaction_is_reextracted(self):
+        from .models import TransactionSignalsRecord
+        from .utils.transaction_signals import signals_source_hash
+
+        self._load([self.outgoing])
+        old_hash = TransactionSignalsRecord.objects.get(outgoing_transaction=self.outgoing).source_hash
+
+        self.outgoing.counterparty_name = "UAB Naujas tiekėjas"
+        self.outgoing.save()
+        out, extracted = self._load([self.outgoing])
+
+        self.assertEqual(extracted, 1)
+        record = TransactionSignalsRecord.objects.get(outgoing_transaction=self.outgoing)
+        self.assertNotEqual(record.source_hash, old_hash)
+        self.assertEqual(record.source_hash, signals_source_hash(self.outgoing))
+        self.assertEqual(record.merchant_name_raw, out[self.outgoing].merchant_name_raw)
+        self.assertIn("Naujas", record.merchant_name_raw)
+
+    def test_exactly_one_transaction_link(self):
+        from django.db import IntegrityError, transaction as db_transaction
+        from .models import TransactionSignalsRecord
+
+        for links in ({}, {"incoming_transaction": self.incoming, "outgoing_transaction": self.outgoing}):
+            with self.subTest(links=sorted(links)), self.assertRaises(IntegrityError):
+                with db_transaction.atomic():
+                    TransactionSignalsRecord.objects.create(user=self.user, **links)
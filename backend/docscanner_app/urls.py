@@ -28,6 +28,7 @@ from .views import (
     InlineLineUpdateView,
     ScannedDocumentViewSet,
     admin_users_simple,
+    admin_rate_limits,
     contact_form,
     DinetaSettingsView,
     OptimumSettingsView,
@@ -99,7 +100,7 @@ from .views import (
     SVSReportGenerateView, 
     SVSReportExportView,
     CompanyProfileViewSet,
-    PurchaseViewSet, transfer_to_accounting,
+    PurchaseViewSet, transfer_to_accounting, transfer_job_status,
     OperacijosViewSet,
     apskaita_skolos,
     apskaita_skolos_invoices,
@@ -223,6 +224,7 @@ urlpatterns = [
     path('documents/<int:pk>/', get_document_detail, name='get_document_detail'),
     path('documents/<int:pk>/lineitems/', get_document_lineitems, name='get_document_lineitems'),
     path('documents/bulk-delete/', bulk_delete_documents, name='bulk_delete_documents'),
+    path('documents/purge-jobs/<int:job_id>/', views.document_purge_status, name='document_purge_status'),
 
     path('download/apskaita5-adapter/', download_apskaita5_adapter, name='download_apskaita5_adapter'),
 
@@ -272,6 +274,7 @@ urlpatterns = [
 
     path('data/import-products/', import_products_view, name='import_products_view'),
     path('data/import-clients/', import_clients_view, name='import_clients_view'),
+    path('data/import-status/<int:session_id>/', views.data_import_status, name='data_import_status'),
 
     path("data/export-products/", views.export_products_view),
     path("data/delete-products/", views.delete_all_products_view),
@@ -401,6 +404,7 @@ urlpatterns = [
     path('superuser/dashboard-stats/', superuser_dashboard_stats, name="superuser_dashboard_stats"),
     path('admin/visi-failai/', admin_all_documents, name='admin_all_documents'),
     path("admin/users/", admin_users_simple, name="admin_users_simple"),
+    path("admin/rate-limits/", admin_rate_limits, name="admin_rate_limits"),
     path("admin/vaztarasciai/", admin_all_waybills, name="admin-all-waybills"),
     path("admin/newsletter/", NewsletterSendView.as_view(), name="newsletter-send"),
 
@@ -604,6 +608,7 @@ urlpatterns = [
     path('svs-report/export/', SVSReportExportView.as_view()),
 
     path("accounting/transfer/", transfer_to_accounting, name="transfer-to-accounting"),
+    path("accounting/transfer/jobs/<int:job_id>/", transfer_job_status, name="transfer-job-status"),
     path("purchases/<int:purchase_id>/line-items/", PurchaseLineItemsListView.as_view()),
     path("purchases/<int:purchase_id>/inline/", PurchaseInlineDocUpdateView.as_view()),
     path("purchases/<int:purchase_id>/line-items/<int:line_id>/inline/", PurchaseInlineLineUpdateView.as_view()),
@@ -7,26 +7,54 @@
   payment_purpose, reference_number, amount (positive), currency, direction
 """
 
+import codecs
 import csv
 import io
 import logging
 import re
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
 from datetime import date, datetime
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
 from typing import BinaryIO, Optional, Union
 from xml.etree import ElementTree as ET
 
 logger = logging.getLogger("docscanner_app")
 
+ENCODINGS = ("utf-8-sig", "utf-8", "windows-1257", "iso-8859-13", "latin-1")
+
 
 class BaseBankParser(ABC):
     bank_name: str = ""
 
+    def __init__(self, sniff: Optional["StatementSniff"] = None):
+        # sniff_statement() rezultatas: jei perduotas, failas nebededukuojamas
+        # ir separatorius / antraštės eilutė nebeieškomi iš naujo
+        self.sniff = sniff
+
     @abstractmethod
     def parse(self, file_content: Union[bytes, BinaryIO]) -> list[dict]:
         pass
 
+    def iter_transactions(self, file_content):
+        """
+        Generatorius. Pagal nutylėjimą — tiesiog parse() rezultatas;
+        srautiniai parseriai (ISO20022Parser) jį perrašo.
+        """
+        yield from self.parse(file_content)
+
+    def iter_chunks(self, file_content, chunk_size: int = 1000):
+        """Operacijos ribotais sąrašais po chunk_size (importui dalimis)."""
+        chunk = []
+        for txn in self.iter_transactions(file_content):
+            chunk.append(txn)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     def _to_bytes(self, file_content) -> bytes:
         if isinstance(file_content, bytes):
             return file_content
@@ -59,13 +87,28 @@ class BaseBankParser(ABC):
             return None
 
     def _detect_encoding(self, raw: bytes) -> str:
-        for enc in ("utf-8-sig", "utf-8", "windows-1257", "iso-8859-13", "latin-1"):
-            try:
-                raw.decode(enc)
-                return enc
-            except (UnicodeDecodeError, LookupError):
-                continue
-        return "utf-8"
+        return detect_encoding(raw)
+
+    def _decode_text(self, raw: bytes) -> tuple[str, str]:
+        """(encoding, text). Jei sniffer'is jau dekodavo failą — naudojam jo rezultatą."""
+        if self.sniff is not None and self.sniff.text is not None:
+            return self.sniff.encoding, self.sniff.text
+        encoding = self._detect_encoding(raw)
+        return encoding, raw.decode(encoding)
+
+    def _csv_separator(self, text: str) -> str:
+        if self.sniff is not None and self.sniff.separator:
+            return self.sniff.separator
+        return self._detect_separator(text)
+
+    def _header_index(self, rows: list[list[str]]) -> Optional[int]:
+        if self.sniff is not None and self.sniff.header_row is not None:
+            return self.sniff.header_row
+        return self._find_header(rows)
+
+    def _find_header(self, rows: list[list[str]]) -> Optional[int]:
+        """Antraštės eilutės indeksas CSV eilutėse (perrašo CSV parseriai)."""
+        return None
 
     def _extract_metadata(self, transactions: list[dict]) -> dict:
         dates = [t["transaction_date"] for t in transactions if t.get("transaction_date")]
@@ -75,90 +118,142 @@ class BaseBankParser(ABC):
         }
 
     def _detect_separator(self, text: str) -> str:
-        """
-        Detect CSV separator by checking which delimiter produces real header columns.
+        return detect_csv_separator(text)
 
-        Important:
-        SEB CSV uses semicolon, but amounts/descriptions contain commas:
-        562,78
-        FACEBK...,fb.me/ads,IE
 
-        So raw comma counting is unreliable.
-        """
-        lines = [line for line in text.splitlines()[:50] if line.strip()]
-        if not lines:
-            return ";"
-
-        candidates = [";", ",", "\t"]
-
-        header_keywords = [
-            "data",
-            "suma",
-            "valiuta",
-            "dok",
-            "paskirtis",
-            "gavėjo",
-            "gavejo",
-            "mokėtojo",
-            "moketojo",
-            "debetas",
-            "kreditas",
-            "sąskaita",
-            "saskaita",
-            "description",
-            "amount",
-            "currency",
-            "started date",
-            "completed date",
-        ]
+# ────────────────────────────────────────────────────────────
+# Encoding / separator
+# ────────────────────────────────────────────────────────────
 
-        scores = {}
 
-        for sep in candidates:
-            best_score = 0
-            best_cols = 0
-            best_hits = 0
+def detect_encoding(raw: bytes) -> str:
+    for enc in ENCODINGS:
+        try:
+            raw.decode(enc)
+            return enc
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return "utf-8"
 
-            for line in lines:
-                try:
-                    parsed = next(csv.reader([line], delimiter=sep, quotechar='"'))
-                except Exception:
-                    continue
 
-                cols = [c.strip().lower() for c in parsed if c.strip()]
-                if len(cols) <= 1:
-                    continue
+def iter_decoded(stream, encoding: str, chunk_size: int = 1024 * 1024):
+    """Dekoduoja baitų srautą gabalais (inkrementiniu dekoderiu)."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(block)
+        if text:
+            yield text
 
-                joined = " ".join(cols)
-                hits = sum(1 for kw in header_keywords if kw in joined)
 
-                # Header-like row with many real columns should win.
-                # hits are more important than raw column count.
-                score = hits * 100 + len(cols)
+def detect_stream_encoding(stream, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Kaip detect_encoding, bet nedekoduoja viso failo į vieną eilutę:
+    kandidatas tikrinamas inkrementiniu dekoderiu gabalais.
+    """
+    for enc in ENCODINGS:
+        stream.seek(0)
+        try:
+            for _ in iter_decoded(stream, enc, chunk_size):
+                pass
+        except (UnicodeDecodeError, LookupError):
+            continue
+        stream.seek(0)
+        return enc
+    stream.seek(0)
+    return "utf-8"
 
-                if score > best_score:
-                    best_score = score
-                    best_cols = len(cols)
-                    best_hits = hits
 
-            scores[sep] = {
-                "score": best_score,
-                "cols": best_cols,
-                "hits": best_hits,
-            }
+def detect_csv_separator(text: str) -> str:
+    """
+    Detect CSV separator by checking which delimiter produces real header columns.
 
-        best_sep = max(scores, key=lambda s: scores[s]["score"])
+    Important:
+    SEB CSV uses semicolon, but amounts/descriptions contain commas:
+    562,78
+    FACEBK...,fb.me/ads,IE
 
-        if scores[best_sep]["score"] <= 1:
-            best_sep = ";"
+    So raw comma counting is unreliable.
+    """
+    lines = [line for line in text.splitlines()[:50] if line.strip()]
+    if not lines:
+        return ";"
+
+    candidates = [";", ",", "\t"]
+
+    header_keywords = [
+        "data",
+        "suma",
+        "valiuta",
+        "dok",
+        "paskirtis",
+        "gavėjo",
+        "gavejo",
+        "mokėtojo",
+        "moketojo",
+        "debetas",
+        "kreditas",
+        "sąskaita",
+        "saskaita",
+        "description",
+        "amount",
+        "currency",
+        "started date",
+        "completed date",
+    ]
 
-        logger.info(
-            "[Parser] Separator detection scores: %s → chose %r",
-            scores,
-            best_sep,
-        )
+    scores = {}
 
-        return best_sep
+    for sep in candidates:
+        best_score = 0
+        best_cols = 0
+        best_hits = 0
+
+        for line in lines:
+            try:
+                parsed = next(csv.reader([line], delimiter=sep, quotechar='"'))
+            except Exception:
+                continue
+
+            cols = [c.strip().lower() for c in parsed if c.strip()]
+            if len(cols) <= 1:
+                continue
+
+            joined = " ".join(cols)
+            hits = sum(1 for kw in header_keywords if kw in joined)
+
+            # Header-like row with many real columns should win.
+            # hits are more important than raw column count.
+            score = hits * 100 + len(cols)
+
+            if score > best_score:
+                best_score = score
+                best_cols = len(cols)
+                best_hits = hits
+
+        scores[sep] = {
+            "score": best_score,
+            "cols": best_cols,
+            "hits": best_hits,
+        }
+
+    best_sep = max(scores, key=lambda s: scores[s]["score"])
+
+    if scores[best_sep]["score"] <= 1:
+        best_sep = ";"
+
+    logger.info(
+        "[Parser] Separator detection scores: %s → chose %r",
+        scores,
+        best_sep,
+    )
+
+    return best_sep
 
 
 # ────────────────────────────────────────────────────────────
@@ -171,12 +266,11 @@ class SwedbankCSVParser(BaseBankParser):
 
     def parse(self, file_content) -> list[dict]:
         raw = self._to_bytes(file_content)
-        encoding = self._detect_encoding(raw)
-        text = raw.decode(encoding)
+        encoding, text = self._decode_text(raw)
 
         logger.info("[SwedbankCSV] Encoding: %s, length: %d", encoding, len(text))
 
-        delimiter = self._detect_separator(text)
+        delimiter = self._csv_separator(text)
         logger.info("[SwedbankCSV] Using delimiter: %s", repr(delimiter))
 
         rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
@@ -189,13 +283,7 @@ class SwedbankCSVParser(BaseBankParser):
         for i, row in enumerate(rows[:3]):
             logger.info("[SwedbankCSV] Row %d (%d cols): %s", i, len(row), row[:5])
 
-        header_idx = None
-        for i, row in enumerate(rows):
-            joined = ";".join(row).lower()
-            if "operacijos data" in joined or "dok" in joined:
-                header_idx = i
-                break
-
+        header_idx = self._header_index(rows)
         if header_idx is None:
             logger.warning("[SwedbankCSV] Could not find header row")
             return []
@@ -224,6 +312,13 @@ class SwedbankCSVParser(BaseBankParser):
         )
         return transactions
 
+    def _find_header(self, rows):
+        for i, row in enumerate(rows):
+            joined = ";".join(row).lower()
+            if "operacijos data" in joined or "dok" in joined:
+                return i
+        return None
+
     def _map_columns(self, headers):
         mapping = {}
         patterns = {
@@ -239,10 +334,10 @@ class SwedbankCSVParser(BaseBankParser):
             "payment_purpose": ["operacijos paskirtis", "paskirtis"],
             "currency": ["valiuta"],
         }
-        for field, terms in patterns.items():
+        for key, terms in patterns.items():
             for i, h in enumerate(headers):
                 if any(t in h for t in terms):
-                    mapping[field] = i
+                    mapping[key] = i
                     break
         return mapping
 
@@ -280,36 +375,94 @@ class SwedbankCSVParser(BaseBankParser):
 
 
 class ISO20022Parser(BaseBankParser):
+    """
+    camt.053 parseris srautiniu režimu: XMLPullParser gauna failą gabalais,
+    kiekvienas <Ntry> išparsinamas ir iškart išmetamas iš medžio, todėl
+    atminties sunaudojimas nepriklauso nuo išrašo dydžio.
+    """
+
     bank_name = "iso20022"
+    STREAM_CHUNK_SIZE = 1024 * 1024
 
     def parse(self, file_content) -> list[dict]:
-        raw = self._to_bytes(file_content)
-        text = raw.decode(self._detect_encoding(raw))
-
-        logger.info("[ISO20022] File length: %d", len(text))
+        return list(self.iter_transactions(file_content))
 
-        root = ET.fromstring(text)
-        ns = self._detect_ns(root)
-        logger.info("[ISO20022] Namespace: %s", ns)
-
-        if not ns:
-            logger.warning("[ISO20022] No namespace detected")
-            return []
+    def iter_transactions(self, file_content):
+        stream = self._to_stream(file_content)
+        if self.sniff is not None and self.sniff.file_format == "xml" and self.sniff.encoding:
+            encoding = self.sniff.encoding
+        else:
+            encoding = self._detect_stream_encoding(stream)
 
-        transactions = []
+        pull = ET.XMLPullParser(events=("start", "end"))
+        ns = None
+        stack = []
+        stmt_depth = 0
         stmt_count = 0
-        for stmt in root.iter(f"{{{ns}}}Stmt"):
-            stmt_count += 1
-            for ntry in stmt.iter(f"{{{ns}}}Ntry"):
-                txn = self._parse_entry(ntry, ns)
-                if txn:
-                    transactions.append(txn)
+        txn_count = 0
+        text_len = 0
+
+        for chunk in self._iter_decoded(stream, encoding):
+            text_len += len(chunk)
+            pull.feed(chunk)
+
+            for event, el in pull.read_events():
+                if event == "start":
+                    if not stack:
+                        ns = self._detect_ns(el)
+                        logger.info("[ISO20022] Namespace: %s", ns)
+                        if not ns:
+                            logger.warning("[ISO20022] No namespace detected")
+                            return
+                        stmt_tag = f"{{{ns}}}Stmt"
+                        ntry_tag = f"{{{ns}}}Ntry"
+                    stack.append(el)
+                    if el.tag == stmt_tag:
+                        stmt_depth += 1
+                        stmt_count += 1
+                    continue
 
+                # event == "end"
+                stack.pop()
+                parent = stack[-1] if stack else None
+
+                if el.tag == ntry_tag and stmt_depth:
+                    txn = self._parse_entry(el, ns)
+                    if parent is not None:
+                        parent.remove(el)
+                    el.clear()
+                    if txn:
+                        txn_count += 1
+                        yield txn
+                elif el.tag == stmt_tag:
+                    stmt_depth -= 1
+                    if parent is not None:
+                        parent.remove(el)
+                    el.clear()
+
+        pull.close()
+
+        logger.info("[ISO20022] File length: %d", text_len)
         logger.info(
             "[ISO20022] Statements: %d, Transactions: %d",
-            stmt_count, len(transactions),
+            stmt_count, txn_count,
         )
-        return transactions
+
+    def _to_stream(self, file_content):
+        if isinstance(file_content, (bytes, bytearray, memoryview)):
+            return io.BytesIO(file_content)
+        if hasattr(file_content, "read"):
+            if hasattr(file_content, "seekable") and file_content.seekable():
+                file_content.seek(0)
+                return file_content
+            return io.BytesIO(file_content.read())
+        return io.BytesIO(bytes(file_content))
+
+    def _detect_stream_encoding(self, stream) -> str:
+        return detect_stream_encoding(stream, self.STREAM_CHUNK_SIZE)
+
+    def _iter_decoded(self, stream, encoding):
+        return iter_decoded(stream, encoding, self.STREAM_CHUNK_SIZE)
 
     def _detect_ns(self, root):
         tag = root.tag
@@ -405,10 +558,9 @@ class SEBCSVParser(BaseBankParser):
 
     def parse(self, file_content) -> list[dict]:
         raw = self._to_bytes(file_content)
-        encoding = self._detect_encoding(raw)
-        text = raw.decode(encoding)
+        encoding, text = self._decode_text(raw)
 
-        delimiter = self._detect_separator(text)
+        delimiter = self._csv_separator(text)
         logger.info("[SEBCSV] Detected delimiter: %s", repr(delimiter))
         reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar='"')
         logger.info("[SEBCSV] Encoding: %s, length: %d", encoding, len(text))
@@ -417,13 +569,7 @@ class SEBCSVParser(BaseBankParser):
         if len(rows) < 3:
             return []
 
-        header_idx = None
-        for i, row in enumerate(rows):
-            joined = ";".join(row).upper()
-            if "DATA" in joined and "SUMA" in joined and "PASKIRTIS" in joined:
-                header_idx = i
-                break
-
+        header_idx = self._header_index(rows)
         if header_idx is None:
             return []
 
@@ -503,6 +649,13 @@ class SEBCSVParser(BaseBankParser):
         logger.info("[SEBCSV] Result: %d transactions", len(transactions))
         return transactions
 
+    def _find_header(self, rows):
+        for i, row in enumerate(rows):
+            joined = ";".join(row).upper()
+            if "DATA" in joined and "SUMA" in joined and "PASKIRTIS" in joined:
+                return i
+        return None
+
 
 # ────────────────────────────────────────────────────────────
 # Luminor CSV
@@ -514,25 +667,18 @@ class LuminorCSVParser(BaseBankParser):
 
     def parse(self, file_content) -> list[dict]:
         raw = self._to_bytes(file_content)
-        encoding = self._detect_encoding(raw)
-        text = raw.decode(encoding)
+        encoding, text = self._decode_text(raw)
 
         logger.info("[LuminorCSV] Encoding: %s, length: %d", encoding, len(text))
 
-        delimiter = self._detect_separator(text)
+        delimiter = self._csv_separator(text)
         logger.info("[LuminorCSV] Using delimiter: %s", repr(delimiter))
 
         rows = list(csv.reader(io.StringIO(text), delimiter=delimiter, quotechar='"'))
         if not rows:
             return []
 
-        header_idx = None
-        for i, row in enumerate(rows):
-            joined = " | ".join(c.strip().lower() for c in row)
-            if "data" in joined and "suma" in joined and "c/d" in joined:
-                header_idx = i
-                break
-
+        header_idx = self._header_index(rows)
         if header_idx is None:
             return []
 
@@ -554,6 +700,13 @@ class LuminorCSVParser(BaseBankParser):
         logger.info("[LuminorCSV] Result: %d transactions", len(transactions))
         return transactions
 
+    def _find_header(self, rows):
+        for i, row in enumerate(rows):
+            joined = " | ".join(c.strip().lower() for c in row)
+            if "data" in joined and "suma" in joined and "c/d" in joined:
+                return i
+        return None
+
     def _map_columns(self, headers):
         mapping = {}
 
@@ -659,10 +812,10 @@ class LuminorCSVParser(BaseBankParser):
             ],
         }
 
-        for field, terms in patterns.items():
+        for key, terms in patterns.items():
             for i, h in enumerate(headers):
                 if any(term in h for term in terms):
-                    mapping[field] = i
+                    mapping[key] = i
                     break
 
         return mapping
@@ -776,9 +929,13 @@ class RevolutCSVParser(BaseBankParser):
 
         return f"REV|{tx_type}|{product}|{started}|{completed}|{balance}|{state}"[:255]
 
+    def _find_header(self, rows):
+        # csv.DictReader: antraštė visada pirma eilutė
+        return 0 if rows else None
+
     def parse(self, file_content) -> list[dict]:
         raw = self._to_bytes(file_content)
-        text = raw.decode(self._detect_encoding(raw))
+        _, text = self._decode_text(raw)
 
         logger.info("[RevolutCSV] File length: %d", len(text))
 
@@ -1376,50 +1533,179 @@ PARSER_REGISTRY = {
 }
 
 
-def get_parser(bank_name: str, file_format: str) -> BaseBankParser:
+def get_parser(
+    bank_name: str,
+    file_format: str,
+    sniff: Optional["StatementSniff"] = None,
+) -> BaseBankParser:
     key = (bank_name.lower(), file_format.lower())
     cls = PARSER_REGISTRY.get(key)
     if not cls:
         raise ValueError(f"No parser for {key}. Supported: {list(PARSER_REGISTRY.keys())}")
-    return cls()
 
-def _detect_bank_from_camt(content: bytes) -> Optional[str]:
+    if sniff is not None:
+        if sniff.file_format != key[1]:
+            sniff = None
+        elif PARSER_REGISTRY.get((sniff.bank or "", key[1])) is not cls:
+            # Bankas parinktas rankiniu būdu ir skiriasi nuo atpažinto:
+            # koduotę/tekstą naudojam, separatorių ir antraštę parseris ieško pats.
+            sniff = replace(sniff, separator=None, header_row=None, header=[])
+    return cls(sniff=sniff)
+
+
+@dataclass
+class StatementSniff:
+    """
+    sniff_statement() rezultatas — kas nustatyta vienu failo praėjimu.
+
+    text  — visas dekoduotas CSV tekstas (XML/XLSX atveju None: XML
+            parseris skaito srautu, XLSX — openpyxl).
+    prefix — pirmi SNIFF_PREFIX_BYTES baitų dekoduoti (atpažinimui / logams).
+    """
+
+    file_format: str
+    bank: Optional[str] = None
+    encoding: Optional[str] = None
+    separator: Optional[str] = None
+    header_row: Optional[int] = None
+    header: list = field(default_factory=list)
+    text: Optional[str] = field(default=None, repr=False)
+    prefix: str = field(default="", repr=False)
+
+
+SNIFF_PREFIX_BYTES = 10000
+SNIFF_HEADER_ROWS = 200
+PAYPAL_XLSX_HEADERS = {"transaction id", "gross", "fee", "net"}
+CAMT_BIC_MAP = {"HABA": "swedbank", "CBVI": "seb", "AGBL": "luminor", "CBSB": "siauliu"}
+
+
+def sniff_statement(content: bytes) -> StatementSniff:
+    """
+    Vienas failo praėjimas: formatas, bankas, koduotė, CSV separatorius ir
+    antraštės eilutė. Rezultatas perduodamas į get_parser(..., sniff=...),
+    kad parseris nebededukuotų ir nebeanalizuotų failo iš naujo.
+    """
+    file_format = detect_format_from_content(content)
+
+    # ── PayPal XLSX (бинарный zip, текстом не читается) ──
+    if file_format == "xlsx":
+        header = _xlsx_header(content)
+        cols = {str(h or "").strip().lower() for h in header}
+        return StatementSniff(
+            file_format="xlsx",
+            bank="paypal" if PAYPAL_XLSX_HEADERS.issubset(cols) else None,
+            header_row=0 if header else None,
+            header=[str(h or "").strip() for h in header],
+        )
+
+    if file_format == "xml":
+        # XML į vieną eilutę nededukuojam — koduotė tikrinama srautu
+        encoding = detect_stream_encoding(io.BytesIO(content))
+        text = None
+    else:
+        encoding = detect_encoding(content)
+        text = content.decode(encoding)
+
+    # Inkrementinis dekoderis: nukirptas ties riba daugiabaitis simbolis
+    # nelaikomas klaida (anksčiau toks prefiksas krisdavo į windows-1257).
+    prefix = codecs.getincrementaldecoder(encoding)().decode(content[:SNIFF_PREFIX_BYTES])
+    compact = re.sub(r"\s+", " ", prefix.lower())
+
+    bank = None
+    # ── ISO 20022 camt.053 XML (Swedbank/SEB/Luminor/Šiaulių) ──
+    # Banką nustatome pagal aptarnautojo BIC (<Svcr>), ne pagal kontrahentus.
+    if "camt.05" in compact or "<document" in compact:
+        bank = _detect_bank_from_camt(content, encoding)
+    if not bank:
+        bank = _detect_bank_from_text(compact)
+
+    sniff = StatementSniff(
+        file_format=file_format,
+        bank=bank,
+        encoding=encoding,
+        text=text,
+        prefix=prefix,
+    )
+    if file_format == "csv":
+        _sniff_csv_layout(sniff)
+    return sniff
+
+
+def _sniff_csv_layout(sniff: StatementSniff) -> None:
+    """Separatorius ir antraštės eilutė — to paties parserio logika, tik per pirmas eilutes."""
+    if sniff.bank == "revolut":
+        sniff.separator = ","          # RevolutCSVParser skaito csv.DictReader
+    else:
+        sniff.separator = detect_csv_separator(sniff.text)
+
+    cls = PARSER_REGISTRY.get((sniff.bank, "csv")) if sniff.bank else None
+    if cls is None:
+        return
+
+    rows = list(islice(
+        csv.reader(io.StringIO(sniff.text), delimiter=sniff.separator, quotechar='"'),
+        SNIFF_HEADER_ROWS,
+    ))
+    # Neradus per pirmas SNIFF_HEADER_ROWS eilučių — parseris ieškos pats
+    idx = cls()._find_header(rows)
+    if idx is not None:
+        sniff.header_row = idx
+        sniff.header = [c.strip() for c in rows[idx]]
+
+
+def _detect_bank_from_camt(content: bytes, encoding: Optional[str] = None) -> Optional[str]:
     """
     camt.053 XML: banką nustatome pagal sąskaitos aptarnautojo BIC (<Svcr>),
     o ne pagal kontrahentų bankus operacijose.
+    Failas skaitomas srautu — sustojama radus pirmą <Acct>/<Svcr>/<FinInstnId>.
     """
+    def local(tag):
+        return tag.rsplit("}", 1)[-1]
+
+    stream = io.BytesIO(content)
+    encoding = encoding or detect_stream_encoding(stream)
+
+    pull = ET.XMLPullParser(events=("start", "end"))
+    stack = []
+    svcr = None
     try:
-        root = None
-        for enc in ("utf-8-sig", "utf-8", "windows-1257", "iso-8859-13"):
-            try:
-                root = ET.fromstring(content.decode(enc))
+        for chunk in iter_decoded(stream, encoding, 64 * 1024):
+            pull.feed(chunk)
+            for event, el in pull.read_events():
+                if event == "start":
+                    stack.append(el)
+                    continue
+
+                stack.pop()
+                tag = local(el.tag)
+                if (
+                    tag == "FinInstnId"
+                    and len(stack) >= 2
+                    and local(stack[-1].tag) == "Svcr"
+                    and local(stack[-2].tag) == "Acct"
+                ):
+                    svcr = el
+                    break
+                if tag == "Ntry" and stack:
+                    stack[-1].remove(el)
+                    el.clear()
+            if svcr is not None:
                 break
-            except (UnicodeDecodeError, LookupError):
-                continue
-        if root is None:
-            return None
-    except ET.ParseError:
+    except (ET.ParseError, UnicodeDecodeError, LookupError):
         return None
 
-    tag = root.tag
-    ns = tag.split("}")[0].lstrip("{") if "{" in tag else ""
-
-    def q(t):
-        return f"{{{ns}}}{t}" if ns else t
-
-    svcr = root.find(f".//{q('Acct')}/{q('Svcr')}/{q('FinInstnId')}")
     bic = name = ""
     if svcr is not None:
-        b = svcr.find(q("BIC"))
+        ns = svcr.tag[: svcr.tag.index("}") + 1] if svcr.tag.startswith("{") else ""
+        b = svcr.find(f"{ns}BIC")
         if b is not None and b.text:
             bic = b.text.strip().upper()
-        n = svcr.find(q("Nm"))
+        n = svcr.find(f"{ns}Nm")
         if n is not None and n.text:
             name = n.text.strip().lower()
 
-    bic_map = {"HABA": "swedbank", "CBVI": "seb", "AGBL": "luminor", "CBSB": "siauliu"}
-    if bic and bic[:4] in bic_map:
-        return bic_map[bic[:4]]
+    if bic and bic[:4] in CAMT_BIC_MAP:
+        return CAMT_BIC_MAP[bic[:4]]
 
     if "swedbank" in name:
         return "swedbank"
@@ -1432,42 +1718,29 @@ def _detect_bank_from_camt(content: bytes) -> Optional[str]:
 
     return None
 
-def _detect_paypal_xlsx(content: bytes) -> bool:
-    """PayPal activity export (xlsx): узнаём по заголовкам (оба формата — старый без Balance Impact)."""
+
+def _xlsx_header(content: bytes) -> tuple:
     try:
         from openpyxl import load_workbook
         wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
         ws = wb.active
-        header = next(ws.iter_rows(max_row=1, values_only=True), ())
-        cols = {str(h or "").strip().lower() for h in header}
-        return {"transaction id", "gross", "fee", "net"}.issubset(cols)
+        return tuple(next(ws.iter_rows(max_row=1, values_only=True), ()))
     except Exception:
-        return False
+        return ()
 
 
-def detect_bank_from_content(content: bytes) -> Optional[str]:
-    # ── PayPal XLSX (бинарный zip, текстом не читается) ──
-    if content[:2] == b"PK" and _detect_paypal_xlsx(content):
-        return "paypal"
-
-    text = ""
+def _detect_paypal_xlsx(content: bytes) -> bool:
+    """PayPal activity export (xlsx): узнаём по заголовкам (оба формата — старый без Balance Impact)."""
+    cols = {str(h or "").strip().lower() for h in _xlsx_header(content)}
+    return PAYPAL_XLSX_HEADERS.issubset(cols)
 
-    for enc in ("utf-8-sig", "utf-8", "windows-1257"):
-        try:
-            text = content[:10000].decode(enc).lower()
-            break
-        except UnicodeDecodeError:
-            continue
 
-    compact = re.sub(r"\s+", " ", text)
+def detect_bank_from_content(content: bytes) -> Optional[str]:
+    return sniff_statement(content).bank
 
-    # ── ISO 20022 camt.053 XML (Swedbank/SEB/Luminor/Šiaulių) ──
-    # Banką nustatome pagal aptarnautojo BIC (<Svcr>), ne pagal kontrahentus.
-    if "camt.05" in compact or "<document" in compact:
-        camt_bank = _detect_bank_from_camt(content)
-        if camt_bank:
-            return camt_bank
 
+def _detect_bank_from_text(compact: str) -> Optional[str]:
+    """Banko atpažinimas pagal tekstinį failo prefiksą (lower-case, suspausti tarpai)."""
     # ── Revolut ─────────────────────────────────────────
     # Du eksporto formatai: senas ("Started Date"/"Completed Date")
     # ir Business ("Date started (UTC)"/"Date completed (UTC)").
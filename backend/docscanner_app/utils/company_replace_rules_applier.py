@@ -6,7 +6,11 @@
 ПОСЛЕ _apply_top_level_fields и ДО _save_line_items.
 """
 
+import hashlib
+import json
 import logging
+from collections import OrderedDict
+from functools import lru_cache
 
 from ..validators.company_name_normalizer import normalize_company_name_v2
 
@@ -18,6 +22,12 @@ def _norm(val):
     return (str(val) if val else "").strip().upper()
 
 
+@lru_cache(maxsize=8192)
+def _name_norm_cached(name):
+    """normalize_company_name_v2 дорогая (десятки regex) — имена контрагентов часто повторяются."""
+    return normalize_company_name_v2(name)
+
+
 def _matches_side(rule, side_data):
     """
     Проверяет, совпадают ли ВСЕ непустые условия правила
@@ -201,23 +211,17 @@ def _apply_result_to_side(db_doc, rule, side: str) -> bool:
         setattr(
             db_doc,
             f"{prefix}_name_normalized",
-            normalize_company_name_v2(new_name),
+            _name_norm_cached(new_name),
         )
 
     return changed
 
-def apply_company_replace_rules(db_doc, user) -> int:
+def apply_company_replace_rules_linear(db_doc, rules) -> int:
     """
-    Применяет правила замены контрагентов из user.company_replace_rules.
-    
-    Логика change_target:
-      - "" (пусто)      → проверяем и buyer, и seller; заменяем совпавших
-      - "buyer_only"     → проверяем только buyer
-      - "seller_only"    → проверяем только seller
-    
-    Возвращает количество применённых замен.
+    Эталонная реализация: каждое правило проверяется на обеих сторонах
+    через _matches_side. Используется для проверки CompiledCompanyReplaceRules
+    (manage.py bench_company_replace_rules).
     """
-    rules = getattr(user, "company_replace_rules", None)
     if not rules or not isinstance(rules, list):
         return 0
     
@@ -271,6 +275,234 @@ def apply_company_replace_rules(db_doc, user) -> int:
     return total_applied
 
 
+# ───────────────────────── compiled engine ─────────────────────────
+
+_SIDES = ("buyer", "seller")
+
+
+class _CompiledReplaceRule:
+    """Условия правила, нормализованные один раз при компиляции."""
+
+    __slots__ = (
+        "index", "rule", "name_norm", "kodas_op", "kodas",
+        "pvm_op", "pvm", "country", "tipas", "has_conditions",
+    )
+
+    def __init__(self, index, rule):
+        self.index = index
+        self.rule = rule
+
+        match_pav = (rule.get("match_pavadinimas") or "").strip()
+        self.name_norm = _name_norm_cached(match_pav) if match_pav else None
+
+        self.kodas = _norm(rule.get("match_kodas"))
+        self.kodas_op = (rule.get("match_kodas_op") or "").strip().lower() or ("eq" if self.kodas else "any")
+
+        self.pvm = _norm(rule.get("match_pvm_kodas"))
+        self.pvm_op = (rule.get("match_pvm_kodas_op") or "").strip().lower() or ("eq" if self.pvm else "any")
+
+        self.country = _norm(rule.get("match_salies_kodas"))
+        self.tipas = (rule.get("match_tipas") or "").strip().lower()
+
+        self.has_conditions = bool(
+            self.name_norm is not None
+            or self.kodas_op != "any"
+            or self.pvm_op != "any"
+            or self.country
+            or self.tipas
+        )
+
+    def index_key(self):
+        """Самое селективное точное условие — ключ hash-бакета (None → общий список)."""
+        if self.kodas_op == "eq" and self.kodas:
+            return ("kodas", self.kodas)
+        if self.pvm_op == "eq" and self.pvm:
+            return ("pvm", self.pvm)
+        if self.country:
+            return ("country", self.country)
+        return None
+
+    def matches(self, side) -> bool:
+        """То же, что _matches_side, но на заранее нормализованных данных."""
+        if self.name_norm is not None:
+            side_name_norm = side.name_norm
+            if not side_name_norm or not self.name_norm:
+                return False
+            if self.name_norm not in side_name_norm and side_name_norm not in self.name_norm:
+                return False
+
+        if self.kodas_op == "eq":
+            if not self.kodas or side.kodas != self.kodas:
+                return False
+        elif self.kodas_op == "empty":
+            if side.kodas:
+                return False
+        elif self.kodas_op == "not_empty":
+            if not side.kodas:
+                return False
+
+        if self.pvm_op == "eq":
+            if not self.pvm or side.pvm != self.pvm:
+                return False
+        elif self.pvm_op == "empty":
+            if side.pvm:
+                return False
+        elif self.pvm_op == "not_empty":
+            if not side.pvm:
+                return False
+
+        if self.country and side.country != self.country:
+            return False
+
+        if self.tipas == "fizinis" and side.is_person is not True:
+            return False
+        if self.tipas == "juridinis" and side.is_person is not False:
+            return False
+
+        return True
+
+
+class _SideState:
+    """Нормализованные данные одной стороны документа (имя нормализуется лениво)."""
+
+    __slots__ = ("_raw_name", "_name_norm", "kodas", "pvm", "country", "is_person")
+
+    def __init__(self, db_doc, side):
+        data = _extract_side(db_doc, side)
+        self._raw_name = data.get("name") or ""
+        self._name_norm = None
+        self.kodas = _norm(data.get("id"))
+        self.pvm = _norm(data.get("vat_code"))
+        self.country = _norm(data.get("country_iso"))
+        self.is_person = data.get("is_person")
+
+    @property
+    def name_norm(self):
+        if self._name_norm is None:
+            self._name_norm = _name_norm_cached(self._raw_name)
+        return self._name_norm
+
+
+class CompiledCompanyReplaceRules:
+    """
+    company_replace_rules, разложенные по сторонам (buyer / seller) в hash-бакеты
+    по нормализованному kodas / PVM kodas / šalies kodas. Правила без точного
+    ключа (только pavadinimas, tipas, empty/not_empty) лежат в общем списке
+    с уже нормализованным именем.
+
+    Семантика та же, что у apply_company_replace_rules_linear: правила идут
+    по порядку списка, и после замены на стороне следующие правила видят уже
+    изменённые данные этой стороны.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self._buckets = {side: {} for side in _SIDES}
+        self._scan = {side: [] for side in _SIDES}
+
+        for index, rule in enumerate(rules or []):
+            if not isinstance(rule, dict) or not rule.get("enabled", True):
+                continue
+            cr = _CompiledReplaceRule(index, rule)
+            if not cr.has_conditions:
+                continue
+            self.rules.append(cr)
+
+            change_target = (rule.get("change_target") or "").strip().lower()
+            sides = [
+                side for side in _SIDES
+                if change_target in ("", f"{side}_only")
+            ]
+            key = cr.index_key()
+            for side in sides:
+                if key is None:
+                    self._scan[side].append(cr)
+                else:
+                    self._buckets[side].setdefault(key, []).append(cr)
+
+    def matching(self, side, state, after=-1):
+        """Совпавшие правила стороны с index > after, в порядке списка."""
+        buckets = self._buckets[side]
+        candidates = list(self._scan[side])
+        for key in (("kodas", state.kodas), ("pvm", state.pvm), ("country", state.country)):
+            if key[1]:
+                candidates.extend(buckets.get(key, ()))
+        matched = [cr for cr in candidates if cr.index > after and cr.matches(state)]
+        matched.sort(key=lambda cr: cr.index)
+        return matched
+
+
+_COMPILED_CACHE = OrderedDict()
+_COMPILED_CACHE_SIZE = 64
+
+
+def get_compiled_replace_rules(user, rules) -> CompiledCompanyReplaceRules:
+    """Кэш на процесс: перекомпиляция только при изменении company_replace_rules."""
+    cache_key = getattr(user, "pk", None) or id(user)
+    fingerprint = hashlib.md5(
+        json.dumps(rules, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+    hit = _COMPILED_CACHE.get(cache_key)
+    if hit and hit[0] == fingerprint:
+        _COMPILED_CACHE.move_to_end(cache_key)
+        return hit[1]
+
+    compiled = CompiledCompanyReplaceRules(rules)
+    _COMPILED_CACHE[cache_key] = (fingerprint, compiled)
+    _COMPILED_CACHE.move_to_end(cache_key)
+    while len(_COMPILED_CACHE) > _COMPILED_CACHE_SIZE:
+        _COMPILED_CACHE.popitem(last=False)
+    return compiled
+
+
+def _apply_compiled(db_doc, compiled) -> int:
+    db_doc.buyer_replaced_by_rule = False
+    db_doc.seller_replaced_by_rule = False
+
+    total_applied = 0
+    pending = {side: compiled.matching(side, _SideState(db_doc, side)) for side in _SIDES}
+
+    while pending["buyer"] or pending["seller"]:
+        # следующее по порядку правило, совпавшее хотя бы на одной стороне
+        index = min(pending[side][0].index for side in _SIDES if pending[side])
+
+        for side in _SIDES:
+            if not pending[side] or pending[side][0].index != index:
+                continue
+            cr = pending[side].pop(0)
+            if _apply_result_to_side(db_doc, cr.rule, side):
+                setattr(db_doc, f"{side}_replaced_by_rule", True)
+                total_applied += 1
+                logger.info(
+                    "company_replace_rule[%s] applied to %s (doc=%s)",
+                    cr.rule.get("id", "?"), side.upper(), db_doc.pk,
+                )
+                # сторона изменилась — следующие правила проверяем на новых данных
+                pending[side] = compiled.matching(side, _SideState(db_doc, side), after=index)
+
+    return total_applied
+
+
+def apply_company_replace_rules(db_doc, user) -> int:
+    """
+    Применяет правила замены контрагентов из user.company_replace_rules.
+    
+    Логика change_target:
+      - "" (пусто)      → проверяем и buyer, и seller; заменяем совпавших
+      - "buyer_only"     → проверяем только buyer
+      - "seller_only"    → проверяем только seller
+    
+    Возвращает количество применённых замен.
+    """
+    rules = getattr(user, "company_replace_rules", None)
+    if not rules or not isinstance(rules, list):
+        return 0
+
+    compiled = get_compiled_replace_rules(user, rules)
+    return _apply_compiled(db_doc, compiled)
+
+
 
 
 
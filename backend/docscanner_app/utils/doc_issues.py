@@ -0,0 +1,129 @@
+"""
+utils/doc_issues.py
+===================
+Dokumento problemų santrauka (admin / vartotojo sąrašams).
+
+Skaičiuojama vieną kartą, kai ScannedDocument išsaugomas su pasikeitusiu
+structured_json / gpt_raw_json (ScannedDocument.save → refresh_issue_fields),
+ir laikoma kompaktiškuose stulpeliuose:
+  issue_flags  — bitų kaukė (ISSUE_*),
+  has_issues   — matematinė validacija FAIL (vienintelis „error“ kriterijus),
+  issue_count  — problemų skaičius sąrašo badge'ui.
+
+Sąrašuose JSON nebekraunamas: badge'ai / summary atstatomi iš issue_flags
+(summarize_issue_flags). Seniems dokumentams:
+    python manage.py backfill_doc_issues
+"""
+
+import json
+
+ISSUE_MATH_DETALIAI = 1 << 0      # _final_math_validation.summary.overall_status == FAIL
+ISSUE_MATH_SUMISKAI = 1 << 1      # _final_math_validation_sumiskai.overall_status == FAIL
+ISSUE_GLOBAL_VALIDATION = 1 << 2  # _global_validation_log: "OVERALL STATUS: FAIL"
+
+ISSUE_MATH = ISSUE_MATH_DETALIAI | ISSUE_MATH_SUMISKAI
+
+ISSUE_FIELDS = ("issue_flags", "has_issues", "issue_count")
+ISSUE_SOURCE_FIELDS = ("structured_json", "gpt_raw_json")
+
+
+def _ensure_dict(x):
+    if x is None:
+        return {}
+    if isinstance(x, dict):
+        return x
+    if isinstance(x, str):
+        try:
+            return json.loads(x)
+        except Exception:
+            return {}
+    return {}
+
+
+def compute_issue_flags(structured_json, gpt_raw_json=None) -> int:
+    """
+    Math FAIL tikrinamas structured_json (arba gpt_raw_json, jei structured_json tuščias),
+    _global_validation_log — tik structured_json (kaip admin_documents_with_errors).
+    """
+    flags = 0
+    doc = _ensure_dict(structured_json or gpt_raw_json)
+
+    final_validation = doc.get("_final_math_validation")
+    if isinstance(final_validation, dict):
+        summary = final_validation.get("summary") or {}
+        if isinstance(summary, dict) and summary.get("overall_status") == "FAIL":
+            flags |= ISSUE_MATH_DETALIAI
+
+    sumiskai_validation = doc.get("_final_math_validation_sumiskai")
+    if isinstance(sumiskai_validation, dict) and sumiskai_validation.get("overall_status") == "FAIL":
+        flags |= ISSUE_MATH_SUMISKAI
+
+    validation_log = _ensure_dict(structured_json).get("_global_validation_log")
+    if isinstance(validation_log, str) and "OVERALL STATUS: FAIL" in validation_log:
+        flags |= ISSUE_GLOBAL_VALIDATION
+
+    return flags
+
+
+def summarize_issue_flags(flags: int) -> dict:
+    """Tas pats formatas kaip anksčiau views.summarize_doc_issues()."""
+    flags = flags or 0
+    has_error = bool(flags & ISSUE_MATH)
+
+    badges = ["MATH✗"] if has_error else []
+    summary = " ".join(badges)
+    # sumiskai nugali detaliai (kaip senoje versijoje — tikrinama paskutinė)
+    if flags & ISSUE_MATH_SUMISKAI:
+        summary = f"{summary} (sumiskai)".strip()
+    elif flags & ISSUE_MATH_DETALIAI:
+        summary = f"{summary} (detaliai)".strip()
+
+    return {
+        "has_issues": has_error,
+        "severity": "error" if has_error else "ok",
+        "issue_badges": " ".join(badges),
+        "issue_summary": summary,
+        "issue_count": 1 if has_error else 0,
+    }
+
+
+def summarize_doc_issues(doc_struct):
+    """
+    Возвращает 'error' ТОЛЬКО если overall_status == "FAIL" из финальной математической валидации.
+    """
+    return summarize_issue_flags(compute_issue_flags(doc_struct))
+
+
+def issue_field_values(structured_json, gpt_raw_json=None) -> dict:
+    flags = compute_issue_flags(structured_json, gpt_raw_json)
+    summary = summarize_issue_flags(flags)
+    return {
+        "issue_flags": flags,
+        "has_issues": summary["has_issues"],
+        "issue_count": summary["issue_count"],
+    }
+
+
+def refresh_issue_fields(doc, save_kwargs: dict) -> None:
+    """
+    Iš ScannedDocument.save(): perskaičiuoja issue_* laukus, jei išsaugomas
+    structured_json / gpt_raw_json. Jei abu JSON laukai deferred ir nepakeisti —
+    nieko nedaro (JSON iš DB nekraunamas). update_fields papildomas issue_* laukais.
+    """
+    update_fields = save_kwargs.get("update_fields")
+    if update_fields is not None and not set(update_fields) & set(ISSUE_SOURCE_FIELDS):
+        return
+
+    deferred = doc.get_deferred_fields()
+    if all(f in deferred for f in ISSUE_SOURCE_FIELDS):
+        return
+
+    structured = doc.structured_json
+    # gpt_raw_json reikalingas tik kai structured_json tuščias
+    gpt_raw = doc.gpt_raw_json if not structured else None
+
+    for field, value in issue_field_values(structured, gpt_raw).items():
+        setattr(doc, field, value)
+
+    if update_fields is not None:
+        save_kwargs["update_fields"] = list(dict.fromkeys([*update_fields, *ISSUE_FIELDS]))
@@ -155,6 +155,8 @@ enhanced_ocr.py — Enhanced OCR через Gemini для документов 
 import base64
 import logging
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 logger = logging.getLogger("docscanner_app")
 
 ENHANCED_OCR_PROMPT = (
@@ -241,6 +243,7 @@ def get_enhanced_ocr_text(data: bytes, filename: str = None, logger=None) -> tup
                         filename or "unknown", len(data), mime_type, model,
                     )
 
+                require_rate_limit("gemini", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
                 response = client.models.generate_content(
                     model=model,
                     contents=contents,
@@ -366,6 +366,146 @@ def _from_office_bytes(raw: bytes, name: str, soffice_path: str) -> Dict:
     return _from_pdf_bytes(pdf, name)
 
 # ============ Архивы (поведение как и прежде, без компрессии) ============
+#
+# Manifest — kurie archyvo failai taps dokumentais (tas pats filtras, kurį
+# taiko normalizavimas): skaitomas tik archyvo katalogas (ZIP central
+# directory, RAR / 7Z antraštės, TAR antraštės srautu). compute_expected_items
+# jį išsaugo ScannedDocument.archive_manifest, normalize_any(manifest=...)
+# naudoja iš naujo — be pakartotinio filtravimo, RAR / 7Z išskleidžiami tik
+# atrinkti failai.
+
+MANIFEST_VERSION = 1
+TAR_EXTS = {'.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz', '.tbz2'}
+
+
+def _archive_kind(ext: str) -> str:
+    if ext in TAR_EXTS:
+        return 'tar'
+    return ext.lstrip('.')
+
+
+def _build_manifest(kind: str, entries, archive_bytes: int) -> Dict:
+    """entries: (vardas, dydis) — tik failai (be katalogų / nuorodų)."""
+    members = []
+    too_large = []
+    unsupported = []
+    skipped_system = 0
+    skipped_unsafe = 0
+    file_count = 0
+
+    for fname, size in entries:
+        file_count += 1
+        if not fname:
+            continue
+        basename = os.path.basename(fname)
+        if _is_system_file(fname):
+            skipped_system += 1
+            continue
+        if not _is_safe_path(fname):
+            skipped_unsafe += 1
+            continue
+        if not _is_supported_format(fname):
+            unsupported.append({'name': basename, 'extension': _ext(fname)})
+            continue
+        size = int(size or 0)
+        if size > MAX_SINGLE_FILE_BYTES:
+            too_large.append({'name': basename, 'size': size, 'max_size': MAX_SINGLE_FILE_BYTES})
+            continue
+        members.append({'name': fname, 'size': size})
+
+    return {
+        'v': MANIFEST_VERSION,
+        'format': kind,
+        'bytes': archive_bytes,
+        'file_count': file_count,
+        'members': members,
+        'too_large': too_large,
+        'unsupported': unsupported,
+        'skipped_system': skipped_system,
+        'skipped_unsafe': skipped_unsafe,
+    }
+
+
+def _zip_entries(zf):
+    return [(zi.filename, zi.file_size) for zi in zf.infolist() if not zi.is_dir()]
+
+
+def _rar_entries(rf):
+    entries = []
+    for ri in rf.infolist():
+        try:
+            if ri.isdir():
+                continue
+        except Exception:
+            continue
+        entries.append((getattr(ri, 'filename', None), getattr(ri, 'file_size', 0)))
+    return entries
+
+
+def _7z_entries(sz):
+    return [(fi.filename, fi.uncompressed) for fi in sz.list() if not fi.is_directory]
+
+
+def _tar_entries(members):
+    return [(tm.name, tm.size) for tm in members if tm.isfile()]
+
+
+def archive_manifest(path: str, name: str) -> Dict:
+    """
+    Manifest'as iš failo kelio, skaitant tik archyvo katalogą. Suspaustas TAR —
+    srautinis antraščių skenavimas (r|*): išskleidžiamas vieną kartą, be
+    atgalinio seek ir be narių sąrašo atmintyje.
+    """
+    ext = _ext(name)
+    kind = _archive_kind(ext)
+    size = os.path.getsize(path)
+
+    if kind == 'zip':
+        with zipfile.ZipFile(path) as zf:
+            return _build_manifest(kind, _zip_entries(zf), size)
+    if kind == 'rar':
+        if not RARFILE_AVAILABLE:
+            raise ValueError("RAR support not installed")
+        with rarfile.RarFile(path) as rf:
+            return _build_manifest(kind, _rar_entries(rf), size)
+    if kind == '7z':
+        if not PY7ZR_AVAILABLE:
+            raise ValueError("7Z support not installed")
+        with py7zr.SevenZipFile(path, mode='r') as sz:
+            return _build_manifest(kind, _7z_entries(sz), size)
+    if kind == 'tar':
+        # Nesuspaustas — antraštės su seek per duomenis; suspaustas — vienas srautinis perėjimas
+        mode = 'r:' if ext == '.tar' else 'r|*'
+        try:
+            tf = tarfile.open(path, mode=mode)
+        except tarfile.ReadError:
+            if mode == 'r|*':
+                raise
+            tf = tarfile.open(path, mode='r|*')
+        with tf:
+            return _build_manifest(kind, ((tm.name, tm.size) for tm in tf if tm.isfile()), size)
+    raise ValueError(f"Unsupported archive format: {ext}")
+
+
+def _usable_manifest(manifest: Optional[Dict], kind: str, raw: bytes) -> Optional[Dict]:
+    """Manifest'as tinka tik tam pačiam failui (formatas + dydis)."""
+    if not manifest:
+        return None
+    if manifest.get('v') != MANIFEST_VERSION or manifest.get('format') != kind:
+        return None
+    if manifest.get('bytes') != len(raw):
+        return None
+    return manifest
+
+
+def _check_archive_limit(manifest: Dict, label: str, name: str) -> None:
+    file_count = manifest['file_count']
+    logger.info(f"{label} archive {name} contains {file_count} files")
+    if file_count > MAX_ARCHIVE_FILES:
+        raise ArchiveLimitError(
+            f"Per daug failų archyve: {file_count} (max {MAX_ARCHIVE_FILES})"
+        )
+
 
 def _process_archive_member(fake_upload, fname: str, processed_count: int) -> Optional[Dict]:
     try:
@@ -377,228 +517,139 @@ def _process_archive_member(fake_upload, fname: str, processed_count: int) -> Op
         logger.warning(f"Failed to normalize file from archive {fname}: {e}")
         return None
 
-def _normalize_zip(raw: bytes, name: str) -> List[Dict]:
+
+def _append_member(results: List[Dict], fname: str, chunk: bytes) -> bool:
+    fake_upload = type('TmpUpload', (), {
+        'name': os.path.basename(fname),
+        'content_type': '',
+        '_data': chunk,
+        'read': lambda self: self._data
+    })()
+    result = _process_archive_member(fake_upload, fname, len(results))
+    if not result:
+        return False
+    if isinstance(result, list):
+        results.extend(result)
+    else:
+        results.append(result)
+    return True
+
+
+def _finish_archive(results: List[Dict], manifest: Dict, label: str, name: str, processed_count: int) -> List[Dict]:
+    logger.info(
+        f"{label} {name} processing complete: processed={processed_count}, "
+        f"skipped_unsupported={len(manifest['unsupported'])}, "
+        f"skipped_system={manifest['skipped_system']}, "
+        f"skipped_unsafe={manifest['skipped_unsafe']}, "
+        f"skipped_too_large={len(manifest['too_large'])}"
+    )
+
+    if results:
+        results[0]['_archive_skipped'] = {
+            'too_large': manifest['too_large'],
+            'unsupported': manifest['unsupported'],
+        }
+
+    if not results:
+        raise ValueError(f"No supported files found in {label} archive: {name}")
+    return results
+
+
+def _normalize_zip(raw: bytes, name: str, manifest: Optional[Dict] = None) -> List[Dict]:
     try:
         zf = zipfile.ZipFile(io.BytesIO(raw))
     except zipfile.BadZipFile:
         raise ValueError(f"Invalid ZIP archive: {name}")
 
-    infos = zf.infolist()
-    file_count = len([zi for zi in infos if not zi.is_dir()])
-    
-    logger.info(f"ZIP archive {name} contains {file_count} files")
-    
-    if file_count > MAX_ARCHIVE_FILES:
-        raise ArchiveLimitError(
-            f"Per daug failų archyve: {file_count} (max {MAX_ARCHIVE_FILES})"
-        )
+    manifest = _usable_manifest(manifest, 'zip', raw) or _build_manifest('zip', _zip_entries(zf), len(raw))
+    _check_archive_limit(manifest, 'ZIP', name)
 
     total_bytes = 0
     processed_count = 0
-    skipped_unsupported = 0
-    skipped_system = 0
-    skipped_too_large = []
-    skipped_unsupported_files = []
     results: List[Dict] = []
 
-    for zi in infos:
-        if zi.is_dir():
-            continue
-        fname = zi.filename
-        basename = os.path.basename(fname)
-        if not _is_safe_path(fname):
-            logger.warning(f"Unsafe path in ZIP, skipping: {fname}")
-            continue
-        if _is_system_file(fname):
-            skipped_system += 1
-            continue
-        if not _is_supported_format(fname):
-            skipped_unsupported += 1
-            skipped_unsupported_files.append({
-                'name': basename,
-                'extension': _ext(fname)
-            })
-            logger.debug(f"Skip unsupported format in ZIP: {fname}")
-            continue
-        
-        if zi.file_size > MAX_SINGLE_FILE_BYTES:
-            skipped_too_large.append({
-                'name': basename,
-                'size': zi.file_size,
-                'max_size': MAX_SINGLE_FILE_BYTES
-            })
-            logger.warning(f"File too large in ZIP ({zi.file_size} bytes), skipping: {fname}")
-            continue
-            
+    for member in manifest['members']:
+        fname = member['name']
         try:
-            with zf.open(zi, 'r') as f:
+            with zf.open(fname, 'r') as f:
                 chunk = f.read()
         except Exception as e:
             logger.warning(f"Failed to read file from ZIP {fname}: {e}")
             continue
-            
+
         total_bytes += len(chunk)
         if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
             logger.warning(f"ZIP total bytes exceeded limit; stopping at {processed_count} files")
             break
 
-        fake_upload = type('TmpUpload', (), {
-            'name': basename,
-            'content_type': '',
-            '_data': chunk,
-            'read': lambda self: self._data
-        })()
-        result = _process_archive_member(fake_upload, fname, processed_count)
-        if result:
-            if isinstance(result, list):
-                results.extend(result)
-            else:
-                results.append(result)
+        if _append_member(results, fname, chunk):
             processed_count += 1
 
-    logger.info(
-        f"ZIP {name} processing complete: processed={processed_count}, "
-        f"skipped_unsupported={skipped_unsupported}, skipped_system={skipped_system}, "
-        f"skipped_too_large={len(skipped_too_large)}"
-    )
-    
-    if results:
-        results[0]['_archive_skipped'] = {
-            'too_large': skipped_too_large,
-            'unsupported': skipped_unsupported_files,
-        }
-    
-    if not results:
-        raise ValueError(f"No supported files found in ZIP archive: {name}")
-    return results
+    return _finish_archive(results, manifest, 'ZIP', name, processed_count)
+
+
+def _read_extracted(tmpdir: str, members: List[Dict], label: str) -> List[Tuple[str, bytes]]:
+    """Išskleistų failų turinys (RAR / 7Z) iki MAX_ARCHIVE_TOTAL_BYTES."""
+    out = []
+    total_bytes = 0
+    for member in members:
+        fname = member['name']
+        extracted_path = os.path.join(tmpdir, fname)
+        if not os.path.isfile(extracted_path):
+            logger.warning(f"File not found after extraction: {fname}")
+            continue
+        try:
+            with open(extracted_path, 'rb') as f:
+                chunk = f.read()
+        except Exception as e:
+            logger.warning(f"Failed to read from {label} {fname}: {e}")
+            continue
+
+        total_bytes += len(chunk)
+        if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
+            logger.warning(f"{label} total bytes exceeded limit; stopping")
+            break
+        out.append((fname, chunk))
+    return out
 
 
-def _normalize_rar(raw: bytes, name: str) -> List[Dict]:
+def _normalize_rar(raw: bytes, name: str, manifest: Optional[Dict] = None) -> List[Dict]:
     if not RARFILE_AVAILABLE:
         raise ValueError("RAR support not installed. Install: pip install rarfile && apt-get install unrar")
 
     tmp_archive_path = None
-    
+
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix='.rar') as tmp:
             tmp.write(raw)
             tmp_archive_path = tmp.name
-        
+
         try:
             rf = rarfile.RarFile(tmp_archive_path)
         except Exception as e:
             raise ValueError(f"Invalid RAR archive or missing backend (unrar/unar). Archive: {name}") from e
 
-        infos = rf.infolist()
-        file_count = len([ri for ri in infos if not (ri.isdir() if hasattr(ri, 'isdir') else False)])
-        
-        logger.info(f"RAR archive {name} contains {file_count} files")
-        
-        if file_count > MAX_ARCHIVE_FILES:
-            rf.close()
-            raise ArchiveLimitError(
-                f"Per daug failų archyve: {file_count} (max {MAX_ARCHIVE_FILES})"
-            )
-
-        total_bytes = 0
-        processed_count = 0
-        skipped_unsupported = 0
-        skipped_system = 0
-        skipped_too_large = []
-        skipped_unsupported_files = []
-        results: List[Dict] = []
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            rf.extractall(path=tmpdir)
-            rf.close()
-
-            for ri in infos:
-                try:
-                    is_dir = ri.isdir() if hasattr(ri, 'isdir') else False
-                except Exception:
-                    continue
-                if is_dir:
-                    continue
+        try:
+            manifest = _usable_manifest(manifest, 'rar', raw) or _build_manifest('rar', _rar_entries(rf), len(raw))
+            _check_archive_limit(manifest, 'RAR', name)
 
-                fname = getattr(ri, 'filename', None) or getattr(ri, 'name', None)
-                if not fname:
-                    continue
-                basename = os.path.basename(fname)
+            processed_count = 0
+            results: List[Dict] = []
 
-                if not _is_safe_path(fname):
-                    logger.warning(f"Unsafe path in RAR, skipping: {fname}")
-                    continue
-                if _is_system_file(fname):
-                    skipped_system += 1
-                    continue
-                if not _is_supported_format(fname):
-                    skipped_unsupported += 1
-                    skipped_unsupported_files.append({
-                        'name': basename,
-                        'extension': _ext(fname)
-                    })
-                    logger.debug(f"Skip unsupported format in RAR: {fname}")
-                    continue
+            with tempfile.TemporaryDirectory() as tmpdir:
+                # Tik atrinkti failai — vienas unrar iškvietimas
+                names = [m['name'] for m in manifest['members']]
+                if names:
+                    rf.extractall(path=tmpdir, members=names)
 
-                extracted_path = os.path.join(tmpdir, fname)
-                if not os.path.exists(extracted_path):
-                    logger.warning(f"File not found after extraction: {fname}")
-                    continue
+                for fname, chunk in _read_extracted(tmpdir, manifest['members'], 'RAR'):
+                    if _append_member(results, fname, chunk):
+                        processed_count += 1
+        finally:
+            rf.close()
 
-                try:
-                    file_size = os.path.getsize(extracted_path)
-                    
-                    if file_size > MAX_SINGLE_FILE_BYTES:
-                        skipped_too_large.append({
-                            'name': basename,
-                            'size': file_size,
-                            'max_size': MAX_SINGLE_FILE_BYTES
-                        })
-                        logger.warning(f"File too large in RAR ({file_size} bytes), skipping: {fname}")
-                        continue
-                    
-                    with open(extracted_path, 'rb') as f:
-                        chunk = f.read()
-                except Exception as e:
-                    logger.warning(f"Failed to read from RAR {fname}: {e}")
-                    continue
+        return _finish_archive(results, manifest, 'RAR', name, processed_count)
 
-                total_bytes += len(chunk)
-                if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
-                    logger.warning("RAR total bytes exceeded limit; stopping")
-                    break
-
-                fake_upload = type('TmpUpload', (), {
-                    'name': basename,
-                    'content_type': '',
-                    '_data': chunk,
-                    'read': lambda self: self._data
-                })()
-                result = _process_archive_member(fake_upload, fname, processed_count)
-                if result:
-                    if isinstance(result, list):
-                        results.extend(result)
-                    else:
-                        results.append(result)
-                    processed_count += 1
-
-        logger.info(
-            f"RAR {name} processing complete: processed={processed_count}, "
-            f"skipped_unsupported={skipped_unsupported}, skipped_system={skipped_system}, "
-            f"skipped_too_large={len(skipped_too_large)}"
-        )
-        
-        if results:
-            results[0]['_archive_skipped'] = {
-                'too_large': skipped_too_large,
-                'unsupported': skipped_unsupported_files,
-            }
-        
-        if not results:
-            raise ValueError(f"No supported files found in RAR archive: {name}")
-        
-        return results
-        
     finally:
         if tmp_archive_path and os.path.exists(tmp_archive_path):
             try:
@@ -607,233 +658,94 @@ def _normalize_rar(raw: bytes, name: str) -> List[Dict]:
                 pass
 
 
-def _normalize_7z(raw: bytes, name: str) -> List[Dict]:
+def _normalize_7z(raw: bytes, name: str, manifest: Optional[Dict] = None) -> List[Dict]:
     if not PY7ZR_AVAILABLE:
         raise ValueError("7Z support not installed. Install: pip install py7zr")
-    
+
     try:
         sz = py7zr.SevenZipFile(io.BytesIO(raw), mode='r')
-        all_files = sz.getnames()
+        manifest = _usable_manifest(manifest, '7z', raw) or _build_manifest('7z', _7z_entries(sz), len(raw))
     except py7zr.Bad7zFile:
         raise ValueError(f"Invalid 7Z archive: {name}")
 
-    file_count = len([f for f in all_files if not f.endswith('/')])
-    logger.info(f"7Z archive {name} contains {file_count} files")
-    
-    if file_count > MAX_ARCHIVE_FILES:
+    try:
+        _check_archive_limit(manifest, '7Z', name)
+    except ArchiveLimitError:
         sz.close()
-        raise ArchiveLimitError(
-            f"Per daug failų archyve: {file_count} (max {MAX_ARCHIVE_FILES})"
-        )
+        raise
 
-    total_bytes = 0
     processed_count = 0
-    skipped_unsupported = 0
-    skipped_system = 0
-    skipped_too_large = []
-    skipped_unsupported_files = []
     results: List[Dict] = []
 
     with tempfile.TemporaryDirectory() as tmpdir:
         try:
-            sz.extractall(path=tmpdir)
+            names = [m['name'] for m in manifest['members']]
+            if names:
+                sz.extract(path=tmpdir, targets=names)
         finally:
             sz.close()
-        
-        for fname in all_files:
-            basename = os.path.basename(fname)
-            if fname.endswith('/'):
-                continue
-            if not _is_safe_path(fname):
-                logger.warning(f"Unsafe path in 7Z, skipping: {fname}")
-                continue
-            if _is_system_file(fname):
-                skipped_system += 1
-                continue
-            if not _is_supported_format(fname):
-                skipped_unsupported += 1
-                skipped_unsupported_files.append({
-                    'name': basename,
-                    'extension': _ext(fname)
-                })
-                logger.debug(f"Skip unsupported format in 7Z: {fname}")
-                continue
-            
-            extracted_path = os.path.join(tmpdir, fname)
-            if not os.path.exists(extracted_path):
-                logger.warning(f"File not found after extraction: {fname}")
-                continue
-            
-            try:
-                file_size = os.path.getsize(extracted_path)
-                
-                if file_size > MAX_SINGLE_FILE_BYTES:
-                    skipped_too_large.append({
-                        'name': basename,
-                        'size': file_size,
-                        'max_size': MAX_SINGLE_FILE_BYTES
-                    })
-                    logger.warning(f"File too large in 7Z ({file_size} bytes), skipping: {fname}")
-                    continue
-                
-                with open(extracted_path, 'rb') as f:
-                    chunk = f.read()
-            except Exception as e:
-                logger.warning(f"Failed to read from 7Z {fname}: {e}")
-                continue
-
-            total_bytes += len(chunk)
-            if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
-                logger.warning("7Z total bytes exceeded limit; stopping")
-                break
 
-            fake_upload = type('TmpUpload', (), {
-                'name': basename,
-                'content_type': '',
-                '_data': chunk,
-                'read': lambda self: self._data
-            })()
-            result = _process_archive_member(fake_upload, fname, processed_count)
-            if result:
-                if isinstance(result, list):
-                    results.extend(result)
-                else:
-                    results.append(result)
+        for fname, chunk in _read_extracted(tmpdir, manifest['members'], '7Z'):
+            if _append_member(results, fname, chunk):
                 processed_count += 1
 
-    logger.info(
-        f"7Z {name} processing complete: processed={processed_count}, "
-        f"skipped_unsupported={skipped_unsupported}, skipped_system={skipped_system}, "
-        f"skipped_too_large={len(skipped_too_large)}"
-    )
-    
-    if results:
-        results[0]['_archive_skipped'] = {
-            'too_large': skipped_too_large,
-            'unsupported': skipped_unsupported_files,
-        }
-    
-    if not results:
-        raise ValueError(f"No supported files found in 7Z archive: {name}")
-    return results
+    return _finish_archive(results, manifest, '7Z', name, processed_count)
 
 
-def _normalize_tar(raw: bytes, name: str) -> List[Dict]:
+def _normalize_tar(raw: bytes, name: str, manifest: Optional[Dict] = None) -> List[Dict]:
     try:
         tf = tarfile.open(fileobj=io.BytesIO(raw), mode='r:*')
     except tarfile.TarError:
         raise ValueError(f"Invalid TAR archive: {name}")
 
-    members = tf.getmembers()
-    file_count = len([m for m in members if m.isfile()])
-    
-    logger.info(f"TAR archive {name} contains {file_count} files")
-    
-    if file_count > MAX_ARCHIVE_FILES:
-        tf.close()
-        raise ArchiveLimitError(
-            f"Per daug failų archyve: {file_count} (max {MAX_ARCHIVE_FILES})"
-        )
+    try:
+        manifest = _usable_manifest(manifest, 'tar', raw) or _build_manifest('tar', _tar_entries(tf.getmembers()), len(raw))
+        _check_archive_limit(manifest, 'TAR', name)
 
-    total_bytes = 0
-    processed_count = 0
-    skipped_unsupported = 0
-    skipped_system = 0
-    skipped_too_large = []
-    skipped_unsupported_files = []
-    results: List[Dict] = []
+        total_bytes = 0
+        processed_count = 0
+        results: List[Dict] = []
 
-    for tm in members:
-        if tm.isdir() or tm.issym() or tm.islnk():
-            continue
-        fname = tm.name
-        basename = os.path.basename(fname)
-        if not _is_safe_path(fname):
-            logger.warning(f"Unsafe path in TAR, skipping: {fname}")
-            continue
-        if _is_system_file(fname):
-            skipped_system += 1
-            continue
-        if not _is_supported_format(fname):
-            skipped_unsupported += 1
-            skipped_unsupported_files.append({
-                'name': basename,
-                'extension': _ext(fname)
-            })
-            logger.debug(f"Skip unsupported format in TAR: {fname}")
-            continue
-        
-        if tm.size > MAX_SINGLE_FILE_BYTES:
-            skipped_too_large.append({
-                'name': basename,
-                'size': tm.size,
-                'max_size': MAX_SINGLE_FILE_BYTES
-            })
-            logger.warning(f"File too large in TAR ({tm.size} bytes), skipping: {fname}")
-            continue
-            
-        try:
-            f = tf.extractfile(tm)
-            if f is None:
+        for member in manifest['members']:
+            fname = member['name']
+            try:
+                f = tf.extractfile(fname)
+                if f is None:
+                    continue
+                chunk = f.read()
+                f.close()
+            except Exception as e:
+                logger.warning(f"Failed to read from TAR {fname}: {e}")
                 continue
-            chunk = f.read()
-            f.close()
-        except Exception as e:
-            logger.warning(f"Failed to read from TAR {fname}: {e}")
-            continue
 
-        total_bytes += len(chunk)
-        if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
-            logger.warning("TAR total bytes exceeded limit; stopping")
-            break
+            total_bytes += len(chunk)
+            if total_bytes > MAX_ARCHIVE_TOTAL_BYTES:
+                logger.warning("TAR total bytes exceeded limit; stopping")
+                break
 
-        fake_upload = type('TmpUpload', (), {
-            'name': basename,
-            'content_type': '',
-            '_data': chunk,
-            'read': lambda self: self._data
-        })()
-        result = _process_archive_member(fake_upload, fname, processed_count)
-        if result:
-            if isinstance(result, list):
-                results.extend(result)
-            else:
-                results.append(result)
-            processed_count += 1
+            if _append_member(results, fname, chunk):
+                processed_count += 1
+    finally:
+        tf.close()
 
-    tf.close()
-    logger.info(
-        f"TAR {name} processing complete: processed={processed_count}, "
-        f"skipped_unsupported={skipped_unsupported}, skipped_system={skipped_system}, "
-        f"skipped_too_large={len(skipped_too_large)}"
-    )
-    
-    if results:
-        results[0]['_archive_skipped'] = {
-            'too_large': skipped_too_large,
-            'unsupported': skipped_unsupported_files,
-        }
-    
-    if not results:
-        raise ValueError(f"No supported files found in TAR archive: {name}")
-    return results
+    return _finish_archive(results, manifest, 'TAR', name, processed_count)
 
 
 
-def _normalize_archive(raw: bytes, name: str) -> List[Dict]:
+def _normalize_archive(raw: bytes, name: str, manifest: Optional[Dict] = None) -> List[Dict]:
     """
     Маршрутизирует обработку архива к соответствующей функции в зависимости от расширения
     """
     ext = _ext(name)
     
     if ext == '.zip':
-        return _normalize_zip(raw, name)
+        return _normalize_zip(raw, name, manifest)
     elif ext == '.rar':
-        return _normalize_rar(raw, name)
+        return _normalize_rar(raw, name, manifest)
     elif ext == '.7z':
-        return _normalize_7z(raw, name)
-    elif ext in {'.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz', '.tbz2'}:
-        return _normalize_tar(raw, name)
+        return _normalize_7z(raw, name, manifest)
+    elif ext in TAR_EXTS:
+        return _normalize_tar(raw, name, manifest)
     else:
         raise ValueError(f"Unsupported archive format: {ext}")
 
@@ -909,12 +821,14 @@ def _is_image_mime(mime: str) -> bool:
     return mime is not None and mime.startswith('image/')
 
 
-def normalize_any(uploaded_file) -> List[Dict] | Dict:
+def normalize_any(uploaded_file, manifest: Optional[Dict] = None) -> List[Dict] | Dict:
     """
     Возвращает:
       - dict: один нормализованный файл (картинка для OCR/превью)
       - list[dict]: несколько нормализованных файлов (если пришёл архив)
     НОРМАЛИЗАЦИЯ: только даунскейл по LIMIT_SIDE_PX/LIMIT_BYTES; DPI не меняем.
+    manifest — archive_manifest() rezultatas (ScannedDocument.archive_manifest),
+    naudojamas tik jei atitinka archyvą.
     """
     try:
         from django.conf import settings
@@ -997,7 +911,7 @@ def normalize_any(uploaded_file) -> List[Dict] | Dict:
 
     # Архивы
     if ext in ARCHIVE_EXTS:
-        return _normalize_archive(raw, name)
+        return _normalize_archive(raw, name, manifest)
 
     # PDF
     if ext == '.pdf' or content_type == 'application/pdf':
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types  # для HttpOptions(timeout=...)
 from ..celery_signals import _send_telegram
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
 
 # Попытка импортировать типовые исключения rate limit от Google SDK (если доступно)
 try:
@@ -872,6 +873,7 @@ def ask_gemini(
 
     client = _client_with_timeout(timeout_seconds)
 
+    require_rate_limit("gemini", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
     response = client.models.generate_content(
         model=model,
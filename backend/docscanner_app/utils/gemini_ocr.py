@@ -5,6 +5,8 @@ from typing import Tuple
 from dotenv import load_dotenv
 from google import genai
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 load_dotenv()
 
 # Попытка использовать общий клиент, если он уже настроен в проекте.
@@ -64,6 +66,7 @@ def get_ocr_text_gemini(
         b64 = base64.b64encode(data).decode("utf-8")
         mime = _guess_mime(filename)
 
+        require_rate_limit("gemini", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
         resp = gemini_client.models.generate_content(
             model=model,
             contents=[
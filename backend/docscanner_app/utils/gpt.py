@@ -3,6 +3,7 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import time
 import openai
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
 
 load_dotenv()
 
@@ -327,6 +328,7 @@ def ask_gpt_with_retry(text: str, prompt: str, max_retries=2, wait_seconds=60) -
 def ask_gpt(text: str, prompt: str) -> str:
     full_prompt = prompt + "\n\n" + text
 
+    require_rate_limit("openai", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     response = client.chat.completions.create(
         model="gpt-4.1",
         messages=[
@@ -9,6 +9,8 @@ from typing import Any, Dict, List, Optional, Tuple
 import requests
 from dotenv import load_dotenv
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 load_dotenv()
 LOGGER = logging.getLogger("docscanner_app")
 
@@ -460,6 +462,7 @@ def ask_grok(
         model, len(text or ""), len(prompt or ""), eff_timeout
     )
 
+    require_rate_limit("grok", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
     r = requests.post(
         GROK_API_URL,
@@ -0,0 +1,239 @@
+"""
+utils/incremental_matching.py
+=============================
+Incremental matching: vietoj viso išrašo / visų dokumentų perskaičiavimo
+perskaičiuojamos tik operacijos, kurias paveikė pasikeitę dokumentai ar
+alokacijos.
+
+Pakeitimų eilė — MatchingChange (user, kind, object_id). Į ją rašo
+utils/signals.py (Invoice / Purchase / PaymentAllocation save/delete) toje
+pačioje DB transakcijoje kaip pats pakeitimas; process_matching_changes_task
+(debounce INCREMENTAL_MATCHING_DELAY s) eilę apdoroja.
+
+Kodėl rezultatas toks pat kaip pilno paleidimo:
+  - match_transactions() kiekvienai operacijai skaičiuoja rezultatą
+    nepriklausomai (kandidatai tarp operacijų „nesunaudojami“), todėl
+    užtenka perskaičiuoti operacijas, kurių kandidatų aibė / balai pasikeitė.
+  - Incoming (InvoiceMatchingEngine): operacija paveikta, jei pasikeitusi
+    sąskaita patenka į jos _candidate_ids() „zondo“ engine'e, kuriame yra
+    tik pasikeitusios sąskaitos (įskaitant apmokėtas / uždarytas — jų
+    išnykimas gali įjungti amount fallback'ą). Ištrinta sąskaita →
+    perskaičiuojamos visos neapmokėtos operacijos.
+  - Outgoing (SignalPurchaseMatchingEngine): operacija paveikta, jei
+    pasikeitęs Purchase patenka į CandidateBlockingIndex shortlist'ą
+    (garantuoja visus kandidatus su balu > BLOCKING_MAX_MISSED_SCORE <
+    LIKELY_THRESHOLD). Dokumento išnykimas neapmatchintos operacijos
+    rezultato pakeisti negali — geriausias balas tik mažėja.
+  - Paveiktos operacijos perskaičiuojamos pilnu engine'u (visi kandidatai),
+    rezultatai įrašomi vienoje DB transakcijoje kartu su eilės išvalymu.
+
+Patikra: tests.IncrementalMatchingTests (pakeitimai → process_matching_changes == pilnas paleidimas)
+"""
+
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+logger = logging.getLogger("docscanner_app")
+
+MATCHING_CHANGES_BATCH = 5000
+MATCHING_CHANGES_DEBOUNCE_KEY = "incremental_matching:{user_id}"
+
+
+def incremental_matching_enabled() -> bool:
+    return getattr(settings, "INCREMENTAL_MATCHING_ENABLED", True)
+
+
+# ════════════════════════════════════════════════════════════
+# Queue
+# ════════════════════════════════════════════════════════════
+
+def enqueue_matching_changes(user_id, kind, object_ids):
+    """
+    Įrašo pakeitimus į MatchingChange (einamoje transakcijoje) ir po commit'o
+    suplanuoja apdorojimą. Dublikatai ignoruojami (unique user/kind/object_id).
+    """
+    from ..models import MatchingChange
+
+    if not user_id or not incremental_matching_enabled():
+        return
+    ids = {int(i) for i in object_ids if i}
+    if not ids:
+        return
+
+    MatchingChange.objects.bulk_create(
+        [MatchingChange(user_id=user_id, kind=kind, object_id=i) for i in ids],
+        ignore_conflicts=True,
+    )
+    db_transaction.on_commit(lambda: schedule_incremental_matching(user_id))
+
+
+def schedule_incremental_matching(user_id):
+    """Debounce: vienas task'as per INCREMENTAL_MATCHING_DELAY s vienam vartotojui."""
+    from django.core.cache import cache
+    from ..tasks import process_matching_changes_task
+
+    delay = getattr(settings, "INCREMENTAL_MATCHING_DELAY", 30)
+    key = MATCHING_CHANGES_DEBOUNCE_KEY.format(user_id=user_id)
+    if not cache.add(key, 1, timeout=delay + 60):
+        return
+    try:
+        process_matching_changes_task.apply_async(args=[user_id], countdown=delay)
+    except Exception as e:
+        cache.delete(key)
+        logger.warning("[IncrementalMatch] Failed to schedule for user %s: %s", user_id, e)
+
+
+# ════════════════════════════════════════════════════════════
+# Affected transactions
+# ════════════════════════════════════════════════════════════
+
+def unmatched_for_matching(user, direction: str) -> list:
+    """Tos pačios operacijos, kurias pilnas paleidimas siunčia į matching'ą."""
+    from ..models import IncomingTransaction, OutgoingTransaction
+    from .bank_transaction_policy import should_try_document_match
+
+    Model = IncomingTransaction if direction == "incoming" else OutgoingTransaction
+    qs = (
+        Model.objects
+        .filter(user=user, match_status="unmatched")
+        .select_related("category_rule")
+        .order_by("id")
+    )
+    return [t for t in qs if should_try_document_match(t, direction)]
+
+
+def affected_incoming(user, invoice_ids, txn_ids, unmatched) -> list:
+    """Neapmatchintos incoming operacijos, kurių rezultatą gali pakeisti invoice_ids."""
+    from ..models import Invoice, PaymentAllocation
+    from django.db.models import Sum
+    from .payment_invoice_matching import InvoiceMatchingEngine
+
+    txn_ids = set(txn_ids)
+    affected = {t.id for t in unmatched if t.id in txn_ids}
+
+    if invoice_ids:
+        invoices = list(Invoice.objects.filter(user=user, id__in=invoice_ids))
+        if len(invoices) < len(set(invoice_ids)):
+            # Ištrinta sąskaita: nežinom, kurioms operacijoms ji buvo kandidatė
+            return list(unmatched)
+
+        paid = dict(
+            PaymentAllocation.objects
+            .filter(invoice_id__in=[i.id for i in invoices], status__in=["confirmed", "auto", "manual"])
+            .values("invoice_id")
+            .annotate(t=Sum("amount"))
+            .values_list("invoice_id", "t")
+        )
+        probe = InvoiceMatchingEngine(user)
+        for inv in invoices:
+            amount = inv.amount_with_vat or Decimal("0")
+            probe._add_to_cache(inv, amount - (paid.get(inv.id) or Decimal("0")))
+
+        for t in unmatched:
+            if t.id not in affected and probe._candidate_ids(t)[0]:
+                affected.add(t.id)
+
+    return [t for t in unmatched if t.id in affected]
+
+
+def affected_outgoing(user, purchase_ids, txn_ids, unmatched, signals_map=None) -> list:
+    """Neapmatchintos outgoing operacijos, kurių rezultatą gali pakeisti purchase_ids."""
+    from ..models import Purchase
+    from .purchase_matching_signals import SignalPurchaseMatchingEngine
+    from .transaction_signals import CandidateBlockingIndex, load_signals
+
+    txn_ids = set(txn_ids)
+    affected = {t.id for t in unmatched if t.id in txn_ids}
+
+    if purchase_ids:
+        engine = SignalPurchaseMatchingEngine(user)
+        probe = CandidateBlockingIndex([
+            engine._purchase_to_candidate(p)
+            for p in Purchase.objects.filter(user=user, id__in=purchase_ids)
+        ])
+        rest = [t for t in unmatched if t.id not in affected]
+        if signals_map is None:
+            signals_map = load_signals(rest)
+        for t in rest:
+            signals = signals_map.get(t)
+            if signals is None or signals.skip_matching:
+                continue
+            if probe.shortlist(signals, t.transaction_date):
+                affected.add(t.id)
+
+    return [t for t in unmatched if t.id in affected]
+
+
+# ════════════════════════════════════════════════════════════
+# Processing
+# ════════════════════════════════════════════════════════════
+
+def process_matching_changes(user, limit: int = MATCHING_CHANGES_BATCH) -> dict:
+    """
+    Paima iki limit pakeitimų iš eilės, perskaičiuoja paveiktas operacijas ir
+    įrašo rezultatus. Viskas vienoje transakcijoje: klaida → eilė lieka.
+    """
+    from ..models import MatchingChange
+    from .payment_invoice_matching import InvoiceMatchingEngine
+    from .purchase_matching_signals import SignalPurchaseMatchingEngine
+
+    stats = {"changes": 0, "incoming": 0, "outgoing": 0, "matched": 0}
+    Kind = MatchingChange.Kind
+
+    with db_transaction.atomic():
+        rows = list(
+            MatchingChange.objects
+            .select_for_update(skip_locked=True)
+            .filter(user=user)
+            .order_by("id")[:limit]
+        )
+        if not rows:
+            return stats
+        MatchingChange.objects.filter(id__in=[r.id for r in rows]).delete()
+        stats["changes"] = len(rows)
+
+        ids = {k: [] for k in Kind.values}
+        for r in rows:
+            ids[r.kind].append(r.object_id)
+
+        if ids[Kind.INVOICE] or ids[Kind.INCOMING]:
+            unmatched = unmatched_for_matching(user, "incoming")
+            txns = affected_incoming(user, ids[Kind.INVOICE], ids[Kind.INCOMING], unmatched)
+            if txns:
+                engine = InvoiceMatchingEngine(user)
+                results = engine.match_transactions(txns)
+                engine.apply_results(results)
+                stats["incoming"] = len(txns)
+                stats["matched"] += sum(1 for r in results if r.status != "unmatched")
+                _auto_create_sf(results)
+
+        if ids[Kind.PURCHASE] or ids[Kind.OUTGOING]:
+            unmatched = unmatched_for_matching(user, "outgoing")
+            txns = affected_outgoing(user, ids[Kind.PURCHASE], ids[Kind.OUTGOING], unmatched)
+            if txns:
+                p_engine = SignalPurchaseMatchingEngine(user)
+                p_results = p_engine.match_transactions(txns)
+                p_engine.apply_results(p_results)
+                stats["outgoing"] = len(txns)
+                stats["matched"] += sum(1 for r in p_results if r.status != "unmatched")
+
+    logger.info("[IncrementalMatch] user=%s %s", user.pk, stats)
+    return stats
+
+
+def _auto_create_sf(results):
+    """Kaip importe: auto_matched išankstinėms — SF sukūrimas."""
+    from ..models import Invoice
+    from ..services.auto_sf import maybe_auto_create_sf
+
+    for r in results:
+        if r.status != "auto_matched":
+            continue
+        for prop in r.allocations:
+            try:
+                maybe_auto_create_sf(Invoice.objects.get(id=prop.invoice_id))
+            except Exception as e:
+                logger.warning("[IncrementalMatch] Auto SF failed for invoice %s: %s", prop.invoice_id, e)
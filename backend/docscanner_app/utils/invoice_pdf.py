@@ -6,6 +6,7 @@ PDF generation via ReportLab — design matches InvoiceA4 React preview.
 import io
 import os
 import platform
+from functools import lru_cache
 from decimal import Decimal, ROUND_HALF_UP
 import logging
 
@@ -28,6 +29,10 @@ from django.core.files.base import ContentFile
 
 logger = logging.getLogger("docscanner_app")
 
+# Maketo versija — PDF kešo rakto dalis (services/invoice_pdf_cache.py).
+# Didinti keičiant išdėstymą, stilius, šriftus ar naudojamus laukus.
+TEMPLATE_VERSION = 1
+
 # ════════════════════════════════════════════════════════════
 # Fonts
 # ════════════════════════════════════════════════════════════
@@ -379,10 +384,16 @@ def _parse_num(v):
     return Decimal(str(v).replace(",", "."))
 
 
+@lru_cache(maxsize=64)
+def _image_size(logo_path, size, mtime_ns):
+    """Logotipo matmenys; dekoduojama kartą procesui (kol failas nepakeistas)."""
+    return ImageReader(logo_path).getSize()
+
+
 def _make_logo(logo_path, max_width_mm=25, max_height_mm=10):
     try:
-        img = ImageReader(logo_path)
-        iw, ih = img.getSize()
+        st = os.stat(logo_path)
+        iw, ih = _image_size(logo_path, st.st_size, st.st_mtime_ns)
         if not iw or not ih:
             return None
 
@@ -1417,29 +1428,9 @@ def generate_invoice_pdf(invoice, logo_path=None, watermark=False):
 
 
 def save_invoice_pdf(invoice):
-    logo_path = None
-    try:
-        settings = invoice.user.invoice_settings
-        if settings.logo and settings.logo.storage.exists(settings.logo.name):
-            logo_path = settings.logo.path
-    except Exception:
-        pass
-
-    # --- Watermark for free plan ---
-    watermark = False
-    try:
-        from docscanner_app.models import InvSubscription
-        sub = InvSubscription.objects.filter(user=invoice.user).first()
-        if sub:
-            sub.check_and_expire()
-            watermark = sub.status == "free"
-            logger.info("[PDF] user=%s inv_sub.status=%s watermark=%s", invoice.user.email, sub.status, watermark)
-        else:
-            logger.info("[PDF] user=%s no InvSubscription found", invoice.user.email)
-    except Exception as e:
-        logger.error("[PDF] watermark check failed: %s", e)
+    from docscanner_app.services.invoice_pdf_cache import get_invoice_pdf
 
-    pdf_bytes = generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+    pdf_bytes = get_invoice_pdf(invoice)
     filename = f"saskaita_{invoice.document_series}{invoice.document_number}.pdf"
     invoice.pdf_file.save(filename, ContentFile(pdf_bytes), save=False)
     invoice.save(update_fields=["pdf_file"])
@@ -72,63 +72,66 @@ def resolve_debeto_for_inventory(pirkimo_code, *, uses_inventory, user_override=
     return code
 
 
+# Sąskaitų plano pavadinimai (denormalizuojami į JournalEntryLine.account_name)
+ACCOUNT_NAMES = {
+    # Turtas
+    "1130": "Programinės įrangos įsigijimo savikaina",
+    "1220": "Mašinų ir įrangos įsigijimo savikaina",
+    "1230": "Transporto priemonių įsigijimo savikaina",
+    "1240": "Kitų įrenginių, prietaisų įsigijimo savikaina",
+    "2010": "Žaliavos, medžiagos",
+    "2040": "Prekės perpardavimui",
+    "2080": "Avansai tiekėjams",
+    "2410": "Pirkėjų skolos",
+    "2441": "Gautinas PVM",
+    "271": "Sąskaitos bankuose",
+    "272": "Kasa",
+    "291": "Ateinančių laikotarpių sąnaudos",
+
+    # Nuosavas kapitalas
+    "3010": "Įstatinis kapitalas",
+
+    # Įsipareigojimai
+    "4430": "Skolos tiekėjams",
+    "4480": "Kitos mokėtinos sumos",
+    "4481": "Mokėtini mokesčiai",
+    "4492": "Mokėtinas PVM",
+
+    # Pajamos
+    "5000": "Parduotų prekių pajamos",
+    "5001": "Suteiktų paslaugų pajamos",
+    "509": "Nuolaidos, grąžinimas",
+    "5009": "Apvalinimas",
+    "5400": "Ilgalaikio turto perleidimo pelnas",
+    "5401": "Kitos veiklos pajamos",
+
+    # Sąnaudos
+    "6000": "Parduotų prekių savikaina",
+    "6001": "Suteiktų paslaugų savikaina",
+    "6002": "Įsigytų prekių ir paslaugų savikaina",
+    "6003": "Tiesioginės gamybos išlaidos",
+    "6004": "Netiesioginės gamybos išlaidos",
+    "6200": "Komisiniai mokesčiai",
+    "6202": "Reklamos sąnaudos",
+    "6208": "Kitos pardavimo sąnaudos",
+    "6300": "Nuomos sąnaudos",
+    "6301": "Remonto ir eksploatacijos sąnaudos",
+    "6302": "Išmokos tretiesiems asmenims",
+    "6303": "Draudimo sąnaudos",
+    "6304": "Darbuotojų darbo užmokestis",
+    "6308": "Veiklos mokesčių sąnaudos",
+    "6311": "Baudos ir delspinigiai",
+    "6312": "Kitos bendrosios sąnaudos",
+    "6401": "Kitos sąnaudos",
+    "6802": "Palūkanų sąnaudos",
+    "6803": "Valiutų kursų nuostoliai",
+    "6810": "Kitos finansinės sąnaudos",
+}
+
+
 def _get_account_name(code):
     """Возвращает название sąskaitos по коду для денормализации."""
-    ACCOUNTS = {
-        # Turtas
-        "1130": "Programinės įrangos įsigijimo savikaina",
-        "1220": "Mašinų ir įrangos įsigijimo savikaina",
-        "1230": "Transporto priemonių įsigijimo savikaina",
-        "1240": "Kitų įrenginių, prietaisų įsigijimo savikaina",
-        "2010": "Žaliavos, medžiagos",
-        "2040": "Prekės perpardavimui",
-        "2080": "Avansai tiekėjams",
-        "2410": "Pirkėjų skolos",
-        "2441": "Gautinas PVM",
-        "271": "Sąskaitos bankuose",
-        "272": "Kasa",
-        "291": "Ateinančių laikotarpių sąnaudos",
-
-        # Nuosavas kapitalas
-        "3010": "Įstatinis kapitalas",
-
-        # Įsipareigojimai
-        "4430": "Skolos tiekėjams",
-        "4480": "Kitos mokėtinos sumos",
-        "4481": "Mokėtini mokesčiai",
-        "4492": "Mokėtinas PVM",
-
-        # Pajamos
-        "5000": "Parduotų prekių pajamos",
-        "5001": "Suteiktų paslaugų pajamos",
-        "509": "Nuolaidos, grąžinimas",
-        "5009": "Apvalinimas",
-        "5400": "Ilgalaikio turto perleidimo pelnas",
-        "5401": "Kitos veiklos pajamos",
-
-        # Sąnaudos
-        "6000": "Parduotų prekių savikaina",
-        "6001": "Suteiktų paslaugų savikaina",
-        "6002": "Įsigytų prekių ir paslaugų savikaina",
-        "6003": "Tiesioginės gamybos išlaidos",
-        "6004": "Netiesioginės gamybos išlaidos",
-        "6200": "Komisiniai mokesčiai",
-        "6202": "Reklamos sąnaudos",
-        "6208": "Kitos pardavimo sąnaudos",
-        "6300": "Nuomos sąnaudos",
-        "6301": "Remonto ir eksploatacijos sąnaudos",
-        "6302": "Išmokos tretiesiems asmenims",
-        "6303": "Draudimo sąnaudos",
-        "6304": "Darbuotojų darbo užmokestis",
-        "6308": "Veiklos mokesčių sąnaudos",
-        "6311": "Baudos ir delspinigiai",
-        "6312": "Kitos bendrosios sąnaudos",
-        "6401": "Kitos sąnaudos",
-        "6802": "Palūkanų sąnaudos",
-        "6803": "Valiutų kursų nuostoliai",
-        "6810": "Kitos finansinės sąnaudos",
-    }
-    return ACCOUNTS.get(str(code or ""), "")
+    return ACCOUNT_NAMES.get(str(code or ""), "")
 
 
 def _to_decimal(value):
@@ -215,6 +218,32 @@ def recalculate_invoice_totals(invoice):
     3. Nuolaida proporcingai paskirstoma pagal PVM tarifus.
     4. Išsaugomos galutinės Invoice sumos.
     """
+    invoice_lines = list(
+        invoice.line_items.order_by("sort_order", "id")
+    )
+
+    if not invoice_lines:
+        return invoice
+
+    _compute_invoice_totals(invoice, invoice_lines)
+
+    # QuerySet.update() не вызывает Invoice.save() и post_save signal,
+    # поэтому DK generator не запускает сам себя рекурсивно.
+    Invoice.objects.filter(pk=invoice.pk).update(
+        amount_wo_vat=invoice.amount_wo_vat,
+        vat_amount=invoice.vat_amount,
+        amount_with_vat=invoice.amount_with_vat,
+        invoice_discount_wo_vat=invoice.invoice_discount_wo_vat,
+    )
+
+    return invoice
+
+
+def _compute_invoice_totals(invoice, invoice_lines):
+    """
+    recalculate_invoice_totals() skaičiavimas be DB užklausų: nustato
+    invoice sumų laukus pagal jau užkrautas eilutes (naudoja ir batch DK).
+    """
     MONEY = Decimal("0.01")
     ZERO = Decimal("0")
 
@@ -224,13 +253,6 @@ def recalculate_invoice_totals(invoice):
             rounding=ROUND_HALF_UP,
         )
 
-    invoice_lines = list(
-        invoice.line_items.order_by("sort_order", "id")
-    )
-
-    if not invoice_lines:
-        return invoice
-
     # Subtotal jau yra suma po eilutės nuolaidos,
     # bet prieš bendrą visos sąskaitos nuolaidą.
     sum_net = sum(
@@ -326,17 +348,6 @@ def recalculate_invoice_totals(invoice):
         invoice_discount * sign
     )
 
-    # QuerySet.update() не вызывает Invoice.save() и post_save signal,
-    # поэтому DK generator не запускает сам себя рекурсивно.
-    Invoice.objects.filter(pk=invoice.pk).update(
-        amount_wo_vat=invoice.amount_wo_vat,
-        vat_amount=invoice.vat_amount,
-        amount_with_vat=invoice.amount_with_vat,
-        invoice_discount_wo_vat=invoice.invoice_discount_wo_vat,
-    )
-
-    return invoice
-
 
 def _period_from_date(dt):
     """Возвращает первый день месяца для periodo."""
@@ -365,13 +376,28 @@ def finalize_journal_entry(entry):
         s=Coalesce(Sum("amount"), Decimal("0"))
     )["s"]
 
-    difference = debit - credit
-
     has_lines = lines.exists()
     has_missing_account = lines.filter(
         Q(account_code__isnull=True) | Q(account_code="")
     ).exists()
 
+    _apply_totals_and_status(entry, debit, credit, has_lines, has_missing_account)
+
+    entry.save(update_fields=[
+        "total_debit",
+        "total_credit",
+        "difference",
+        "status",
+        "updated_at",
+    ])
+
+    return entry
+
+
+def _apply_totals_and_status(entry, debit, credit, has_lines, has_missing_account):
+    """Bendros finalize_journal_entry() / _finalize_in_memory() taisyklės."""
+    difference = debit - credit
+
     entry.total_debit = debit
     entry.total_credit = credit
     entry.difference = difference
@@ -389,14 +415,14 @@ def finalize_journal_entry(entry):
     else:
         entry.status = JournalEntry.STATUS_UNBALANCED
 
-    entry.save(update_fields=[
-        "total_debit",
-        "total_credit",
-        "difference",
-        "status",
-        "updated_at",
-    ])
 
+def _finalize_in_memory(entry, lines):
+    """finalize_journal_entry() dar neišsaugotam įrašui ir jo eilutėms."""
+    debit = sum((l.amount for l in lines if l.side == "D"), Decimal("0"))
+    credit = sum((l.amount for l in lines if l.side == "K"), Decimal("0"))
+    has_missing_account = any(not l.account_code for l in lines)
+
+    _apply_totals_and_status(entry, debit, credit, bool(lines), has_missing_account)
     return entry
 
 
@@ -453,6 +479,21 @@ def generate_purchase_journal_entry(purchase):
         source_type=JournalEntry.SOURCE_PURCHASE,
     ).delete()
 
+    entry, lines = _build_purchase_entry(purchase, list(purchase.line_items.all()))
+
+    # Auto-generated pirkimas не должен оставаться Juodraštis.
+    _finalize_in_memory(entry, lines)
+    entry.save()
+    JournalEntryLine.objects.bulk_create(lines)
+
+    return entry
+
+
+def _build_purchase_entry(purchase, purchase_lines):
+    """
+    Purchase DK įrašas atmintyje: (neišsaugotas JournalEntry, [JournalEntryLine]).
+    purchase_lines — jau užkrautos purchase.line_items eilutės.
+    """
     entry_date = (
         purchase.operation_date
         or purchase.invoice_date
@@ -462,9 +503,9 @@ def generate_purchase_journal_entry(purchase):
 
     document_number = f"{purchase.document_series or ''}{purchase.document_number or ''}".strip()
 
-    entry = JournalEntry.objects.create(
-        user=purchase.user,
-        company_profile=purchase.company_profile,
+    entry = JournalEntry(
+        user_id=purchase.user_id,
+        company_profile_id=purchase.company_profile_id,
         source_type=JournalEntry.SOURCE_PURCHASE,
         purchase=purchase,
         entry_date=entry_date,
@@ -487,12 +528,12 @@ def generate_purchase_journal_entry(purchase):
     kredito_code = purchase.kredito_saskaita or "4430"
     pvm_code = purchase.pvm_saskaita or "2441"
 
-    has_lines = purchase.line_items.exists()
+    has_lines = bool(purchase_lines)
 
     if has_lines:
         groups = {}
 
-        for pl in purchase.line_items.all():
+        for pl in purchase_lines:
             code = pl.effective_debeto or "6312"
             subtotal = _to_decimal(pl.subtotal)
 
@@ -549,12 +590,7 @@ def generate_purchase_journal_entry(purchase):
         sort_order=sort_order,
     )
 
-    JournalEntryLine.objects.bulk_create(lines)
-
-    # Auto-generated pirkimas не должен оставаться Juodraštis.
-    finalize_journal_entry(entry)
-
-    return entry
+    return entry, lines
 
 
 # ═══════════════════════════════════════════════════════════
@@ -586,6 +622,21 @@ def generate_invoice_journal_entry(invoice):
         source_type=JournalEntry.SOURCE_SALE,
     ).delete()
 
+    entry, lines = _build_invoice_entry(invoice, list(invoice.line_items.all()))
+
+    # Auto-generated pardavimas не должен оставаться Juodraštis.
+    _finalize_in_memory(entry, lines)
+    entry.save()
+    JournalEntryLine.objects.bulk_create(lines)
+
+    return entry
+
+
+def _build_invoice_entry(invoice, invoice_lines):
+    """
+    Invoice DK įrašas atmintyje: (neišsaugotas JournalEntry, [JournalEntryLine]).
+    Sumos imamos iš invoice — prieš tai turi būti perskaičiuotos.
+    """
     entry_date = (
         invoice.operation_date
         or invoice.invoice_date
@@ -595,9 +646,9 @@ def generate_invoice_journal_entry(invoice):
 
     document_number = invoice.full_number
 
-    entry = JournalEntry.objects.create(
-        user=invoice.user,
-        company_profile=invoice.company_profile,
+    entry = JournalEntry(
+        user_id=invoice.user_id,
+        company_profile_id=invoice.company_profile_id,
         source_type=JournalEntry.SOURCE_SALE,
         invoice=invoice,
         entry_date=entry_date,
@@ -630,12 +681,12 @@ def generate_invoice_journal_entry(invoice):
         sort_order=sort_order,
     )
 
-    has_lines = invoice.line_items.exists()
+    has_lines = bool(invoice_lines)
 
     if has_lines:
         raw_income_groups = {}
 
-        for il in invoice.line_items.all():
+        for il in invoice_lines:
             code = (
                 il.kredito_saskaita
                 or derive_pardavimo(
@@ -707,7 +758,7 @@ def generate_invoice_journal_entry(invoice):
     if has_lines:
         raw_pvm_groups = {}
 
-        for il in invoice.line_items.all():
+        for il in invoice_lines:
             code = (
                 getattr(il, "pvm_saskaita", None)
                 or invoice.pvm_saskaita
@@ -774,12 +825,158 @@ def generate_invoice_journal_entry(invoice):
                 sort_order=sort_order,
             )
 
-    JournalEntryLine.objects.bulk_create(lines)
+    return entry, lines
 
-    # Auto-generated pardavimas не должен оставаться Juodraštis.
-    finalize_journal_entry(entry)
 
-    return entry
+# ═══════════════════════════════════════════════════════════
+# Batch DK generavimas (perskaičiavimas daugeliui dokumentų)
+# ═══════════════════════════════════════════════════════════
+# Tas pats rezultatas kaip generate_*_journal_entry() kiekvienam dokumentui
+# (tie patys _build_*_entry / _compute_invoice_totals / _finalize_in_memory),
+# bet per chunk'ą: 1 užklausa dokumentams, 1 eilutėms (prefetch), 1 seniems
+# įrašams ištrinti, bulk_create įrašams ir jų eilutėms.
+
+JOURNAL_BATCH_SIZE = 500
+
+
+def _iter_chunks(queryset, chunk_size):
+    ids = list(queryset.order_by().values_list("pk", flat=True).distinct())
+    for i in range(0, len(ids), chunk_size):
+        yield ids[i:i + chunk_size]
+
+
+def _save_entries_bulk(built, chunk_size):
+    entries = [entry for entry, _ in built]
+    JournalEntry.objects.bulk_create(entries, batch_size=chunk_size)
+
+    # Postgres grąžina pk, todėl eilutės gauna entry_id iš entry objekto
+    lines = [line for _, entry_lines in built for line in entry_lines]
+    JournalEntryLine.objects.bulk_create(lines, batch_size=chunk_size * 10)
+
+    return entries
+
+
+def generate_purchase_journal_entries(queryset, chunk_size=JOURNAL_BATCH_SIZE):
+    """
+    Batch generate_purchase_journal_entry(): perkuria DK įrašus visiems
+    queryset pirkimams. Pirkimai be company_profile praleidžiami.
+    can_post_to_dk() netikrinamas — tam sync_purchase_journal_entries().
+
+    Grąžina sukurtų JournalEntry skaičių.
+    """
+    from django.db.models import Prefetch
+    from ..models import PurchaseLine
+
+    created = 0
+
+    for ids in _iter_chunks(queryset, chunk_size):
+        purchases = list(
+            Purchase.objects
+            .filter(pk__in=ids, company_profile__isnull=False)
+            .prefetch_related(Prefetch("line_items", queryset=PurchaseLine.objects.order_by("sort_order", "id")))
+        )
+        if not purchases:
+            continue
+
+        built = []
+        for purchase in purchases:
+            entry, lines = _build_purchase_entry(purchase, list(purchase.line_items.all()))
+            _finalize_in_memory(entry, lines)
+            built.append((entry, lines))
+
+        with transaction.atomic():
+            JournalEntry.objects.filter(
+                purchase_id__in=[p.pk for p in purchases],
+                source_type=JournalEntry.SOURCE_PURCHASE,
+            ).delete()
+            created += len(_save_entries_bulk(built, chunk_size))
+
+    return created
+
+
+def generate_invoice_journal_entries(queryset, chunk_size=JOURNAL_BATCH_SIZE):
+    """
+    Batch generate_invoice_journal_entry(): perskaičiuoja Invoice sumas
+    (bulk_update, be save()/signal'ų — kaip recalculate_invoice_totals())
+    ir perkuria DK įrašus visoms queryset sąskaitoms.
+
+    Grąžina sukurtų JournalEntry skaičių.
+    """
+    from django.db.models import Prefetch
+    from ..models import InvoiceLineItem
+
+    total_fields = ["amount_wo_vat", "vat_amount", "amount_with_vat", "invoice_discount_wo_vat"]
+    created = 0
+
+    for ids in _iter_chunks(queryset, chunk_size):
+        invoices = list(
+            Invoice.objects
+            .filter(pk__in=ids, company_profile__isnull=False)
+            .prefetch_related(Prefetch("line_items", queryset=InvoiceLineItem.objects.order_by("sort_order", "id")))
+        )
+        if not invoices:
+            continue
+
+        built = []
+        recalculated = []
+        for invoice in invoices:
+            invoice_lines = list(invoice.line_items.all())
+            if invoice_lines:
+                _compute_invoice_totals(invoice, invoice_lines)
+                recalculated.append(invoice)
+
+            entry, lines = _build_invoice_entry(invoice, invoice_lines)
+            _finalize_in_memory(entry, lines)
+            built.append((entry, lines))
+
+        with transaction.atomic():
+            if recalculated:
+                Invoice.objects.bulk_update(recalculated, total_fields, batch_size=chunk_size)
+            JournalEntry.objects.filter(
+                invoice_id__in=[i.pk for i in invoices],
+                source_type=JournalEntry.SOURCE_SALE,
+            ).delete()
+            created += len(_save_entries_bulk(built, chunk_size))
+
+    return created
+
+
+def sync_purchase_journal_entries(queryset, chunk_size=JOURNAL_BATCH_SIZE):
+    """Batch sync_purchase_journal_entry(): (sukurta, ištrinta)."""
+    postable, rejected = [], []
+    for purchase in queryset.order_by().only(
+        "id", "status", "ready_for_export", "math_validation_passed", "kor_balanced",
+    ).iterator(chunk_size=2000):
+        (postable if can_post_to_dk(purchase) else rejected).append(purchase.pk)
+
+    deleted, _ = JournalEntry.objects.filter(
+        purchase_id__in=rejected,
+        source_type=JournalEntry.SOURCE_PURCHASE,
+    ).delete() if rejected else (0, None)
+
+    created = generate_purchase_journal_entries(
+        Purchase.objects.filter(pk__in=postable), chunk_size=chunk_size,
+    ) if postable else 0
+
+    return created, deleted
+
+
+def sync_invoice_journal_entries(queryset, chunk_size=JOURNAL_BATCH_SIZE):
+    """Batch sync_invoice_journal_entry(): (sukurta, ištrinta)."""
+    postable, rejected = [], []
+    for invoice in queryset.order_by().only("id", "invoice_type", "status").iterator(chunk_size=2000):
+        (postable if can_post_to_dk(invoice) else rejected).append(invoice.pk)
+
+    deleted, _ = JournalEntry.objects.filter(
+        invoice_id__in=rejected,
+        source_type=JournalEntry.SOURCE_SALE,
+    ).delete() if rejected else (0, None)
+
+    created = generate_invoice_journal_entries(
+        Invoice.objects.filter(pk__in=postable), chunk_size=chunk_size,
+    ) if postable else 0
+
+    return created, deleted
 
 
 # ═══════════════════════════════════════════════════════════
@@ -6,6 +6,7 @@ import requests
 from dotenv import load_dotenv
 
 from ..celery_signals import _send_telegram
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
 from . import gemini as direct_gemini
 from .gemini import (
     GEMINI_DEFAULT_PROMPT,
@@ -197,6 +198,7 @@ def ask_kie(
         "max_tokens": max_output_tokens,
     }
 
+    require_rate_limit("kie", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
 
     try:
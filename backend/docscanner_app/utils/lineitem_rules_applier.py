@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 from decimal import Decimal
 from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import json
 import logging
 
 from .lineitem_rules import normalize_name_for_match, _norm_code  # <-- импорт из utils/lineitem_rules.py
@@ -234,6 +237,240 @@ def _rule_matches(
     return True
 
 
+def _sort_rules(rules: List[Rule]) -> List[Rule]:
+    # сортируем по id, чтобы tie-breaker по id можно было делать просто
+    return sorted(rules, key=_rule_id_int)
+
+
+def select_rule_linear(
+    rules: List[Rule],
+    line,
+    buyer_id: str,
+    buyer_vat_code: str,
+    seller_id: str,
+    seller_vat_code: str,
+) -> Optional[Rule]:
+    """
+    Эталонный (O(rules)) выбор правила для строки. rules — уже отсортированы
+    через _sort_rules. Используется для проверки эквивалентности CompiledLineItemRules
+    (tests.LineItemRulesEngineTests).
+    """
+    best_rule: Optional[Rule] = None
+    best_score = -1
+    best_id = 10**9
+    best_apply_to_all = True
+
+    # 1) ищем лучшее правило для этой строки
+    for rule in rules:
+        if not _rule_matches(rule, line, buyer_id, buyer_vat_code, seller_id, seller_vat_code):
+            continue
+
+        apply_to_all = bool(rule.get("apply_to_all"))
+        score = _rule_specificity(rule)
+        rid = _rule_id_int(rule)
+
+        if best_rule is None:
+            best_rule = rule
+            best_score = score
+            best_id = rid
+            best_apply_to_all = apply_to_all
+            continue
+
+        # Правила с apply_to_all = true самые низкоприоритетные:
+        # если уже есть сработавшее правило с apply_to_all = False,
+        # то apply_to_all-правила игнорируем.
+        if apply_to_all and not best_apply_to_all:
+            continue
+
+        # Если текущее правило НЕ apply_to_all, а лучшее сейчас apply_to_all —
+        # сразу выбираем это правило, даже если score меньше/равен.
+        if not apply_to_all and best_apply_to_all:
+            best_rule = rule
+            best_score = score
+            best_id = rid
+            best_apply_to_all = apply_to_all
+            continue
+
+        # Оба правила одного типа (оба apply_to_all или оба нет) —
+        # сравниваем по количеству совпадений, затем по id.
+        if score > best_score:
+            best_rule = rule
+            best_score = score
+            best_id = rid
+            best_apply_to_all = apply_to_all
+        elif score == best_score and rid < best_id:
+            best_rule = rule
+            best_score = score
+            best_id = rid
+            best_apply_to_all = apply_to_all
+
+    return best_rule
+
+
+# ───────────────────────── compiled engine ─────────────────────────
+
+_PARTY_FIELDS = ("buyer_id", "buyer_vat_code", "seller_id", "seller_vat_code")
+# все 16 комбинаций «какие из 4 party-полей заданы в правиле»
+_PARTY_MASKS = [tuple(bool(m >> i & 1) for i in range(4)) for m in range(16)]
+_NAME_GRAM = 3
+
+
+class _CompiledRule:
+    __slots__ = ("rule", "rank", "apply_to_all", "name_norm", "vat")
+
+    def __init__(self, rule: Rule, rank: int, name_norm: str):
+        self.rule = rule
+        self.rank = rank
+        self.apply_to_all = bool(rule.get("apply_to_all"))
+        self.name_norm = name_norm
+        self.vat = rule.get("vat_percent")
+
+
+def _rule_name_norm(rule: Rule) -> str:
+    """Та же логика, что в _match_name_condition: "" — условия по имени нет."""
+    name_norm = (rule.get("name_contains_norm") or "").strip()
+    if not name_norm:
+        raw = (rule.get("name_contains") or "").strip()
+        if raw:
+            name_norm = normalize_name_for_match(raw)
+    return name_norm
+
+
+class CompiledLineItemRules:
+    """
+    Правила пользователя, скомпилированные один раз (на версию user.lineitem_rules):
+
+      - party-индекс: (маска заданных полей, значения) -> правила; для документа
+        делается 16 dict-lookup'ов вместо проверки всех правил;
+      - name-индекс: первые 3 символа name_contains_norm -> правила; для строки
+        берутся только правила, чей 3-грам встречается в названии строки;
+      - rank — позиция в порядке приоритета (apply_to_all последние,
+        затем specificity по убыванию, затем id) — лучший = минимальный rank.
+
+    Результат выбора полностью совпадает с select_rule_linear.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        ordered = _sort_rules(rules)
+        enabled = [
+            (pos, r) for pos, r in enumerate(ordered)
+            if r.get("enabled", True)
+        ]
+        enabled.sort(key=lambda item: (
+            bool(item[1].get("apply_to_all")),
+            -_rule_specificity(item[1]),
+            item[0],
+        ))
+
+        self.size = len(enabled)
+        self.apply_to_all: List[_CompiledRule] = []
+        self._party: Dict[tuple, List[_CompiledRule]] = {}
+
+        for rank, (_, rule) in enumerate(enabled):
+            if bool(rule.get("apply_to_all")):
+                self.apply_to_all.append(_CompiledRule(rule, rank, ""))
+                continue
+            values = tuple(_norm_code(rule.get(f)) for f in _PARTY_FIELDS)
+            mask = tuple(bool(v) for v in values)
+            cr = _CompiledRule(rule, rank, _rule_name_norm(rule))
+            self._party.setdefault((mask, values), []).append(cr)
+
+    def for_document(self, buyer_id: str, buyer_vat_code: str, seller_id: str, seller_vat_code: str) -> "_DocumentMatcher":
+        doc_values = (buyer_id, buyer_vat_code, seller_id, seller_vat_code)
+        candidates: List[_CompiledRule] = []
+        for mask in _PARTY_MASKS:
+            key = tuple(v if m else "" for v, m in zip(doc_values, mask))
+            if mask != tuple(bool(v) for v in key):
+                # правило требует поле, которого у документа нет
+                continue
+            bucket = self._party.get((mask, key))
+            if bucket:
+                candidates.extend(bucket)
+        return _DocumentMatcher(candidates, self.apply_to_all)
+
+
+class _DocumentMatcher:
+    def __init__(self, candidates: List[_CompiledRule], apply_to_all: List[_CompiledRule]):
+        self.no_name: List[_CompiledRule] = []
+        self.short_names: List[_CompiledRule] = []
+        self.by_gram: Dict[str, List[_CompiledRule]] = {}
+        for cr in candidates:
+            if not cr.name_norm:
+                self.no_name.append(cr)
+            elif len(cr.name_norm) < _NAME_GRAM:
+                self.short_names.append(cr)
+            else:
+                self.by_gram.setdefault(cr.name_norm[:_NAME_GRAM], []).append(cr)
+        self.apply_to_all = apply_to_all
+
+    def select(self, line) -> Optional[Rule]:
+        line_vat = getattr(line, "vat_percent", None)
+
+        pool: List[_CompiledRule] = list(self.no_name)
+        if self.by_gram or self.short_names:
+            line_name_norm = normalize_name_for_match(getattr(line, "prekes_pavadinimas", "") or "")
+            if line_name_norm:
+                for cr in self.short_names:
+                    if cr.name_norm in line_name_norm:
+                        pool.append(cr)
+                if self.by_gram:
+                    seen = set()
+                    for i in range(len(line_name_norm) - _NAME_GRAM + 1):
+                        gram = line_name_norm[i:i + _NAME_GRAM]
+                        if gram in seen:
+                            continue
+                        seen.add(gram)
+                        for cr in self.by_gram.get(gram, ()):
+                            if cr.name_norm in line_name_norm:
+                                pool.append(cr)
+
+        best: Optional[_CompiledRule] = None
+        for cr in pool:
+            if best is not None and cr.rank >= best.rank:
+                continue
+            if _vat_matches(cr.vat, line_vat):
+                best = cr
+        if best is not None:
+            return best.rule
+
+        # apply_to_all — только если ничего другого не сработало (уже по rank)
+        for cr in self.apply_to_all:
+            if _vat_matches(cr.vat, line_vat):
+                return cr.rule
+        return None
+
+
+_COMPILED_CACHE: "OrderedDict[Any, tuple]" = OrderedDict()
+_COMPILED_CACHE_SIZE = 64
+
+
+def _rules_fingerprint(rules: List[Rule]) -> str:
+    return hashlib.md5(
+        json.dumps(rules, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def get_compiled_rules(user, rules: List[Rule]) -> CompiledLineItemRules:
+    """
+    CompiledLineItemRules для пользователя; перекомпилируется только когда
+    меняется содержимое user.lineitem_rules (fingerprint).
+    """
+    cache_key = getattr(user, "pk", None) or id(user)
+    fingerprint = _rules_fingerprint(rules)
+
+    hit = _COMPILED_CACHE.get(cache_key)
+    if hit and hit[0] == fingerprint:
+        _COMPILED_CACHE.move_to_end(cache_key)
+        return hit[1]
+
+    compiled = CompiledLineItemRules(rules)
+    _COMPILED_CACHE[cache_key] = (fingerprint, compiled)
+    _COMPILED_CACHE.move_to_end(cache_key)
+    while len(_COMPILED_CACHE) > _COMPILED_CACHE_SIZE:
+        _COMPILED_CACHE.popitem(last=False)
+    return compiled
+
+
 def apply_lineitem_rules_for_detaliai(db_doc, user) -> int:
     """
     Применяет lineitem_rules пользователя к КАЖДОЙ строке detaliai:
@@ -263,15 +500,7 @@ def apply_lineitem_rules_for_detaliai(db_doc, user) -> int:
         logger.info("No lineitem_rules for user id=%s", getattr(user, "id", None))
         return 0
 
-    # сортируем по id, чтобы tie-breaker по id можно было делать просто
-    def _rule_key(r: Rule):
-        rid = r.get("id")
-        try:
-            return int(rid)
-        except Exception:
-            return 10**9
-
-    rules = sorted(rules, key=_rule_key)
+    compiled = get_compiled_rules(user, rules)
 
     # контрагенты документа нормализованы так же, как и в нормализаторе правил
     buyer_id = _norm_code(getattr(db_doc, "buyer_id", ""))
@@ -279,57 +508,12 @@ def apply_lineitem_rules_for_detaliai(db_doc, user) -> int:
     seller_id = _norm_code(getattr(db_doc, "seller_id", ""))
     seller_vat_code = _norm_code(getattr(db_doc, "seller_vat_code", ""))
 
+    matcher = compiled.for_document(buyer_id, buyer_vat_code, seller_id, seller_vat_code)
     changed_lines = 0
 
     for line in db_doc.line_items.all():  # type: ignore[attr-defined]
-        best_rule: Optional[Rule] = None
-        best_score = -1
-        best_id = 10**9
-        best_apply_to_all = True
-
         # 1) ищем лучшее правило для этой строки
-        for rule in rules:
-            if not _rule_matches(rule, line, buyer_id, buyer_vat_code, seller_id, seller_vat_code):
-                continue
-
-            apply_to_all = bool(rule.get("apply_to_all"))
-            score = _rule_specificity(rule)
-            rid = _rule_id_int(rule)
-
-            if best_rule is None:
-                best_rule = rule
-                best_score = score
-                best_id = rid
-                best_apply_to_all = apply_to_all
-                continue
-
-            # Правила с apply_to_all = true самые низкоприоритетные:
-            # если уже есть сработавшее правило с apply_to_all = False,
-            # то apply_to_all-правила игнорируем.
-            if apply_to_all and not best_apply_to_all:
-                continue
-
-            # Если текущее правило НЕ apply_to_all, а лучшее сейчас apply_to_all —
-            # сразу выбираем это правило, даже если score меньше/равен.
-            if not apply_to_all and best_apply_to_all:
-                best_rule = rule
-                best_score = score
-                best_id = rid
-                best_apply_to_all = apply_to_all
-                continue
-
-            # Оба правила одного типа (оба apply_to_all или оба нет) —
-            # сравниваем по количеству совпадений, затем по id.
-            if score > best_score:
-                best_rule = rule
-                best_score = score
-                best_id = rid
-                best_apply_to_all = apply_to_all
-            elif score == best_score and rid < best_id:
-                best_rule = rule
-                best_score = score
-                best_id = rid
-                best_apply_to_all = apply_to_all
+        best_rule = matcher.select(line)
 
         if best_rule is None:
             logger.debug("No rule matched for line id=%s", getattr(line, "id", None))
@@ -4,6 +4,8 @@ import time
 import logging
 from openai import OpenAI, RateLimitError, APITimeoutError
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 logger = logging.getLogger("docscanner_app")
 
 MERCURY_API_KEY = os.getenv("INCEPTION_API_KEY", "")
@@ -41,6 +43,7 @@ def ask_mercury(
         model, len(text), len(prompt), len(combined), temperature, reasoning_effort,
     )
 
+    require_rate_limit("mercury", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
     client = _get_client()
 
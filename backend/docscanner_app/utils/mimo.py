@@ -9,6 +9,8 @@ from typing import Any, Dict, List, Optional, Tuple
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 load_dotenv()
 LOGGER = logging.getLogger("docscanner_app")
 
@@ -434,6 +436,7 @@ def ask_mimo(
         model, len(text or ""), len(prompt or ""), eff_timeout, enable_thinking
     )
 
+    require_rate_limit("mimo", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
     
     client = _get_client()
@@ -4,6 +4,8 @@ import time
 import logging
 from openai import OpenAI, RateLimitError, APITimeoutError
 
+from .rate_limiter import require as require_rate_limit, LLM_RATE_LIMIT_MAX_WAIT
+
 logger = logging.getLogger("docscanner_app")
 
 NOVITA_API_KEY = os.getenv("NOVITA_API_KEY", "")
@@ -37,6 +39,7 @@ def ask_novita(
         model, len(text), len(prompt), temperature, reasoning,
     )
 
+    require_rate_limit("novita", max_wait=LLM_RATE_LIMIT_MAX_WAIT)
     t0 = time.perf_counter()
     client = _get_client()
 
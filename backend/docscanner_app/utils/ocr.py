@@ -29,11 +29,15 @@ except Exception:
 from sklearn.cluster import DBSCAN
 from google.api_core.exceptions import ResourceExhausted, GoogleAPIError
 from ..celery_signals import _send_telegram
+from .rate_limiter import acquire as acquire_rate_limit
 import logging
 logger = logging.getLogger("docscanner_app")
 
 # ---------- Константы ----------
 
+# Kiek sekundžių laukti Vision token'o prieš perplanuojant task'ą
+VISION_RATE_LIMIT_MAX_WAIT = 45.0
+
 # Пунктуация, которая прилипает к ПРЕДЫДУЩЕМУ слову (без пробела перед)
 PUNCT_FOLLOW = set('.,:;%)!?»"\'')
 
@@ -680,6 +684,83 @@ def choose_mode_by_metrics(
     return "ERROR"
 
 
+def build_ocr_result(
+    pages_out: List[Dict[str, Any]],
+    words_flat: List[Dict[str, Any]],
+    full_text: str,
+    filename: Optional[str] = None,
+    logger: Optional[Any] = None,
+) -> Tuple[Optional[str], Optional[str], Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    Общая часть для всех OCR backend'ов (Google Vision, PaddleOCR):
+    выбор режима по геометрии, склейка слов в строки и сборка raw_json.
+    Возвращает (raw_json, plain_text, words_flat, error).
+    """
+    has_fulltext = bool((full_text or "").strip())
+
+    if not words_flat and not has_fulltext:
+        err = "No words with bbox and no full_text_annotation"
+        if logger:
+            logger.error(f"[OCR] {err} for {filename}")
+        return None, None, None, err
+
+    if words_flat:
+        metrics = compute_geometry_metrics(words_flat, k_neighbors=6)
+        mode = choose_mode_by_metrics(
+            metrics=metrics,
+            has_fulltext=has_fulltext,
+        )
+    else:
+        metrics = {}
+        mode = "FULLTEXT" if has_fulltext else "ERROR"
+
+    if logger:
+        logger.info(f"[OCR] {filename}: mode={mode}, metrics={metrics}")
+
+    if mode == "WORDS_SPACES":
+        try:
+            joined_text, skew_deg = _join_words_to_lines(
+                words_flat,
+                use_skew=True,
+                line_width_chars=120,
+            )
+            plain_text = joined_text
+            metrics["detected_skew_deg"] = float(skew_deg)
+        except Exception as e:
+            if logger:
+                logger.warning(f"[OCR] WORDS_SPACES failed for {filename}, fallback to FULLTEXT: {e}")
+            plain_text = full_text
+            mode = "FULLTEXT"
+    elif mode == "WORDS":
+        try:
+            joined_text, skew_deg = _join_words_simple(words_flat, use_skew=True)
+            plain_text = joined_text
+            metrics["detected_skew_deg"] = float(skew_deg)
+        except Exception as e:
+            if logger:
+                logger.warning(f"[OCR] WORDS failed for {filename}, fallback to FULLTEXT: {e}")
+            plain_text = full_text
+            mode = "FULLTEXT"
+    elif mode == "FULLTEXT":
+        plain_text = full_text
+    else:
+        err = "Geometry metrics failed and no full_text_annotation available"
+        if logger:
+            logger.error(f"[OCR] {err} for {filename}")
+        return None, None, None, err
+
+    result = {
+        "pages": pages_out,
+        "meta": {
+            "mode": mode,
+            "metrics": {k: round(v, 3) for k, v in metrics.items()},
+        }
+    }
+    raw_json = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+    return raw_json, plain_text, words_flat, None
+
+
 # ---------- Главная функция для backend ----------
 
 def get_ocr_text(
@@ -696,6 +777,12 @@ def get_ocr_text(
             logger.error(f"[OCR] {err}")
         return None, None, None, err
 
+    # Bendras visiems worker'iams limiteris — laukiam token'o vietoj 429
+    if not acquire_rate_limit("google_vision", max_wait=VISION_RATE_LIMIT_MAX_WAIT):
+        if logger:
+            logger.warning(f"[OCR] Vision rate limiter: no token for {filename}")
+        return None, None, None, "RATE_LIMITED: google_vision"
+
     try:
         client = vision.ImageAnnotatorClient()
         image = vision.Image(content=data)
@@ -774,69 +861,8 @@ def get_ocr_text(
         })
 
     full_text = getattr(resp.full_text_annotation, "text", "") or ""
-    has_fulltext = bool(full_text.strip())
-
-    if not words_flat and not has_fulltext:
-        err = "No words with bbox and no full_text_annotation"
-        if logger:
-            logger.error(f"[OCR] {err} for {filename}")
-        return None, None, None, err
-
-    if words_flat:
-        metrics = compute_geometry_metrics(words_flat, k_neighbors=6)
-        mode = choose_mode_by_metrics(
-            metrics=metrics,
-            has_fulltext=has_fulltext,
-        )
-    else:
-        metrics = {}
-        mode = "FULLTEXT" if has_fulltext else "ERROR"
-
-    if logger:
-        logger.info(f"[OCR] {filename}: mode={mode}, metrics={metrics}")
-
-    if mode == "WORDS_SPACES":
-        try:
-            joined_text, skew_deg = _join_words_to_lines(
-                words_flat,
-                use_skew=True,
-                line_width_chars=120,
-            )
-            plain_text = joined_text
-            metrics["detected_skew_deg"] = float(skew_deg)
-        except Exception as e:
-            if logger:
-                logger.warning(f"[OCR] WORDS_SPACES failed for {filename}, fallback to FULLTEXT: {e}")
-            plain_text = full_text
-            mode = "FULLTEXT"
-    elif mode == "WORDS":
-        try:
-            joined_text, skew_deg = _join_words_simple(words_flat, use_skew=True)
-            plain_text = joined_text
-            metrics["detected_skew_deg"] = float(skew_deg)
-        except Exception as e:
-            if logger:
-                logger.warning(f"[OCR] WORDS failed for {filename}, fallback to FULLTEXT: {e}")
-            plain_text = full_text
-            mode = "FULLTEXT"
-    elif mode == "FULLTEXT":
-        plain_text = full_text
-    else:
-        err = "Geometry metrics failed and no full_text_annotation available"
-        if logger:
-            logger.error(f"[OCR] {err} for {filename}")
-        return None, None, None, err
-
-    result = {
-        "pages": pages_out,
-        "meta": {
-            "mode": mode,
-            "metrics": {k: round(v, 3) for k, v in metrics.items()},
-        }
-    }
-    raw_json = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
 
-    return raw_json, plain_text, words_flat, None
+    return build_ocr_result(pages_out, words_flat, full_text, filename=filename, logger=logger)
 
 
 
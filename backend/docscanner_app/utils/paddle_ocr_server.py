@@ -3,16 +3,130 @@
 
 """
 PaddleOCR с PP-OCRv5_server моделью для лучшего распознавания (в т.ч. литовских букв).
+
+Модель грузится ОДИН раз на процесс (get_paddle_engine). Для backend'а есть
+резидентный worker-процесс (PaddleOCRWorker, запуск: manage.py run_paddle_ocr_worker):
+  - модель прогрета при старте,
+  - локальная очередь запросов (multiprocessing.connection, localhost;
+    обязателен PADDLE_OCR_WORKER_AUTHKEY — без него worker не стартует),
+  - страницы из нескольких запросов склеиваются в batch для одного predict().
+
+Celery вызывает get_ocr_text_paddle() — тот же формат, что и utils.ocr.get_ocr_text
+(raw_json, plain_text, words_flat, error), склейка строк через _join_words_to_lines.
 """
 
+import io
+import os
 import sys
 import json
 import time
-from typing import List, Dict, Any, Tuple
+import queue
+import threading
+import logging
+from multiprocessing.connection import Listener, Client
+from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
 from PIL import Image
-from paddleocr import PaddleOCR
+
+try:
+    from paddleocr import PaddleOCR
+except Exception:
+    PaddleOCR = None
+
+logger = logging.getLogger("docscanner_app")
+
+PADDLE_OCR_MODEL = "PP-OCRv5_server"
+
+# Значения по умолчанию, если Django settings недоступны (CLI запуск)
+DEFAULT_WORKER_HOST = "127.0.0.1"
+DEFAULT_WORKER_PORT = 8765
+DEFAULT_MAX_BATCH_PAGES = 8
+DEFAULT_BATCH_WAIT_SECONDS = 0.05
+DEFAULT_REQUEST_TIMEOUT = 120
+
+
+_ENGINE = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_paddle_engine():
+    """Ленивая инициализация PaddleOCR — один экземпляр на процесс."""
+    global _ENGINE
+    if _ENGINE is not None:
+        return _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            if PaddleOCR is None:
+                raise RuntimeError("paddleocr не установлен. pip install paddleocr")
+            _ENGINE = PaddleOCR(
+                lang="lt",                     # Литовский язык
+                use_textline_orientation=True, # Классификация ориентации строк
+                ocr_version="PP-OCRv5",        # Версия OCR (по умолчанию server-модели)
+                text_det_thresh=0.3,           # Порог пикселей на карте вероятностей
+                text_det_box_thresh=0.5,       # Порог уверенности для боксов
+            )
+    return _ENGINE
+
+
+def _worker_setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _parse_page_result(page) -> List[Dict[str, Any]]:
+    """Один OCRResult (или dict) -> list[{"text", "bbox": 4 точки, "score"}]."""
+    if hasattr(page, "dt_polys"):
+        dt_polys = page.dt_polys
+        rec_texts = page.rec_texts
+        rec_scores = page.rec_scores
+    elif isinstance(page, dict):
+        dt_polys = page.get("dt_polys", [])
+        rec_texts = page.get("rec_texts", [])
+        rec_scores = page.get("rec_scores", [])
+    else:
+        return []
+
+    words: List[Dict[str, Any]] = []
+    for box, text, score in zip(dt_polys, rec_texts, rec_scores):
+        text = (text or "").strip()
+        if not text:
+            continue
+
+        pts = [{"x": float(x), "y": float(y)} for x, y in box]
+        if len(pts) < 4:
+            continue
+
+        words.append({
+            "text": text,
+            "bbox": pts[:4],
+            "score": float(score),
+        })
+    return words
+
+
+def _image_bytes_to_np(data: bytes) -> np.ndarray:
+    img = Image.open(io.BytesIO(data))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return np.array(img)
+
+
+def ocr_images(images: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+    """Batched inference: один predict() на все страницы, результат — по странице."""
+    if not images:
+        return []
+    engine = get_paddle_engine()
+    result = engine.predict(images if len(images) > 1 else images[0])
+    if isinstance(result, dict) or not isinstance(result, list):
+        result = [result]
+    pages = [_parse_page_result(page) for page in result]
+    # predict() возвращает по результату на картинку; на всякий случай выравниваем
+    pages += [[] for _ in range(len(images) - len(pages))]
+    return pages[:len(images)]
 
 
 def run_paddle_ocr_server(image_path: str) -> Tuple[str, List[Dict[str, Any]], float]:
@@ -21,83 +135,226 @@ def run_paddle_ocr_server(image_path: str) -> Tuple[str, List[Dict[str, Any]], f
     Возвращает:
       - plain_text
       - words_flat
-      - ocr_seconds: время работы OCR (инициализация + predict + разбор результата).
+      - ocr_seconds: время работы OCR (predict + разбор результата; модель кэшируется в процессе).
     """
 
     start_ocr = time.time()
 
-    ocr = PaddleOCR(
-        lang="lt",                     # Литовский язык
-        use_textline_orientation=True, # Классификация ориентации строк
-        ocr_version="PP-OCRv5",        # Версия OCR (по умолчанию server-модели)
-        text_det_thresh=0.3,           # Порог пикселей на карте вероятностей
-        text_det_box_thresh=0.5,       # Порог уверенности для боксов
-    )
-
     img = Image.open(image_path)
     img_np = np.array(img)
-    img_width, img_height = img.size
-
-    print("Запуск OCR с PP-OCRv5_server (это может занять больше времени)...")
-
-    result = ocr.predict(img_np)
-
-    words_flat: List[Dict[str, Any]] = []
-    lines_out: List[str] = []
-
-    if isinstance(result, list):
-        for page in result:
-            if hasattr(page, "dt_polys"):
-                dt_polys = page.dt_polys
-                rec_texts = page.rec_texts
-                rec_scores = page.rec_scores
-            elif isinstance(page, dict):
-                dt_polys = page.get("dt_polys", [])
-                rec_texts = page.get("rec_texts", [])
-                rec_scores = page.get("rec_scores", [])
-            else:
-                continue
 
-            for box, text, score in zip(dt_polys, rec_texts, rec_scores):
-                text = (text or "").strip()
-                if not text:
-                    continue
+    words_flat = ocr_images([img_np])[0]
+    lines_out = [w["text"] for w in words_flat]
+
+    plain_text = "\n".join(lines_out)
+    ocr_seconds = time.time() - start_ocr
+    return plain_text, words_flat, ocr_seconds
+
+
+# ---------- Резидентный worker ----------
+
+class _OCRJob:
+    __slots__ = ("images", "event", "result", "error")
+
+    def __init__(self, images: List[np.ndarray]):
+        self.images = images
+        self.event = threading.Event()
+        self.result: Optional[List[List[Dict[str, Any]]]] = None
+        self.error: Optional[str] = None
 
-                pts = [{"x": float(x), "y": float(y)} for x, y in box]
-                if len(pts) < 4:
+
+class PaddleOCRWorker:
+    """
+    Локальный OCR сервер с прогретой моделью.
+    Каждое соединение — отдельный поток, который кладёт job в очередь;
+    batch-поток собирает до max_batch_pages страниц (ждёт не дольше batch_wait)
+    и прогоняет их одним predict().
+
+    Протокол (pickle через multiprocessing.connection):
+      request:  {"pages": [bytes, ...]}
+      response: {"pages": [[word, ...], ...], "error": None | str, "ocr_seconds": float}
+    """
+
+    def __init__(self, host=None, port=None, authkey=None,
+                 max_batch_pages=None, batch_wait=None):
+        self.address = (
+            host or _worker_setting("PADDLE_OCR_WORKER_HOST", DEFAULT_WORKER_HOST),
+            int(port or _worker_setting("PADDLE_OCR_WORKER_PORT", DEFAULT_WORKER_PORT)),
+        )
+        if authkey is not None and len(authkey) < MIN_AUTHKEY_LENGTH:
+            raise WorkerNotConfigured(f"authkey must be at least {MIN_AUTHKEY_LENGTH} bytes")
+        self.authkey = authkey or _worker_authkey()
+        self.max_batch_pages = int(
+            max_batch_pages or _worker_setting("PADDLE_OCR_MAX_BATCH_PAGES", DEFAULT_MAX_BATCH_PAGES)
+        )
+        self.batch_wait = float(
+            batch_wait if batch_wait is not None
+            else _worker_setting("PADDLE_OCR_BATCH_WAIT_SECONDS", DEFAULT_BATCH_WAIT_SECONDS)
+        )
+        self._queue: "queue.Queue[_OCRJob]" = queue.Queue()
+
+    def _collect_batch(self) -> List[_OCRJob]:
+        jobs = [self._queue.get()]
+        n_pages = len(jobs[0].images)
+        deadline = time.time() + self.batch_wait
+        while n_pages < self.max_batch_pages:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            n_pages += len(job.images)
+        return jobs
+
+    def _batch_loop(self):
+        while True:
+            jobs = self._collect_batch()
+            images = [img for job in jobs for img in job.images]
+            t0 = time.time()
+            try:
+                pages = ocr_images(images)
+            except Exception as e:
+                logger.exception("[PADDLE] batch of %d pages failed", len(images))
+                for job in jobs:
+                    job.error = str(e)
+                    job.event.set()
+                continue
+
+            logger.info("[PADDLE] batch jobs=%d pages=%d took=%.2fs",
+                        len(jobs), len(images), time.time() - t0)
+            offset = 0
+            for job in jobs:
+                job.result = pages[offset:offset + len(job.images)]
+                offset += len(job.images)
+                job.event.set()
+
+    def _handle_connection(self, conn):
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    return
+                t0 = time.time()
+                try:
+                    images = [_image_bytes_to_np(b) for b in request.get("pages") or []]
+                except Exception as e:
+                    conn.send({"pages": None, "error": f"Bad image: {e}", "ocr_seconds": 0.0})
                     continue
 
-                words_flat.append({
-                    "text": text,
-                    "bbox": pts[:4],
-                    "score": float(score),
+                job = _OCRJob(images)
+                self._queue.put(job)
+                job.event.wait()
+                conn.send({
+                    "pages": job.result,
+                    "error": job.error,
+                    "ocr_seconds": time.time() - t0,
                 })
-                lines_out.append(text)
+        finally:
+            conn.close()
 
-    elif isinstance(result, dict):
-        dt_polys = result.get("dt_polys", [])
-        rec_texts = result.get("rec_texts", [])
-        rec_scores = result.get("rec_scores", [])
+    def serve_forever(self):
+        t0 = time.time()
+        get_paddle_engine()
+        # Прогрев: первый predict() инициализирует графы и кэши
+        ocr_images([np.full((64, 64, 3), 255, dtype=np.uint8)])
+        logger.info("[PADDLE] model %s loaded in %.1fs", PADDLE_OCR_MODEL, time.time() - t0)
 
-        for box, text, score in zip(dt_polys, rec_texts, rec_scores):
-            text = (text or "").strip()
-            if not text:
-                continue
+        threading.Thread(target=self._batch_loop, daemon=True, name="paddle-batch").start()
 
-            pts = [{"x": float(x), "y": float(y)} for x, y in box]
-            if len(pts) < 4:
-                continue
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info("[PADDLE] worker listening on %s:%s", *self.address)
+            while True:
+                conn = listener.accept()
+                threading.Thread(
+                    target=self._handle_connection, args=(conn,), daemon=True,
+                ).start()
 
-            words_flat.append({
-                "text": text,
-                "bbox": pts[:4],
-                "score": float(score),
-            })
-            lines_out.append(text)
 
-    plain_text = "\n".join(lines_out)
-    ocr_seconds = time.time() - start_ocr
-    return plain_text, words_flat, ocr_seconds
+class WorkerNotConfigured(RuntimeError):
+    """PADDLE_OCR_WORKER_AUTHKEY не задан — worker не запускается, клиент не подключается."""
+
+
+MIN_AUTHKEY_LENGTH = 16
+
+
+def _worker_authkey() -> bytes:
+    """
+    Общий секрет worker'а и клиентов. Listener распаковывает (pickle) каждый
+    запрос, поэтому без секрета порт нельзя открывать — значения по умолчанию нет.
+    """
+    key = _worker_setting("PADDLE_OCR_WORKER_AUTHKEY", "") or os.getenv("PADDLE_OCR_WORKER_AUTHKEY", "")
+    if len(key or "") < MIN_AUTHKEY_LENGTH:
+        raise WorkerNotConfigured(
+            f"PADDLE_OCR_WORKER_AUTHKEY must be set (at least {MIN_AUTHKEY_LENGTH} characters)"
+        )
+    return key.encode()
+
+
+# ---------- Клиент для Celery ----------
+
+def paddle_ocr_pages(pages: List[bytes], timeout: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+    """Отправляет страницы резидентному worker'у и ждёт ответ."""
+    address = (
+        _worker_setting("PADDLE_OCR_WORKER_HOST", DEFAULT_WORKER_HOST),
+        int(_worker_setting("PADDLE_OCR_WORKER_PORT", DEFAULT_WORKER_PORT)),
+    )
+    timeout = timeout or float(_worker_setting("PADDLE_OCR_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+
+    conn = Client(address, authkey=_worker_authkey())
+    try:
+        conn.send({"pages": pages})
+        if not conn.poll(timeout):
+            raise TimeoutError(f"PaddleOCR worker timeout ({timeout:.0f}s)")
+        response = conn.recv()
+    finally:
+        conn.close()
+
+    if response.get("error"):
+        raise RuntimeError(response["error"])
+    return response.get("pages") or []
+
+
+def get_ocr_text_paddle(
+    data: bytes,
+    filename: Optional[str] = None,
+    logger: Optional[Any] = None,
+) -> Tuple[Optional[str], Optional[str], Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    Offline OCR backend. Тот же контракт, что и utils.ocr.get_ocr_text:
+    (raw_json, plain_text, words_flat, error).
+    """
+    from .ocr import build_ocr_result
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        width_px, height_px = img.size
+    except Exception as e:
+        if logger:
+            logger.error(f"[OCR-PADDLE] Cannot open image {filename}: {e}")
+        return None, None, None, f"PADDLE: bad image: {e}"
+
+    try:
+        pages = paddle_ocr_pages([data])
+    except Exception as e:
+        if logger:
+            logger.error(f"[OCR-PADDLE] Worker error for {filename}: {e}")
+        return None, None, None, f"PADDLE: {e}"
+
+    words_flat = pages[0] if pages else []
+    pages_out = [{
+        "page_number": 1,
+        "width_px": width_px,
+        "height_px": height_px,
+        "words": words_flat,
+    }]
+    # PaddleOCR даёт строки, а не слова — они же служат fallback "full text"
+    full_text = "\n".join(w["text"] for w in words_flat)
+
+    return build_ocr_result(pages_out, words_flat, full_text, filename=filename, logger=logger)
 
 
 def main():
@@ -136,7 +393,7 @@ def main():
     out_json = {
         "plain_text": plain_text,
         "items": words_flat,
-        "model": "PP-OCRv5_server",
+        "model": PADDLE_OCR_MODEL,
         "image_size": {
             "width": words_flat and max(pt["x"] for w in words_flat for pt in w["bbox"]) or None,
             "height": words_flat and max(pt["y"] for w in words_flat for pt in w["bbox"]) or None,
@@ -153,4 +410,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
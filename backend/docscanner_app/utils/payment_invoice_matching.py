@@ -33,8 +33,11 @@ from dataclasses import dataclass, field
 from decimal import Decimal
 from typing import Optional
 
+from django.conf import settings
 from django.db.models import Sum
 
+from .subset_sum import SubsetItem, solve_subset_sum, to_cents
+
 logger = logging.getLogger("docscanner_app")
 
 AUTO_MATCH_THRESHOLD = Decimal("0.80")
@@ -42,6 +45,8 @@ LIKELY_MATCH_THRESHOLD = Decimal("0.40")
 AMOUNT_TOLERANCE_ABS = Decimal("0.05")
 AMOUNT_TOLERANCE_PCT = Decimal("0.01")
 
+MULTI_SOLVERS = ("greedy", "subset_sum")
+
 
 # ════════════════════════════════════════════════════════════
 # Data classes
@@ -102,6 +107,63 @@ NUMBER_KEYWORDS = [
 ]
 
 
+# ════════════════════════════════════════════════════════════
+# Multi-document split (bendra abiem engine'ams)
+# ════════════════════════════════════════════════════════════
+
+def _resolve_multi_solver(name):
+    name = name or getattr(settings, "PAYMENT_MULTI_SOLVER", "greedy")
+    if name not in MULTI_SOLVERS:
+        logger.warning("Unknown PAYMENT_MULTI_SOLVER=%r, using greedy", name)
+        return "greedy"
+    return name
+
+
+def _greedy_multi(amt, eligible, remaining, exact) -> Optional[list]:
+    """Senas FIFO: imam kandidatus balo tvarka, kol surenkam sumą."""
+    selected = []
+    running = Decimal("0")
+    for c in eligible:
+        if running >= amt:
+            break
+        take = min(remaining(c), amt - running)
+        selected.append((c, take))
+        running += take
+    if not exact(running, amt) and running < amt:
+        return None
+    if len(selected) < 2:
+        return None
+    return selected
+
+
+def _solve_multi(amt, eligible, remaining, due):
+    """
+    Tikslus poaibis: dokumentai, kurių likučių suma = amt ±AMOUNT_TOLERANCE_ABS.
+    Grąžina ([(candidate, take), ...], details) arba (None, details) — tada
+    kviečiantysis krenta į greedy.
+    """
+    items = [
+        SubsetItem(key=c, cents=to_cents(remaining(c)), score=c.score, due=due(c))
+        for c in eligible
+    ]
+    sol = solve_subset_sum(items, to_cents(amt), tolerance_cents=to_cents(AMOUNT_TOLERANCE_ABS))
+    if sol is None:
+        return None, {"solver": "greedy"}
+
+    selected = []
+    running = Decimal("0")
+    for it in sol.items:
+        # Paskutinė (ar bet kuri) alokacija neviršija mokėjimo sumos
+        take = min(remaining(it.key), amt - running)
+        if take <= 0:
+            break
+        selected.append((it.key, take))
+        running += take
+    if len(selected) < 2:
+        return None, {"solver": "greedy"}
+    return selected, {"solver": "subset_sum", "exhaustive": sol.exhaustive}
+
+
 # ════════════════════════════════════════════════════════════
 # Engine
 # ════════════════════════════════════════════════════════════
@@ -109,8 +171,9 @@ NUMBER_KEYWORDS = [
 class InvoiceMatchingEngine:
     """Matching IncomingTransaction → Invoice with scoring."""
 
-    def __init__(self, user):
+    def __init__(self, user, multi_solver=None):
         self.user = user
+        self.multi_solver = _resolve_multi_solver(multi_solver)
         self._cache = {}          # inv_id → dict
         self._number_idx = {}     # "ISF456" → inv_id (full number variations)
         self._bare_number_idx = {}  # "456" → inv_id (bare document_number, needs boundary check)
@@ -213,8 +276,8 @@ class InvoiceMatchingEngine:
 
     # ── Cache ───────────────────────────────────────────────
 
-    def _build_cache(self):
-        from ..models import Invoice, PaymentAllocation, normalize_name as norm
+    def _build_cache(self, exclude_ids=()):
+        from ..models import Invoice, PaymentAllocation
 
         invoices = (
             Invoice.objects
@@ -226,6 +289,8 @@ class InvoiceMatchingEngine:
         )
 
         for inv in invoices:
+            if inv.id in exclude_ids:
+                continue
             paid = (
                 PaymentAllocation.objects
                 .filter(invoice=inv, status__in=["confirmed", "auto", "manual"])
@@ -236,51 +301,7 @@ class InvoiceMatchingEngine:
             if remaining <= Decimal("0.01"):
                 continue
 
-            fn = inv.full_number.strip()
-            series = (inv.document_series or "").strip()
-            number = (inv.document_number or "").strip()
-
-            entry = {
-                "id": inv.id,
-                "full_number": fn,
-                "series": series,
-                "number": number,
-                "amount": inv.amount_with_vat,
-                "remaining": remaining,
-                "buyer_name": inv.buyer_name or "",
-                "buyer_norm": inv.buyer_name_normalized or norm(inv.buyer_name or ""),
-                "buyer_code": (inv.buyer_id or "").strip(),
-                "buyer_iban": (getattr(inv, "buyer_iban", "") or "").strip().upper(),
-                "invoice_date": inv.invoice_date,
-                "due_date": getattr(inv, "due_date", None),
-            }
-            self._cache[inv.id] = entry
-
-            # ── Number index (full number with series) ──────
-            self._index_number(fn, inv.id)
-
-            # All variations of series+number
-            if series and number:
-                for variation in self._number_variations(series, number):
-                    self._number_idx[variation] = inv.id
-
-            # ── Bare number index (needs word-boundary check) ──
-            if number and len(number) >= 3:
-                self._bare_number_idx[number.upper()] = inv.id
-
-            # ── Buyer code index ────────────────────────────
-            if inv.buyer_id:
-                code = inv.buyer_id.strip()
-                self._code_idx.setdefault(code, []).append(inv.id)
-
-            # ── Buyer name index ────────────────────────────
-            bn = entry["buyer_norm"]
-            if bn:
-                self._name_idx.setdefault(bn, []).append(inv.id)
-
-            # ── Buyer IBAN index ────────────────────────────
-            if entry["buyer_iban"]:
-                self._iban_idx.setdefault(entry["buyer_iban"], []).append(inv.id)
+            self._add_to_cache(inv, remaining)
 
         logger.info(
             "[Match] Cache built: %d invoices, %d number keys, %d bare keys, "
@@ -289,6 +310,56 @@ class InvoiceMatchingEngine:
             len(self._code_idx), len(self._name_idx), len(self._iban_idx),
         )
 
+    def _add_to_cache(self, inv, remaining: Decimal):
+        """Įtraukia vieną sąskaitą į _cache ir visus indeksus."""
+        from ..models import normalize_name as norm
+
+        fn = inv.full_number.strip()
+        series = (inv.document_series or "").strip()
+        number = (inv.document_number or "").strip()
+
+        entry = {
+            "id": inv.id,
+            "full_number": fn,
+            "series": series,
+            "number": number,
+            "amount": inv.amount_with_vat or Decimal("0"),
+            "remaining": remaining,
+            "buyer_name": inv.buyer_name or "",
+            "buyer_norm": inv.buyer_name_normalized or norm(inv.buyer_name or ""),
+            "buyer_code": (inv.buyer_id or "").strip(),
+            "buyer_iban": (getattr(inv, "buyer_iban", "") or "").strip().upper(),
+            "invoice_date": inv.invoice_date,
+            "due_date": getattr(inv, "due_date", None),
+        }
+        self._cache[inv.id] = entry
+
+        # ── Number index (full number with series) ──────
+        self._index_number(fn, inv.id)
+
+        # All variations of series+number
+        if series and number:
+            for variation in self._number_variations(series, number):
+                self._number_idx[variation] = inv.id
+
+        # ── Bare number index (needs word-boundary check) ──
+        if number and len(number) >= 3:
+            self._bare_number_idx[number.upper()] = inv.id
+
+        # ── Buyer code index ────────────────────────────
+        if inv.buyer_id:
+            code = inv.buyer_id.strip()
+            self._code_idx.setdefault(code, []).append(inv.id)
+
+        # ── Buyer name index ────────────────────────────
+        bn = entry["buyer_norm"]
+        if bn:
+            self._name_idx.setdefault(bn, []).append(inv.id)
+
+        # ── Buyer IBAN index ────────────────────────────
+        if entry["buyer_iban"]:
+            self._iban_idx.setdefault(entry["buyer_iban"], []).append(inv.id)
+
     def _index_number(self, number_str: str, inv_id: int):
         """Add a number string and its cleaned variant to the index."""
         if not number_str or len(number_str) < 3:
@@ -330,6 +401,45 @@ class InvoiceMatchingEngine:
     # ── Single Match ────────────────────────────────────────
 
     def _match_one(self, txn) -> MatchResult:
+        all_ids, from_purpose = self._candidate_ids(txn)
+
+        if not all_ids:
+            return MatchResult(
+                transaction_id=txn.id, status="unmatched",
+                details={"reason": "no_candidates"},
+            )
+
+        # 6. Score all candidates
+        candidates = []
+        for inv_id in all_ids:
+            inv = self._cache.get(inv_id)
+            if not inv:
+                continue
+            c = self._score(txn, inv, from_purpose)
+            candidates.append(c)
+
+        if not candidates:
+            return MatchResult(
+                transaction_id=txn.id, status="unmatched",
+                details={"reason": "no_valid_candidates"},
+            )
+
+        candidates.sort(key=lambda c: c.score, reverse=True)
+
+        # Log top candidates for debugging
+        for c in candidates[:3]:
+            logger.debug(
+                "[Match] txn=%s candidate: inv=%s (%s) score=%.2f reasons=%s",
+                txn.id, c.invoice_id, c.invoice_full_number, c.score, c.reasons,
+            )
+
+        return self._build_result(txn, candidates)
+
+    def _candidate_ids(self, txn) -> tuple[set, set]:
+        """
+        Sąskaitų ID, kurias verta vertinti šiai operacijai (iš _cache indeksų).
+        Returns: (all_ids, from_purpose).
+        """
         purpose = txn.payment_purpose or ""
 
         # 1. Find invoice IDs by number in purpose
@@ -369,37 +479,7 @@ class InvoiceMatchingEngine:
                         or self._exact(txn.amount, inv["amount"])):
                     all_ids.add(inv_id)
 
-        if not all_ids:
-            return MatchResult(
-                transaction_id=txn.id, status="unmatched",
-                details={"reason": "no_candidates"},
-            )
-
-        # 6. Score all candidates
-        candidates = []
-        for inv_id in all_ids:
-            inv = self._cache.get(inv_id)
-            if not inv:
-                continue
-            c = self._score(txn, inv, from_purpose)
-            candidates.append(c)
-
-        if not candidates:
-            return MatchResult(
-                transaction_id=txn.id, status="unmatched",
-                details={"reason": "no_valid_candidates"},
-            )
-
-        candidates.sort(key=lambda c: c.score, reverse=True)
-
-        # Log top candidates for debugging
-        for c in candidates[:3]:
-            logger.debug(
-                "[Match] txn=%s candidate: inv=%s (%s) score=%.2f reasons=%s",
-                txn.id, c.invoice_id, c.invoice_full_number, c.score, c.reasons,
-            )
-
-        return self._build_result(txn, candidates)
+        return all_ids, from_purpose
 
     # ── Number Extraction from Purpose ──────────────────────
 
@@ -716,18 +796,17 @@ class InvoiceMatchingEngine:
         if len(eligible) < 2:
             return None
 
-        selected = []
-        running = Decimal("0")
-        for c in eligible:
-            if running >= amt:
-                break
-            take = min(c.invoice_remaining, amt - running)
-            selected.append((c, take))
-            running += take
-
-        if not self._exact(running, amt) and running < amt:
-            return None
-        if len(selected) < 2:
+        details = {"solver": "greedy"}
+        selected = None
+        if self.multi_solver == "subset_sum":
+            selected, details = _solve_multi(
+                amt, eligible,
+                remaining=lambda c: c.invoice_remaining,
+                due=lambda c: self._candidate_due(self._cache.get(c.invoice_id)),
+            )
+        if selected is None:
+            selected = _greedy_multi(amt, eligible, lambda c: c.invoice_remaining, self._exact)
+        if not selected:
             return None
 
         min_score = min(c.score for c, _ in selected)
@@ -748,9 +827,15 @@ class InvoiceMatchingEngine:
                 )
                 for c, take in selected
             ],
-            details={"match_type": "multi_invoice", "count": len(selected)},
+            details={"match_type": "multi_invoice", "count": len(selected), **details},
         )
 
+    @staticmethod
+    def _candidate_due(doc):
+        if not doc:
+            return None
+        return doc.get("due_date") or doc.get("invoice_date")
+
     def _recalc_invoice(self, invoice_id):
         from ..models import Invoice
         try:
@@ -790,9 +875,10 @@ class PurchaseAllocationProposal:
 class PurchaseMatchingEngine:
     """Matching OutgoingTransaction → Purchase with scoring."""
 
-    def __init__(self, user, company_profile=None):
+    def __init__(self, user, company_profile=None, multi_solver=None):
         self.user = user
         self.company_profile = company_profile
+        self.multi_solver = _resolve_multi_solver(multi_solver)
         self._cache = {}
         self._number_idx = {}
         self._bare_number_idx = {}
@@ -1257,17 +1343,17 @@ class PurchaseMatchingEngine:
         eligible = [c for c in candidates if c.score >= LIKELY_MATCH_THRESHOLD]
         if len(eligible) < 2:
             return None
-        selected = []
-        running = Decimal("0")
-        for c in eligible:
-            if running >= amt:
-                break
-            take = min(c.purchase_remaining, amt - running)
-            selected.append((c, take))
-            running += take
-        if not self._exact(running, amt) and running < amt:
-            return None
-        if len(selected) < 2:
+        details = {"solver": "greedy"}
+        selected = None
+        if self.multi_solver == "subset_sum":
+            selected, details = _solve_multi(
+                amt, eligible,
+                remaining=lambda c: c.purchase_remaining,
+                due=lambda c: InvoiceMatchingEngine._candidate_due(self._cache.get(c.purchase_id)),
+            )
+        if selected is None:
+            selected = _greedy_multi(amt, eligible, lambda c: c.purchase_remaining, self._exact)
+        if not selected:
             return None
         min_score = min(c.score for c, _ in selected)
         avg_score = sum(c.score for c, _ in selected) / len(selected)
@@ -1285,7 +1371,7 @@ class PurchaseMatchingEngine:
                 )
                 for c, take in selected
             ],
-            details={"match_type": "multi_purchase", "count": len(selected)},
+            details={"match_type": "multi_purchase", "count": len(selected), **details},
         )
 
     def _recalc_purchase(self, purchase_id):
@@ -7,7 +7,9 @@ from django.db import transaction as db_transaction
 from django.utils import timezone
 
 from ..models import Purchase, PaymentAllocation, normalize_name
-from .transaction_signals import extract_signals, score_with_signals
+from .transaction_signals import (
+    CandidateBlockingIndex, extract_signals, load_signals, score_with_signals,
+)
 
 logger = logging.getLogger("docscanner_app")
 
@@ -45,12 +47,17 @@ class SignalPurchaseMatchingEngine:
     def match_transactions(self, transactions):
         purchases = list(self._load_purchases())
         candidates = [self._purchase_to_candidate(p) for p in purchases]
+        index = CandidateBlockingIndex(candidates)
+
+        # Signalai išsaugoti importo metu — regex'ai čia nebekartojami
+        transactions = list(transactions)
+        signals_map = load_signals(transactions)
 
         results = []
 
         for txn in transactions:
             try:
-                result = self._match_one(txn, candidates)
+                result = self._match_one(txn, candidates, signals=signals_map.get(txn), index=index)
             except Exception as e:
                 logger.exception("[SignalPurchaseMatch] txn=%s failed: %s", txn.id, e)
                 result = SignalPurchaseMatchResult(txn=txn)
@@ -158,8 +165,13 @@ class SignalPurchaseMatchingEngine:
                         e,
                     )
 
-    def _match_one(self, txn, candidates):
-        signals = extract_signals(txn)
+    def _match_one(self, txn, candidates, signals=None, index=None):
+        """
+        index (CandidateBlockingIndex) — jei perduotas, balas skaičiuojamas tik
+        shortlist'o kandidatams. Rezultatas tas pats, nes už shortlist'o likę
+        kandidatai negali surinkti daugiau nei BLOCKING_MAX_MISSED_SCORE < LIKELY_THRESHOLD.
+        """
+        signals = signals or extract_signals(txn)
         setattr(signals, "_txn_date", txn.transaction_date)
 
         if signals.skip_matching:
@@ -175,6 +187,9 @@ class SignalPurchaseMatchingEngine:
                 signals=self._serialize_signals(signals),
             )
 
+        if index is not None:
+            candidates = index.shortlist(signals, txn.transaction_date)
+
         scored = []
 
         for c in candidates:
@@ -0,0 +1,246 @@
+# utils/rate_limiter.py
+"""
+Paskirstytas (visiems Celery worker'iams bendras) token-bucket limiteris išoriniams API.
+
+Būsena laikoma Redis'e (tas pats Redis kaip Celery broker), token'ų atėmimas
+atliekamas atomiškai Lua skriptu, laikas imamas iš Redis TIME — worker'ių
+laikrodžių skirtumai neturi įtakos.
+
+Naudojimas:
+    from .rate_limiter import acquire, require, RateLimited
+
+    if not acquire("google_vision", max_wait=30):
+        # limitas neatsilaisvino per 30 s — perplanuoti task'ą su countdown
+        ...
+
+    require("grok")                  # laukia kol gaus token'ą arba kelia RateLimited
+    r = requests.post(...)
+
+Jei Redis nepasiekiamas — limiteris "fail open" (leidžia užklausą), kad
+nesustabdytų apdorojimo.
+"""
+
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger("docscanner_app")
+
+
+# provider -> (capacity, period_seconds): ne daugiau capacity užklausų per period
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "google_vision": (55, 60),   # GCV quota 60 req/min, paliekam atsargą
+    "gemini": (300, 60),
+    "kie": (120, 60),
+    "grok": (120, 60),
+    "openai": (60, 60),
+    "mimo": (60, 60),
+    "novita": (60, 60),
+    "mercury": (60, 60),
+    "vies": (20, 60),
+    "lb_fx": (30, 60),
+}
+
+# Kiek laukiama token'o pagal nutylėjimą (sekundėmis)
+DEFAULT_MAX_WAIT = 30.0
+# LLM kvietimams — trumpiau, kad retry/fallback grandinė galėtų pereiti prie kito provider'io
+LLM_RATE_LIMIT_MAX_WAIT = 20.0
+
+_KEY_PREFIX = "ratelimit"
+_STATS_TTL = 2 * 3600
+
+
+# KEYS[1] = bucket hash; ARGV: capacity, refill_per_sec, requested
+# Grąžina {allowed(0/1), wait_ms, tokens_left*1000}
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+
+local elapsed = math.max(0, now - ts)
+tokens = math.min(capacity, tokens + elapsed * rate)
+
+local allowed = 0
+local wait_ms = 0
+if tokens >= requested then
+  tokens = tokens - requested
+  allowed = 1
+else
+  wait_ms = math.ceil((requested - tokens) / rate * 1000)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2 + 60)
+return {allowed, wait_ms, math.floor(tokens * 1000)}
+"""
+
+
+class RateLimited(Exception):
+    """Token'as negautas per max_wait. retry_after — po kiek sekundžių verta bandyti vėl."""
+
+    def __init__(self, provider: str, retry_after: float):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"RATE_LIMITED: {provider} (retry after {retry_after:.1f}s)")
+
+
+_redis_conn = None
+_script = None
+
+
+def _get_redis():
+    global _redis_conn, _script
+    if _redis_conn is None:
+        import redis as _redis
+        url = getattr(settings, "RATE_LIMIT_REDIS_URL", None) or settings.CELERY_BROKER_URL
+        _redis_conn = _redis.from_url(url)
+        _script = _redis_conn.register_script(_TOKEN_BUCKET_LUA)
+    return _redis_conn
+
+
+def get_limit(provider: str) -> Tuple[int, int]:
+    overrides = getattr(settings, "RATE_LIMITS", None) or {}
+    return overrides.get(provider) or DEFAULT_RATE_LIMITS.get(provider) or (60, 60)
+
+
+def _stats_key(provider: str, minute: Optional[int] = None) -> str:
+    minute = int(time.time() // 60) if minute is None else minute
+    return f"{_KEY_PREFIX}:stats:{provider}:{minute}"
+
+
+def _record(provider: str, field: str, amount: int = 1):
+    try:
+        conn = _get_redis()
+        key = _stats_key(provider)
+        pipe = conn.pipeline()
+        pipe.hincrby(key, field, amount)
+        pipe.expire(key, _STATS_TTL)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def try_acquire(provider: str, tokens: int = 1) -> Tuple[bool, float]:
+    """
+    Vienas bandymas paimti token'ą. Grąžina (allowed, wait_seconds).
+    Redis klaidos atveju — (True, 0.0) (fail open).
+    """
+    capacity, period = get_limit(provider)
+    rate = capacity / float(period)
+    try:
+        _get_redis()
+        allowed, wait_ms, _ = _script(
+            keys=[f"{_KEY_PREFIX}:bucket:{provider}"],
+            args=[capacity, rate, tokens],
+        )
+    except Exception as e:
+        logger.warning("[RATE] %s: limiter unavailable, allowing request: %s", provider, e)
+        return True, 0.0
+    return bool(allowed), int(wait_ms) / 1000.0
+
+
+def acquire(provider: str, tokens: int = 1, max_wait: Optional[float] = None) -> bool:
+    """
+    Laukia (time.sleep) kol gaus token'ą, bet ne ilgiau nei max_wait sekundžių.
+    Grąžina True, jei token'as gautas.
+    """
+    max_wait = DEFAULT_MAX_WAIT if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+    waited = 0.0
+
+    while True:
+        allowed, wait_s = try_acquire(provider, tokens)
+        if allowed:
+            _record(provider, "allowed")
+            if waited:
+                _record(provider, "waited_ms", int(waited * 1000))
+            return True
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            _record(provider, "throttled")
+            logger.warning("[RATE] %s: no token after %.1fs wait", provider, waited)
+            return False
+
+        sleep_for = min(max(wait_s, 0.05), remaining)
+        time.sleep(sleep_for)
+        waited += sleep_for
+
+
+def retry_after(provider: str, tokens: int = 1) -> float:
+    """Apytikslis laikas (s), po kurio atsiras token'as — task'o countdown'ui."""
+    capacity, period = get_limit(provider)
+    return max(1.0, tokens * period / float(capacity))
+
+
+def require(provider: str, tokens: int = 1, max_wait: Optional[float] = None) -> None:
+    """Kaip acquire(), bet vietoj False kelia RateLimited (su retry_after)."""
+    if not acquire(provider, tokens=tokens, max_wait=max_wait):
+        raise RateLimited(provider, retry_after(provider, tokens))
+
+
+def get_utilisation(providers=None) -> Dict[str, dict]:
+    """
+    Metrikos kiekvienam provider'iui:
+      tokens_available, capacity, period_seconds,
+      allowed / throttled / waited_ms per paskutinę minutę ir per 60 min,
+      utilisation — paskutinės minutės allowed / per-minute capacity.
+    """
+    providers = providers or sorted(set(DEFAULT_RATE_LIMITS) | set(getattr(settings, "RATE_LIMITS", {}) or {}))
+    out: Dict[str, dict] = {}
+
+    try:
+        conn = _get_redis()
+    except Exception as e:
+        logger.warning("[RATE] utilisation: redis unavailable: %s", e)
+        return out
+
+    now_minute = int(time.time() // 60)
+    for provider in providers:
+        capacity, period = get_limit(provider)
+        per_minute_capacity = capacity * 60.0 / period
+
+        pipe = conn.pipeline()
+        pipe.hmget(f"{_KEY_PREFIX}:bucket:{provider}", "tokens", "ts")
+        for m in range(now_minute - 59, now_minute + 1):
+            pipe.hgetall(_stats_key(provider, m))
+        res = pipe.execute()
+
+        tokens_raw = res[0][0]
+        tokens_available = float(tokens_raw) if tokens_raw is not None else float(capacity)
+
+        def _sum(rows, field):
+            return sum(int(r.get(field.encode(), 0) or 0) for r in rows)
+
+        minutes = res[1:]
+        last = minutes[-1:]
+        out[provider] = {
+            "capacity": capacity,
+            "period_seconds": period,
+            "tokens_available": round(min(tokens_available, capacity), 2),
+            "last_minute": {
+                "allowed": _sum(last, "allowed"),
+                "throttled": _sum(last, "throttled"),
+                "waited_ms": _sum(last, "waited_ms"),
+            },
+            "last_hour": {
+                "allowed": _sum(minutes, "allowed"),
+                "throttled": _sum(minutes, "throttled"),
+                "waited_ms": _sum(minutes, "waited_ms"),
+            },
+            "utilisation": round(_sum(last, "allowed") / per_minute_capacity, 3) if per_minute_capacity else 0.0,
+        }
+    return out
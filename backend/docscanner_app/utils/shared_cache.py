@@ -0,0 +1,200 @@
+# utils/shared_cache.py
+"""
+Bendras (tarp visų gunicorn / Celery procesų) cache sluoksnis virš django.core.cache.
+
+- Raktai sudaromi per namespace: "<namespace>:v<version>:<part>:<part>...".
+  Namespace versija laikoma cache'e — invalidate_namespace() ją padidina ir
+  visi seni raktai tampa nepasiekiami (išnyksta pagal TTL).
+- Kiekvienas namespace turi savo TTL (NAMESPACE_TTLS, perrašoma settings.CACHE_NAMESPACE_TTLS).
+- get_or_set() saugo nuo "stampede": reikšmę skaičiuoja tik vienas procesas
+  (cache.add lock), kiti trumpai palaukia ir pasiima jau paskaičiuotą.
+- None reikšmės taip pat cache'inamos (negatyvus cache registrų paieškoms).
+
+Naudojimas:
+    from .shared_cache import get_or_set, memoize, invalidate_namespace
+
+    @memoize("registry")
+    def company_by_code(code): ...
+
+    rate = get_or_set("fx", ("USD", "2025-01-31"), lambda: ...)
+    invalidate_namespace("fx")
+"""
+
+import time
+import logging
+import functools
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger("docscanner_app")
+
+
+# namespace -> TTL sekundėmis
+NAMESPACE_TTLS = {
+    "fx": 6 * 3600,           # valiutų kursai (atnaujinami kartą per dieną)
+    "registry": 24 * 3600,    # Company registras (sinchronizuojamas kas savaitę)
+    "export_ref": 3600,       # eksportų žinynai
+    "site_search": 900,       # gidų / tinklaraščio paieška (invaliduojama publikuojant)
+    "default": 600,
+}
+
+LOCK_TTL = 30          # kiek ilgiausiai laikomas skaičiavimo lock'as
+LOCK_WAIT = 5.0        # kiek kiti procesai laukia kol reikšmė atsiras
+LOCK_POLL = 0.05
+
+_MISSING = object()
+_NONE = "__shared_cache_none__"
+
+
+def get_ttl(namespace: str) -> int:
+    overrides = getattr(settings, "CACHE_NAMESPACE_TTLS", None) or {}
+    if namespace in overrides:
+        return overrides[namespace]
+    return NAMESPACE_TTLS.get(namespace, NAMESPACE_TTLS["default"])
+
+
+def _version_key(namespace: str) -> str:
+    return f"{namespace}:__version__"
+
+
+def _namespace_version(namespace: str) -> int:
+    try:
+        version = cache.get(_version_key(namespace))
+        if version is None:
+            cache.add(_version_key(namespace), 1, timeout=None)
+            version = cache.get(_version_key(namespace)) or 1
+        return int(version)
+    except Exception as e:
+        logger.warning("[CACHE] %s: version lookup failed: %s", namespace, e)
+        return 1
+
+
+def make_key(namespace: str, parts: Iterable[Any]) -> str:
+    if isinstance(parts, (str, bytes)) or not isinstance(parts, Iterable):
+        parts = (parts,)
+    joined = ":".join("" if p is None else str(p) for p in parts)
+    return f"{namespace}:v{_namespace_version(namespace)}:{joined}"
+
+
+def cache_get(namespace: str, parts, default=None):
+    try:
+        value = cache.get(make_key(namespace, parts), _MISSING)
+    except Exception as e:
+        logger.warning("[CACHE] %s get failed: %s", namespace, e)
+        return default
+    if value is _MISSING:
+        return default
+    return None if value == _NONE else value
+
+
+def cache_set(namespace: str, parts, value, ttl: Optional[int] = None) -> None:
+    try:
+        cache.set(
+            make_key(namespace, parts),
+            _NONE if value is None else value,
+            timeout=get_ttl(namespace) if ttl is None else ttl,
+        )
+    except Exception as e:
+        logger.warning("[CACHE] %s set failed: %s", namespace, e)
+
+
+def cache_delete(namespace: str, parts) -> None:
+    try:
+        cache.delete(make_key(namespace, parts))
+    except Exception as e:
+        logger.warning("[CACHE] %s delete failed: %s", namespace, e)
+
+
+def invalidate_namespace(namespace: str) -> None:
+    """Padidina namespace versiją — visi esami raktai tampa nebegaliojantys."""
+    try:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        cache.incr(_version_key(namespace))
+    except Exception as e:
+        logger.warning("[CACHE] %s invalidate failed: %s", namespace, e)
+
+
+def get_or_set(namespace: str, parts, producer: Callable[[], Any], ttl: Optional[int] = None):
+    """
+    Grąžina cache'intą reikšmę arba ją paskaičiuoja per producer().
+    Lygiagrečiai tą patį raktą skaičiuoja tik vienas procesas.
+    Cache klaidos atveju tiesiog grąžinamas producer() rezultatas.
+    """
+    try:
+        key = make_key(namespace, parts)
+        value = cache.get(key, _MISSING)
+    except Exception as e:
+        logger.warning("[CACHE] %s unavailable, computing directly: %s", namespace, e)
+        return producer()
+
+    if value is not _MISSING:
+        return None if value == _NONE else value
+
+    lock_key = f"{key}:lock"
+    try:
+        got_lock = cache.add(lock_key, "1", timeout=LOCK_TTL)
+    except Exception:
+        got_lock = True
+
+    if not got_lock:
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return None if value == _NONE else value
+        # lock'o savininkas užtruko — skaičiuojam patys
+
+    try:
+        value = producer()
+        cache.set(
+            key,
+            _NONE if value is None else value,
+            timeout=get_ttl(namespace) if ttl is None else ttl,
+        )
+        return value
+    finally:
+        if got_lock:
+            try:
+                cache.delete(lock_key)
+            except Exception:
+                pass
+
+
+def memoize(namespace: str, ttl: Optional[int] = None):
+    """
+    Dekoratorius funkcijoms su paprastais (str/int/date) pozicioniais argumentais.
+    Raktas: funkcijos pavadinimas + argumentai. Funkcija gauna .invalidate(*args).
+    """
+    def decorator(func):
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            return get_or_set(namespace, (prefix, *args), lambda: func(*args), ttl=ttl)
+
+        wrapper.invalidate = lambda *args: cache_delete(namespace, (prefix, *args))
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+# ─── Dažnai naudojami lookup'ai ─────────────────────────────────────────────
+
+@memoize("fx")
+def lookup_currency_rate(currency: str, on_date):
+    """
+    CurrencyRate.rate (Decimal) valiutai datai: tikslus kursas arba paskutinis iki datos.
+    None, jei kurso nėra. EUR tvarko kviečiantis kodas.
+    """
+    from ..models import CurrencyRate
+
+    code = (currency or "").upper()
+    obj = (
+        CurrencyRate.objects.filter(currency=code, date=on_date).only("rate").first()
+        or CurrencyRate.objects.filter(currency=code, date__lt=on_date).order_by("-date").only("rate").first()
+    )
+    return obj.rate if obj else None
@@ -1,6 +1,18 @@
-from django.db.models.signals import post_save, post_delete
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from ..models import Purchase, Invoice, JournalEntry
+from wagtail.signals import page_published, page_unpublished
+from ..models import (
+    Purchase, Invoice, JournalEntry, MatchingChange, PaymentAllocation,
+    ScannedDocument, LineItem, InvoiceLineItem,
+    GuideCategoryPage, GuidePage, BlogCategoryPage, BlogPostPage,
+)
+from .incremental_matching import enqueue_matching_changes
+from .shared_cache import invalidate_namespace
+from ..services.debts_ledger import invalidate_debt_snapshots
+from ..services import vat_report_facts as vat_facts
+from ..services.counterparty_directory import document_counterparty_keys, sync_counterparties
+from ..services.invoice_pdf_cache import drop_invoice_pdf_cache
 from .journal_generators import (
     generate_purchase_journal_entry,
     generate_invoice_journal_entry,
@@ -32,4 +44,233 @@ def _delete_invoice_journal(sender, instance, **kwargs):
     JournalEntry.objects.filter(
         invoice=instance,
         source_type=JournalEntry.SOURCE_SALE,
-    ).delete()
\ No newline at end of file
+    ).delete()
+
+
+@receiver(post_delete, sender=Invoice)
+def _drop_invoice_pdf_cache(sender, instance, **kwargs):
+    drop_invoice_pdf_cache(instance)
+
+# ── Incremental matching: pakeitimų eilė (utils/incremental_matching.py) ──
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def _queue_invoice_matching(sender, instance, **kwargs):
+    enqueue_matching_changes(instance.user_id, MatchingChange.Kind.INVOICE, [instance.pk])
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+def _queue_purchase_matching(sender, instance, **kwargs):
+    enqueue_matching_changes(instance.user_id, MatchingChange.Kind.PURCHASE, [instance.pk])
+
+
+@receiver(post_save, sender=PaymentAllocation)
+@receiver(post_delete, sender=PaymentAllocation)
+def _queue_allocation_matching(sender, instance, **kwargs):
+    """Alokacija keičia dokumento likutį; ištrinta — operacija vėl gali būti unmatched."""
+    Kind = MatchingChange.Kind
+    links = (
+        ("invoice", Kind.INVOICE),
+        ("purchase", Kind.PURCHASE),
+        ("incoming_transaction", Kind.INCOMING),
+        ("outgoing_transaction", Kind.OUTGOING),
+    )
+    user_id = None
+    for attr, _ in links:
+        if getattr(instance, f"{attr}_id"):
+            try:
+                user_id = getattr(instance, attr).user_id
+                break
+            except ObjectDoesNotExist:
+                continue
+    for attr, kind in links:
+        obj_id = getattr(instance, f"{attr}_id")
+        if obj_id:
+            enqueue_matching_changes(user_id, kind, [obj_id])
+
+
+# ── Skolų kopijos (services/debts_ledger.py): ištrinamos, jei pasikeitė jų laikotarpis ──
+# Perkėlus dokumentą / mokėjimą į kitą datą ar įmonės profilį, pasensta ir
+# senojo profilio kopijos, ir kopijos tarp senos bei naujos datos — todėl
+# pre_save įsimenamos senos reikšmės, o invaliduojama nuo min(sena, nauja).
+# QuerySet.update() / bulk_update() čia nepatenka — žr. services/debts_ledger.py.
+
+DOC_DEBT_FIELDS = frozenset({"invoice_date", "company_profile", "company_profile_id"})
+ALLOCATION_DEBT_FIELDS = frozenset({
+    "invoice", "invoice_id", "purchase", "purchase_id", "payment_date",
+    "incoming_transaction", "incoming_transaction_id",
+    "outgoing_transaction", "outgoing_transaction_id",
+})
+
+
+def _invalidate_debt_periods(entries):
+    """[(profilis, data, tipas)] → po vieną trynimą (profilis, tipas) nuo anksčiausios datos."""
+    since = {}
+    for profile_id, date, debt_type in entries:
+        if not profile_id:
+            continue
+        key = (profile_id, debt_type)
+        if key not in since:
+            since[key] = date
+        elif since[key] is not None:
+            since[key] = None if date is None else min(since[key], date)
+    for (profile_id, debt_type), date in since.items():
+        invalidate_debt_snapshots(profile_id, date, debt_type)
+
+
+def _allocation_debt_entries(alloc):
+    entries = []
+    for attr, debt_type in (("invoice", "customer"), ("purchase", "supplier")):
+        if not getattr(alloc, f"{attr}_id"):
+            continue
+        try:
+            entries.append((
+                getattr(alloc, attr).company_profile_id,
+                alloc.effective_payment_date,
+                debt_type,
+            ))
+        except ObjectDoesNotExist:
+            continue
+    return entries
+
+
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Purchase)
+def _remember_document_debt_period(sender, instance, update_fields=None, **kwargs):
+    instance._debt_before = None
+    if instance._state.adding or not instance.pk or not _touches(update_fields, DOC_DEBT_FIELDS):
+        return
+    instance._debt_before = (
+        sender._base_manager.filter(pk=instance.pk)
+        .values_list("company_profile_id", "invoice_date")
+        .first()
+    )
+
+
+@receiver(pre_save, sender=PaymentAllocation)
+def _remember_allocation_debt_period(sender, instance, update_fields=None, **kwargs):
+    instance._debt_before = None
+    if instance._state.adding or not instance.pk or not _touches(update_fields, ALLOCATION_DEBT_FIELDS):
+        return
+    old = (
+        sender._base_manager.filter(pk=instance.pk)
+        .select_related("invoice", "purchase", "incoming_transaction", "outgoing_transaction")
+        .first()
+    )
+    instance._debt_before = _allocation_debt_entries(old) if old else None
+
+
+def _document_debt_entries(instance, debt_type):
+    entries = [(instance.company_profile_id, instance.invoice_date, debt_type)]
+    before = getattr(instance, "_debt_before", None)
+    if before:
+        entries.append((before[0], before[1], debt_type))
+    instance._debt_before = None
+    return entries
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def _invalidate_invoice_debt_snapshots(sender, instance, **kwargs):
+    _invalidate_debt_periods(_document_debt_entries(instance, "customer"))
+
+
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+def _invalidate_purchase_debt_snapshots(sender, instance, **kwargs):
+    _invalidate_debt_periods(_document_debt_entries(instance, "supplier"))
+
+
+@receiver(post_save, sender=PaymentAllocation)
+@receiver(post_delete, sender=PaymentAllocation)
+def _invalidate_allocation_debt_snapshots(sender, instance, **kwargs):
+    entries = _allocation_debt_entries(instance) + (getattr(instance, "_debt_before", None) or [])
+    instance._debt_before = None
+    _invalidate_debt_periods(entries)
+
+
+# ── OSS / SVS faktai (services/vat_report_facts.py) ──
+
+def _touches(update_fields, fields):
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=ScannedDocument)
+def _refresh_scan_vat_facts(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, vat_facts.SCAN_FACT_FIELDS):
+        vat_facts.refresh_document_facts(vat_facts.SOURCE_SCAN, instance)
+
+
+@receiver(post_save, sender=Invoice)
+def _refresh_invoice_vat_facts(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, vat_facts.INVOICE_FACT_FIELDS):
+        vat_facts.refresh_document_facts(vat_facts.SOURCE_INVOICE, instance)
+
+
+@receiver(post_delete, sender=ScannedDocument)
+def _delete_scan_vat_facts(sender, instance, **kwargs):
+    vat_facts.delete_document_facts(vat_facts.SOURCE_SCAN, instance.pk)
+
+
+@receiver(post_delete, sender=Invoice)
+def _delete_invoice_vat_facts(sender, instance, **kwargs):
+    vat_facts.delete_document_facts(vat_facts.SOURCE_INVOICE, instance.pk)
+
+
+@receiver(post_save, sender=LineItem)
+@receiver(post_delete, sender=LineItem)
+def _refresh_scan_line_vat_facts(sender, instance, **kwargs):
+    """Eilutės svarbios tik separate_vat dokumentams (OSS tarifų grupės)."""
+    doc = ScannedDocument.objects.filter(
+        pk=instance.document_id, separate_vat=True, status__in=vat_facts.SCAN_STATUSES,
+    ).first()
+    if doc:
+        vat_facts.refresh_document_facts(vat_facts.SOURCE_SCAN, doc)
+
+
+@receiver(post_save, sender=InvoiceLineItem)
+@receiver(post_delete, sender=InvoiceLineItem)
+def _refresh_invoice_line_vat_facts(sender, instance, **kwargs):
+    inv = Invoice.objects.filter(
+        pk=instance.invoice_id, separate_vat=True, status__in=vat_facts.INVOICE_STATUSES,
+    ).first()
+    if inv:
+        vat_facts.refresh_document_facts(vat_facts.SOURCE_INVOICE, inv)
+
+
+# ── Kontrahentų katalogas (services/counterparty_directory.py) ──
+
+@receiver(post_save, sender=ScannedDocument)
+def _sync_scan_counterparties(sender, instance, **kwargs):
+    """Raktus ir ankstesnę būseną pažymi ScannedDocument.save() (refresh_counterparty_keys)."""
+    for user_id, keys in (getattr(instance, "_counterparty_sync", None) or {}).items():
+        sync_counterparties(user_id, keys)
+    instance._counterparty_sync = None
+
+
+@receiver(post_delete, sender=ScannedDocument)
+def _sync_deleted_scan_counterparties(sender, instance, **kwargs):
+    # Masinis purge trina .only("id") objektus — eilutės jau nėra, atidėtų laukų
+    # neįmanoma užkrauti; katalogą tada jau perskaičiavo document_purge._sync_derived
+    if {"user_id", "seller_key", "buyer_key"} & instance.get_deferred_fields():
+        return
+    for user_id, keys in document_counterparty_keys(instance).items():
+        sync_counterparties(user_id, keys)
+
+
+# ── Gidų / tinklaraščio paieškos cache (search_api.py) ──
+
+SEARCH_PAGE_MODELS = (GuideCategoryPage, GuidePage, BlogCategoryPage, BlogPostPage)
+
+
+def _invalidate_site_search(sender, **kwargs):
+    from ..search_api import SEARCH_CACHE_NAMESPACE
+
+    invalidate_namespace(SEARCH_CACHE_NAMESPACE)
+
+
+for _model in SEARCH_PAGE_MODELS:
+    page_published.connect(_invalidate_site_search, sender=_model)
+    page_unpublished.connect(_invalidate_site_search, sender=_model)
+    post_delete.connect(_invalidate_site_search, sender=_model)
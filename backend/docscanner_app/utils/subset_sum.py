@@ -0,0 +1,189 @@
+# utils/subset_sum.py
+"""
+Tikslus (ribotas laiku) subset-sum sprendėjas kelių sąskaitų mokėjimams:
+kurių dokumentų likučių suma (centais) lygi mokėjimo sumai ±tolerancija.
+
+Algoritmas:
+  1. meet-in-the-middle (kai kandidatų <= mitm_max_items): mažiausias
+     įmanomas |suma - target| per visus poaibius. Jei jis > tolerancijos —
+     sprendinio tikrai nėra (min_items / max_items čia neribojami).
+  2. branch & bound DFS (didžiausi likučiai pirmi) su likusių sumų
+     ribomis. Radus sprendinį, langas susiaurinamas iki jo
+     nuokrypio, todėl toliau ieškoma tik lygiaverčių ar geresnių.
+  3. time_budget — pasibaigus laikui grąžinamas geriausias rastas
+     (SubsetSolution.exhaustive = False).
+
+Sprendinių palyginimas: mažesnis nuokrypis → didesnis vidutinis balas →
+senesni terminai (mažesnė vidutinė due data) → mažiau dokumentų.
+
+Naudojimas:
+    items = [SubsetItem(key=c, cents=to_cents(c.remaining), score=c.score, due=c.due_date) ...]
+    sol = solve_subset_sum(items, to_cents(txn.amount), tolerance_cents=5)
+"""
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+# Sprendėjo numatytieji parametrai (naudoja matching engine'ai)
+MULTI_SOLVER_TIME_BUDGET = 0.1    # sekundės vienam mokėjimui
+MULTI_SOLVER_MAX_ITEMS = 60       # daugiausia dokumentų viename mokėjime
+MITM_MAX_ITEMS = 30               # 2 x 2^15 sumų
+MAX_POOL = 400                    # DFS gylis (rekursija)
+
+_NO_DUE = date.max.toordinal()
+
+
+def _due_ord(d) -> int:
+    return d.toordinal() if isinstance(d, date) else _NO_DUE
+
+
+@dataclass
+class SubsetItem:
+    key: object                     # kandidatas (grąžinamas sprendinyje)
+    cents: int                      # likutis centais
+    score: Decimal = Decimal("0")
+    due: Optional[date] = None
+
+
+@dataclass
+class SubsetSolution:
+    items: list                     # list[SubsetItem], seniausi terminai pirmi
+    total_cents: int
+    diff_cents: int                 # total - target (gali būti neigiamas)
+    exhaustive: bool                # paieška baigta per laiką → sprendinys optimalus
+    nodes: int = 0
+
+
+def to_cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def _subset_sums(values: list) -> list:
+    sums = [0]
+    for v in values:
+        sums += [s + v for s in sums]
+    return sums
+
+
+def min_abs_diff(values: list, target: int) -> int:
+    """meet-in-the-middle: min |sum(subset) - target| per visus (ne tuščius) poaibius."""
+    half = len(values) // 2
+    left = _subset_sums(values[:half])
+    right = sorted(_subset_sums(values[half:]))
+    best = None
+    for a in left:
+        need = target - a
+        i = bisect_left(right, need)
+        for j in (i - 1, i):
+            if 0 <= j < len(right):
+                if a == 0 and right[j] == 0:
+                    continue          # tuščias poaibis
+                d = abs(a + right[j] - target)
+                if best is None or d < best:
+                    best = d
+                    if d == 0:
+                        return 0
+    return best if best is not None else target
+
+
+def _rank(chosen: list, diff: int) -> tuple:
+    n = len(chosen)
+    avg_score = sum((it.score for it in chosen), Decimal("0")) / n
+    avg_due = sum(_due_ord(it.due) for it in chosen) / n
+    return (abs(diff), -avg_score, avg_due, n)
+
+
+def solve_subset_sum(
+    items: list,
+    target_cents: int,
+    tolerance_cents: int = 5,
+    min_items: int = 2,
+    max_items: Optional[int] = MULTI_SOLVER_MAX_ITEMS,
+    time_budget: float = MULTI_SOLVER_TIME_BUDGET,
+    mitm_max_items: int = MITM_MAX_ITEMS,
+) -> Optional[SubsetSolution]:
+    """
+    Grąžina geriausią poaibį, kurio suma target_cents ±tolerance_cents,
+    arba None (sprendinio nėra arba nerastas per time_budget).
+    """
+    if target_cents <= 0:
+        return None
+
+    hi = target_cents + tolerance_cents
+    pool = [it for it in items if 0 < it.cents <= hi]
+    if len(pool) < min_items:
+        return None
+    if sum(it.cents for it in pool) < target_cents - tolerance_cents:
+        return None
+
+    # ── 1. MITM: ar sprendinys apskritai egzistuoja ────────
+    # min_abs_diff skaičiuoja per visus poaibius (ir < min_items), todėl tinka
+    # tik neegzistavimo įrodymui, ne pradiniam langui
+    if len(pool) <= mitm_max_items:
+        best_possible = min_abs_diff([it.cents for it in pool], target_cents)
+        if best_possible > tolerance_cents:
+            return None
+    window = tolerance_cents
+
+    # ── 2. Branch & bound ───────────────────────────────────
+    # Didžiausi likučiai pirmi: greičiau randamas pirmas sprendinys ir
+    # stipresnės suffix ribos (balas / due data lemia tik _rank)
+    pool.sort(key=lambda it: -it.cents)
+    pool = pool[:MAX_POOL]
+    n = len(pool)
+    suffix = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + pool[i].cents
+
+    limit = max_items or n
+    deadline = time.monotonic() + time_budget
+    state = {"best": None, "rank": None, "window": window, "nodes": 0, "timeout": False}
+    chosen = []
+
+    def dfs(i: int, total: int):
+        state["nodes"] += 1
+        if state["nodes"] & 1023 == 0 and time.monotonic() > deadline:
+            state["timeout"] = True
+        if state["timeout"]:
+            return
+
+        w = state["window"]
+        diff = total - target_cents
+        if abs(diff) <= w and len(chosen) >= min_items:
+            rank = _rank(chosen, diff)
+            if state["rank"] is None or rank < state["rank"]:
+                state["best"] = (list(chosen), total, diff)
+                state["rank"] = rank
+                state["window"] = abs(diff)
+                w = abs(diff)
+
+        if i >= n or len(chosen) >= limit:
+            return
+        # Net paėmus viską, kas liko, nepasieksim apatinės ribos
+        if total + suffix[i] < target_cents - w:
+            return
+
+        it = pool[i]
+        if total + it.cents <= target_cents + w:
+            chosen.append(it)
+            dfs(i + 1, total + it.cents)
+            chosen.pop()
+        dfs(i + 1, total)
+
+    dfs(0, 0)
+
+    if state["best"] is None:
+        return None
+    best_items, total, diff = state["best"]
+    best_items.sort(key=lambda it: (_due_ord(it.due), -it.score))
+    return SubsetSolution(
+        items=best_items,
+        total_cents=total,
+        diff_cents=diff,
+        exhaustive=not state["timeout"],
+        nodes=state["nodes"],
+    )
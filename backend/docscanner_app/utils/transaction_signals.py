@@ -28,12 +28,17 @@ invoicing/utils/transaction_signals.py
   Format D: комиссии, зарплаты, налоги
 """
 
+import hashlib
 import logging
 import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from dataclasses import dataclass, field
 from decimal import Decimal, InvalidOperation
 from typing import Optional
 
+from .subset_sum import SubsetItem, solve_subset_sum, to_cents
+
 logger = logging.getLogger("docscanner_app")
 
 
@@ -159,12 +164,7 @@ def extract_signals(txn) -> TransactionSignals:
     op_code = getattr(txn, "bank_operation_code", "") or ""
     doc_num = getattr(txn, "doc_number", "") or ""
 
-    # Pass-through
-    signals.counterparty_code = (txn.counterparty_code or "").strip()
-    signals.counterparty_iban = (txn.counterparty_account or "").strip().upper()
-    signals.counterparty_name = cp_name.strip()
-    signals.bank_amount = txn.amount
-    signals.bank_currency = txn.currency or ""
+    _set_passthrough(txn, signals)
 
     # ── Step 1: Classify transaction type ───────────────────
     signals.txn_type = _classify_type(txn, purpose, cp_name, op_code, signals.counterparty_iban)
@@ -198,6 +198,15 @@ def extract_signals(txn) -> TransactionSignals:
     return signals
 
 
+def _set_passthrough(txn, signals: TransactionSignals):
+    """Laukai, kurie imami tiesiai iš operacijos (neišsaugomi TransactionSignalsRecord)."""
+    signals.counterparty_code = (txn.counterparty_code or "").strip()
+    signals.counterparty_iban = (txn.counterparty_account or "").strip().upper()
+    signals.counterparty_name = (txn.counterparty_name or "").strip()
+    signals.bank_amount = txn.amount
+    signals.bank_currency = txn.currency or ""
+
+
 # ════════════════════════════════════════════════════════════
 # Step 1: Transaction type classification
 # ════════════════════════════════════════════════════════════
@@ -828,6 +837,124 @@ def _score_date(txn_date, inv_date, due_date) -> tuple[Decimal, str]:
     return Decimal("-0.20"), f"Mokėjimas per toli ({days} d.)"
 
 
+# ════════════════════════════════════════════════════════════
+# Candidate blocking (pre-filter prieš score_with_signals)
+# ════════════════════════════════════════════════════════════
+
+# Didžiausias score_with_signals balas kandidatui, kuris NEpatenka į shortlist:
+#   be reference / kodo / IBAN sutapimo, suma ne intervale arba data už lango:
+#   suma 0.30 + pavadinimas 0.20 - data 0.20 = 0.30,
+#   dalinė įmoka 0.05 + pavadinimas 0.20 + data 0.05 = 0.30,
+#   be sumos: pavadinimas 0.20 + data 0.05 = 0.25.
+# Todėl kiekvienas kandidatas su balu > BLOCKING_MAX_MISSED_SCORE visada shortlist'e.
+BLOCKING_MAX_MISSED_SCORE = Decimal("0.30")
+
+REF_GRAM = 6
+
+
+class CandidateBlockingIndex:
+    """
+    Indeksas virš kandidatų (score_with_signals candidate dict'ų sąrašo).
+    shortlist() grąžina tik tuos kandidatus, kurie gali surinkti
+    > BLOCKING_MAX_MISSED_SCORE:
+      - reference: tikslus numeris / numeris be prefikso / REF_GRAM ilgio
+        fragmentas (dalinis sutapimas),
+      - tiekėjo kodas, tiekėjo IBAN,
+      - suma (likutis ar bendra suma ±1% / ±0.05; cross-currency — settled ±15%)
+        ir data lange (mokėjimas ne anksčiau nei 3 d. prieš dokumentą ir
+        ne vėliau nei 180 d. po termino).
+    Grąžinami kandidatai išlaiko pradinę tvarką, todėl rūšiavimas pagal balą
+    (ir lygių balų tvarka) nepasikeičia.
+    """
+
+    def __init__(self, candidates: list):
+        self.candidates = list(candidates)
+        self._ref_exact = defaultdict(list)
+        self._ref_gram = defaultdict(list)
+        self._code = defaultdict(list)
+        self._iban = defaultdict(list)
+
+        by_remaining = []
+        by_amount = []
+
+        for pos, c in enumerate(self.candidates):
+            number_clean = re.sub(r"[\s\-/]", "", (c.get("number") or "").upper())
+            full_clean = re.sub(r"[\s\-/]", "", (c.get("full_number") or "").upper())
+            digits = re.sub(r"^[A-Z]{1,2}", "", number_clean)
+
+            keys = {number_clean, full_clean}
+            if len(digits) >= 6:
+                keys.add(digits)
+            for key in keys:
+                self._ref_exact[key].append(pos)
+
+            grams = set()
+            for text in (number_clean, full_clean):
+                for i in range(len(text) - REF_GRAM + 1):
+                    grams.add(text[i:i + REF_GRAM])
+            for g in grams:
+                self._ref_gram[g].append(pos)
+
+            if c.get("seller_code"):
+                self._code[c["seller_code"]].append(pos)
+            if c.get("seller_iban"):
+                self._iban[c["seller_iban"]].append(pos)
+
+            by_remaining.append((c.get("remaining", Decimal("0")), pos))
+            by_amount.append((c.get("amount", Decimal("0")), pos))
+
+        by_remaining.sort()
+        by_amount.sort()
+        self._remaining_keys = [a for a, _ in by_remaining]
+        self._remaining_pos = [p for _, p in by_remaining]
+        self._amount_keys = [a for a, _ in by_amount]
+        self._amount_pos = [p for _, p in by_amount]
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def _range(self, keys, positions, lo, hi):
+        return positions[bisect_left(keys, lo):bisect_right(keys, hi)]
+
+    def shortlist(self, signals: TransactionSignals, txn_date=None) -> list:
+        picked = set()
+
+        # ── Reference ───────────────────────────────────────
+        for ref in signals.references:
+            norm = ref.value_normalized
+            picked.update(self._ref_exact.get(norm, ()))
+            if len(norm) >= REF_GRAM:
+                picked.update(self._ref_gram.get(norm[:REF_GRAM], ()))
+
+        # ── Kodas / IBAN ────────────────────────────────────
+        if signals.counterparty_code:
+            picked.update(self._code.get(signals.counterparty_code, ()))
+        if signals.counterparty_iban:
+            picked.update(self._iban.get(signals.counterparty_iban, ()))
+
+        # ── Suma + datos langas ─────────────────────────────
+        by_amount = set()
+        match_amount = signals.original_amount or signals.bank_amount
+        if match_amount:
+            lo = min(match_amount - Decimal("0.05"), match_amount / Decimal("1.01"))
+            hi = max(match_amount + Decimal("0.05"), match_amount / Decimal("0.99"))
+            by_amount.update(self._range(self._remaining_keys, self._remaining_pos, lo, hi))
+            by_amount.update(self._range(self._amount_keys, self._amount_pos, lo, hi))
+
+        if signals.is_cross_currency and signals.settled_amount:
+            lo = signals.settled_amount / Decimal("1.15")
+            hi = signals.settled_amount / Decimal("0.85")
+            by_amount.update(self._range(self._remaining_keys, self._remaining_pos, lo, hi))
+
+        for pos in by_amount - picked:
+            c = self.candidates[pos]
+            date_score, _ = _score_date(txn_date, c.get("invoice_date"), c.get("due_date"))
+            if date_score > Decimal("-0.20"):
+                picked.add(pos)
+
+        return [self.candidates[pos] for pos in sorted(picked)]
+
+
 # ════════════════════════════════════════════════════════════
 # Multi-invoice matching (1 payment → N invoices)
 # ════════════════════════════════════════════════════════════
@@ -837,12 +964,15 @@ def try_multi_invoice_match(
     scored_candidates: list,
     likely_threshold: Decimal = Decimal("0.40"),
     amount_tolerance: Decimal = Decimal("0.05"),
+    solver: str = "greedy",
 ) -> Optional[dict]:
     """
     Пробует сматчить один платёж с несколькими счетами
     от одного контрагента.
 
     scored_candidates: list of (candidate_dict, score, reasons)
+    solver: "greedy" (FIFO) или "subset_sum" — точный подбор подмножества
+            (utils/subset_sum.py), при неудаче — FIFO.
     Returns: dict с результатом или None.
     """
     match_amount = signals.original_amount or signals.bank_amount
@@ -873,16 +1003,22 @@ def try_multi_invoice_match(
         # Сортируем по дате (FIFO — старые первые)
         group.sort(key=lambda x: x[0].get("invoice_date") or "9999-99-99")
 
-        selected = []
-        running = Decimal("0")
-
-        for c, s, r in group:
-            if running >= match_amount:
-                break
-            remaining = c.get("remaining", Decimal("0"))
-            take = min(remaining, match_amount - running)
-            selected.append((c, s, r, take))
-            running += take
+        selected = None
+        if solver == "subset_sum":
+            selected = _subset_sum_group(group, match_amount, amount_tolerance)
+
+        if selected is None:
+            selected = []
+            running = Decimal("0")
+            for c, s, r in group:
+                if running >= match_amount:
+                    break
+                remaining = c.get("remaining", Decimal("0"))
+                take = min(remaining, match_amount - running)
+                selected.append((c, s, r, take))
+                running += take
+        else:
+            running = sum((t for _, _, _, t in selected), Decimal("0"))
 
         if len(selected) < 2:
             continue
@@ -912,30 +1048,196 @@ def try_multi_invoice_match(
     return best_result
 
 
+def _subset_sum_group(group: list, match_amount: Decimal, amount_tolerance: Decimal) -> Optional[list]:
+    """Точный подбор счетов группы: [(c, s, r, take), ...] или None."""
+    items = [
+        SubsetItem(
+            key=(c, s, r),
+            cents=to_cents(c.get("remaining") or 0),
+            score=s,
+            due=c.get("due_date") or c.get("invoice_date"),
+        )
+        for c, s, r in group
+    ]
+    sol = solve_subset_sum(items, to_cents(match_amount), tolerance_cents=to_cents(amount_tolerance))
+    if sol is None:
+        return None
+
+    selected = []
+    running = Decimal("0")
+    for it in sol.items:
+        c, s, r = it.key
+        take = min(c.get("remaining", Decimal("0")), match_amount - running)
+        if take <= 0:
+            break
+        selected.append((c, s, r, take))
+        running += take
+    return selected if len(selected) >= 2 else None
+
+
 # ════════════════════════════════════════════════════════════
-# Integration helper: use signals in existing engine
+# Persisted signals (TransactionSignalsRecord)
 # ════════════════════════════════════════════════════════════
 
-def should_skip_transaction(txn) -> tuple[bool, str]:
-    """
-    Быстрая проверка — нужно ли пропустить транзакцию.
-    Используется ДО build_cache для раннего выхода.
+# Padidinti pakeitus _classify_type / šablonus / MERCHANT_ALIASES —
+# seni įrašai bus perskaičiuoti pirmo matching'o metu.
+SIGNALS_VERSION = 1
+
+_RECORD_FIELDS = (
+    "txn_type", "skip_matching", "skip_reason",
+    "merchant_name_raw", "merchant_name_clean",
+    "merchant_keywords", "merchant_alias_matches", "references",
+    "original_amount", "original_currency",
+    "settled_amount", "settled_currency",
+    "conversion_fee", "is_cross_currency",
+)
+
+
+def signals_source_hash(txn) -> str:
+    """md5 iš laukų, nuo kurių priklauso extract_signals() rezultatas."""
+    raw = "|".join([
+        txn.payment_purpose or "",
+        txn.counterparty_name or "",
+        getattr(txn, "bank_operation_code", "") or "",
+        getattr(txn, "doc_number", "") or "",
+        txn.counterparty_code or "",
+        txn.counterparty_account or "",
+        str(txn.amount),
+        txn.currency or "",
+    ])
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def _txn_link(txn) -> str:
+    from ..models import OutgoingTransaction
+    return "outgoing_transaction" if isinstance(txn, OutgoingTransaction) else "incoming_transaction"
+
+
+def _record_values(signals: TransactionSignals) -> dict:
+    return {
+        "txn_type": signals.txn_type,
+        "skip_matching": signals.skip_matching,
+        "skip_reason": signals.skip_reason,
+        "merchant_name_raw": (signals.merchant_name_raw or "")[:255],
+        "merchant_name_clean": (signals.merchant_name_clean or "")[:255],
+        "merchant_keywords": list(signals.merchant_keywords),
+        "merchant_alias_matches": list(signals.merchant_alias_matches),
+        "references": [
+            {
+                "value": r.value,
+                "value_normalized": r.value_normalized,
+                "source": r.source,
+                "confidence": r.confidence,
+            }
+            for r in signals.references
+        ],
+        "original_amount": signals.original_amount,
+        "original_currency": signals.original_currency,
+        "settled_amount": signals.settled_amount,
+        "settled_currency": signals.settled_currency,
+        "conversion_fee": signals.conversion_fee,
+        "is_cross_currency": signals.is_cross_currency,
+    }
 
-    Returns: (should_skip, category)
+
+def _signals_from_record(record, txn) -> TransactionSignals:
+    signals = TransactionSignals(
+        txn_type=record.txn_type,
+        skip_matching=record.skip_matching,
+        skip_reason=record.skip_reason,
+        merchant_name_raw=record.merchant_name_raw,
+        merchant_name_clean=record.merchant_name_clean,
+        merchant_keywords=list(record.merchant_keywords or []),
+        merchant_alias_matches=list(record.merchant_alias_matches or []),
+        references=[ExtractedReference(**r) for r in (record.references or [])],
+        original_amount=record.original_amount,
+        original_currency=record.original_currency,
+        settled_amount=record.settled_amount,
+        settled_currency=record.settled_currency,
+        conversion_fee=record.conversion_fee,
+        is_cross_currency=record.is_cross_currency,
+    )
+    _set_passthrough(txn, signals)
+    return signals
+
+
+def store_signals(transactions) -> dict:
+    """
+    Ištraukia signalus ir išsaugo (upsert) TransactionSignalsRecord.
+    Kviečiama importo metu. Grąžina {txn: TransactionSignals}.
+    Nepavykus įrašyti — tik warning (matching'as tada ištrauks pats).
     """
-    signals = extract_signals(txn)
-    if signals.skip_matching:
-        return True, signals.txn_type
-    return False, ""
+    from django.db import transaction as db_transaction
+    from ..models import TransactionSignalsRecord
+
+    out = {}
+    by_link = defaultdict(list)
+
+    for txn in transactions:
+        if txn.pk is None:
+            continue
+        signals = extract_signals(txn)
+        out[txn] = signals
+        link = _txn_link(txn)
+        by_link[link].append(TransactionSignalsRecord(
+            user_id=txn.user_id,
+            version=SIGNALS_VERSION,
+            source_hash=signals_source_hash(txn),
+            **{link: txn},
+            **_record_values(signals),
+        ))
+
+    for link, records in by_link.items():
+        try:
+            # savepoint: kviečiama ir importo atomic bloke
+            with db_transaction.atomic():
+                TransactionSignalsRecord.objects.bulk_create(
+                    records,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=[link],
+                    update_fields=["version", "source_hash", *_RECORD_FIELDS, "updated_at"],
+                )
+        except Exception as e:
+            logger.warning("[Signals] store failed for %d %s rows: %s", len(records), link, e)
+
+    return out
 
 
-def get_match_amount_and_currency(txn) -> tuple[Decimal, str]:
+def load_signals(transactions) -> dict:
     """
-    Возвращает правильную сумму и валюту для матчинга.
-    Для cross-currency транзакций — оригинальная сумма/валюта.
+    {txn: TransactionSignals} operacijų sąrašui: iš TransactionSignalsRecord
+    (viena užklausa kiekvienai krypčiai), o trūkstami / pasenę (kita versija ar
+    pasikeitę operacijos laukai) — ištraukiami iš naujo ir išsaugomi.
     """
-    signals = extract_signals(txn)
-    return (
-        signals.original_amount or txn.amount,
-        signals.original_currency or txn.currency or "",
-    )
\ No newline at end of file
+    from ..models import TransactionSignalsRecord
+
+    by_link = defaultdict(list)
+    for txn in transactions:
+        if txn.pk is not None:
+            by_link[_txn_link(txn)].append(txn)
+
+    out = {}
+    stale = []
+    for link, txns in by_link.items():
+        records = {
+            getattr(r, f"{link}_id"): r
+            for r in TransactionSignalsRecord.objects.filter(
+                **{f"{link}_id__in": [t.pk for t in txns]}
+            )
+        }
+        for txn in txns:
+            record = records.get(txn.pk)
+            if (
+                record is not None
+                and record.version == SIGNALS_VERSION
+                and record.source_hash == signals_source_hash(txn)
+            ):
+                out[txn] = _signals_from_record(record, txn)
+            else:
+                stale.append(txn)
+
+    if stale:
+        logger.info("[Signals] %d transactions without stored signals — extracting", len(stale))
+        out.update(store_signals(stale))
+    return out
@@ -3,6 +3,8 @@ import xml.etree.ElementTree as ET
 from datetime import date as dt_date
 from decimal import Decimal, InvalidOperation
 from docscanner_app.models import CurrencyRate
+from docscanner_app.utils.rate_limiter import require as require_rate_limit
+from docscanner_app.utils.shared_cache import invalidate_namespace
 
 LB_BASE = "https://www.lb.lt/webservices/FxRates/FxRates.asmx"
 HEADERS = {
@@ -34,6 +36,7 @@ def update_currency_rates(target_date: dt_date | None = None, tp: str = "EU", ti
 
     url = f"{LB_BASE}/getFxRates"
     params = {"tp": tp, "dt": target_date.strftime("%Y-%m-%d")}
+    require_rate_limit("lb_fx")
     resp = requests.get(url, params=params, headers=HEADERS, timeout=timeout)
     resp.raise_for_status()
     resp.encoding = "utf-8"
@@ -93,6 +96,9 @@ def update_currency_rates(target_date: dt_date | None = None, tp: str = "EU", ti
             CurrencyRate.objects.create(currency=code, date=target_date, rate=rate)
             inserted += 1
 
+    if inserted or updated:
+        invalidate_namespace("fx")
+
     return {"date": target_date, "inserted": inserted, "updated": updated, "skipped": skipped}
 
 
@@ -0,0 +1,136 @@
+"""
+utils/xlsx_stream.py
+====================
+Srautinis XLSX rašymas dideliems eksportams (openpyxl write_only režimas).
+
+Įprastas Workbook laiko visą lapą atmintyje (kiekviena celė — objektas su
+savo Border / Font), todėl 50k eilučių eksportas užima šimtus MB. Čia:
+  - Workbook(write_only=True): eilutės iškart serializuojamos į lapo XML,
+  - stiliai registruojami vieną kartą kaip NamedStyle, celėms priskiriamas
+    tik stiliaus vardas (XLSX faile — vienas xf įrašas visoms celėms),
+  - date / datetime reikšmės CELL stulpelyje gauna DATE / DATETIME stilių
+    (priskyrus StyleArray, openpyxl automatinis datos formatas dingsta),
+  - failas rašomas į laikiną failą ir grąžinamas per FileResponse.
+
+Naudojimas:
+    writer = StreamingXlsxWriter()
+    sheet = writer.add_sheet("Operacijos", [("Data", 16), ("Suma", 16)])
+    sheet.append([d, 12.5], styles=(CELL, MONEY))
+    return writer.file_response("eksportas.xlsx")
+
+Palyginimas su senu būdu: python manage.py benchmark_xlsx_export --rows 50000
+"""
+
+import os
+import tempfile
+from copy import copy
+from datetime import date, datetime
+
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Stilių vardai
+HEADER = "xs_header"
+CELL = "xs_cell"
+MONEY = "xs_money"
+DATE = "xs_date"
+DATETIME = "xs_datetime"
+
+
+def _named_styles():
+    """Nauji NamedStyle kiekvienam workbook'ui (NamedStyle prisiriša prie workbook'o)."""
+    thin = Side(style="thin")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return [
+        NamedStyle(
+            name=HEADER,
+            font=Font(bold=True, size=11),
+            fill=PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid"),
+            border=border,
+            alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+        ),
+        NamedStyle(name=CELL, border=border),
+        NamedStyle(name=MONEY, border=border, number_format="#,##0.00"),
+        # Formatai — kaip openpyxl priskiria date / datetime celėms pats
+        NamedStyle(name=DATE, border=border, number_format="yyyy-mm-dd"),
+        NamedStyle(name=DATETIME, border=border, number_format="yyyy-mm-dd h:mm:ss"),
+    ]
+
+
+def _cell_style(style, value):
+    """CELL stilius datoms pakeičiamas DATE / DATETIME (kitaip — serijinis skaičius)."""
+    if style == CELL:
+        if isinstance(value, datetime):
+            return DATETIME
+        if isinstance(value, date):
+            return DATE
+    return style
+
+
+class StreamingSheet:
+    """Vienas write-only lapas. Eilutės rašomos tik iš eilės (append)."""
+
+    def __init__(self, ws, columns, freeze_header=True):
+        self.ws = ws
+        self.rows = 0
+        self._style_arrays = {}
+        for idx, (_, width) in enumerate(columns, start=1):
+            if width:
+                ws.column_dimensions[get_column_letter(idx)].width = width
+        if freeze_header:
+            ws.freeze_panes = "A2"
+        self.append([label for label, _ in columns], styles=HEADER)
+
+    def append(self, values, styles=CELL):
+        """styles — vienas stiliaus vardas visai eilutei arba seka pagal stulpelius."""
+        if isinstance(styles, str):
+            styles = (styles,) * len(values)
+        row = []
+        for value, style in zip(values, styles):
+            cell = WriteOnlyCell(self.ws, value=value)
+            style = _cell_style(style, value)
+            if style:
+                cell._style = copy(self._style_array(style))
+            row.append(cell)
+        self.ws.append(row)
+        self.rows += 1
+
+    def _style_array(self, name):
+        """NamedStyle → StyleArray vieną kartą (cell.style = name kiekvienai celei — lėtas)."""
+        array = self._style_arrays.get(name)
+        if array is None:
+            template = WriteOnlyCell(self.ws)
+            template.style = name
+            array = self._style_arrays[name] = template._style
+        return array
+
+
+class StreamingXlsxWriter:
+    def __init__(self):
+        self.wb = Workbook(write_only=True)
+        for style in _named_styles():
+            self.wb.add_named_style(style)
+
+    def add_sheet(self, title, columns, freeze_header=True) -> StreamingSheet:
+        """columns — [(antraštė, plotis | None), ...]. Pločiai nustatomi prieš eilutes."""
+        return StreamingSheet(self.wb.create_sheet(title), columns, freeze_header=freeze_header)
+
+    def save(self, path):
+        """Write-only workbook'ą galima išsaugoti tik vieną kartą."""
+        self.wb.save(path)
+
+    def file_response(self, filename) -> FileResponse:
+        """Išsaugo į laikiną failą ir grąžina jį srautu (failas ištrinamas iškart, handle lieka)."""
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            self.save(path)
+            fh = open(path, "rb")
+        finally:
+            os.unlink(path)
+        return FileResponse(fh, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
@@ -5,6 +5,8 @@ import textwrap
 import requests
 import xml.etree.ElementTree as ET
 
+from ..utils.rate_limiter import acquire as acquire_rate_limit
+
 
 logger = logging.getLogger("docscanner_app")
 
@@ -62,6 +64,12 @@ def check_vat(country_code: str, vat_number: str) -> dict:
 
     body = build_soap_request(country_code, vat_number)
 
+    if not acquire_rate_limit("vies", max_wait=10):
+        return {
+            "success": False,
+            "error": "VIES rate limit reached, try again later",
+        }
+
     try:
         resp = requests.post(VIES_SOAP_URL, data=body, headers=headers, timeout=10)
     except requests.RequestException as e:
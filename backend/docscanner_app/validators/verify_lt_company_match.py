@@ -1,4 +1,5 @@
 from docscanner_app.models import Company
+from docscanner_app.utils.shared_cache import memoize
 from .company_name_normalizer import normalize_company_name
 import re, time, logging
 from difflib import SequenceMatcher
@@ -57,6 +58,16 @@ def _seq_ratio(a: str, b: str) -> float:
 
 # ───────────────────────── core ─────────────────────────
 
+@memoize("registry")
+def _company_by_im_kodas(code):
+    return Company.objects.filter(im_kodas__iexact=code).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+
+
+@memoize("registry")
+def _company_by_pvm_kodas(code):
+    return Company.objects.filter(pvm_kodas__iexact=code).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+
+
 def update_seller_buyer_info_from_companies(scanned_doc):
     """
     Быстрый и «неубиваемый» матчинг покупателя/продавца с Company.
@@ -88,7 +99,7 @@ def update_seller_buyer_info_from_companies(scanned_doc):
             # 1) im_kodas — самый надёжный идентификатор
             comp = None
             if company_id:
-                c = Company.objects.filter(im_kodas__iexact=company_id.strip()).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+                c = _company_by_im_kodas(company_id.strip())
                 if c:
                     comp = c
                     logger.info(f"[COMP] {sideU} matched by im_kodas")
@@ -98,7 +109,7 @@ def update_seller_buyer_info_from_companies(scanned_doc):
                 for v in _vat_variants(vat_code, country_iso):
                     if time_left() <= 0:
                         break
-                    c = Company.objects.filter(pvm_kodas__iexact=v).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+                    c = _company_by_pvm_kodas(v)
                     if c:
                         comp = c
                         logger.info(f"[COMP] {sideU} matched by VAT={v}")
@@ -137,7 +148,7 @@ def update_seller_buyer_info_from_companies(scanned_doc):
                 # Попробовать company_id как VAT код
                 if company_id:
                     for v in _vat_variants(company_id, country_iso):
-                        c = Company.objects.filter(pvm_kodas__iexact=v).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+                        c = _company_by_pvm_kodas(v)
                         if c:
                             comp = c
                             logger.info(f"[COMP] {sideU} matched by pvm_kodas (from _id field): {v}")
@@ -150,7 +161,7 @@ def update_seller_buyer_info_from_companies(scanned_doc):
                     if clean.startswith("LT"):
                         clean = clean[2:]
                     if clean:
-                        c = Company.objects.filter(im_kodas__iexact=clean).only("id","pavadinimas","im_kodas","pvm_kodas").first()
+                        c = _company_by_im_kodas(clean)
                         if c:
                             comp = c
                             logger.info(f"[COMP] {sideU} matched by im_kodas (from _vat_code field): {clean}")
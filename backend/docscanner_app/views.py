@@ -4,10 +4,8 @@ import io
 import logging
 import logging.config
 import os
-import uuid
 import re
 import tempfile
-import zipfile, tarfile
 import json
 from datetime import date, datetime, timedelta, time as dt_time
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
@@ -53,7 +51,6 @@ from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidd
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.dateparse import parse_date
-from django.core.files.base import File
 
 
 
@@ -70,7 +67,6 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.tokens import AccessToken
 
 # --- Local (project) imports ---
-from .data_import.data_import_from_buh import import_products_from_xlsx, import_clients_from_xlsx
 from .exports.apskaita5 import export_documents_group_to_apskaita5_files
 from .exports.centas import export_documents_group_to_centras_xml, generate_prekes_paslaugos_csv, generate_pradiniai_likuciai_csv
 from .exports.finvalda import (
@@ -131,7 +127,6 @@ from .models import (
     Invoice,
     InvoiceEmail,
     InvoiceSettings,
-    CreditUsageLog,
     InvSubscription,
     RivileGamaAPIKey,
     PaymentAllocation,
@@ -254,333 +249,16 @@ import json
 # from .permissions import IsSuperUser
 # from .views import summarize_doc_issues  # если в том же файле — не нужно
 
-def _today_dates():
-    today = timezone.localdate()
-    yesterday = today - timedelta(days=1)
-    return today, yesterday
-
-def _qs_by_date(model, date_field: str, target_date, exclude_archives=True):
-    start = timezone.make_aware(datetime.combine(target_date, dt_time.min))
-    end = timezone.make_aware(datetime.combine(target_date, dt_time.max))
-    qs = model.objects.filter(**{f"{date_field}__range": (start, end)})
-    if exclude_archives:
-        qs = qs.filter(is_archive_container=False)
-    return qs
-
-def _qs_last_n_days(model, date_field: str, days: int, exclude_archives=True):
-    since = timezone.now() - timedelta(days=days)
-    qs = model.objects.filter(**{f"{date_field}__gte": since})
-    if exclude_archives:
-        qs = qs.filter(is_archive_container=False)
-    return qs
-
-def _qs_all_docs(exclude_archives=True):
-    qs = ScannedDocument.objects.all()
-    if exclude_archives:
-        qs = qs.filter(is_archive_container=False)
-    return qs
-
-def _count_errors_in_qs(qs):
-    """Ошибка = math_validation_passed=False ИЛИ ready_for_export=False"""
-    return qs.filter(
-        Q(math_validation_passed=False) | Q(ready_for_export=False)
-    ).count()
-
-def _count_rejected_in_qs(qs):
-    """Количество rejected документов"""
-    return qs.filter(status="rejected").count()
-
-def _pct(part, whole):
-    return round((part / whole * 100.0), 2) if whole else 0.0
-
-def _rate(ok_count, total_count):
-    """% успешных (без ошибок) от общего количества."""
-    return _pct(ok_count, total_count)
-
-def _rejected_stats(rejected, total):
-    """Статистика rejected: count, total, percent"""
-    return {
-        "rejected": rejected,
-        "total": total,
-        "pct": _pct(rejected, total),
-    }
-
-def _payments_agg(qs):
-    r = qs.aggregate(
-        total_eur=Sum('amount_total'),
-        net_eur=Sum('net_amount'),
-        count=Count('id'),
-    )
-    return {
-        "total_eur": round((r['total_eur'] or 0) / 100, 2),
-        "net_eur":   round((r['net_eur'] or 0) / 100, 2),
-        "count":     r['count'] or 0,
-    }
-
-def _invoice_count_by_date(date_val):
-    """Считает выставленные счета за дату (status != draft)"""
-    start = timezone.make_aware(datetime.combine(date_val, dt_time.min))
-    end = timezone.make_aware(datetime.combine(date_val, dt_time.max))
-    return Invoice.objects.filter(
-        created_at__range=(start, end)
-    ).exclude(status="draft").count()
-
-def _invoice_count_last_n_days(n):
-    since = timezone.now() - timedelta(days=n)
-    return Invoice.objects.filter(created_at__gte=since).exclude(status="draft").count()
-
-def _invoice_count_total():
-    return Invoice.objects.exclude(status="draft").count()
-
-def _email_stats_by_date(date_val):
-    """Возвращает {'sent': X, 'failed': Y} за дату"""
-    start = timezone.make_aware(datetime.combine(date_val, dt_time.min))
-    end = timezone.make_aware(datetime.combine(date_val, dt_time.max))
-    qs = InvoiceEmail.objects.filter(sent_at__range=(start, end))
-    return {
-        "sent": qs.filter(status="sent").count(),
-        "failed": qs.filter(status__in=["failed", "bounced"]).count(),
-    }
-
-def _email_stats_last_n_days(n):
-    since = timezone.now() - timedelta(days=n)
-    qs = InvoiceEmail.objects.filter(sent_at__gte=since)
-    return {
-        "sent": qs.filter(status="sent").count(),
-        "failed": qs.filter(status__in=["failed", "bounced"]).count(),
-    }
-
-def _email_stats_total():
-    qs = InvoiceEmail.objects.all()
-    return {
-        "sent": qs.filter(status="sent").count(),
-        "failed": qs.filter(status__in=["failed", "bounced"]).count(),
-    }
-
-def _inv_subscription_stats():
-    """Статистика подписок Išrašymas"""
-    now = timezone.now()
-    
-    # Активные триалы (status=trial И trial_end ещё не прошёл)
-    trial_active = InvSubscription.objects.filter(
-        status="trial",
-        trial_end__gte=now
-    ).count()
-    
-    # Завершённые триалы (trial_used=True И (status != trial ИЛИ trial_end < now))
-    trial_expired = InvSubscription.objects.filter(
-        trial_used=True
-    ).exclude(
-        status="trial",
-        trial_end__gte=now
-    ).count()
-    
-    # Платные подписки
-    paid_monthly = InvSubscription.objects.filter(
-        status="active",
-        plan__icontains="monthly"
-    ).count()
-    
-    paid_yearly = InvSubscription.objects.filter(
-        status="active",
-        plan__icontains="yearly"
-    ).count()
-    
-    return {
-        "trial_active": trial_active,
-        "trial_expired": trial_expired,
-        "paid_monthly": paid_monthly,
-        "paid_yearly": paid_yearly,
-    }
-
 @api_view(["GET"])
 @permission_classes([IsSuperUser])
 def superuser_dashboard_stats(request):
-    doc_date_field = "uploaded_at"
-    user_date_field = "date_joined"
-
-    today, yesterday = _today_dates()
-
-    # Все QuerySet'ы исключают is_archive_container=True
-    qs_all       = _qs_all_docs()
-    qs_today     = _qs_by_date(ScannedDocument, doc_date_field, today)
-    qs_yesterday = _qs_by_date(ScannedDocument, doc_date_field, yesterday)
-    qs_7d        = _qs_last_n_days(ScannedDocument, doc_date_field, 7)
-    qs_30d       = _qs_last_n_days(ScannedDocument, doc_date_field, 30)
-
-    docs_today     = qs_today.count()
-    docs_yesterday = qs_yesterday.count()
-    docs_7d        = qs_7d.count()
-    docs_30d       = qs_30d.count()
-    total_docs     = qs_all.count()
-
-    # Ошибки (math_validation_passed=False OR ready_for_export=False)
-    err_today     = _count_errors_in_qs(qs_today)
-    err_yesterday = _count_errors_in_qs(qs_yesterday)
-    err_7d        = _count_errors_in_qs(qs_7d)
-    err_30d       = _count_errors_in_qs(qs_30d)
-    err_total     = _count_errors_in_qs(qs_all)
-
-    ok_today     = max(docs_today - err_today, 0)
-    ok_yesterday = max(docs_yesterday - err_yesterday, 0)
-    ok_7d        = max(docs_7d - err_7d, 0)
-    ok_30d       = max(docs_30d - err_30d, 0)
-    ok_total     = max(total_docs - err_total, 0)
-
-    # Rejected документы (status="rejected")
-    rej_today     = _count_rejected_in_qs(qs_today)
-    rej_yesterday = _count_rejected_in_qs(qs_yesterday)
-    rej_7d        = _count_rejected_in_qs(qs_7d)
-    rej_30d       = _count_rejected_in_qs(qs_30d)
-    rej_total     = _count_rejected_in_qs(qs_all)
-
-    # уникальные пользователи
-    start_today = timezone.make_aware(datetime.combine(today, dt_time.min))
-    end_today   = timezone.make_aware(datetime.combine(today, dt_time.max))
-    unique_users_excl_1_2_today = (
-        ScannedDocument.objects
-        .filter(is_archive_container=False)
-        .exclude(user_id__in=[1, 2])
-        .filter(**{f"{doc_date_field}__range": (start_today, end_today)})
-        .values("user_id").distinct().count()
-    )
-
-    # пользователи/регистрации
-    new_users_today     = CustomUser.objects.filter(**{f"{user_date_field}__date": today}).count()
-    new_users_yesterday = CustomUser.objects.filter(**{f"{user_date_field}__date": yesterday}).count()
-    new_users_7d        = _qs_last_n_days(CustomUser, user_date_field, 7, exclude_archives=False).count()
-    new_users_30d       = _qs_last_n_days(CustomUser, user_date_field, 30, exclude_archives=False).count()
-    total_users         = CustomUser.objects.count()
-
-    # разбивка по типам
-    st_sumiskai = qs_all.filter(scan_type="sumiskai").count()
-    st_detaliai = qs_all.filter(scan_type="detaliai").count()
-
-    # Payments статистика
-    pay_base = Payments.objects.filter(payment_status='paid')
-
-    start_today = timezone.make_aware(datetime.combine(today, dt_time.min))
-    end_today   = timezone.make_aware(datetime.combine(today, dt_time.max))
-    start_yest  = timezone.make_aware(datetime.combine(yesterday, dt_time.min))
-    end_yest    = timezone.make_aware(datetime.combine(yesterday, dt_time.max))
-
-    week_start  = today - timedelta(days=today.weekday())  # Понедельник текущей недели
-    month_start = today.replace(day=1)
-
-    pay_today      = _payments_agg(pay_base.filter(paid_at__range=(start_today, end_today)))
-    pay_yesterday  = _payments_agg(pay_base.filter(paid_at__range=(start_yest, end_yest)))
-    pay_this_week  = _payments_agg(pay_base.filter(paid_at__gte=timezone.make_aware(datetime.combine(week_start, dt_time.min))))
-    pay_this_month = _payments_agg(pay_base.filter(paid_at__gte=timezone.make_aware(datetime.combine(month_start, dt_time.min))))
-    pay_30d        = _payments_agg(pay_base.filter(paid_at__gte=timezone.now() - timedelta(days=30)))
-    pay_total      = _payments_agg(pay_base)
-
-    # ========== Išrašymas stats ==========
-    inv_today = _invoice_count_by_date(today)
-    inv_yesterday = _invoice_count_by_date(yesterday)
-    inv_7d = _invoice_count_last_n_days(7)
-    inv_30d = _invoice_count_last_n_days(30)
-    inv_total = _invoice_count_total()
-
-    inv_subs = _inv_subscription_stats()
-
-    email_today = _email_stats_by_date(today)
-    email_yesterday = _email_stats_by_date(yesterday)
-    email_7d = _email_stats_last_n_days(7)
-    email_30d = _email_stats_last_n_days(30)
-    email_total = _email_stats_total()
-
-    # ========== Važtaraščiai stats ==========
-    wb_qs_all = ScannedWaybill.objects.filter(
-        is_archive_container=False,
-        is_multi_doc_container=False,
-    ).exclude(user_id__in=[1, 2, 31, 105])
-    wb_qs_today = wb_qs_all.filter(uploaded_at__date=today)
-    wb_qs_yesterday = wb_qs_all.filter(uploaded_at__date=yesterday)
-    wb_qs_7d = wb_qs_all.filter(uploaded_at__gte=timezone.now() - timedelta(days=7))
-    wb_qs_30d = wb_qs_all.filter(uploaded_at__gte=timezone.now() - timedelta(days=30))
-
-    def _wb_stats(qs):
-        total = qs.count()
-        ok = qs.filter(status__in=("completed", "exported")).count()
-        rej = qs.filter(status="rejected").count()
-        return {"total": total, "ok": ok, "rejected": rej}
-
-    data = {
-        "documents": {
-            "today":       {"count": docs_today,     "errors": err_today},
-            "yesterday":   {"count": docs_yesterday, "errors": err_yesterday},
-            "last_7_days": {"count": docs_7d,        "errors": err_7d},
-            "last_30_days":{"count": docs_30d,       "errors": err_30d},
-            "total":       {"count": total_docs,     "errors": err_total},
-
-            "success_rate": {
-                "today":       _rate(ok_today,     docs_today),
-                "yesterday":   _rate(ok_yesterday, docs_yesterday),
-                "last_7_days": _rate(ok_7d,        docs_7d),
-                "last_30_days":_rate(ok_30d,       docs_30d),
-                "total":       _rate(ok_total,     total_docs),
-            },
-
-            # ✅ Новый блок — Rejected статистика
-            "rejected": {
-                "today":       _rejected_stats(rej_today,     docs_today),
-                "yesterday":   _rejected_stats(rej_yesterday, docs_yesterday),
-                "last_7_days": _rejected_stats(rej_7d,        docs_7d),
-                "last_30_days":_rejected_stats(rej_30d,       docs_30d),
-                "total":       _rejected_stats(rej_total,     total_docs),
-            },
+    """
+    Skaičiai iš DashboardRollup (valandų / dienų agregatai) + gyvai tik
+    nepadengta „uodega“ — žr. services/dashboard_rollups.py.
+    """
+    from .services.dashboard_rollups import dashboard_stats
 
-            "unique_users_excluding_1_2_today": unique_users_excl_1_2_today,
-            "scan_types": {
-                "sumiskai": {"count": st_sumiskai, "pct": _pct(st_sumiskai, total_docs)},
-                "detaliai": {"count": st_detaliai, "pct": _pct(st_detaliai, total_docs)},
-            },
-        },
-        "vaztarasciai": {
-            "today": _wb_stats(wb_qs_today),
-            "yesterday": _wb_stats(wb_qs_yesterday),
-            "last_7_days": _wb_stats(wb_qs_7d),
-            "last_30_days": _wb_stats(wb_qs_30d),
-            "total": _wb_stats(wb_qs_all),
-        },
-        "users": {
-            "new_today":        new_users_today,
-            "new_yesterday":    new_users_yesterday,
-            "new_last_7_days":  new_users_7d,
-            "new_last_30_days": new_users_30d,
-            "total":            total_users,
-        },
-        "payments": {
-            "today":       pay_today,
-            "yesterday":   pay_yesterday,
-            "this_week":   pay_this_week,
-            "this_month":  pay_this_month,
-            "last_30_days":pay_30d,
-            "total":       pay_total,
-        },
-        "israsymas": {
-            "invoices": {
-                "today": inv_today,
-                "yesterday": inv_yesterday,
-                "last_7_days": inv_7d,
-                "last_30_days": inv_30d,
-                "total": inv_total,
-            },
-            "subscriptions": inv_subs,
-            "emails": {
-                "today": email_today,
-                "yesterday": email_yesterday,
-                "last_7_days": email_7d,
-                "last_30_days": email_30d,
-                "total": email_total,
-            },
-        },
-        "meta": {
-            "timezone": str(timezone.get_current_timezone()),
-            "generated_at": timezone.now().isoformat(),
-        },
-    }
-    return Response(data)
+    return Response(dashboard_stats())
 
 
 
@@ -2531,21 +2209,48 @@ def bulk_delete_documents(request):
     if not ids:
         return Response({'error': 'No IDs provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-    queryset = ScannedDocument.objects.filter(id__in=ids, user=request.user)
+    from .services.document_purge import mark_documents_for_purge
+    from .tasks import purge_documents_task
 
-    # --- audit log: помечаем удаление в CreditUsageLog ---
-    doc_ids = list(queryset.values_list('id', flat=True))
-    if doc_ids:
-        CreditUsageLog.objects.filter(
-            scanned_document_id__in=doc_ids,
-            document_deleted_by_user=False,
-        ).update(
-            document_deleted_by_user=True,
-            document_deleted_at=timezone.now(),
-        )
+    # Soft-mark iškart, tikras trynimas (DB batch'ai + failai) — fone
+    job, marked, protected = mark_documents_for_purge(request.user, ids)
+    if job is None:
+        return Response({'deleted': 0, 'protected': protected}, status=status.HTTP_200_OK)
+
+    task = purge_documents_task.delay(job.pk)
+    job.task_id = task.id or ""
+    job.save(update_fields=["task_id"])
 
-    deleted, _ = queryset.delete()
-    return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+    # protected — perkelti į apskaitą (Purchase / Invoice), netrinami
+    return Response(
+        {'deleted': marked, 'protected': protected, 'purge_job_id': job.pk},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def document_purge_status(request, job_id):
+    from .models import DocumentPurgeJob
+
+    job = DocumentPurgeJob.objects.filter(pk=job_id, user=request.user).first()
+    if not job:
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        "id": job.pk,
+        "stage": job.stage,
+        "total_documents": job.total_documents,
+        "processed_documents": job.processed_documents,
+        "deleted_documents": job.deleted_documents,
+        "skipped_documents": job.skipped_documents,
+        "failed_documents": job.failed_documents,
+        "deleted_files": job.deleted_files,
+        "error": job.error_message or None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    })
 
 
 
@@ -2634,6 +2339,12 @@ def get_user_documents(request):
         if status_param:
             qs = qs.filter(status=status_param)
 
+        issues_param = q.get("issues")
+        if issues_param in ("1", "true"):
+            qs = qs.filter(has_issues=True)
+        elif issues_param in ("0", "false"):
+            qs = qs.filter(has_issues=False)
+
         tz = timezone.get_current_timezone()
 
         if date_from:
@@ -2705,6 +2416,8 @@ def get_user_documents(request):
             "scan_type",
             "ready_for_export",
             "math_validation_passed",
+            "has_issues",
+            "issue_count",
 
             "optimum_api_status",
             "optimum_last_try_date",
@@ -3665,18 +3378,39 @@ def autocomplete_clients(request):
 
 
 
+
+
+def _start_data_import(request, kind):
+    from .models import DataImportSession
+    from .tasks import run_data_import_task
+
+    file = request.FILES.get('file')
+    if not file:
+        return Response({"error": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+    session = DataImportSession.objects.create(
+        user=request.user,
+        kind=kind,
+        original_filename=(file.name or "")[:255],
+    )
+    session.file.save(file.name, file, save=True)
+
+    task = run_data_import_task.delay(session.pk)
+    session.task_id = task.id or ""
+    session.save(update_fields=["task_id"])
+
+    return Response(
+        {"session_id": session.pk, "stage": session.stage},
+        status=status.HTTP_202_ACCEPTED,
+    )
 
 
 # --- Импорт товаров (products) ---
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def import_products_view(request):
-    file = request.FILES.get('file')
-    if not file:
-        return Response({"error": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        report = import_products_from_xlsx(request.user, file)
-        return Response(report, status=status.HTTP_200_OK)
+        return _start_data_import(request, "products")
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -3684,15 +3418,33 @@ def import_products_view(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def import_clients_view(request):
-    file = request.FILES.get('file')
-    if not file:
-        return Response({"error": "No file provided."}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        report = import_clients_from_xlsx(request.user, file)
-        return Response(report, status=status.HTTP_200_OK)
+        return _start_data_import(request, "clients")
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# --- Статус фонового импорта (фронт поллит) ---
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def data_import_status(request, session_id):
+    from .models import DataImportSession
+
+    session = DataImportSession.objects.filter(pk=session_id, user=request.user).first()
+    if not session:
+        return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        "session_id": session.pk,
+        "kind": session.kind,
+        "stage": session.stage,
+        "total_rows": session.total_rows,
+        "processed_rows": session.processed_rows,
+        "report": session.report,
+        "created_at": session.created_at.isoformat() if session.created_at else None,
+        "started_at": session.started_at.isoformat() if session.started_at else None,
+        "finished_at": session.finished_at.isoformat() if session.finished_at else None,
+    })
+
 
 # --- Экспорт товаров ---
 @api_view(["GET"])
@@ -4282,81 +4034,12 @@ def subscription_status(request):
 #1) dlia admin-suvestine
 
 
-def _ensure_dict(x):
-    if x is None:
-        return {}
-    if isinstance(x, dict):
-        return x
-    if isinstance(x, str):
-        try:
-            return json.loads(x)
-        except Exception:
-            return {}
-    return {}
-
-
-def _ensure_dict(x):
-    if x is None:
-        return {}
-    if isinstance(x, dict):
-        return x
-    if isinstance(x, str):
-        try:
-            return json.loads(x)
-        except Exception:
-            return {}
-    return {}
-
-def summarize_doc_issues(doc_struct):
-    """
-    Возвращает 'error' ТОЛЬКО если overall_status == "FAIL" из финальной математической валидации.
-    Это единственный критерий для определения проблемных документов.
-    """
-    doc = _ensure_dict(doc_struct)
-
-    # ✅ ЕДИНСТВЕННАЯ ПРОВЕРКА: overall_status из финальной валидации
-    math_failed = False
-    math_badge = None
-    validation_type = None
-    
-    # Проверяем для detaliai (с line_items)
-    final_validation = doc.get("_final_math_validation")
-    if final_validation:
-        overall = final_validation.get("summary", {}).get("overall_status")
-        if overall == "FAIL":
-            math_failed = True
-            math_badge = "MATH✗"
-            validation_type = "detaliai"
-    
-    # Проверяем для sumiskai (без line_items)
-    sumiskai_validation = doc.get("_final_math_validation_sumiskai")
-    if sumiskai_validation:
-        overall = sumiskai_validation.get("overall_status")
-        if overall == "FAIL":
-            math_failed = True
-            math_badge = "MATH✗"
-            validation_type = "sumiskai"
-
-    has_error = math_failed
-
-    # --- оформление результата ---
-    badges = []
-    if math_badge:
-        badges.append(math_badge)
-
-    summary = " ".join(badges) if badges else ""
-    if validation_type:
-        summary = f"{summary} ({validation_type})".strip()
-
-    issue_count = 1 if has_error else 0
+# Problemų santrauka skaičiuojama ScannedDocument.save() metu (issue_flags / has_issues / issue_count)
+from .utils.doc_issues import (
+    ISSUE_GLOBAL_VALIDATION,
+    summarize_issue_flags,
+)
 
-    return {
-        "has_issues": has_error,
-        "severity": "error" if has_error else "ok",
-        "issue_badges": " ".join(badges),
-        "issue_summary": summary,
-        "issue_count": issue_count,
-    }
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -4365,17 +4048,26 @@ def admin_documents_with_errors(request):
     Для superuser — документы всех пользователей с ошибками.
     Ошибка = math_validation_passed=False ИЛИ ready_for_export=False
              ИЛИ structured_json._global_validation_log содержит "OVERALL STATUS: FAIL"
+             (issue_flags & ISSUE_GLOBAL_VALIDATION — JSON не читаем)
     Курсорная пагинация с infinite scroll.
     """
     user = request.user
     if not user.is_superuser:
         return Response({"detail": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
 
+    from django.db.models import F
+
     # Только документы с ошибками
-    qs = ScannedDocument.objects.select_related('user').filter(
-        Q(math_validation_passed=False) | 
-        Q(ready_for_export=False) |
-        Q(structured_json___global_validation_log__icontains='OVERALL STATUS: FAIL')
+    qs = (
+        ScannedDocument.objects
+        .select_related('user')
+        .defer(*BIG_FIELDS)
+        .alias(global_fail=F('issue_flags').bitand(ISSUE_GLOBAL_VALIDATION))
+        .filter(
+            Q(math_validation_passed=False) |
+            Q(ready_for_export=False) |
+            Q(global_fail__gt=0)
+        )
     )
 
     # --- фильтры ---
@@ -4406,10 +4098,8 @@ def admin_documents_with_errors(request):
         if not obj.ready_for_export:
             badges.append("NOT_READY")
         
-        # Проверяем _global_validation_log в structured_json
-        structured = obj.structured_json or {}
-        validation_log = structured.get('_global_validation_log', '')
-        if validation_log and 'OVERALL STATUS: FAIL' in validation_log:
+        # _global_validation_log FAIL — iš issue_flags
+        if obj.issue_flags & ISSUE_GLOBAL_VALIDATION:
             badges.append("VALIDATION✗")
         
         r["issue_badges"] = " ".join(badges)
@@ -4482,7 +4172,8 @@ def admin_all_documents(request):
     if not user.is_superuser:
         return Response({"detail": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
 
-    qs = ScannedDocument.objects.select_related('user').all()
+    # JSON laukai nekraunami — problemų santrauka iš issue_* stulpelių
+    qs = ScannedDocument.objects.select_related('user').defer(*BIG_FIELDS)
 
     # --- фильтры ---
     status_filter = request.GET.get('status')
@@ -4497,6 +4188,12 @@ def admin_all_documents(request):
     if search:
         qs = qs.filter(document_number__icontains=search)
 
+    issues_filter = request.GET.get('issues')
+    if issues_filter in ('1', 'true'):
+        qs = qs.filter(has_issues=True)
+    elif issues_filter in ('0', 'false'):
+        qs = qs.filter(has_issues=False)
+
     from django.utils.dateparse import parse_date
     from datetime import timedelta
 
@@ -4526,8 +4223,7 @@ def admin_all_documents(request):
     # --- обогащение данных ---
     data = []
     for obj, row in zip(page, ser.data):
-        doc_struct_raw = getattr(obj, 'structured_json', None) or getattr(obj, 'gpt_raw_json', None)
-        issues = summarize_doc_issues(doc_struct_raw)
+        issues = summarize_issue_flags(obj.issue_flags)
 
         enriched_row = {
             "user_id": getattr(obj.user, "id", None),
@@ -4644,6 +4340,20 @@ def admin_users_simple(request):
     return paginator.get_paginated_response(ser.data)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_rate_limits(request):
+    """
+    Для superuser — загрузка rate limiter'а по внешним API
+    (доступные токены, allowed/throttled за последнюю минуту и час).
+    """
+    if not request.user.is_superuser:
+        return Response({"detail": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
+
+    from .utils.rate_limiter import get_utilisation
+    return Response(get_utilisation())
+
+
 
 #Wagtail blog
 class GuideCategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -5664,28 +5374,38 @@ def payment_invoice(request, pk):
 
 # Optimizacija skorosti zagruzki
 
-def company_key(name, vat, cp_id):
-    cp_id = (cp_id or "").strip()
-    if cp_id:
-        return f"id:{cp_id}"
-    vat = (vat or "").strip().lower()
-    if vat:
-        return vat
-    name = (name or "").strip().lower()
-    return name
-
-
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_user_counterparties(request):
+    """
+    Kontrahentai iš UserCounterparty katalogo (services/counterparty_directory.py).
+    Be filtrų — keyset puslapiavimas (?cursor=), su status / from / to —
+    kiekiai tik tų dokumentų (GROUP BY seller_key / buyer_key).
+    """
+    from .services.counterparty_directory import (
+        DEFAULT_LIMIT, directory_page, filtered_counterparties,
+    )
+
     user = request.user
     q = request.query_params
 
     status_param = q.get("status")
     date_from = q.get("from")
     date_to = q.get("to")
-    search = (q.get("q") or "").strip().lower()
-    limit = int(q.get("limit") or 200)
+    search = (q.get("q") or "").strip()
+    try:
+        limit = int(q.get("limit") or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+
+    if not (status_param or date_from or date_to):
+        page = directory_page(user, search=search, cursor=q.get("cursor"), limit=limit)
+        ser = CounterpartySerializer(page["results"], many=True)
+        return Response({
+            "results": ser.data,
+            "has_more": page["has_more"],
+            "next_cursor": page["next_cursor"],
+        })
 
     qs = ScannedDocument.objects.filter(user=user, is_archive_container=False)
 
@@ -5706,66 +5426,7 @@ def get_user_counterparties(request):
             dt_to = timezone.make_aware(datetime.combine(d, dt_time.min), tz) + timedelta(days=1)
             qs = qs.filter(uploaded_at__lt=dt_to)
 
-    # агрегируем sellers
-    sellers = (
-        qs.exclude(seller_name__isnull=True, seller_name__exact="")
-          .values("seller_id", "seller_name", "seller_vat_code")
-          .annotate(docs_count=Count("id"))
-    )
-
-    # агрегируем buyers
-    buyers = (
-        qs.exclude(buyer_name__isnull=True, buyer_name__exact="")
-          .values("buyer_id", "buyer_name", "buyer_vat_code")
-          .annotate(docs_count=Count("id"))
-    )
-
-    merged = {}
-
-    def upsert(cp_id, name, vat, cnt):
-        key = company_key(name, vat, cp_id)
-        if not key:
-            return
-        item = merged.get(key)
-        if not item:
-            merged[key] = {
-                "key": key,
-                "id": (cp_id or "").strip() or None,
-                "name": name or "",
-                "vat": vat or "",
-                "docs_count": int(cnt or 0),
-            }
-        else:
-            item["docs_count"] += int(cnt or 0)
-            # “улучшаем” данные, если раньше было пусто
-            if not item["id"] and cp_id:
-                item["id"] = (cp_id or "").strip() or None
-            if not item["vat"] and vat:
-                item["vat"] = vat or ""
-            if not item["name"] and name:
-                item["name"] = name or ""
-
-    for r in sellers:
-        upsert(r.get("seller_id"), r.get("seller_name"), r.get("seller_vat_code"), r.get("docs_count"))
-
-    for r in buyers:
-        upsert(r.get("buyer_id"), r.get("buyer_name"), r.get("buyer_vat_code"), r.get("docs_count"))
-
-    items = list(merged.values())
-
-    # поиск по контрагентам (по имени/ват/id)
-    if search:
-        def match(it):
-            return (
-                search in (it.get("name") or "").lower()
-                or search in (it.get("vat") or "").lower()
-                or search in (it.get("id") or "").lower()
-            )
-        items = [x for x in items if match(x)]
-
-    items.sort(key=lambda x: (-(x.get("docs_count") or 0), (x.get("name") or "").lower()))
-    items = items[:limit]
-
+    items = filtered_counterparties(user, qs, search=search, limit=limit)
     ser = CounterpartySerializer(items, many=True)
     return Response({"results": ser.data})
 
@@ -5959,22 +5620,21 @@ def chunk_init(request, session_id):
     if _ext(filename) not in ARCHIVE_EXTS:
         return Response({"error":"Not an archive filename"}, status=400)
 
-    # создаём tmp file path
-    import os, tempfile
-    tmp_dir = os.path.join(tempfile.gettempdir(), "doksken_chunks")
-    os.makedirs(tmp_dir, exist_ok=True)
+    from .services.chunked_upload import ChunkUploadError, create_upload
 
-    cu = ChunkedUpload.objects.create(
-        user=request.user,
-        session=s,
-        filename=filename,
-        total_size=total_size,
-        chunk_size=chunk_size,
-        total_chunks=total_chunks,
-        received=[],
-        status="uploading",
-        tmp_path=os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part"),
-    )
+    try:
+        cu = create_upload(
+            ChunkedUpload,
+            user=request.user,
+            session=s,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=total_chunks,
+            sha256=request.data.get("sha256"),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     return Response({"upload_id": str(cu.id)})
 
@@ -5987,47 +5647,15 @@ def upload_chunk(request, session_id, upload_id, index):
     s = UploadSession.objects.get(id=session_id, user=request.user)
     cu = ChunkedUpload.objects.get(id=upload_id, user=request.user, session=s)
 
-    if cu.status != "uploading":
-        return Response({"error":"Not uploading"}, status=400)
-
-    index = int(index)
-    if index < 0 or index >= cu.total_chunks:
-        return Response({"error":"Bad index"}, status=400)
-
-    data = request.body or b""
-    if not data:
-        return Response({"error":"Empty chunk"}, status=400)
+    from .services.chunked_upload import CHUNK_HASH_HEADER, ChunkUploadError, write_chunk
 
-    # проверки размера чанка
-    is_last = (index == cu.total_chunks - 1)
-    if not is_last and len(data) != cu.chunk_size:
-        return Response({"error":"Bad chunk size"}, status=400)
-    if is_last and len(data) > cu.chunk_size:
-        return Response({"error":"Bad last chunk size"}, status=400)
-
-    offset = index * cu.chunk_size
-    if offset + len(data) > cu.total_size:
-        return Response({"error":"Out of bounds"}, status=400)
-
-    # пишем по смещению
-    import os
-    os.makedirs(os.path.dirname(cu.tmp_path), exist_ok=True)
-    with open(cu.tmp_path, "ab") as f:
-        pass  # ensure file exists
-    with open(cu.tmp_path, "r+b") as f:
-        f.seek(offset)
-        f.write(data)
-
-    # отметить чанк полученным (атомарно)
-    with transaction.atomic():
-        cu = ChunkedUpload.objects.select_for_update().get(id=cu.id)
-        got = set(cu.received or [])
-        if index not in got:
-            got.add(index)
-            cu.received = sorted(got)
-            cu.save(update_fields=["received","updated_at"])
-
-        received_count = len(cu.received)
+    # Chunk'ai rašomi savo poslinkiu (pwrite) — galima siųsti lygiagrečiai ir bet kuria tvarka
+    try:
+        received_count = write_chunk(
+            cu, int(index), request.body or b"", request.META.get(CHUNK_HASH_HEADER, ""),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     return Response({"ok": True, "received": received_count, "total": cu.total_chunks})
 
@@ -6040,10 +5668,12 @@ def upload_chunk(request, session_id, upload_id, index):
 def chunk_status(request, session_id, upload_id):
     s = UploadSession.objects.get(id=session_id, user=request.user)
     cu = ChunkedUpload.objects.get(id=upload_id, user=request.user, session=s)
+    from .services.chunked_upload import received_indexes
+
     return Response({
         "upload_id": str(cu.id),
         "status": cu.status,
-        "received": cu.received,
+        "received": received_indexes(cu),
         "total_chunks": cu.total_chunks,
     })
 
@@ -6056,30 +5686,43 @@ def chunk_complete(request, session_id, upload_id):
     s = UploadSession.objects.get(id=session_id, user=request.user)
     cu = ChunkedUpload.objects.get(id=upload_id, user=request.user, session=s)
 
+    from .services.chunked_upload import (
+        ChecksumMismatch, ChunkUploadError, check_complete, discard_stored,
+        discard_tmp, fail_upload, place_in_storage,
+    )
+
+    # Pakartotinis complete (kliento retry po timeout'o) — tas pats atsakymas
+    if cu.status == "complete" and cu.doc_id:
+        return Response({"ok": True, "doc_id": cu.doc_id})
     if cu.status != "uploading":
         return Response({"error":"Bad state"}, status=400)
 
-    got = set(cu.received or [])
-    if len(got) != cu.total_chunks:
-        return Response({"error":"Not all chunks uploaded"}, status=400)
-
-    if not os.path.exists(cu.tmp_path):
-        return Response({"error":"Missing tmp file"}, status=400)
-
-    if os.path.getsize(cu.tmp_path) != cu.total_size:
-        return Response({"error":"Size mismatch"}, status=400)
+    try:
+        check_complete(cu, request.data.get("sha256"))
+    except ChecksumMismatch as e:
+        fail_upload(cu, e)
+        return Response({"error": str(e)}, status=400)
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     # НОВОЕ: определяем формат архива
     archive_fmt = _get_archive_format(cu.filename)
 
     # атомарно создаём архив-документ
     with transaction.atomic():
-        # пометим upload complete
-        cu.status = "complete"
-        cu.save(update_fields=["status","updated_at"])
-
-        # создаём ScannedDocument container
-        doc = ScannedDocument.objects.create(
+        # пометим upload complete (vienas complete net ir esant pakartotiniams užklausimams)
+        updated = ChunkedUpload.objects.filter(id=cu.id, status="uploading").update(
+            status="complete", updated_at=timezone.now(),
+        )
+        if not updated:
+            # Lygiagretus complete jau baigtas (UPDATE laukė jo eilutės užrakto)
+            cu.refresh_from_db(fields=["status", "doc_id"])
+            if cu.status == "complete" and cu.doc_id:
+                return Response({"ok": True, "doc_id": cu.doc_id})
+            return Response({"error":"Bad state"}, status=400)
+
+        # создаём ScannedDocument container; .part failas į saugyklą — hard link, be kopijavimo
+        doc = ScannedDocument(
             user=request.user,
             upload_session=s,
             status="pending",
@@ -6088,29 +5731,29 @@ def chunk_complete(request, session_id, upload_id):
             is_archive_container=True,
             uploaded_size_bytes=cu.total_size,
         )
+        name = place_in_storage(cu, doc)
+        try:
+            doc.file.name = name
+            doc.save()
+            ChunkedUpload.objects.filter(id=cu.id).update(doc_id=doc.id)
+
+            # счётчики upload
+            s.uploaded_files = s.uploaded_files + 1
+            s.uploaded_bytes = s.uploaded_bytes + int(cu.total_size)
+
+            # НОВОЕ: сохраняем формат архива в сессии
+            if archive_fmt:
+                current_formats = s.archive_formats or []
+                if archive_fmt not in current_formats:
+                    current_formats.append(archive_fmt)
+                s.archive_formats = current_formats
+
+            s.save(update_fields=["uploaded_files", "uploaded_bytes", "archive_formats", "updated_at"])
+        except Exception:
+            discard_stored(doc, name)
+            raise
 
-        # переносим tmp файл в FileField (через open)
-        with open(cu.tmp_path, "rb") as fp:
-            doc.file.save(cu.filename, File(fp), save=True)
-
-        # счётчики upload
-        s.uploaded_files = s.uploaded_files + 1
-        s.uploaded_bytes = s.uploaded_bytes + int(cu.total_size)
-        
-        # НОВОЕ: сохраняем формат архива в сессии
-        if archive_fmt:
-            current_formats = s.archive_formats or []
-            if archive_fmt not in current_formats:
-                current_formats.append(archive_fmt)
-            s.archive_formats = current_formats
-
-        s.save(update_fields=["uploaded_files", "uploaded_bytes", "archive_formats", "updated_at"])
-
-    # можно удалить tmp_path после успешного save (если storage локальный)
-    try:
-        os.remove(cu.tmp_path)
-    except Exception:
-        pass
+    discard_tmp(cu)
 
     return Response({"ok": True, "doc_id": doc.id})
 
@@ -6122,62 +5765,35 @@ def chunk_complete(request, session_id, upload_id):
 COST = {"sumiskai": Decimal("1.00"), "detaliai": Decimal("1.30")}
 
 def compute_expected_items(session: UploadSession) -> int:
+    from .utils.file_converter import MAX_ARCHIVE_FILES, MANIFEST_VERSION, archive_manifest
+
     # обычные файлы
     base = ScannedDocument.objects.filter(upload_session=session, is_archive_container=False).count()
 
-    # архивы (минимальный preflight)
+    # архивы: tik archyvo katalogas (ZIP central directory, RAR/7Z antraštės, TAR antraštės);
+    # manifest'as išsaugomas ir naudojamas normalize_any
     archives = ScannedDocument.objects.filter(upload_session=session, is_archive_container=True)
     total_inside = 0
 
     for a in archives:
-        path = a.file.path
-        ext = _ext(a.original_filename)
-        count = 0
-
-        if ext == ".zip":
-            with zipfile.ZipFile(path) as zf:
-                for zi in zf.infolist():
-                    if zi.is_dir():
-                        continue
-                    if not zi.filename:
-                        continue
-                    count += 1
-
-        elif ext in {".tar", ".tgz", ".tar.gz", ".tar.bz2", ".tar.xz", ".tbz2"}:
-            with tarfile.open(path, mode="r:*") as tf:
-                for m in tf.getmembers():
-                    if not m.isfile():
-                        continue
-                    count += 1
-
-        elif ext == ".7z":
-            try:
-                import py7zr
-                with py7zr.SevenZipFile(path, mode='r') as sz:
-                    for name in sz.getnames():
-                        if not name.endswith('/'):
-                            count += 1
-            except Exception as e:
-                logger.warning(f"Failed to read 7z archive {a.original_filename}: {e}")
-                count = 1
-
-        elif ext == ".rar":
+        manifest = a.archive_manifest
+        if not manifest or manifest.get("v") != MANIFEST_VERSION:
             try:
-                import rarfile
-                with rarfile.RarFile(path) as rf:
-                    for ri in rf.infolist():
-                        if ri.isdir():
-                            continue
-                        count += 1
+                manifest = archive_manifest(a.file.path, a.original_filename)
             except Exception as e:
-                logger.warning(f"Failed to read rar archive {a.original_filename}: {e}")
-                count = 1
+                logger.warning(f"Failed to read archive {a.original_filename}: {e}")
+                manifest = None
 
-        else:
+        if manifest is None:
             count = 1
+        elif manifest["file_count"] > MAX_ARCHIVE_FILES:
+            count = 0  # normalize_any atmes visą archyvą (ArchiveLimitError)
+        else:
+            count = len(manifest["members"])
 
         a.archive_file_count = count
-        a.save(update_fields=["archive_file_count"])
+        a.archive_manifest = manifest
+        a.save(update_fields=["archive_file_count", "archive_manifest"])
 
         total_inside += count
     return base + total_inside
@@ -6601,7 +6217,7 @@ from datetime import timedelta
 from decimal import Decimal
 
 from django.db import transaction
-from django.db.models import Q, Sum, Count, Case, When, BooleanField, Value
+from django.db.models import Q, Sum, Count, Case, When, BooleanField
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -7265,6 +6881,10 @@ def invoice_send(request, pk):
     invoice.sent_to_email = email
     invoice.save(update_fields=["status", "sent_at", "sent_to_email"])
 
+    # Pirkėjas atsidarys nuorodą / priedą — PDF paruošiamas iš anksto
+    from .tasks import warm_invoice_pdf_cache
+    transaction.on_commit(lambda: warm_invoice_pdf_cache.delay(invoice.id))
+
     serializer = InvoiceDetailSerializer(invoice, context={"request": request})
     return Response(serializer.data)
 
@@ -7731,28 +7351,8 @@ def invoice_public_pdf(request, uuid):
     if not invoice.public_link_enabled or invoice.status == "draft":
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    # Логотип
-    logo_path = None
-    try:
-        settings = invoice.user.invoice_settings
-        if settings.logo and settings.logo.storage.exists(settings.logo.name):
-            logo_path = settings.logo.path
-    except Exception:
-        pass
-
-    # --- Watermark for free plan ---
-    watermark = False
-    try:
-        from docscanner_app.models import InvSubscription
-        sub = InvSubscription.objects.filter(user=invoice.user).first()
-        if sub:
-            sub.check_and_expire()
-            watermark = sub.status == "free"
-    except Exception:
-        pass
-
-    from .utils.invoice_pdf import generate_invoice_pdf
-    pdf_bytes = generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+    from .services.invoice_pdf_cache import get_invoice_pdf
+    pdf_bytes = get_invoice_pdf(invoice)
 
     filename = f"saskaita-{invoice.document_series}-{invoice.document_number}.pdf"
     response = HttpResponse(pdf_bytes, content_type="application/pdf")
@@ -8119,7 +7719,7 @@ def invoice_series_check_number(request):
 
 
 
-from django.db.models import Q, Value, CharField
+from django.db.models import Q, CharField
 from django.db.models.functions import Concat
 
 
@@ -8391,7 +7991,7 @@ def product_detail(request, pk):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def invoice_pdf(request, pk):
-    """Сгенерировать PDF на лету и отдать."""
+    """Отдать PDF (services/invoice_pdf_cache.py)."""
     invoice = get_object_or_404(Invoice, pk=pk, user=request.user)
 
     if invoice.status == "draft":
@@ -8400,28 +8000,9 @@ def invoice_pdf(request, pk):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    # Логотип
-    logo_path = None
-    try:
-        settings = invoice.user.invoice_settings
-        if settings.logo and settings.logo.storage.exists(settings.logo.name):
-            logo_path = settings.logo.path
-    except Exception:
-        pass
-
-    # --- Watermark for free plan ---
-    watermark = False
-    try:
-        from docscanner_app.models import InvSubscription
-        sub = InvSubscription.objects.filter(user=request.user).first()
-        if sub:
-            sub.check_and_expire()
-            watermark = sub.status == "free"
-    except Exception:
-        pass
-
-    from .utils.invoice_pdf import generate_invoice_pdf
-    pdf_bytes = generate_invoice_pdf(invoice, logo_path=logo_path, watermark=watermark)
+    # Iš kešo; generuojama tik pasikeitus sąskaitai / logotipui / planui
+    from .services.invoice_pdf_cache import get_invoice_pdf
+    pdf_bytes = get_invoice_pdf(invoice)
 
     filename = f"{invoice.full_number or invoice.pk}.pdf"
     response = HttpResponse(pdf_bytes, content_type="application/pdf")
@@ -9951,6 +9532,7 @@ class BankMatchingDebugView(APIView):
         txns.sort(key=lambda pair: (pair[1].transaction_date or date.min, pair[1].id))
 
         from .utils.purchase_matching_signals import SignalPurchaseMatchingEngine
+        from .utils.transaction_signals import CandidateBlockingIndex, load_signals
 
         signal_engine = SignalPurchaseMatchingEngine(request.user)
 
@@ -9959,6 +9541,8 @@ class BankMatchingDebugView(APIView):
             signal_engine._purchase_to_candidate(p)
             for p in signal_engine._load_purchases()
         ]
+        signal_index = CandidateBlockingIndex(signal_candidates)
+        signals_map = load_signals([t for d, t in txns if d == "outgoing"])
 
         items = []
 
@@ -9994,7 +9578,9 @@ class BankMatchingDebugView(APIView):
                 }
             else:
                 try:
-                    signal_result = signal_engine._match_one(txn, signal_candidates)
+                    signal_result = signal_engine._match_one(
+                        txn, signal_candidates, signals=signals_map.get(txn), index=signal_index,
+                    )
                     signal_match = self._build_signal_match(signal_result)
                 except Exception as e:
                     logger.exception("[BankMatchingDebug] signal dry-run failed txn=%s", txn.id)
@@ -13483,6 +13069,45 @@ class VeiklosZurnalasGenerateView(APIView):
         return entries, summary
 
 
+def build_veiklos_zurnalas_xlsx(entries, summary):
+    """Žurnalo XLSX (utils/xlsx_stream.py — write_only, bendri NamedStyle)."""
+    from .utils.xlsx_stream import CELL, MONEY, StreamingXlsxWriter
+
+    writer = StreamingXlsxWriter()
+
+    # ── Sheet 1: Operacijos ──
+    ws1 = writer.add_sheet("Operacijos", [
+        ('Eil. Nr.', 10),
+        ('Sąskaitos data', 16),
+        ('Serija ir numeris', 22),
+        ('Pirkėjas/pardavėjas', 30),
+        ('Turinys', 30),
+        ('Pajamos, EUR', 16),
+        ('Išlaidos, EUR', 16),
+    ], freeze_header=False)
+
+    row_styles = (CELL, CELL, CELL, CELL, CELL, MONEY, MONEY)
+    for row_idx, entry in enumerate(entries, 1):
+        ws1.append([
+            row_idx,
+            entry['invoice_date'],
+            entry['serija_nr'],
+            entry['counterparty'],
+            entry['turinys'],
+            float(entry['pajamos']) if entry['pajamos'] else None,
+            float(entry['islaidos']) if entry['islaidos'] else None,
+        ], styles=row_styles)
+
+    # ── Sheet 2: Apžvalga ──
+    ws2 = writer.add_sheet("Apžvalga", [('Rodiklis', 28), ('Reikšmė', 18)], freeze_header=False)
+    ws2.append(['Pardavimo operacijos', summary['pardavimo_operacijos']])
+    ws2.append(['Pirkimo operacijos', summary['pirkimo_operacijos']])
+    ws2.append(['Pajamos, EUR', float(summary['pajamu_suma'])], styles=(CELL, MONEY))
+    ws2.append(['Išlaidos, EUR', float(summary['islaidu_suma'])], styles=(CELL, MONEY))
+
+    return writer
+
+
 class VeiklosZurnalasExportView(APIView):
     """XLSX экспорт журнала."""
     permission_classes = [IsAuthenticated]
@@ -13501,102 +13126,13 @@ class VeiklosZurnalasExportView(APIView):
             request.user, contractor_keys, pvm_moketojas, date_from, date_to, sources,
         )
 
-        wb = Workbook()
-        header_font = Font(bold=True, size=11)
-        header_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin'),
-        )
+        # ── Response (laikinas failas → FileResponse) ──
+        return build_veiklos_zurnalas_xlsx(entries, summary).file_response("ind_veiklos_zurnalas.xlsx")
 
-        # ── Sheet 1: Operacijos ──
-        ws1 = wb.active
-        ws1.title = "Operacijos"
 
-        headers = [
-            'Eil. Nr.', 'Sąskaitos data', 'Serija ir numeris',
-            'Pirkėjas/pardavėjas', 'Turinys', 'Pajamos, EUR', 'Išlaidos, EUR',
-        ]
-
-        for col_idx, h in enumerate(headers, 1):
-            cell = ws1.cell(row=1, column=col_idx, value=h)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        for row_idx, entry in enumerate(entries, 1):
-            r = row_idx + 1
-            ws1.cell(row=r, column=1, value=row_idx).border = thin_border
-            ws1.cell(row=r, column=2, value=entry['invoice_date']).border = thin_border
-            ws1.cell(row=r, column=3, value=entry['serija_nr']).border = thin_border
-            ws1.cell(row=r, column=4, value=entry['counterparty']).border = thin_border
-            ws1.cell(row=r, column=5, value=entry['turinys']).border = thin_border
-
-            paj_cell = ws1.cell(row=r, column=6)
-            paj_cell.border = thin_border
-            if entry['pajamos']:
-                paj_cell.value = float(entry['pajamos'])
-                paj_cell.number_format = '#,##0.00'
-
-            isl_cell = ws1.cell(row=r, column=7)
-            isl_cell.border = thin_border
-            if entry['islaidos']:
-                isl_cell.value = float(entry['islaidos'])
-                isl_cell.number_format = '#,##0.00'
-
-        ws1.column_dimensions['A'].width = 10
-        ws1.column_dimensions['B'].width = 16
-        ws1.column_dimensions['C'].width = 22
-        ws1.column_dimensions['D'].width = 30
-        ws1.column_dimensions['E'].width = 30
-        ws1.column_dimensions['F'].width = 16
-        ws1.column_dimensions['G'].width = 16
-
-        # ── Sheet 2: Apžvalga ──
-        ws2 = wb.create_sheet("Apžvalga")
-
-        apzvalga_headers = ['Rodiklis', 'Reikšmė']
-        for col_idx, h in enumerate(apzvalga_headers, 1):
-            cell = ws2.cell(row=1, column=col_idx, value=h)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        summary_rows = [
-            ('Pardavimo operacijos', summary['pardavimo_operacijos']),
-            ('Pirkimo operacijos', summary['pirkimo_operacijos']),
-            ('Pajamos, EUR', float(summary['pajamu_suma'])),
-            ('Išlaidos, EUR', float(summary['islaidu_suma'])),
-        ]
-
-        for i, (label, val) in enumerate(summary_rows, 2):
-            ws2.cell(row=i, column=1, value=label).border = thin_border
-            c = ws2.cell(row=i, column=2, value=val)
-            c.border = thin_border
-            if isinstance(val, float):
-                c.number_format = '#,##0.00'
-
-        ws2.column_dimensions['A'].width = 28
-        ws2.column_dimensions['B'].width = 18
-
-        # ── Response ──
-        buf = io.BytesIO()
-        wb.save(buf)
-        buf.seek(0)
-
-        response = HttpResponse(
-            buf.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename="ind_veiklos_zurnalas.xlsx"'
-        return response
-
-
-# ──────────────────────────────────────────────────────────────
-# END - Individualios veiklos žurnalas
-# ──────────────────────────────────────────────────────────────
+# ──────────────────────────────────────────────────────────────
+# END - Individualios veiklos žurnalas
+# ──────────────────────────────────────────────────────────────
 
 # ──────────────────────────────────────────────────────────────
 # OSS žurnalas
@@ -13605,7 +13141,6 @@ class VeiklosZurnalasExportView(APIView):
 import io
 import logging
 from decimal import Decimal
-from collections import defaultdict
 
 from django.db.models import Count, Q
 from django.http import HttpResponse
@@ -13773,10 +13308,12 @@ class OSSContractorSearchView(APIView):
 # ──────────────────────────────────────────────────────────────
 
 class OSSReportGenerateView(APIView):
-    """Генерация OSS отчёта с пагинацией."""
+    """Генерация OSS отчёта с пагинацией (VatReportFact, services/vat_report_facts.py)."""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        from .services.vat_report_facts import oss_report
+
         contractor_keys = request.data.get("contractor_keys", [])
         date_from = request.data.get("date_from")
         date_to = request.data.get("date_to")
@@ -13787,303 +13324,26 @@ class OSSReportGenerateView(APIView):
         if not contractor_keys:
             return Response({"error": "Nepasirinktas nė vienas kontrahentas"}, status=400)
 
-        summary, entries, grand_totals = self._build_report(
+        result = oss_report(
             request.user, contractor_keys, date_from, date_to, sources,
+            offset=offset, limit=limit,
         )
 
-        total_count = len(entries)
-        page = entries[offset : offset + limit]
-
         return Response({
-            "summary": summary,
-            "grand_totals": grand_totals,
-            "total_count": total_count,
+            "summary": result["summary"],
+            "grand_totals": result["grand_totals"],
+            "total_count": result["total_count"],
             "offset": offset,
-            "entries": page,
+            "entries": result["entries"],
         })
 
     @staticmethod
     def _build_report(user, contractor_keys, date_from, date_to, sources):
-        contractor_keys_set = set(contractor_keys)
-        raw_rows = []
-
-        # ── ScannedDocument ──
-        if "skaitmenizavimas" in sources:
-            sd_qs = ScannedDocument.objects.filter(
-                user=user,
-                status__in=["completed", "exported"],
-                is_archive_container=False,
-                buyer_country_iso__in=EU_COUNTRIES_NO_LT,
-                buyer_is_person=True,
-                invoice_date__isnull=False,
-                ready_for_export=True,
-                math_validation_passed=True,
-            ).filter(
-                Q(buyer_vat_code__isnull=True) | Q(buyer_vat_code="")
-            )
-            if date_from:
-                sd_qs = sd_qs.filter(invoice_date__gte=date_from)
-            if date_to:
-                sd_qs = sd_qs.filter(invoice_date__lte=date_to)
-
-            for doc in sd_qs.iterator():
-                seller_key = _company_key(doc.seller_name, doc.seller_vat_code, doc.seller_id)
-                buyer_key = _company_key(doc.buyer_name, doc.buyer_vat_code, doc.buyer_id)
-
-                # Направление определяем по совпадению с выбранным контрагентом
-                if seller_key in contractor_keys_set:
-                    pass  # pardavimas — наша фирма = seller, подходит для OSS
-                elif buyer_key in contractor_keys_set:
-                    continue  # pirkimas — наша фирма = buyer, не OSS
-                else:
-                    continue
-
-                scan_type = getattr(doc, "scan_type", "sumiskai") or "sumiskai"
-                has_separate_vat = bool(doc.separate_vat)
-
-                base = {
-                    "source": "skaitmenizavimas",
-                    "doc_id": doc.id,
-                    "invoice_date": doc.invoice_date,
-                    "document_series": doc.document_series or "",
-                    "document_number": doc.document_number or "",
-                    "amount_with_vat": doc.amount_with_vat,
-                    "buyer_name": doc.buyer_name or "",
-                    "buyer_country_iso": doc.buyer_country_iso or "",
-                    "currency": doc.currency or "EUR",
-                }
-
-                if has_separate_vat and scan_type == "sumiskai":
-                    base.update({
-                        "vat_percent": None,
-                        "taxable_amount_eur": Decimal("0"),
-                        "vat_amount_eur": Decimal("0"),
-                        "warning": "Keli skirtingi PVM – suminis režimas, reikia peržiūrėti",
-                    })
-                    raw_rows.append(base)
-
-                elif has_separate_vat and scan_type == "detaliai":
-                    rate_groups = defaultdict(lambda: {"subtotal": Decimal("0"), "vat": Decimal("0")})
-                    for li in doc.line_items.all():
-                        vp = li.vat_percent
-                        if vp is None or _safe_d(vp) <= 0:
-                            continue
-                        vp_key = _safe_d(vp)
-                        rate_groups[vp_key]["subtotal"] += _safe_d(li.subtotal)
-                        rate_groups[vp_key]["vat"] += _safe_d(li.vat)
-
-                    if not rate_groups:
-                        continue
-
-                    for vp_key, amounts in rate_groups.items():
-                        row = dict(base)
-                        row.update({
-                            "vat_percent": str(vp_key),
-                            "taxable_amount_eur": _to_eur(amounts["subtotal"], doc.currency, doc.invoice_date),
-                            "vat_amount_eur": _to_eur(amounts["vat"], doc.currency, doc.invoice_date),
-                            "warning": None,
-                        })
-                        raw_rows.append(row)
-                else:
-                    vp = _safe_d(doc.vat_percent)
-                    if vp <= 0:
-                        continue
-                    base.update({
-                        "vat_percent": str(vp),
-                        "taxable_amount_eur": _to_eur(doc.amount_wo_vat, doc.currency, doc.invoice_date),
-                        "vat_amount_eur": _to_eur(doc.vat_amount, doc.currency, doc.invoice_date),
-                        "warning": None,
-                    })
-                    raw_rows.append(base)
-
-        # ── Invoice ──
-        if "israsymas" in sources:
-            inv_qs = Invoice.objects.filter(
-                user=user,
-                status__in=["issued", "sent", "partially_paid", "paid"],
-                invoice_type__in=["saskaita", "pvm_saskaita"],
-                buyer_country_iso__in=EU_COUNTRIES_NO_LT,
-                buyer_is_person=True,
-                invoice_date__isnull=False,
-            ).filter(
-                Q(buyer_vat_code__isnull=True) | Q(buyer_vat_code="")
-            )
-            if date_from:
-                inv_qs = inv_qs.filter(invoice_date__gte=date_from)
-            if date_to:
-                inv_qs = inv_qs.filter(invoice_date__lte=date_to)
-
-            for inv in inv_qs.iterator():
-                seller_key = _company_key(inv.seller_name, inv.seller_vat_code, inv.seller_id)
-                buyer_key = _company_key(inv.buyer_name, inv.buyer_vat_code, inv.buyer_id)
-
-                if seller_key in contractor_keys_set:
-                    pass  # pardavimas
-                elif buyer_key in contractor_keys_set:
-                    continue  # pirkimas — не OSS
-                else:
-                    continue
-
-                has_separate_vat = bool(inv.separate_vat)
-
-                base = {
-                    "source": "israsymas",
-                    "doc_id": inv.id,
-                    "invoice_date": inv.invoice_date,
-                    "document_series": inv.document_series or "",
-                    "document_number": inv.document_number or "",
-                    "amount_with_vat": inv.amount_with_vat,
-                    "buyer_name": inv.buyer_name or "",
-                    "buyer_country_iso": inv.buyer_country_iso or "",
-                    "currency": inv.currency or "EUR",
-                }
-
-                if has_separate_vat:
-                    rate_groups = defaultdict(lambda: {"subtotal": Decimal("0"), "vat": Decimal("0")})
-                    for li in inv.line_items.all():
-                        vp = li.vat_percent
-                        if vp is None or _safe_d(vp) <= 0:
-                            continue
-                        vp_key = _safe_d(vp)
-                        rate_groups[vp_key]["subtotal"] += _safe_d(li.subtotal)
-                        rate_groups[vp_key]["vat"] += _safe_d(li.vat)
-
-                    if not rate_groups:
-                        continue
-
-                    for vp_key, amounts in rate_groups.items():
-                        row = dict(base)
-                        row.update({
-                            "vat_percent": str(vp_key),
-                            "taxable_amount_eur": _to_eur(amounts["subtotal"], inv.currency, inv.invoice_date),
-                            "vat_amount_eur": _to_eur(amounts["vat"], inv.currency, inv.invoice_date),
-                            "warning": None,
-                        })
-                        raw_rows.append(row)
-                else:
-                    vp = _safe_d(inv.vat_percent)
-                    if vp <= 0:
-                        continue
-                    base.update({
-                        "vat_percent": str(vp),
-                        "taxable_amount_eur": _to_eur(inv.amount_wo_vat, inv.currency, inv.invoice_date),
-                        "vat_amount_eur": _to_eur(inv.vat_amount, inv.currency, inv.invoice_date),
-                        "warning": None,
-                    })
-                    raw_rows.append(base)
-
-        # ── Дедупликация: israsymas приоритетнее ──
-        raw_rows.sort(key=lambda r: (0 if r["source"] == "israsymas" else 1))
-        seen_keys = {}
-        entries = []
-
-        for row in raw_rows:
-            dk = _oss_dedup_key(
-                row["document_series"], row["document_number"],
-                row["amount_with_vat"], row["invoice_date"],
-            )
-            is_duplicate = False
-            if dk != ("", "", "", ""):
-                if dk in seen_keys:
-                    if row["source"] == "skaitmenizavimas" and seen_keys[dk] == "israsymas":
-                        is_duplicate = True
-                    elif row["source"] == "israsymas" and seen_keys[dk] == "skaitmenizavimas":
-                        for prev in entries:
-                            prev_dk = _oss_dedup_key(
-                                prev["document_series"], prev["document_number"],
-                                prev.get("_amount_with_vat_raw"), prev.get("_invoice_date_raw"),
-                            )
-                            if prev_dk == dk and prev["source"] == "skaitmenizavimas":
-                                prev["is_duplicate"] = True
-                        is_duplicate = False
-                        seen_keys[dk] = "israsymas"
-                    else:
-                        is_duplicate = True
-                else:
-                    seen_keys[dk] = row["source"]
-
-            series = row["document_series"]
-            number = row["document_number"]
-            serija_nr = f"{series}-{number}" if series else number
-            country_iso = row["buyer_country_iso"]
-
-            entries.append({
-                "doc_id": row["doc_id"],
-                "source": row["source"],
-                "invoice_date": row["invoice_date"].strftime("%Y-%m-%d") if row["invoice_date"] else "",
-                "serija_nr": serija_nr,
-                "buyer_name": row["buyer_name"],
-                "buyer_country_iso": country_iso,
-                "buyer_country_name": EU_COUNTRY_NAMES_LT.get(country_iso, country_iso),
-                "vat_percent": row["vat_percent"],
-                "taxable_amount": str(row["taxable_amount_eur"].quantize(Decimal("0.01"))),
-                "vat_amount": str(row["vat_amount_eur"].quantize(Decimal("0.01"))),
-                "is_duplicate": is_duplicate,
-                "warning": row.get("warning"),
-                "document_series": row["document_series"],
-                "document_number": row["document_number"],
-                "_amount_with_vat_raw": row["amount_with_vat"],
-                "_invoice_date_raw": row["invoice_date"],
-            })
-
-        entries.sort(key=lambda r: r["invoice_date"], reverse=True)
-
-        # ── Сводка по (страна, ставка) — только не-дубликаты и без warnings ──
-        summary_map = defaultdict(lambda: {"taxable": Decimal("0"), "vat": Decimal("0"), "doc_count": 0})
-        for entry in entries:
-            if entry["is_duplicate"] or entry["warning"]:
-                continue
-            key = (entry["buyer_country_iso"], entry["vat_percent"])
-            summary_map[key]["taxable"] += _safe_d(entry["taxable_amount"])
-            summary_map[key]["vat"] += _safe_d(entry["vat_amount"])
-            summary_map[key]["doc_count"] += 1
-
-        summary = []
-        grand_taxable = Decimal("0")
-        grand_vat = Decimal("0")
-        grand_doc_count = 0
-
-        for (country_iso, vat_pct), amounts in sorted(summary_map.items(), key=lambda x: (x[0][0], x[0][1])):
-            t = amounts["taxable"].quantize(Decimal("0.01"))
-            v = amounts["vat"].quantize(Decimal("0.01"))
-            summary.append({
-                "buyer_country_iso": country_iso,
-                "buyer_country_name": EU_COUNTRY_NAMES_LT.get(country_iso, country_iso),
-                "vat_percent": vat_pct,
-                "taxable_amount": str(t),
-                "vat_amount": str(v),
-                "doc_count": amounts["doc_count"],
-            })
-            grand_taxable += t
-            grand_vat += v
-            grand_doc_count += amounts["doc_count"]
-
-        grand_totals = {
-            "taxable_amount": str(grand_taxable.quantize(Decimal("0.01"))),
-            "vat_amount": str(grand_vat.quantize(Decimal("0.01"))),
-            "documents_count": grand_doc_count,
-            "warnings_count": sum(1 for e in entries if e["warning"]),
-            "duplicates_count": sum(1 for e in entries if e["is_duplicate"]),
-        }
+        """Visa ataskaita (eksportui): (summary, entries, grand_totals)."""
+        from .services.vat_report_facts import oss_report
 
-        clean_entries = []
-        for entry in entries:
-            clean_entries.append({
-                "doc_id": entry["doc_id"],
-                "source": entry["source"],
-                "invoice_date": entry["invoice_date"],
-                "serija_nr": entry["serija_nr"],
-                "buyer_name": entry["buyer_name"],
-                "buyer_country_iso": entry["buyer_country_iso"],
-                "buyer_country_name": entry["buyer_country_name"],
-                "vat_percent": entry["vat_percent"],
-                "taxable_amount": entry["taxable_amount"],
-                "vat_amount": entry["vat_amount"],
-                "is_duplicate": entry["is_duplicate"],
-                "warning": entry["warning"],
-            })
-
-        return summary, clean_entries, grand_totals
+        result = oss_report(user, contractor_keys, date_from, date_to, sources)
+        return result["summary"], result["entries"], result["grand_totals"]
 
 # ──────────────────────────────────────────────────────────────
 # Excel export
@@ -14243,7 +13503,6 @@ class OSSReportExportView(APIView):
 import io
 import logging
 from decimal import Decimal
-from collections import defaultdict
 
 from django.db.models import Count, Q
 from django.http import HttpResponse
@@ -14295,96 +13554,6 @@ def _strip_vat_prefix(vat_code, country_iso):
     return vat
 
 
-def _classify_svs_doc(
-    source, doc_id,
-    seller_key, buyer_key,
-    seller_country_iso, buyer_country_iso,
-    buyer_vat_code, buyer_name, seller_name,
-    vat_percent, vat_amount,
-    amount_wo_vat, amount_with_vat,
-    traded_type,
-    invoice_date, document_series, document_number,
-    currency,
-    contractor_keys_set,
-):
-    """
-    Klasifikuoja dokumentą kaip SVS pirkimą (140/141) arba pardavimą (043).
-    Grąžina dict arba None jei dokumentas netinka SVS.
-    """
-    seller_iso = (seller_country_iso or "").strip().upper()
-    buyer_iso = (buyer_country_iso or "").strip().upper()
-    b_vat = (buyer_vat_code or "").strip()
-    t_type = (traded_type or "").strip().lower()
-
-    # traded_type filtras: tik paslaugos/mišrus (arba tuščias — atgalinis suderinamumas)
-    is_services = t_type in ("services")
-
-    # ── Pirkimas: mano įmonė = buyer, seller užsienietis, PVM ≈ 0% ──
-    if buyer_key in contractor_keys_set and seller_key not in contractor_keys_set:
-        if not seller_iso or seller_iso == "LT":
-            return None
-        if not is_services:
-            return None
-
-        # Tikriname ar pardavėjas nepritaikė LT PVM (pvz. per OSS)
-        vp = _safe_d(vat_percent)
-        va = _safe_d(vat_amount)
-        if vp > 0 and va > 0:
-            return None
-
-        svs_code = "140" if seller_iso in EU_COUNTRIES_NO_LT else "141"
-
-        # Apmokestinamoji vertė: amount_wo_vat, fallback į amount_with_vat (nes PVM=0)
-        taxable = _to_eur(amount_wo_vat, currency, invoice_date)
-        if taxable == Decimal("0") and amount_with_vat:
-            taxable = _to_eur(amount_with_vat, currency, invoice_date)
-
-        return {
-            "source": source,
-            "doc_id": doc_id,
-            "svs_code": svs_code,
-            "invoice_date": invoice_date,
-            "document_series": document_series or "",
-            "document_number": document_number or "",
-            "counterparty_name": seller_name or "",
-            "counterparty_country_iso": seller_iso,
-            "counterparty_vat_code": "",
-            "amount_wo_vat_eur": taxable,
-            "vat_amount_eur": Decimal("0"),
-            "amount_with_vat": amount_with_vat,
-        }
-
-    # ── Pardavimas: mano įmonė = seller, buyer yra ES PVM mokėtojas ──
-    if seller_key in contractor_keys_set and buyer_key not in contractor_keys_set:
-        if buyer_iso not in EU_COUNTRIES_NO_LT:
-            return None
-        if not b_vat:
-            return None
-        if not is_services:
-            return None
-
-        taxable = _to_eur(amount_wo_vat, currency, invoice_date)
-        if taxable == Decimal("0") and amount_with_vat:
-            taxable = _to_eur(amount_with_vat, currency, invoice_date)
-
-        return {
-            "source": source,
-            "doc_id": doc_id,
-            "svs_code": "043",
-            "invoice_date": invoice_date,
-            "document_series": document_series or "",
-            "document_number": document_number or "",
-            "counterparty_name": buyer_name or "",
-            "counterparty_country_iso": buyer_iso,
-            "counterparty_vat_code": b_vat,
-            "amount_wo_vat_eur": taxable,
-            "vat_amount_eur": Decimal("0"),
-            "amount_with_vat": amount_with_vat,
-        }
-
-    return None
-
-
 # ──────────────────────────────────────────────────────────────
 # Contractor search
 # ──────────────────────────────────────────────────────────────
@@ -14510,10 +13679,12 @@ class SVSContractorSearchView(APIView):
 # ──────────────────────────────────────────────────────────────
 
 class SVSReportGenerateView(APIView):
-    """SVS ataskaitos generavimas (PVM101 + FR0564) su puslapiavimu."""
+    """SVS ataskaitos generavimas (PVM101 + FR0564) su puslapiavimu (VatReportFact)."""
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        from .services.vat_report_facts import svs_report
+
         contractor_keys = request.data.get("contractor_keys", [])
         date_from = request.data.get("date_from")
         date_to = request.data.get("date_to")
@@ -14524,236 +13695,26 @@ class SVSReportGenerateView(APIView):
         if not contractor_keys:
             return Response({"error": "Nepasirinktas nė vienas kontrahentas"}, status=400)
 
-        result = self._build_report(
+        result = svs_report(
             request.user, contractor_keys, date_from, date_to, sources,
+            offset=offset, limit=limit,
         )
 
-        total_count = len(result["entries"])
-        page = result["entries"][offset:offset + limit]
-
         return Response({
             "pvm101_summary": result["pvm101_summary"],
             "fr0564_summary": result["fr0564_summary"],
             "grand_totals": result["grand_totals"],
-            "total_count": total_count,
+            "total_count": result["total_count"],
             "offset": offset,
-            "entries": page,
+            "entries": result["entries"],
         })
 
     @staticmethod
     def _build_report(user, contractor_keys, date_from, date_to, sources):
-        contractor_keys_set = set(contractor_keys)
-        raw_rows = []
-
-        def _iter_docs(source_label, qs):
-            for obj in qs.iterator():
-                seller_key = _company_key(obj.seller_name, obj.seller_vat_code, obj.seller_id)
-                buyer_key = _company_key(obj.buyer_name, obj.buyer_vat_code, obj.buyer_id)
-                row = _classify_svs_doc(
-                    source=source_label,
-                    doc_id=obj.id,
-                    seller_key=seller_key,
-                    buyer_key=buyer_key,
-                    seller_country_iso=obj.seller_country_iso,
-                    buyer_country_iso=obj.buyer_country_iso,
-                    buyer_vat_code=obj.buyer_vat_code,
-                    buyer_name=obj.buyer_name,
-                    seller_name=obj.seller_name,
-                    vat_percent=obj.vat_percent,
-                    vat_amount=obj.vat_amount,
-                    amount_wo_vat=obj.amount_wo_vat,
-                    amount_with_vat=obj.amount_with_vat,
-                    traded_type=getattr(obj, "traded_type", None),
-                    invoice_date=obj.invoice_date,
-                    document_series=obj.document_series,
-                    document_number=obj.document_number,
-                    currency=obj.currency,
-                    contractor_keys_set=contractor_keys_set,
-                )
-                if row:
-                    raw_rows.append(row)
-
-        # ── ScannedDocument ──
-        if "skaitmenizavimas" in sources:
-            sd_qs = ScannedDocument.objects.filter(
-                user=user,
-                status__in=["completed", "exported"],
-                is_archive_container=False,
-                invoice_date__isnull=False,
-            )
-            if date_from:
-                sd_qs = sd_qs.filter(invoice_date__gte=date_from)
-            if date_to:
-                sd_qs = sd_qs.filter(invoice_date__lte=date_to)
-            _iter_docs("skaitmenizavimas", sd_qs)
-
-        # ── Invoice ──
-        if "israsymas" in sources:
-            inv_qs = Invoice.objects.filter(
-                user=user,
-                status__in=["issued", "sent", "partially_paid", "paid"],
-                invoice_type__in=["saskaita", "pvm_saskaita"],
-                invoice_date__isnull=False,
-            )
-            if date_from:
-                inv_qs = inv_qs.filter(invoice_date__gte=date_from)
-            if date_to:
-                inv_qs = inv_qs.filter(invoice_date__lte=date_to)
-            _iter_docs("israsymas", inv_qs)
+        """Visa ataskaita (eksportui)."""
+        from .services.vat_report_facts import svs_report
 
-        # ── Deduplikacija: israsymas prioritetas ──
-        raw_rows.sort(key=lambda r: (0 if r["source"] == "israsymas" else 1))
-        seen_keys = {}
-        entries = []
-
-        for row in raw_rows:
-            dk = _svs_dedup_key(
-                row["document_series"], row["document_number"],
-                row["amount_wo_vat_eur"], row["invoice_date"],
-            )
-            is_duplicate = False
-            if dk != ("", "", "", ""):
-                if dk in seen_keys:
-                    if row["source"] == "skaitmenizavimas" and seen_keys[dk] == "israsymas":
-                        is_duplicate = True
-                    elif row["source"] == "israsymas" and seen_keys[dk] == "skaitmenizavimas":
-                        for prev in entries:
-                            prev_dk = _svs_dedup_key(
-                                prev["document_series"], prev["document_number"],
-                                prev.get("_amount_raw"), prev.get("_date_raw"),
-                            )
-                            if prev_dk == dk and prev["source"] == "skaitmenizavimas":
-                                prev["is_duplicate"] = True
-                        is_duplicate = False
-                        seen_keys[dk] = "israsymas"
-                    else:
-                        is_duplicate = True
-                else:
-                    seen_keys[dk] = row["source"]
-
-            series = row["document_series"]
-            number = row["document_number"]
-            serija_nr = f"{series}-{number}" if series else number
-            c_iso = row["counterparty_country_iso"]
-
-            entries.append({
-                "doc_id": row["doc_id"],
-                "source": row["source"],
-                "svs_code": row["svs_code"],
-                "invoice_date": row["invoice_date"].strftime("%Y-%m-%d") if row["invoice_date"] else "",
-                "serija_nr": serija_nr,
-                "counterparty_name": row["counterparty_name"],
-                "counterparty_country_iso": c_iso,
-                "counterparty_country_name": EU_COUNTRY_NAMES_LT.get(c_iso, c_iso or ""),
-                "counterparty_vat_code": row.get("counterparty_vat_code", ""),
-                "amount_wo_vat": str(row["amount_wo_vat_eur"].quantize(Decimal("0.01"))),
-                "is_duplicate": is_duplicate,
-                # Internal fields dlia dedup
-                "document_series": row["document_series"],
-                "document_number": row["document_number"],
-                "_amount_raw": row["amount_wo_vat_eur"],
-                "_date_raw": row["invoice_date"],
-            })
-
-        entries.sort(key=lambda r: r["invoice_date"], reverse=True)
-
-        # ── PVM101 suvestinė: pagal kodą ──
-        pvm101_map = defaultdict(lambda: {"taxable": Decimal("0"), "doc_count": 0})
-        for entry in entries:
-            if entry["is_duplicate"]:
-                continue
-            code = entry["svs_code"]
-            pvm101_map[code]["taxable"] += _safe_d(entry["amount_wo_vat"])
-            pvm101_map[code]["doc_count"] += 1
-
-        pvm101_summary = []
-        grand_taxable = Decimal("0")
-        grand_vat = Decimal("0")
-        grand_doc_count = 0
-
-        for code in sorted(pvm101_map.keys()):
-            amounts = pvm101_map[code]
-            taxable = amounts["taxable"].quantize(Decimal("0.01"))
-            if code in ("140", "141"):
-                vat = (taxable * Decimal("0.21")).quantize(Decimal("0.01"))
-                vat_pct = "21"
-            else:
-                vat = Decimal("0")
-                vat_pct = "0"
-
-            pvm101_summary.append({
-                "code": code,
-                "label": CODE_LABELS.get(code, code),
-                "vat_percent": vat_pct,
-                "taxable_amount": str(taxable),
-                "vat_amount": str(vat),
-                "doc_count": amounts["doc_count"],
-            })
-            grand_taxable += taxable
-            grand_vat += vat
-            grand_doc_count += amounts["doc_count"]
-
-        # ── FR0564 suvestinė: pagal kiekvieną pirkėją (tik kodas 043) ──
-        fr0564_map = defaultdict(lambda: {
-            "country_iso": "", "vat_code_raw": "",
-            "buyer_name": "", "amount": Decimal("0"), "doc_count": 0,
-        })
-        for entry in entries:
-            if entry["is_duplicate"] or entry["svs_code"] != "043":
-                continue
-            vat_raw = entry.get("counterparty_vat_code", "")
-            c_iso = entry["counterparty_country_iso"]
-            fr_key = (c_iso, vat_raw)
-            fr0564_map[fr_key]["country_iso"] = c_iso
-            fr0564_map[fr_key]["vat_code_raw"] = vat_raw
-            fr0564_map[fr_key]["buyer_name"] = entry["counterparty_name"]
-            fr0564_map[fr_key]["amount"] += _safe_d(entry["amount_wo_vat"])
-            fr0564_map[fr_key]["doc_count"] += 1
-
-        fr0564_summary = []
-        for (c_iso, vat_raw), data in sorted(fr0564_map.items()):
-            # FR0564 sumos apvalinamos iki sveikų skaičių (taisyklių 11 p.)
-            amount_rounded = data["amount"].quantize(Decimal("1"))
-            fr0564_summary.append({
-                "country_iso": c_iso,
-                "country_name": EU_COUNTRY_NAMES_LT.get(c_iso, c_iso),
-                "vat_code": _strip_vat_prefix(vat_raw, c_iso),
-                "vat_code_full": vat_raw,
-                "buyer_name": data["buyer_name"],
-                "services_amount": str(amount_rounded),
-                "doc_count": data["doc_count"],
-            })
-
-        grand_totals = {
-            "taxable_amount": str(grand_taxable.quantize(Decimal("0.01"))),
-            "vat_amount": str(grand_vat.quantize(Decimal("0.01"))),
-            "documents_count": grand_doc_count,
-            "duplicates_count": sum(1 for e in entries if e["is_duplicate"]),
-        }
-
-        # Valome entries prieš grąžinant
-        clean_entries = []
-        for entry in entries:
-            clean_entries.append({
-                "doc_id": entry["doc_id"],
-                "source": entry["source"],
-                "svs_code": entry["svs_code"],
-                "invoice_date": entry["invoice_date"],
-                "serija_nr": entry["serija_nr"],
-                "counterparty_name": entry["counterparty_name"],
-                "counterparty_country_iso": entry["counterparty_country_iso"],
-                "counterparty_country_name": entry["counterparty_country_name"],
-                "counterparty_vat_code": entry.get("counterparty_vat_code", ""),
-                "amount_wo_vat": entry["amount_wo_vat"],
-                "is_duplicate": entry["is_duplicate"],
-            })
-
-        return {
-            "pvm101_summary": pvm101_summary,
-            "fr0564_summary": fr0564_summary,
-            "grand_totals": grand_totals,
-            "entries": clean_entries,
-        }
+        return svs_report(user, contractor_keys, date_from, date_to, sources)
 
 
 # ──────────────────────────────────────────────────────────────
@@ -15054,7 +14015,6 @@ waybill_views.py — API views для важтарашчей.
 """
 import logging
 import os
-import uuid
 from decimal import Decimal
 
 from django.conf import settings
@@ -15215,14 +14175,21 @@ def waybill_chunked_upload_init(request):
     if session.stage != "uploading":
         return Response({"error": "Session is not in uploading stage"}, status=400)
 
-    upload = WaybillChunkedUpload.objects.create(
-        user=request.user,
-        session=session,
-        filename=d["filename"],
-        total_size=d["total_size"],
-        chunk_size=d["chunk_size"],
-        total_chunks=d["total_chunks"],
-    )
+    from .services.chunked_upload import ChunkUploadError, create_upload
+
+    try:
+        upload = create_upload(
+            WaybillChunkedUpload,
+            user=request.user,
+            session=session,
+            filename=d["filename"],
+            total_size=d["total_size"],
+            chunk_size=d["chunk_size"],
+            total_chunks=d["total_chunks"],
+            sha256=request.data.get("sha256"),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     return Response(
         {"upload_id": str(upload.id), "status": upload.status},
@@ -15248,29 +14215,18 @@ def waybill_chunked_upload_chunk(request, upload_id):
     if chunk_index is None or chunk_file is None:
         return Response({"error": "chunk_index and chunk file required"}, status=400)
 
-    chunk_index = int(chunk_index)
-
-    # Путь для tmp файла
-    if not upload.tmp_path:
-        tmp_dir = os.path.join(settings.MEDIA_ROOT, "waybills_tmp", str(request.user.id))
-        os.makedirs(tmp_dir, exist_ok=True)
-        upload.tmp_path = os.path.join(tmp_dir, f"{upload.id}.part")
+    from .services.chunked_upload import CHUNK_HASH_HEADER, ChunkUploadError, write_chunk
 
-    # Записываем chunk
-    mode = "ab" if os.path.exists(upload.tmp_path) else "wb"
-    with open(upload.tmp_path, mode) as f:
-        for c in chunk_file.chunks():
-            f.write(c)
-
-    received = upload.received or []
-    if chunk_index not in received:
-        received.append(chunk_index)
-    upload.received = received
-    upload.save(update_fields=["received", "tmp_path", "updated_at"])
+    try:
+        received = write_chunk(
+            upload, int(chunk_index), chunk_file, request.META.get(CHUNK_HASH_HEADER, ""),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     return Response({
         "upload_id": str(upload.id),
-        "received": len(received),
+        "received": received,
         "total_chunks": upload.total_chunks,
     })
 
@@ -15284,63 +14240,72 @@ def waybill_chunked_upload_complete(request, upload_id):
     except WaybillChunkedUpload.DoesNotExist:
         return Response({"error": "Upload not found"}, status=404)
 
-    received = upload.received or []
-    if len(received) < upload.total_chunks:
-        return Response(
-            {"error": f"Not all chunks received: {len(received)}/{upload.total_chunks}"},
-            status=400,
-        )
-
-    if not upload.tmp_path or not os.path.exists(upload.tmp_path):
-        return Response({"error": "Temporary file not found"}, status=400)
-
-    try:
-        session = upload.session
-
-        # Создаём ScannedWaybill
-        doc = ScannedWaybill(
-            user=request.user,
-            original_filename=upload.filename,
-            status="pending",
-            upload_session=session,
-        )
+    return _complete_waybill_chunked_upload(request, upload, extra={"upload_id": str(upload.id)})
 
-        with open(upload.tmp_path, 'rb') as f:
-            from django.core.files.base import ContentFile
-            doc.file.save(upload.filename, ContentFile(f.read()), save=False)
 
-        doc.uploaded_size_bytes = upload.total_size
-        doc.save()
-
-        # Обновляем счётчики сессии
-        WaybillUploadSession.objects.filter(id=session.id).update(
-            uploaded_files=F("uploaded_files") + 1,
-            uploaded_bytes=F("uploaded_bytes") + upload.total_size,
-            expected_items=F("expected_items") + 1,
-        )
+def _complete_waybill_chunked_upload(request, upload, extra=None):
+    """Bendras complete: patikra → ScannedWaybill su .part failu (hard link) → sesijos skaitikliai."""
+    from .services.chunked_upload import (
+        ChecksumMismatch, ChunkUploadError, check_complete, discard_stored,
+        discard_tmp, fail_upload, place_in_storage,
+    )
 
-        upload.status = "complete"
-        upload.save(update_fields=["status", "updated_at"])
+    # Pakartotinis complete (kliento retry po timeout'o) — tas pats atsakymas
+    if upload.status == "complete" and upload.doc_id:
+        return Response({"doc_id": upload.doc_id, **(extra or {}), "status": "complete"})
+    if upload.status != "uploading":
+        return Response({"error": "Upload is not active"}, status=400)
 
-        # Удаляем tmp
-        try:
-            os.remove(upload.tmp_path)
-        except Exception:
-            pass
+    try:
+        check_complete(upload, request.data.get("sha256"))
+    except ChecksumMismatch as e:
+        fail_upload(upload, e)
+        return Response({"error": str(e)}, status=400)
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
+
+    doc = None
+    name = None
+    try:
+        with transaction.atomic():
+            updated = WaybillChunkedUpload.objects.filter(id=upload.id, status="uploading").update(
+                status="complete", updated_at=timezone.now(),
+            )
+            if not updated:
+                upload.refresh_from_db(fields=["status", "doc_id"])
+                if upload.status == "complete" and upload.doc_id:
+                    return Response({"doc_id": upload.doc_id, **(extra or {}), "status": "complete"})
+                return Response({"error": "Upload is not active"}, status=400)
 
-        return Response({
-            "doc_id": doc.id,
-            "upload_id": str(upload.id),
-            "status": "complete",
-        })
+            doc = ScannedWaybill(
+                user=request.user,
+                original_filename=upload.filename,
+                status="pending",
+                upload_session=upload.session,
+                uploaded_size_bytes=upload.total_size,
+            )
+            name = place_in_storage(upload, doc)
+            doc.file.name = name
+            doc.save()
+            WaybillChunkedUpload.objects.filter(id=upload.id).update(doc_id=doc.id)
+
+            # Обновляем счётчики сессии
+            WaybillUploadSession.objects.filter(id=upload.session_id).update(
+                uploaded_files=F("uploaded_files") + 1,
+                uploaded_bytes=F("uploaded_bytes") + upload.total_size,
+                expected_items=F("expected_items") + 1,
+            )
 
     except Exception as e:
-        logger.exception("[WAYBILL-UPLOAD] Complete failed: %s", e)
-        upload.status = "failed"
-        upload.error_message = str(e)
-        upload.save(update_fields=["status", "error_message", "updated_at"])
+        logger.exception("[WAYBILL-UPLOAD] Chunk complete failed: %s", e)
+        if name:
+            discard_stored(doc, name)
+        fail_upload(upload, e)
         return Response({"error": str(e)}, status=500)
 
+    discard_tmp(upload)
+    return Response({"doc_id": doc.id, **(extra or {}), "status": "complete"})
+
 
 # ============================================================
 # Waybill List
@@ -15554,6 +14519,27 @@ def _format_value(field_name, val):
     return val
 
 
+def build_waybill_xlsx(rows):
+    """rows — _format_value() reikšmės EXPORT_COLUMNS tvarka (utils/xlsx_stream.py)."""
+    from .utils.xlsx_stream import StreamingXlsxWriter
+
+    # Avto-shirina stolbcov (write_only: pločiai — prieš eilutes)
+    widths = [len(label) for _, label in EXPORT_COLUMNS]
+    for row in rows:
+        for col_idx, val in enumerate(row):
+            if val:
+                widths[col_idx] = max(widths[col_idx], len(str(val)))
+
+    writer = StreamingXlsxWriter()
+    ws = writer.add_sheet(
+        "Važtaraščiai",
+        [(label, min(w + 3, 30)) for (_, label), w in zip(EXPORT_COLUMNS, widths)],
+    )
+    for row in rows:
+        ws.append(row)
+    return writer
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def waybill_export_xls(request):
@@ -15571,71 +14557,22 @@ def waybill_export_xls(request):
     if not docs.exists():
         return Response({"error": "Nerasta eksportuojamų dokumentų"}, status=404)
 
-    try:
-        import openpyxl
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    except ImportError:
-        return Response({"error": "openpyxl neįdiegtas serveryje"}, status=500)
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Važtaraščiai"
-
-    # Stiliai
-    header_font = Font(bold=True, size=11)
-    header_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
-
-    # Zagolovki
-    for col_idx, (_, label) in enumerate(EXPORT_COLUMNS, start=1):
-        cell = ws.cell(row=1, column=col_idx, value=label)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    # Danyje
-    for row_idx, doc in enumerate(docs, start=2):
-        for col_idx, (field, _) in enumerate(EXPORT_COLUMNS, start=1):
-            val = getattr(doc, field, None)
-            cell = ws.cell(row=row_idx, column=col_idx, value=_format_value(field, val))
-            cell.border = thin_border
-
-    # Avto-shirina stolbcov
-    for col_idx, (_, label) in enumerate(EXPORT_COLUMNS, start=1):
-        max_len = len(label)
-        for row in ws.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx):
-            for cell in row:
-                if cell.value:
-                    max_len = max(max_len, len(str(cell.value)))
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = min(max_len + 3, 30)
+    # Tik eksportuojami laukai (be modelio objektų)
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    rows = [
+        [_format_value(field, val) for field, val in zip(fields, values)]
+        for values in docs.values_list(*fields)
+    ]
+    doc_ids = list(docs.values_list("id", flat=True))
 
-    # Zamorozka zagolovkov
-    ws.freeze_panes = "A2"
+    writer = build_waybill_xlsx(rows)
+    del rows
 
     # Pomecijajem kak exported
-    doc_ids = list(docs.values_list("id", flat=True))
     ScannedWaybill.objects.filter(id__in=doc_ids).update(status="exported")
 
-    # Otdajem fail
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    filename = f"vaztarasciai_{timestamp}.xlsx"
-
-    response = HttpResponse(
-        buffer.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response = writer.file_response(f"vaztarasciai_{timestamp}.xlsx")
 
     logger.info(
         "[WAYBILL-EXPORT] User %s exported %d waybills to XLS",
@@ -15722,17 +14659,25 @@ def waybill_chunk_init(request, session_id):
     chunk_size = int(request.data.get("chunk_size", 0))
     total_chunks = int(request.data.get("total_chunks", 0))
 
-    if not filename or not total_size or not total_chunks:
-        return Response({"error": "filename, total_size, total_chunks required"}, status=400)
+    # chunk_size privalomas: chunk'ai rašomi poslinkiu index * chunk_size
+    if not filename or not total_size or not chunk_size or not total_chunks:
+        return Response({"error": "filename, total_size, chunk_size, total_chunks required"}, status=400)
 
-    upload = WaybillChunkedUpload.objects.create(
-        user=request.user,
-        session=session,
-        filename=filename,
-        total_size=total_size,
-        chunk_size=chunk_size,
-        total_chunks=total_chunks,
-    )
+    from .services.chunked_upload import ChunkUploadError, create_upload
+
+    try:
+        upload = create_upload(
+            WaybillChunkedUpload,
+            user=request.user,
+            session=session,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=total_chunks,
+            sha256=request.data.get("sha256"),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
     return Response({"upload_id": str(upload.id)}, status=201)
 
@@ -15751,22 +14696,16 @@ def waybill_chunk_upload(request, session_id, upload_id, index):
     if upload.status != "uploading":
         return Response({"error": "Upload is not active"}, status=400)
 
-    if not upload.tmp_path:
-        tmp_dir = os.path.join(settings.MEDIA_ROOT, "waybills_tmp", str(request.user.id))
-        os.makedirs(tmp_dir, exist_ok=True)
-        upload.tmp_path = os.path.join(tmp_dir, f"{upload.id}.part")
-
-    mode = "ab" if os.path.exists(upload.tmp_path) else "wb"
-    with open(upload.tmp_path, mode) as f:
-        f.write(request.body)
+    from .services.chunked_upload import CHUNK_HASH_HEADER, ChunkUploadError, write_chunk
 
-    received = upload.received or []
-    if index not in received:
-        received.append(index)
-    upload.received = received
-    upload.save(update_fields=["received", "tmp_path", "updated_at"])
+    try:
+        received = write_chunk(
+            upload, int(index), request.body or b"", request.META.get(CHUNK_HASH_HEADER, ""),
+        )
+    except ChunkUploadError as e:
+        return Response({"error": str(e)}, status=400)
 
-    return Response({"received": len(received), "total_chunks": upload.total_chunks})
+    return Response({"received": received, "total_chunks": upload.total_chunks})
 
 
 @api_view(["POST"])
@@ -15780,50 +14719,7 @@ def waybill_chunk_complete(request, session_id, upload_id):
     except WaybillChunkedUpload.DoesNotExist:
         return Response({"error": "Upload not found"}, status=404)
 
-    received = upload.received or []
-    if len(received) < upload.total_chunks:
-        return Response({"error": f"Not all chunks: {len(received)}/{upload.total_chunks}"}, status=400)
-
-    if not upload.tmp_path or not os.path.exists(upload.tmp_path):
-        return Response({"error": "Temp file not found"}, status=400)
-
-    try:
-        session = upload.session
-        doc = ScannedWaybill(
-            user=request.user,
-            original_filename=upload.filename,
-            status="pending",
-            upload_session=session,
-            uploaded_size_bytes=upload.total_size,
-        )
-
-        from django.core.files.base import ContentFile
-        with open(upload.tmp_path, 'rb') as f:
-            doc.file.save(upload.filename, ContentFile(f.read()), save=False)
-        doc.save()
-
-        WaybillUploadSession.objects.filter(id=session.id).update(
-            uploaded_files=F("uploaded_files") + 1,
-            uploaded_bytes=F("uploaded_bytes") + upload.total_size,
-            expected_items=F("expected_items") + 1,
-        )
-
-        upload.status = "complete"
-        upload.save(update_fields=["status", "updated_at"])
-
-        try:
-            os.remove(upload.tmp_path)
-        except Exception:
-            pass
-
-        return Response({"doc_id": doc.id, "status": "complete"})
-
-    except Exception as e:
-        logger.exception("[WAYBILL-UPLOAD] Chunk complete failed: %s", e)
-        upload.status = "failed"
-        upload.error_message = str(e)
-        upload.save(update_fields=["status", "error_message", "updated_at"])
-        return Response({"error": str(e)}, status=500)
+    return _complete_waybill_chunked_upload(request, upload)
 
 
 @api_view(["GET"])
@@ -15840,7 +14736,7 @@ def waybill_chunk_status(request, session_id, upload_id):
     return Response({
         "upload_id": str(upload.id),
         "status": upload.status,
-        "received": len(upload.received or []),
+        "received": upload.received_count,
         "total_chunks": upload.total_chunks,
     })
 
@@ -16381,53 +15277,19 @@ def compute_kor_balanced(document):
     return abs(d_total - k_total) <= tolerance
 
 
-def _next_free_number_int(user, company_profile_id, invoice_type, prefix, start_from):
-    """
-    Возвращает первое свободное числовое значение номера для серии
-    (prefix + invoice_type) в пределах профиля, начиная со start_from.
-    Сравнение числовое (padding-agnostic): document_number хранится строкой
-    с ведущими нулями, поэтому парсим в int.
-    """
-    from .models import Invoice
-
-    taken_raw = (
-        Invoice.objects
-        .filter(
-            user=user,
-            company_profile_id=company_profile_id,
-            document_series=prefix,
-            invoice_type=invoice_type,
-        )
-        .exclude(status="cancelled")
-        .values_list("document_number", flat=True)
-    )
-
-    taken = set()
-    for val in taken_raw:
-        try:
-            taken.add(int(str(val).strip()))
-        except (ValueError, TypeError):
-            continue  # нечисловые номера игнорируем
-
-    n = max(int(start_from), 1)
-    while n in taken:
-        n += 1
-    return n
-
-
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def transfer_to_accounting(request):
-    from .utils.journal_generators import derive_pardavimo, resolve_debeto_for_inventory
-    from decimal import Decimal, InvalidOperation
-    from django.utils import timezone
-    from .models import (
-        CompanyProfile,
-        ScannedDocument,
-        Purchase,
-        PurchaseLine,
-        Invoice,
-        InvoiceLineItem,
+    """
+    dry_run — planas (kas bus sukurta / praleista) be jokių pakeitimų.
+    Realus perkėlimas vykdo tą patį planą per AccountingTransferJob:
+    iki ACCOUNTING_TRANSFER_SYNC_LIMIT dokumentų — iškart request'e,
+    daugiau — Celery task'e (202 + job, progresas per transfer_job_status).
+    """
+    from .models import CompanyProfile
+    from .services.accounting_transfer_job import (
+        TransferContext, create_transfer_job, preview_transfer, run_transfer_job,
+        transfer_job_payload, transfer_sync_limit,
     )
 
     user = request.user
@@ -16449,6 +15311,14 @@ def transfer_to_accounting(request):
             status=400,
         )
 
+    try:
+        doc_ids = [int(i) for i in doc_ids]
+    except (TypeError, ValueError):
+        return Response(
+            {"detail": "Neteisingi dokumentų ID."},
+            status=400,
+        )
+
     try:
         profile = CompanyProfile.objects.get(
             id=company_profile_id,
@@ -16459,1155 +15329,66 @@ def transfer_to_accounting(request):
             {"detail": "Įmonės profilis nerastas."},
             status=404,
         )
-    
-    uses_inventory = bool(getattr(profile, "uses_inventory", False))
-    documents = (
-        ScannedDocument.objects
-        .filter(id__in=doc_ids, user=user)
-        .prefetch_related("line_items")
-    )
-
-    # ═══════════════════════════════════════════════════════
-    # Helpers: signs / amounts
-    # ═══════════════════════════════════════════════════════
-
-    def _dec(val, default=None):
-        if val is None or val == "":
-            return default
-
-        try:
-            return Decimal(str(val))
-        except (InvalidOperation, TypeError, ValueError):
-            return default
-
-    def _has_amount(val):
-        d = _dec(val)
-        return d is not None and abs(d) > Decimal("0.001")
-
-    def _signed_amount(val, is_credit):
-        """
-        Normalizuoja sumas:
-        - įprastai SF visada teigiama
-        - kreditinei SF visada neigiama
-        """
-        d = _dec(val)
-        if d is None:
-            return None
-
-        if d == 0:
-            return Decimal("0")
-
-        return -abs(d) if is_credit else abs(d)
-
-    def _signed_quantity(val, is_credit, default=1):
-        """
-        Normalizuoja kiekį:
-        - įprastai SF kiekis teigiamas
-        - kreditinei SF kiekis neigiamas
-        """
-        d = _dec(val, Decimal(str(default)))
-
-        if d is None:
-            return None
-
-        if d == 0:
-            return Decimal("0")
-
-        return -abs(d) if is_credit else abs(d)
-
-    def _positive_amount(val, default=None):
-        """
-        Kaina visada turi būti teigiama.
-        """
-        d = _dec(val, default)
-
-        if d is None:
-            return None
-
-        return abs(d)
-
-    def _line_price(price, subtotal, quantity):
-        """
-        Jeigu OCR davė price, imam abs(price).
-        Jeigu price nėra, bandom paskaičiuoti iš subtotal / quantity.
-        """
-        price_dec = _dec(price)
-
-        if price_dec is not None and price_dec != 0:
-            return abs(price_dec)
-
-        subtotal_abs = _positive_amount(subtotal)
-        quantity_abs = _positive_amount(quantity)
-
-        if subtotal_abs is not None and quantity_abs not in (None, Decimal("0")):
-            return subtotal_abs / quantity_abs
-
-        return subtotal_abs
-
-    def _mark_doc_transferred(doc):
-        doc.perkelta_i_apskaita = True
-        doc.perkelta_i_apskaita_at = timezone.now()
-        doc.perkelta_i_company_profile = profile
-        doc.save(update_fields=[
-            "perkelta_i_apskaita",
-            "perkelta_i_apskaita_at",
-            "perkelta_i_company_profile",
-        ])
-
-    # ═══════════════════════════════════════════════════════
-    # Company detection helpers
-    # ═══════════════════════════════════════════════════════
-
-    profile_ids = set()
-
-    if profile.company_code:
-        profile_ids.add(profile.company_code.strip().upper())
-
-    if profile.vat_code:
-        profile_ids.add(profile.vat_code.strip().upper())
-
-    profile_name_norm = (profile.name or "").strip().upper()
-
-    if profile_name_norm:
-        profile_ids.add(profile_name_norm)
-
-    def _ids_from_doc(id_val, vat_val, name_val):
-        s = set()
-
-        if id_val:
-            s.add(id_val.strip().upper())
-
-        if vat_val:
-            s.add(vat_val.strip().upper())
-
-        if name_val:
-            s.add(name_val.strip().upper())
-
-        return s
-
-    def _cp_key(id_val, vat_val, name_val):
-        id_str = (str(id_val) if id_val else "").strip()
-
-        if id_str:
-            return f"id:{id_str}"
-
-        norm_vat = (vat_val or "").strip().lower()
-
-        if norm_vat:
-            return norm_vat
-
-        return (name_val or "").strip().lower()
-
-    def _norm(value):
-        return (str(value) if value else "").strip().upper()
-
-
-    def _selected_role_for_doc(doc):
-        """
-        Grąžina, kuri dokumento pusė buvo pasirinkta kaip 'mano įmonė':
-        buyer / seller / None.
-        """
-        if not cp_key:
-            return None
-
-        seller_cp = _cp_key(
-            doc.seller_id,
-            doc.seller_vat_code,
-            doc.seller_name,
-        )
-
-        buyer_cp = _cp_key(
-            doc.buyer_id,
-            doc.buyer_vat_code,
-            doc.buyer_name,
-        )
-
-        if cp_key == seller_cp:
-            return "seller"
-
-        if cp_key == buyer_cp:
-            return "buyer"
-
-        return None
-
-
-    def _party_payload(doc, role):
-        prefix = "seller" if role == "seller" else "buyer"
-
-        return {
-            "role": "Pardavėjas" if role == "seller" else "Pirkėjas",
-            "name": getattr(doc, f"{prefix}_name", "") or "",
-            "code": getattr(doc, f"{prefix}_id", "") or "",
-            "vat": getattr(doc, f"{prefix}_vat_code", "") or "",
-        }
-
-
-    def _profile_payload():
-        return {
-            "name": profile.name or "",
-            "code": profile.company_code or "",
-            "vat": profile.vat_code or "",
-        }
-
-
-    def _clean_name(value):
-        s = _norm(value)
-
-        remove_parts = [
-            "UAB",
-            "AB",
-            "MB",
-            "VŠĮ",
-            "VSI",
-            "IĮ",
-            "II",
-            "INDIVIDUALI ĮMONĖ",
-            "INDIVIDUALI IMONE",
-        ]
-
-        for part in remove_parts:
-            s = s.replace(part, " ")
-
-        s = s.replace('"', " ").replace("'", " ").replace(",", " ").replace(".", " ")
-
-        return " ".join(s.split())
-
-
-    def _party_matches_profile(party):
-        profile_code = _norm(profile.company_code)
-        party_code = _norm(party.get("code"))
-
-        profile_vat = _norm(profile.vat_code)
-        party_vat = _norm(party.get("vat"))
-
-        # 1. Jeigu įmonės kodas sutampa — laikome match
-        if profile_code and party_code and profile_code == party_code:
-            return True
-
-        # 2. Jeigu PVM kodas sutampa — laikome match
-        if profile_vat and party_vat and profile_vat == party_vat:
-            return True
-
-        # 3. Jeigu abu kodai yra ir abu nesutampa — mismatch
-        strong_checks_exist = False
-
-        if profile_code and party_code:
-            strong_checks_exist = True
-
-        if profile_vat and party_vat:
-            strong_checks_exist = True
-
-        if strong_checks_exist:
-            return False
-
-        # 4. Jei kodų palyginti negalime, naudojame name fallback
-        profile_name = _clean_name(profile.name)
-        party_name = _clean_name(party.get("name"))
-
-        if profile_name and party_name:
-            return profile_name == party_name
-
-        # 5. Jei nėra pakankamai duomenų — nerodome mismatch
-        return True
-
-
-    def _company_mismatch_for_docs(doc_list):
-        mismatches = []
-
-        for d in doc_list:
-            role = _selected_role_for_doc(d)
-
-            if not role:
-                continue
-
-            party = _party_payload(d, role)
-
-            if not _party_matches_profile(party):
-                mismatches.append({
-                    "doc_id": d.id,
-                    "selected_company": party,
-                })
-
-        if not mismatches:
-            return None
-
-        first = mismatches[0]
-
-        return {
-            "selected_company": first["selected_company"],
-            "active_profile": _profile_payload(),
-            "affected_count": len(mismatches),
-        }
-
-
-    def _profile_field(*names):
-        for name in names:
-            value = getattr(profile, name, None)
-
-            if value not in (None, ""):
-                return value
-
-        return ""
-
-
-    def _apply_profile_party_to_doc_in_memory(doc, role):
-        """
-        Pakeičia pasirinktą dokumento pusę tik šiame request'e.
-        ScannedDocument DB įrašas nekeičiamas.
-        Pakeisti duomenys naudojami tik kuriant Purchase / Invoice.
-        """
-        prefix = "seller" if role == "seller" else "buyer"
-
-        model_fields = {f.name for f in doc._meta.fields}
-        updates = {}
-
-        updates[f"{prefix}_name"] = profile.name or ""
-        updates[f"{prefix}_id"] = profile.company_code or ""
-        updates[f"{prefix}_vat_code"] = profile.vat_code or ""
-        updates[f"{prefix}_name_normalized"] = _norm(profile.name)
-
-        optional_updates = {
-            f"{prefix}_address": _profile_field("address", "company_address"),
-            f"{prefix}_country": _profile_field("country", "company_country"),
-            f"{prefix}_country_iso": _profile_field("country_iso", "company_country_iso"),
-            f"{prefix}_iban": _profile_field("iban", "bank_iban", "bank_account"),
-            f"{prefix}_is_person": False,
-        }
-
-        for field, value in optional_updates.items():
-            if value not in (None, ""):
-                updates[field] = value
-
-        for field, value in updates.items():
-            if field in model_fields:
-                setattr(doc, field, value)
-
-        return updates
-
-    def detect_direction(doc):
-        seller_cp = _cp_key(
-            doc.seller_id,
-            doc.seller_vat_code,
-            doc.seller_name,
-        )
-
-        buyer_cp = _cp_key(
-            doc.buyer_id,
-            doc.buyer_vat_code,
-            doc.buyer_name,
-        )
-
-        # Multi mode: kryptis nustatoma pagal pasirinktą įmonę dokumente
-        if cp_key:
-            if cp_key == seller_cp:
-                return "pardavimas"
-
-            if cp_key == buyer_cp:
-                return "pirkimas"
-
-        # Fallback pagal aktyvų profilį
-        buyer_ids = _ids_from_doc(
-            doc.buyer_id,
-            doc.buyer_vat_code,
-            doc.buyer_name,
-        )
-
-        seller_ids = _ids_from_doc(
-            doc.seller_id,
-            doc.seller_vat_code,
-            doc.seller_name,
-        )
-
-        if profile_ids & buyer_ids:
-            return "pirkimas"
-
-        if profile_ids & seller_ids:
-            return "pardavimas"
-
-        return None
-
-    # ═══════════════════════════════════════════════════════
-    # Split docs
-    # ═══════════════════════════════════════════════════════
-
-    purchase_docs = []
-    sale_docs = []
-    skipped = []
-
-    for doc in documents:
-        direction = detect_direction(doc)
-
-        if direction == "pirkimas":
-            existing_purchase = Purchase.objects.filter(
-                scanned_document=doc,
-                company_profile=profile,
-            ).first()
-
-            if existing_purchase:
-                if not doc.perkelta_i_apskaita:
-                    _mark_doc_transferred(doc)
 
-                skipped.append({
-                    "id": doc.id,
-                    "reason": "Jau perkeltas į pirkimus",
-                })
-                continue
-
-            selected_role = _selected_role_for_doc(doc)
-
-            if replace_document_company and not dry_run and selected_role:
-                selected_party = _party_payload(doc, selected_role)
-
-                if not _party_matches_profile(selected_party):
-                    _apply_profile_party_to_doc_in_memory(doc, selected_role)
-
-            purchase_docs.append(doc)
-
-        elif direction == "pardavimas":
-            existing_invoice = Invoice.objects.filter(
-                scanned_document=doc,
-                company_profile=profile,
-            ).first()
-
-            if existing_invoice:
-                if not doc.perkelta_i_apskaita:
-                    _mark_doc_transferred(doc)
-
-                skipped.append({
-                    "id": doc.id,
-                    "reason": "Jau perkeltas į pardavimus",
-                })
-                continue
-
-            selected_role = _selected_role_for_doc(doc)
-
-            if replace_document_company and not dry_run and selected_role:
-                selected_party = _party_payload(doc, selected_role)
-
-                if not _party_matches_profile(selected_party):
-                    _apply_profile_party_to_doc_in_memory(doc, selected_role)
-
-            sale_docs.append(doc)
-
-        else:
-            skipped.append({
-                "id": doc.id,
-                "filename": doc.original_filename,
-                "reason": "Nepavyko nustatyti krypties",
-            })
-
-    # ═══════════════════════════════════════════════════════
-    # Dry run
-    # ═══════════════════════════════════════════════════════
-
-    company_mismatch = _company_mismatch_for_docs(
-        purchase_docs + sale_docs
+    ctx = TransferContext(
+        user,
+        profile,
+        cp_key=cp_key,
+        replace_document_company=replace_document_company,
     )
 
     if dry_run:
-        return Response({
-            "company_name": profile.name,
-            "purchase_count": len(purchase_docs),
-            "sale_count": len(sale_docs),
-            "skipped": skipped,
-            "company_mismatch": company_mismatch,
-        })
-
-    # ═══════════════════════════════════════════════════════
-    # Create purchases
-    # ═══════════════════════════════════════════════════════
+        return Response(preview_transfer(ctx, doc_ids))
 
-    created_purchases = []
+    job = create_transfer_job(ctx, doc_ids)
 
-    for doc in purchase_docs:
-        is_credit = bool(doc.is_credit_invoice)
-
-        doc_pvm_kodas = auto_select_pvm_code(
-            pirkimas_pardavimas="pirkimas",
-            buyer_country_iso=doc.buyer_country_iso,
-            seller_country_iso=doc.seller_country_iso,
-            preke_paslauga=doc.preke_paslauga,
-            vat_percent=(
-                float(doc.vat_percent)
-                if doc.vat_percent is not None
-                else None
-            ),
-            separate_vat=bool(doc.separate_vat),
-            buyer_has_vat_code=bool(doc.buyer_vat_code),
-            seller_has_vat_code=bool(doc.seller_vat_code),
-            doc_96_str=bool(getattr(doc, "doc_96_str", False)),
-        )
-
-        purchase = Purchase.objects.create(
-            user=user,
-            company_profile=profile,
-            scanned_document=doc,
-            status="new",
-
-            # Korespondencijos
-            debeto_saskaita=resolve_debeto_for_inventory(
-                doc.pirkimo_saskaita,
-                uses_inventory=uses_inventory,
-            ) or "6312",
-            kredito_saskaita="4430",
-            pvm_saskaita="2441" if _has_amount(doc.vat_amount) else None,
-
-            period=doc.invoice_date.replace(day=1) if doc.invoice_date else None,
-
-            # Dokumento duomenys
-            document_type=doc.document_type,
-            is_credit_invoice=doc.is_credit_invoice,
-            is_debit_invoice=doc.is_debit_invoice,
-            document_series=doc.document_series,
-            document_number=doc.document_number,
-            invoice_date=doc.invoice_date,
-            due_date=doc.due_date,
-            operation_date=doc.operation_date,
-
-            # Seller / tiekėjas
-            seller_name=doc.seller_name,
-            seller_id=doc.seller_id,
-            seller_vat_code=doc.seller_vat_code,
-            seller_address=doc.seller_address,
-            seller_country=doc.seller_country,
-            seller_country_iso=doc.seller_country_iso,
-            seller_iban=doc.seller_iban,
-            seller_is_person=doc.seller_is_person,
-            seller_vat_val=getattr(doc, "seller_vat_val", None),
-
-            # Buyer / mes
-            buyer_name=doc.buyer_name,
-            buyer_id=doc.buyer_id,
-            buyer_vat_code=doc.buyer_vat_code,
-            buyer_address=doc.buyer_address,
-            buyer_country=doc.buyer_country,
-            buyer_country_iso=doc.buyer_country_iso,
-            buyer_iban=doc.buyer_iban,
-            buyer_is_person=doc.buyer_is_person,
-
-            # Sumos
-            currency=doc.currency or "EUR",
-            amount_wo_vat=_signed_amount(doc.amount_wo_vat, is_credit),
-            vat_amount=_signed_amount(doc.vat_amount, is_credit),
-            vat_percent=doc.vat_percent,
-            amount_with_vat=_signed_amount(doc.amount_with_vat, is_credit),
-            invoice_discount_with_vat=_signed_amount(
-                doc.invoice_discount_with_vat,
-                is_credit,
-            ),
-            invoice_discount_wo_vat=_signed_amount(
-                doc.invoice_discount_wo_vat,
-                is_credit,
-            ),
-            separate_vat=doc.separate_vat,
-            doc_96_str=doc.doc_96_str,
-
-            # iSAF / klasifikatoriai
-            pirkimas_pardavimas="pirkimas",
-            report_to_isaf=doc.report_to_isaf,
-            document_type_code=doc.document_type_code or "",
-            pvm_kodas=doc_pvm_kodas or "",
-
-            # Prekė / sumiškai
-            prekes_kodas=doc.prekes_kodas,
-            prekes_pavadinimas=doc.prekes_pavadinimas,
-            preke_paslauga=doc.preke_paslauga,
-
-            # Meta
-            scan_type=doc.scan_type,
-            order_number=doc.order_number,
-            paid_by_cash=doc.paid_by_cash,
-            is_long_term_asset_candidate=doc.is_long_term_asset_candidate,
-            suggested_asset_type=doc.suggested_asset_type or "",
-        )
-
-        purchase_lines = []
-        source_lines = list(doc.line_items.all())
-
-        if source_lines:
-            for i, li in enumerate(source_lines):
-                li_vat_pct = (
-                    float(li.vat_percent)
-                    if li.vat_percent is not None
-                    else (
-                        float(doc.vat_percent)
-                        if doc.vat_percent is not None
-                        else None
-                    )
-                )
-
-                li_preke_paslauga = (
-                    li.preke_paslauga
-                    or doc.preke_paslauga
-                )
-
-                li_pvm_kodas = auto_select_pvm_code(
-                    pirkimas_pardavimas="pirkimas",
-                    buyer_country_iso=doc.buyer_country_iso,
-                    seller_country_iso=doc.seller_country_iso,
-                    preke_paslauga=li_preke_paslauga,
-                    vat_percent=li_vat_pct,
-                    separate_vat=False,
-                    buyer_has_vat_code=bool(doc.buyer_vat_code),
-                    seller_has_vat_code=bool(doc.seller_vat_code),
-                    doc_96_str=bool(getattr(doc, "doc_96_str", False)),
-                )
-
-                raw_quantity = (
-                    li.quantity
-                    if li.quantity is not None
-                    else 1
-                )
-
-                purchase_lines.append(
-                    PurchaseLine(
-                        purchase=purchase,
-
-                        prekes_kodas=li.prekes_kodas or doc.prekes_kodas or "",
-                        prekes_barkodas=li.prekes_barkodas or "",
-                        prekes_pavadinimas=(
-                            li.prekes_pavadinimas
-                            or doc.prekes_pavadinimas
-                            or "Prekės / paslaugos"
-                        ),
-                        preke_paslauga=li_preke_paslauga or "",
-
-                        unit=li.unit or "vnt.",
-
-                        # Kreditinei kiekis neigiamas, kaina teigiama
-                        quantity=_signed_quantity(raw_quantity, is_credit),
-                        price=_line_price(
-                            li.price,
-                            li.subtotal,
-                            raw_quantity,
-                        ),
-
-                        subtotal=_signed_amount(li.subtotal, is_credit),
-                        vat=_signed_amount(li.vat, is_credit),
-                        vat_percent=(
-                            li.vat_percent
-                            if li.vat_percent is not None
-                            else doc.vat_percent
-                        ),
-                        total=_signed_amount(li.total, is_credit),
-
-                        discount_with_vat=_signed_amount(
-                            li.discount_with_vat,
-                            is_credit,
-                        ),
-                        discount_wo_vat=_signed_amount(
-                            li.discount_wo_vat,
-                            is_credit,
-                        ),
-
-                        pvm_kodas=li_pvm_kodas or "",
-                        debeto_saskaita=resolve_debeto_for_inventory(
-                            li.pirkimo_saskaita,
-                            uses_inventory=uses_inventory,
-                        ) or None,
-                        sort_order=i,
-                    )
-                )
-
-        else:
-            fallback_name = (
-                doc.prekes_pavadinimas
-                or doc.original_filename
-                or "Prekės / paslaugos"
-            )
-
-            fallback_subtotal = _signed_amount(doc.amount_wo_vat, is_credit)
-            fallback_vat = _signed_amount(doc.vat_amount, is_credit)
-            fallback_total = _signed_amount(doc.amount_with_vat, is_credit)
-
-            purchase_lines.append(
-                PurchaseLine(
-                    purchase=purchase,
-
-                    prekes_kodas=doc.prekes_kodas or "",
-                    prekes_barkodas="",
-                    prekes_pavadinimas=fallback_name,
-                    preke_paslauga=doc.preke_paslauga or "",
-
-                    unit="vnt.",
-
-                    # Sumiškai:
-                    # įprasta SF:  1 x 100 = 100
-                    # kreditinė:  -1 x 100 = -100
-                    quantity=_signed_quantity(1, is_credit),
-                    price=_positive_amount(doc.amount_wo_vat),
-
-                    subtotal=fallback_subtotal,
-                    vat=fallback_vat,
-                    vat_percent=doc.vat_percent,
-                    total=fallback_total,
-
-                    discount_with_vat=_signed_amount(
-                        doc.invoice_discount_with_vat,
-                        is_credit,
-                    ),
-                    discount_wo_vat=_signed_amount(
-                        doc.invoice_discount_wo_vat,
-                        is_credit,
-                    ),
-
-                    pvm_kodas=doc_pvm_kodas or "",
-                    debeto_saskaita=resolve_debeto_for_inventory(
-                        doc.pirkimo_saskaita,
-                        uses_inventory=uses_inventory,
-                    ) or None,
-                    sort_order=0,
-                )
-            )
-
-        if purchase_lines:
-            PurchaseLine.objects.bulk_create(purchase_lines)
-
-        purchase.ready_for_export = check_required_fields_for_export(purchase)
-
-        is_math_valid, _ = validate_document_math_for_export(purchase)
-        purchase.math_validation_passed = is_math_valid
-
-        purchase.kor_balanced = compute_kor_balanced(purchase)
-
-        purchase.save(update_fields=[
-            "ready_for_export",
-            "math_validation_passed",
-            "kor_balanced",
-        ])
-
-        try:
-            from .utils.journal_generators import sync_purchase_journal_entry
-
-            sync_purchase_journal_entry(purchase)
-        except Exception as e:
-            logger.warning(
-                "[Transfer] sync_purchase_journal_entry failed for %s: %s",
-                purchase.id,
-                e,
-            )
-
-        try:
-            from .utils.payment_invoice_matching import match_purchase_on_transfer
-
-            alloc = match_purchase_on_transfer(purchase)
-
-            if alloc:
-                logger.info(
-                    "[Transfer] Purchase %s auto-matched to bank txn, amount=%s",
-                    purchase.id,
-                    alloc.amount,
-                )
-        except Exception as e:
-            logger.warning(
-                "[Transfer] match_purchase_on_transfer failed: %s",
-                e,
-            )
-
-        created_purchases.append(purchase.id)
-        _mark_doc_transferred(doc)
-
-    # ═══════════════════════════════════════════════════════
-    # Create sales / pardavimai
-    # ═══════════════════════════════════════════════════════
-
-    created_sales = []
-
-    for doc in sale_docs:
-        if not doc.document_number:
-            skipped.append({
-                "id": doc.id,
-                "filename": doc.original_filename,
-                "reason": "Trūksta dokumento numerio",
-            })
-            continue
-
-        dup_qs = (
-            Invoice.objects
-            .filter(
-                user=user,
-                company_profile=profile,
-                document_series=doc.document_series or "",
-                document_number=doc.document_number,
-            )
-            .exclude(status="cancelled")
-        )
-
-        if dup_qs.exists():
-            _hint_type = "kreditine" if bool(doc.is_credit_invoice) else (
-                "pvm_saskaita"
-                if (_has_amount(doc.vat_amount) or doc.separate_vat)
-                else "saskaita"
-            )
-            try:
-                _start = int(str(doc.document_number).strip())
-            except (ValueError, TypeError):
-                _start = 1
-
-            _free_int = _next_free_number_int(
-                user, profile.id, _hint_type,
-                doc.document_series or "", _start,
-            )
-
-            skipped.append({
-                "id": doc.id,
-                "filename": doc.original_filename,
-                "reason": (
-                    f"Dokumentas {doc.document_series or ''}-{doc.document_number} "
-                    f"jau yra apskaitoje. Laisvas numeris šioje serijoje: "
-                    f"{doc.document_series or ''}-{_free_int}"
-                ),
-            })
-            continue
-
-        with transaction.atomic():
-            is_credit = bool(doc.is_credit_invoice)
-
-            if is_credit:
-                inv_type = "kreditine"
-            elif _has_amount(doc.vat_amount):
-                inv_type = "pvm_saskaita"
-            elif doc.separate_vat:
-                inv_type = "pvm_saskaita"
-            else:
-                inv_type = "saskaita"
-
-            doc_pvm_kodas = auto_select_pvm_code(
-                pirkimas_pardavimas="pardavimas",
-                buyer_country_iso=doc.buyer_country_iso,
-                seller_country_iso=doc.seller_country_iso,
-                preke_paslauga=doc.preke_paslauga,
-                vat_percent=(
-                    float(doc.vat_percent)
-                    if doc.vat_percent is not None
-                    else None
-                ),
-                separate_vat=bool(doc.separate_vat),
-                buyer_has_vat_code=bool(doc.buyer_vat_code),
-                seller_has_vat_code=bool(doc.seller_vat_code),
-                doc_96_str=bool(getattr(doc, "doc_96_str", False)),
-            )
-
-            # Pardavimo korespondencijos
-            debit_account = "2410"  # Pirkėjų skolos
-
-            credit_account = (
-                getattr(doc, "pardavimo_saskaita", None)
-                or derive_pardavimo(
-                    getattr(doc, "pirkimo_saskaita", None),
-                    traded_type=getattr(doc, "traded_type", None),
-                )
-            )
-
-            pvm_account = "4492" if _has_amount(doc.vat_amount) else None
-
-            entry_date = doc.invoice_date
-            period = entry_date.replace(day=1) if entry_date else None
-
-            invoice = Invoice.objects.create(
-                user=user,
-                company_profile=profile,
-                scanned_document=doc,
-                invoice_type=inv_type,
-                status="issued",
-
-                # Numeracija
-                document_series=doc.document_series or "",
-                document_number=doc.document_number or "",
-
-                # Datos
-                invoice_date=doc.invoice_date,
-                due_date=doc.due_date,
-                operation_date=doc.operation_date,
-
-                # Korespondencijos
-                debeto_saskaita=debit_account,
-                kredito_saskaita=credit_account,
-                pvm_saskaita=pvm_account,
-                period=period,
-
-                # Seller / mes
-                seller_name=doc.seller_name or "",
-                seller_name_normalized=(doc.seller_name or "").strip().upper(),
-                seller_id=doc.seller_id or "",
-                seller_vat_code=doc.seller_vat_code or "",
-                seller_address=doc.seller_address or "",
-                seller_country=doc.seller_country or "",
-                seller_country_iso=doc.seller_country_iso or "",
-                seller_iban=doc.seller_iban or "",
-                seller_is_person=doc.seller_is_person,
-
-                # Buyer / pirkėjas
-                buyer_name=doc.buyer_name or "",
-                buyer_name_normalized=(doc.buyer_name or "").strip().upper(),
-                buyer_id=doc.buyer_id or "",
-                buyer_vat_code=doc.buyer_vat_code or "",
-                buyer_address=doc.buyer_address or "",
-                buyer_country=doc.buyer_country or "",
-                buyer_country_iso=doc.buyer_country_iso or "",
-                buyer_iban=doc.buyer_iban or "",
-                buyer_is_person=doc.buyer_is_person,
-
-                # Sumos
-                currency=doc.currency or "EUR",
-                pvm_tipas=(
-                    "taikoma"
-                    if inv_type in ("pvm_saskaita", "kreditine")
-                    else "netaikoma"
-                ),
-                vat_percent=doc.vat_percent,
-
-                amount_wo_vat=_signed_amount(doc.amount_wo_vat, is_credit),
-                vat_amount=_signed_amount(doc.vat_amount, is_credit),
-                amount_with_vat=_signed_amount(doc.amount_with_vat, is_credit),
-
-                invoice_discount_with_vat=_signed_amount(
-                    doc.invoice_discount_with_vat,
-                    is_credit,
-                ),
-                invoice_discount_wo_vat=_signed_amount(
-                    doc.invoice_discount_wo_vat,
-                    is_credit,
-                ),
-
-                separate_vat=doc.separate_vat,
-                doc_96_str=doc.doc_96_str,
-
-                # iSAF
-                pirkimas_pardavimas="pardavimas",
-                report_to_isaf=doc.report_to_isaf,
-                document_type_code=doc.document_type_code or "",
-                document_type=doc.document_type or "",
-                pvm_kodas=doc_pvm_kodas or "",
-
-                # Prekė / sumiškai
-                prekes_kodas=doc.prekes_kodas or "",
-                prekes_pavadinimas=doc.prekes_pavadinimas or "",
-                preke_paslauga=doc.preke_paslauga or "",
-
-                # Meta
-                public_link_enabled=False,
-            )
-
-            invoice_lines = []
-            source_lines = list(doc.line_items.all())
-
-            if source_lines:
-                for i, li in enumerate(source_lines):
-                    li_vat_pct = (
-                        float(li.vat_percent)
-                        if li.vat_percent is not None
-                        else (
-                            float(doc.vat_percent)
-                            if doc.vat_percent is not None
-                            else None
-                        )
-                    )
-
-                    li_preke_paslauga = (
-                        li.preke_paslauga
-                        or doc.preke_paslauga
-                    )
-
-                    li_pvm_kodas = auto_select_pvm_code(
-                        pirkimas_pardavimas="pardavimas",
-                        buyer_country_iso=doc.buyer_country_iso,
-                        seller_country_iso=doc.seller_country_iso,
-                        preke_paslauga=li_preke_paslauga,
-                        vat_percent=li_vat_pct,
-                        separate_vat=False,
-                        buyer_has_vat_code=bool(doc.buyer_vat_code),
-                        seller_has_vat_code=bool(doc.seller_vat_code),
-                        doc_96_str=bool(getattr(doc, "doc_96_str", False)),
-                    )
-
-                    raw_quantity = (
-                        li.quantity
-                        if li.quantity is not None
-                        else 1
-                    )
-
-                    invoice_lines.append(
-                        InvoiceLineItem(
-                            invoice=invoice,
-
-                            prekes_kodas=li.prekes_kodas or doc.prekes_kodas or "",
-                            prekes_barkodas=li.prekes_barkodas or "",
-                            prekes_pavadinimas=(
-                                li.prekes_pavadinimas
-                                or doc.prekes_pavadinimas
-                                or "Prekės / paslaugos"
-                            ),
-                            preke_paslauga=li_preke_paslauga or "",
-
-                            unit=li.unit or "vnt.",
-
-                            # Kreditinei kiekis neigiamas, kaina teigiama
-                            quantity=_signed_quantity(raw_quantity, is_credit),
-                            price=_line_price(
-                                li.price,
-                                li.subtotal,
-                                raw_quantity,
-                            ),
-
-                            subtotal=_signed_amount(li.subtotal, is_credit),
-                            vat=_signed_amount(li.vat, is_credit),
-                            vat_percent=(
-                                li.vat_percent
-                                if li.vat_percent is not None
-                                else doc.vat_percent
-                            ),
-                            total=_signed_amount(li.total, is_credit),
-
-                            discount_with_vat=_signed_amount(
-                                li.discount_with_vat,
-                                is_credit,
-                            ),
-                            discount_wo_vat=_signed_amount(
-                                li.discount_wo_vat,
-                                is_credit,
-                            ),
-
-                            pvm_kodas=li_pvm_kodas or "",
-
-                            # Korespondencijos line-level
-                            pirkimo_saskaita=li.pirkimo_saskaita or None,
-                            kredito_saskaita=(
-                                li.pardavimo_saskaita
-                                or derive_pardavimo(
-                                    li.pirkimo_saskaita,
-                                    preke_paslauga=li_preke_paslauga,
-                                    traded_type=getattr(doc, "traded_type", None),
-                                )
-                            ),
-                            pvm_saskaita=pvm_account,
-
-                            sort_order=i,
-                        )
-                    )
-
-            else:
-                fallback_name = (
-                    doc.prekes_pavadinimas
-                    or doc.original_filename
-                    or "Prekės / paslaugos"
-                )
-
-                fallback_subtotal = _signed_amount(doc.amount_wo_vat, is_credit)
-                fallback_vat = _signed_amount(doc.vat_amount, is_credit)
-                fallback_total = _signed_amount(doc.amount_with_vat, is_credit)
-
-                invoice_lines.append(
-                    InvoiceLineItem(
-                        invoice=invoice,
-
-                        prekes_kodas=doc.prekes_kodas or "",
-                        prekes_barkodas="",
-                        prekes_pavadinimas=fallback_name,
-                        preke_paslauga=doc.preke_paslauga or "",
-
-                        unit="vnt.",
-
-                        # Sumiškai:
-                        # įprasta SF:  1 x 100 = 100
-                        # kreditinė:  -1 x 100 = -100
-                        quantity=_signed_quantity(1, is_credit),
-                        price=_positive_amount(doc.amount_wo_vat),
-
-                        subtotal=fallback_subtotal,
-                        vat=fallback_vat,
-                        vat_percent=doc.vat_percent,
-                        total=fallback_total,
-
-                        discount_with_vat=_signed_amount(
-                            doc.invoice_discount_with_vat,
-                            is_credit,
-                        ),
-                        discount_wo_vat=_signed_amount(
-                            doc.invoice_discount_wo_vat,
-                            is_credit,
-                        ),
-
-                        pvm_kodas=doc_pvm_kodas or "",
-
-                        pirkimo_saskaita=doc.pirkimo_saskaita or None,
-                        kredito_saskaita=credit_account,
-                        pvm_saskaita=pvm_account,
-
-                        sort_order=0,
-                    )
-                )
-
-            if invoice_lines:
-                InvoiceLineItem.objects.bulk_create(invoice_lines)
-
-            invoice.ready_for_export = check_required_fields_for_export(invoice)
-
-            is_math_valid, _ = validate_document_math_for_export(invoice)
-            invoice.math_validation_passed = is_math_valid
-
-            invoice.kor_balanced = compute_kor_balanced(invoice)
-
-            invoice.save(update_fields=[
-                "ready_for_export",
-                "math_validation_passed",
-                "kor_balanced",
-            ])
+    if job.total_documents <= transfer_sync_limit():
+        job = run_transfer_job(job.pk)
+        payload = transfer_job_payload(job)
+        return Response({
+            "job_id": job.pk,
+            "stage": job.stage,
+            "created_purchases": payload["created_purchases"],
+            "created_sales": payload["created_sales"],
+            "skipped": payload["skipped"],
+        })
 
-            try:
-                from .utils.journal_generators import sync_invoice_journal_entry
+    from .tasks import accounting_transfer_task
 
-                sync_invoice_journal_entry(invoice)
-            except Exception as e:
-                logger.warning(
-                    "[Transfer] sync_invoice_journal_entry failed for %s: %s",
-                    invoice.id,
-                    e,
-                )
-            try:
-                from .utils.payment_invoice_matching import match_invoice_on_transfer
+    task = accounting_transfer_task.delay(job.pk)
+    job.task_id = task.id or ""
+    job.save(update_fields=["task_id"])
 
-                alloc = match_invoice_on_transfer(invoice)
+    return Response(transfer_job_payload(job), status=status.HTTP_202_ACCEPTED)
 
-                if alloc:
-                    logger.info(
-                        "[Transfer] Invoice %s auto-matched to bank txn, amount=%s",
-                        invoice.id,
-                        alloc.amount,
-                    )
-            except Exception as e:
-                logger.warning(
-                    "[Transfer] match_invoice_on_transfer failed: %s",
-                    e,
-                )
 
-            # ── Вариант 1: подтянуть счётчик серии за перенесённым номером ──
-            try:
-                transferred_int = int(str(invoice.document_number).strip())
-            except (ValueError, TypeError):
-                transferred_int = None
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def transfer_job_status(request, job_id):
+    """
+    Perkėlimo progresas. Jei job'as užstrigo (worker'is nutrūko) ilgiau nei
+    ACCOUNTING_TRANSFER_STALE_SECONDS — pratęsiamas nuo paskutinio chunk'o.
+    """
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.utils import timezone
+    from .models import AccountingTransferJob
+    from .services.accounting_transfer_job import transfer_job_payload
 
-            if transferred_int is not None:
-                series_to_bump = InvoiceSeries.objects.select_for_update().filter(
-                    user=user,
-                    company_profile=profile,
-                    prefix=invoice.document_series,
-                    invoice_type=inv_type,
-                    is_active=True,
-                ).first()
+    job = AccountingTransferJob.objects.filter(pk=job_id, user=request.user).first()
+    if not job:
+        return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-                if series_to_bump and transferred_int >= series_to_bump.next_number:
-                    series_to_bump.next_number = transferred_int + 1
-                    series_to_bump.save(update_fields=["next_number"])
+    stale_after = getattr(settings, "ACCOUNTING_TRANSFER_STALE_SECONDS", 600)
+    is_active = job.stage in (AccountingTransferJob.Stage.QUEUED, AccountingTransferJob.Stage.PROCESSING)
+    if is_active and job.updated_at < timezone.now() - timedelta(seconds=stale_after):
+        if cache.add(f"accounting_transfer_resume:{job.pk}", 1, timeout=stale_after):
+            from .tasks import accounting_transfer_task
 
-            created_sales.append(invoice.id)
-            _mark_doc_transferred(doc)
+            logger.warning("[Transfer] job=%s stale since %s, resuming", job.pk, job.updated_at)
+            accounting_transfer_task.delay(job.pk)
 
-    return Response({
-        "created_purchases": created_purchases,
-        "created_sales": created_sales,
-        "skipped": skipped,
-    })
+    return Response(transfer_job_payload(job))
 
 
 @api_view(["PATCH"])
@@ -17894,7 +15675,7 @@ class PurchaseLineItemsListView(APIView):
 # ═══════════════════════════════════════════════════════════
 # DK
 # ═══════════════════════════════════════════════════════════
-from django.db.models import Sum, Q, F, DecimalField, Count, Max, ExpressionWrapper, Value
+from django.db.models import Sum, Q, F, Count
 from django.db.models.functions import Coalesce
 from decimal import Decimal
 from datetime import date
@@ -17928,158 +15709,66 @@ def _parse_period(period_str):
 # TAB 1: SKOLOS — кто кому должен
 # ═══════════════════════════════════════════════════════════
 
+def _parse_as_of(value):
+    """'2026-07-31' → date; tuščia / neteisinga → šiandien."""
+    if value:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    return timezone.localdate()
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def apskaita_skolos(request):
     """
-    Skolos pagal kontrahentus.
+    Skolos pagal kontrahentus datai as_of (services/debts_ledger.py).
 
-    GET /apskaita/skolos/?type=customer&limit=25&offset=0&search=abc&as_of=2026-07-31
-    GET /apskaita/skolos/?type=supplier&limit=25&offset=0&search=abc&as_of=2026-07-31
+    GET /apskaita/skolos/?type=customer&limit=25&search=abc&as_of=2026-07-31
+    GET /apskaita/skolos/?type=supplier&limit=25&cursor=<next_cursor>
 
-    Возвращает только открытые долги:
-    balance = amount_with_vat - paid_amount > 0
+    Likutis = amount_with_vat − alokacijos su mokėjimo data <= as_of (> 0).
+    Senėjimas: aging 0_30 / 31_60 / 61_90 / 90_plus. Keyset puslapiavimas:
+    next_cursor → cursor. summary grąžinamas tik pirmam puslapiui.
     """
+    from .services.debts_ledger import DEBT_TYPES, decode_cursor, ledger_page
+
     profile = _get_active_profile(request)
     if not profile:
         return Response({"detail": "Nepasirinktas įmonės profilis."}, status=400)
 
     debt_type = request.query_params.get("type", "customer")
-    if debt_type not in ["customer", "supplier"]:
+    if debt_type not in DEBT_TYPES:
         return Response(
             {"detail": "Netinkamas skolos tipas. Naudokite customer arba supplier."},
             status=400,
         )
 
     search = request.query_params.get("search", "").strip()
-    as_of = request.query_params.get("as_of")
+    as_of_date = _parse_as_of(request.query_params.get("as_of"))
 
     try:
         limit = int(request.query_params.get("limit", 25))
     except ValueError:
         limit = 25
-
-    try:
-        offset = int(request.query_params.get("offset", 0))
-    except ValueError:
-        offset = 0
-
     limit = max(1, min(limit, 100))
-    offset = max(0, offset)
-
-    as_of_date = None
-    if as_of:
-        try:
-            year, month, day = as_of.split("-")
-            as_of_date = date(int(year), int(month), int(day))
-        except (ValueError, AttributeError):
-            as_of_date = None
-
-    money_field = DecimalField(max_digits=14, decimal_places=4)
-    zero = Value(Decimal("0.00"), output_field=money_field)
-
-    open_balance_expr = ExpressionWrapper(
-        Coalesce(F("amount_with_vat"), zero) - Coalesce(F("paid_amount"), zero),
-        output_field=money_field,
-    )
-
-    if debt_type == "customer":
-        qs = Invoice.objects.filter(company_profile=profile)
-
-        date_field = "invoice_date"
-        name_field = "buyer_name"
-        code_field = "buyer_id"
-        counterparty_type = "pirkejas"
-
-        if as_of_date:
-            qs = qs.filter(invoice_date__lte=as_of_date)
-
-        if search:
-            qs = qs.filter(
-                Q(buyer_name__icontains=search) |
-                Q(buyer_id__icontains=search)
-            )
-
-    else:
-        qs = Purchase.objects.filter(company_profile=profile)
-
-        date_field = "invoice_date"
-        name_field = "seller_name"
-        code_field = "seller_id"
-        counterparty_type = "tiekejas"
-
-        if as_of_date:
-            qs = qs.filter(invoice_date__lte=as_of_date)
-
-        if search:
-            qs = qs.filter(
-                Q(seller_name__icontains=search) |
-                Q(seller_id__icontains=search)
-            )
-
-    # Берём только открытые invoices/purchases
-    qs = qs.annotate(open_balance=open_balance_expr).filter(
-        open_balance__gt=Decimal("0.009")
-    )
-
-    grouped = (
-        qs.values(name_field, code_field)
-        .annotate(
-            total_invoiced=Coalesce(Sum("amount_with_vat"), Decimal("0")),
-            total_paid=Coalesce(Sum("paid_amount"), Decimal("0")),
-            balance=Coalesce(Sum("open_balance"), Decimal("0")),
-            invoice_count=Count("id"),
-            newest_invoice_date=Max(date_field),
-        )
-    )
-
-    rows = []
-    total_balance = Decimal("0.00")
 
-    for row in grouped:
-        balance = row["balance"] or Decimal("0")
-        if balance <= Decimal("0.009"):
-            continue
-
-        paid = row["total_paid"] or Decimal("0")
-        payment_status = "partially_paid" if paid > 0 else "unpaid"
-
-        newest_date = row["newest_invoice_date"]
-
-        total_balance += balance
+    raw_cursor = request.query_params.get("cursor")
+    cursor = decode_cursor(raw_cursor)
+    if raw_cursor and cursor is None:
+        return Response({"detail": "Neteisingas cursor."}, status=400)
 
-        rows.append({
-            "counterparty_name": row.get(name_field) or "",
-            "counterparty_code": row.get(code_field) or "",
-            "counterparty_type": counterparty_type,
-            "total_invoiced": str(row["total_invoiced"] or Decimal("0")),
-            "total_paid": str(paid),
-            "balance": str(balance),
-            "invoice_count": row["invoice_count"] or 0,
-            "newest_invoice_date": newest_date.isoformat() if newest_date else None,
-            "payment_status": payment_status,
-        })
-
-    rows.sort(
-        key=lambda x: x["newest_invoice_date"] or "",
-        reverse=True,
+    page = ledger_page(
+        profile, debt_type, as_of_date,
+        search=search, cursor=cursor, limit=limit, with_summary=cursor is None,
     )
 
-    total_count = len(rows)
-    paginated = rows[offset:offset + limit]
-    next_offset = offset + limit
-
     return Response({
         "type": debt_type,
-        "results": paginated,
-        "total_count": total_count,
+        "as_of": as_of_date.isoformat(),
         "limit": limit,
-        "offset": offset,
-        "has_more": next_offset < total_count,
-        "next_offset": next_offset if next_offset < total_count else None,
-        "summary": {
-            "total_balance": str(total_balance),
-        },
+        **page,
     })
 
 
@@ -18102,17 +15791,19 @@ def _get_document_number(obj):
 @permission_classes([IsAuthenticated])
 def apskaita_skolos_invoices(request):
     """
-    Возвращает открытые sąskaitos выбранного kontrahento.
+    Возвращает открытые sąskaitos выбранного kontrahento datai as_of.
 
     GET /apskaita/skolos/invoices/?type=customer&counterparty_code=123&counterparty_name=Client&as_of=2026-07-31
     GET /apskaita/skolos/invoices/?type=supplier&counterparty_code=123&counterparty_name=Telia&as_of=2026-07-31
     """
+    from .services.debts_ledger import DEBT_TYPES, counterparty_documents
+
     profile = _get_active_profile(request)
     if not profile:
         return Response({"detail": "Nepasirinktas įmonės profilis."}, status=400)
 
     debt_type = request.query_params.get("type", "customer")
-    if debt_type not in ["customer", "supplier"]:
+    if debt_type not in DEBT_TYPES:
         return Response(
             {"detail": "Netinkamas skolos tipas. Naudokite customer arba supplier."},
             status=400,
@@ -18120,84 +15811,34 @@ def apskaita_skolos_invoices(request):
 
     counterparty_code = request.query_params.get("counterparty_code", "").strip()
     counterparty_name = request.query_params.get("counterparty_name", "").strip()
-    as_of = request.query_params.get("as_of")
-
-    as_of_date = None
-    if as_of:
-        try:
-            year, month, day = as_of.split("-")
-            as_of_date = date(int(year), int(month), int(day))
-        except (ValueError, AttributeError):
-            as_of_date = None
-
-    money_field = DecimalField(max_digits=14, decimal_places=4)
-    zero = Value(Decimal("0.00"), output_field=money_field)
-
-    open_balance_expr = ExpressionWrapper(
-        Coalesce(F("amount_with_vat"), zero) - Coalesce(F("paid_amount"), zero),
-        output_field=money_field,
-    )
+    if not counterparty_code and not counterparty_name:
+        return Response({"detail": "Trūksta kontrahento."}, status=400)
 
-    if debt_type == "customer":
-        qs = Invoice.objects.filter(company_profile=profile)
-        source_type = "sale"
-
-        if as_of_date:
-            qs = qs.filter(invoice_date__lte=as_of_date)
-
-        if counterparty_code:
-            qs = qs.filter(buyer_id=counterparty_code)
-        elif counterparty_name:
-            qs = qs.filter(buyer_name=counterparty_name)
-        else:
-            return Response({"detail": "Trūksta kontrahento."}, status=400)
-
-    else:
-        qs = Purchase.objects.filter(company_profile=profile)
-        source_type = "purchase"
-
-        if as_of_date:
-            qs = qs.filter(invoice_date__lte=as_of_date)
-
-        if counterparty_code:
-            qs = qs.filter(seller_id=counterparty_code)
-        elif counterparty_name:
-            qs = qs.filter(seller_name=counterparty_name)
-        else:
-            return Response({"detail": "Trūksta kontrahento."}, status=400)
-
-    qs = (
-        qs.annotate(open_balance=open_balance_expr)
-        .filter(open_balance__gt=Decimal("0.009"))
-        .order_by("-invoice_date", "-id")
-    )
+    as_of_date = _parse_as_of(request.query_params.get("as_of"))
+    source_type = DEBT_TYPES[debt_type]["source_type"]
 
     results = []
-
-    for obj in qs:
+    for obj in counterparty_documents(profile, debt_type, as_of_date, counterparty_code, counterparty_name):
         amount = obj.amount_with_vat or Decimal("0")
-        paid = obj.paid_amount or Decimal("0")
-        balance = amount - paid
-
-        if balance <= Decimal("0.009"):
-            continue
-
-        payment_status = "partially_paid" if paid > 0 else "unpaid"
+        paid = obj.paid_as_of or Decimal("0")
 
         results.append({
             "id": obj.id,
             "source_type": source_type,
             "document_number": _get_document_number(obj),
             "invoice_date": obj.invoice_date.isoformat() if obj.invoice_date else None,
+            "due_date": obj.due_date.isoformat() if obj.due_date else None,
             "amount_with_vat": str(amount),
             "paid_amount": str(paid),
-            "balance": str(balance),
-            "payment_status": payment_status,
+            "balance": str(obj.open_balance),
+            "payment_status": "partially_paid" if paid > 0 else "unpaid",
+            "aging_bucket": obj.aging_bucket,
             "scanned_document_id": getattr(obj, "scanned_document_id", None),
         })
 
     return Response({
         "type": debt_type,
+        "as_of": as_of_date.isoformat(),
         "results": results,
     })
 
@@ -827,7 +827,7 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
   const [loading, setLoading] = useState(true);
   const [loadingMore, setLoadingMore] = useState(false);
   const [hasMore, setHasMore] = useState(false);
-  const [nextOffset, setNextOffset] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
 
   const [expandedKey, setExpandedKey] = useState(null);
   const [invoicesByKey, setInvoicesByKey] = useState({});
@@ -863,7 +863,7 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
   };
 
   const fetchDebts = useCallback(
-    async ({ offset = 0, append = false } = {}) => {
+    async ({ cursor = null, append = false } = {}) => {
       if (!activeProfileId) return;
 
       if (append) {
@@ -875,9 +875,10 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
       const params = {
         type: activeType,
         limit: LIMIT,
-        offset,
       };
 
+      if (cursor) params.cursor = cursor;
+
       if (period !== "custom") {
         const asOf = getPeriodEndDate(period);
         if (asOf) params.as_of = asOf;
@@ -899,9 +900,10 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
         const newRows = data.results || [];
 
         setRows((prev) => (append ? [...prev, ...newRows] : newRows));
-        setSummary(data.summary || { total_balance: "0" });
+        // summary grąžinamas tik pirmam puslapiui
+        if (!append) setSummary(data.summary || { total_balance: "0" });
         setHasMore(Boolean(data.has_more));
-        setNextOffset(data.next_offset ?? null);
+        setNextCursor(data.next_cursor ?? null);
       } catch (e) {
         console.error(e);
 
@@ -909,7 +911,7 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
           setRows([]);
           setSummary({ total_balance: "0" });
           setHasMore(false);
-          setNextOffset(null);
+          setNextCursor(null);
         }
       } finally {
         setLoading(false);
@@ -922,20 +924,20 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
   useEffect(() => {
     setExpandedKey(null);
     setInvoicesByKey({});
-    fetchDebts({ offset: 0, append: false });
+    fetchDebts({ cursor: null, append: false });
   }, [fetchDebts]);
 
   useEffect(() => {
     const el = loadMoreRef.current;
     if (!el) return;
-    if (!hasMore || loading || loadingMore || nextOffset == null) return;
+    if (!hasMore || loading || loadingMore || nextCursor == null) return;
 
     const observer = new IntersectionObserver(
       (entries) => {
         const first = entries[0];
 
         if (first.isIntersecting && hasMore && !loading && !loadingMore) {
-          fetchDebts({ offset: nextOffset, append: true });
+          fetchDebts({ cursor: nextCursor, append: true });
         }
       },
       { threshold: 0.4 }
@@ -944,7 +946,7 @@ function SkolosTab({ activeProfileId, period, dateFrom, dateTo }) {
     observer.observe(el);
 
     return () => observer.disconnect();
-  }, [fetchDebts, hasMore, loading, loadingMore, nextOffset]);
+  }, [fetchDebts, hasMore, loading, loadingMore, nextCursor]);
 
   const fetchInvoices = async (row) => {
     const key = getRowKey(row);
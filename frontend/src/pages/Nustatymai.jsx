@@ -95,6 +95,7 @@ function ImportTab({
   const [dragging, setDragging] = useState(false);
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
   const [deleteResult, setDeleteResult] = useState(null);
+  const [importProgress, setImportProgress] = useState(null);
 
     const handleDragOver = (e) => {
       e.preventDefault();
@@ -150,10 +151,27 @@ function ImportTab({
     const formData = new FormData();
     formData.append("file", file);
     try {
-      const { data } = await api.post(url, formData, {
+      const { data: started } = await api.post(url, formData, {
         withCredentials: true,
         headers: { "Content-Type": "multipart/form-data" },
       });
+      let data = started;
+      if (started?.session_id) {
+        // Importas vyksta fone — poll'inam statusą kol baigsis
+        setImportProgress({ processed: 0, total: 0 });
+        for (;;) {
+          await new Promise((r) => setTimeout(r, 1500));
+          const { data: st } = await api.get(
+            `/data/import-status/${started.session_id}/`,
+            { withCredentials: true }
+          );
+          setImportProgress({ processed: st.processed_rows || 0, total: st.total_rows || 0 });
+          if (st.stage === "done") {
+            data = st.report || {};
+            break;
+          }
+        }
+      }
       if (data?.error) {
         setError(data.error);
         setResult(null);
@@ -168,6 +186,7 @@ function ImportTab({
     } finally {
       if (inputRef.current) inputRef.current.value = "";
       setFile(null);
+      setImportProgress(null);
     }
   };
 
@@ -303,7 +322,7 @@ function ImportTab({
       <Stack direction="row" spacing={1.5} alignItems="center" sx={{ flexWrap: "wrap", gap: 1 }}>
         <Button
           variant="contained"
-          disabled={!file}
+          disabled={!file || !!importProgress}
           onClick={handleImport}
           size="small"
           startIcon={file ? <FileUploadIcon /> : undefined}
@@ -318,6 +337,13 @@ function ImportTab({
           Importuoti
         </Button>
 
+        {importProgress && (
+          <Typography variant="caption" sx={{ color: "text.secondary" }}>
+            Importuojama… {importProgress.processed}
+            {importProgress.total ? ` / ${importProgress.total}` : ""}
+          </Typography>
+        )}
+
         <Button
           variant="outlined"
           size="small"
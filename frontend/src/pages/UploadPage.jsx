@@ -497,11 +497,21 @@ export default function UploadPage() {
     setTransferring(true);
 
     try {
-      await api.post("/accounting/transfer/", {
+      const { data } = await api.post("/accounting/transfer/", {
         ...transferPayload,
         ...extraPayload,
       });
 
+      // Daug dokumentų — perkėlimas vyksta fone, laukiam kol baigsis
+      let job = data;
+      while (job?.stage === "queued" || job?.stage === "processing") {
+        await new Promise((r) => setTimeout(r, 2000));
+        ({ data: job } = await api.get(`/accounting/transfer/jobs/${job.id}/`));
+      }
+      if (job?.stage === "failed") {
+        throw new Error(job.error || "Perkėlimas nutrūko");
+      }
+
       setTransferPreview(null);
       setTransferPayload(null);
       setSelectedRows([]);